@@ -1,18 +1,29 @@
 import streamlit as st
 import pandas as pd
+import altair as alt
 from datetime import date
 from utils import (
-    calculate_age, 
-    cargar_tablas_de_mortalidad_reales, 
-    cargar_vector_vtd, 
-    cargar_tasas_de_venta,
-    calcular_descuentos_clp
+    calculate_age
 )
-from calculo_motor import (
-    calcular_factores_combinados, 
-    calcular_factor_sobrevivencia
+from cotizacion import (
+    AFP_COMMISSIONS,
+    CacheCotizaciones,
+    DatosMercado,
+    ErrorCotizacion,
+    Escenario,
+    ParametrosCotizacion,
+    cotizar_con_cache
 )
 from pdf_generator import create_native_pdf_report
+from modelos import Afiliado, Conyuge, Hijo, como_conyuge
+from registro_datos import BASE_DIR, obtener_registro
+from historico_vtd import backtest_vtd
+from grilla_productos import RANGO_PCT_AUMENTO, grilla_rvd, grilla_rvi
+from recomendador import RestriccionesAsesor, recomendar_modalidades
+from vejez_anticipada import SupuestosProyeccion, trayectoria_vejez_anticipada
+from cronograma_sobrevivencia import cronograma_sobrevivencia
+from mortalidad_generacional import tablas_generacionales
+from estres_longevidad import estres_cotizacion
 
 # --- 3. LA INTERFAZ WEB ---
 
@@ -21,65 +32,37 @@ st.set_page_config(page_title="Calculadora Pensiones", layout="wide")
 st.title("🤖 Calculadora de Pensiones 34.0 (Refactorizada)") # Título actualizado
 st.subheader("Centro de Cotizaciones y Generador de Informes")
 
-# --- Nombres de archivos Excel ---
-
 import os
 
-# --- Nombres de archivos Excel (PATH ABSOLUTO V35.0) ---
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-
-# Pilar 2: Tablas de Mortalidad (4 tablas)
-ARCHIVO_H_VEJEZ = os.path.join(BASE_DIR, 'CB-H-2020.xlsx')
-ARCHIVO_M_VEJEZ = os.path.join(BASE_DIR, 'B-M-2020.xlsx')
-ARCHIVO_H_INV = os.path.join(BASE_DIR, 'I-H-2020.xlsx')
-ARCHIVO_M_INV = os.path.join(BASE_DIR, 'I-M-2020.xlsx')
-
-TABLAS_DE_MORTALIDAD_REALES = cargar_tablas_de_mortalidad_reales(
-    ARCHIVO_H_VEJEZ, ARCHIVO_M_VEJEZ, ARCHIVO_H_INV, ARCHIVO_M_INV
-)
-if not TABLAS_DE_MORTALIDAD_REALES:
-    st.info("Esperando carga de tablas de mortalidad...")
-    st.stop()
-
-# --- INICIO PILAR 1 (VTD) V28.0 ---
-ARCHIVO_ETTI = os.path.join(BASE_DIR, 'VTD 2020-2025.xlsx')
-
-HOJA_VTD = 'SR 2025' 
-COL_MES_VTD = 'oct-25'
-COL_METRICA_VTD = 'Spot Rate' 
-
-VECTOR_VTD = cargar_vector_vtd(
-    ARCHIVO_ETTI, 
-    hoja=HOJA_VTD, 
-    col_mes=COL_MES_VTD, 
-    col_metrica=COL_METRICA_VTD
-)
-if not VECTOR_VTD:
-    st.error("Falla crítica: No se pudo cargar el Vector de Tasas de Descuento (VTD).")
-    st.stop()
-else:
-    vtd_details_str = f"VTD Cargado: {COL_MES_VTD} (Hoja {HOJA_VTD})"
-# --- FIN PILAR 1 V28.0 ---
-
-# --- INICIO CARGA V30.0 (TASAS DE VENTA) ---
-ARCHIVO_TASAS_VENTA = os.path.join(BASE_DIR, 'svtas_rv.xlsx')
-DF_TASAS_VENTA = cargar_tasas_de_venta(ARCHIVO_TASAS_VENTA)
-if DF_TASAS_VENTA is None:
-    st.error("Falla crítica: No se pudo cargar el archivo de Tasas de Venta (svtas_rv.xlsx).")
+# --- INICIO V40.0: REGISTRO DE DATOS CON RECARGA EN CALIENTE ---
+# Tablas de mortalidad, TODOS los meses del VTD y tasas de venta se leen del
+# registro del proceso (registro_datos.py). Un hilo vigila la carpeta de datos:
+# al publicarse un xlsx nuevo de la CMF, la próxima ejecución del script ya ve
+# la nueva instantánea, sin reiniciar la app.
+REGISTRO_DATOS = obtener_registro(BASE_DIR)
+DATOS = REGISTRO_DATOS.instantanea()
+if DATOS is None:
+    st.error(f"Falla crítica: No se pudieron cargar los archivos de datos (tablas, VTD o tasas de venta). {REGISTRO_DATOS.ultimo_error}")
     st.stop()
-# --- FIN CARGA V30.0 ---
-
 
-# --- Diccionario de Comisiones AFP ---
-AFP_COMMISSIONS = {
-    "AFP PLANVITAL": 0.00,
-    "AFP HABITAT": 0.95,
-    "AFP CAPITAL": 1.25,
-    "AFP CUPRUM": 1.25,
-    "AFP MODELO": 1.20,
-    "AFP PROVIDA": 1.25,
-    "AFP UNO": 1.20,
-}
+TABLAS_DE_MORTALIDAD_REALES = DATOS.tablas_mortalidad
+DF_TASAS_VENTA = DATOS.df_tasas_venta
+COL_MES_VTD = DATOS.mes_vtd_reciente # Se puede cambiar en el panel lateral
+# --- FIN V40.0 ---
+
+# --- INICIO V38.0: CACHÉ DE COTIZACIONES ---
+@st.cache_resource
+def obtener_cache_cotizaciones():
+    """
+    Caché de cotizaciones compartida por todas las sesiones del proceso.
+    Si existe la variable CALCULADORA_CACHE_COTIZACIONES se persiste en ese directorio
+    (se lee con pickle: debe ser un directorio de confianza, solo del servicio).
+    """
+    return CacheCotizaciones(
+        max_entradas=512,
+        directorio=os.environ.get("CALCULADORA_CACHE_COTIZACIONES")
+    )
+# --- FIN V38.0 ---
 
 # --- Panel Lateral de ENTRADA DE DATOS (¡¡MODIFICADA V34.0!!) ---
 with st.sidebar:
@@ -142,7 +125,16 @@ with st.sidebar:
     # --- FIN CAMBIO V34.0 ---
     
     else:
-        st.caption(vtd_details_str) # Muestra el VTD cargado solo si se usa
+        # --- INICIO CAMBIO V40.0 (Mes VTD seleccionable) ---
+        meses_vtd = list(reversed(DATOS.meses_vtd)) # Más reciente primero
+        COL_MES_VTD = st.selectbox(
+            "Mes VTD",
+            options=meses_vtd,
+            index=0,
+            help="Vector de Tasas de Descuento publicado por la CMF. Por defecto, el último mes disponible."
+        )
+        st.caption(f"VTD Cargado: {COL_MES_VTD} (Hoja {DATOS.hoja_por_mes[COL_MES_VTD]})") # Muestra el VTD cargado solo si se usa
+        # --- FIN CAMBIO V40.0 ---
     
     check_incluye_comision = st.checkbox("Ajustar por Comisión de Intermediación")
     
@@ -208,12 +200,12 @@ with st.sidebar:
         afiliado_edad_calculada = calculate_age(afiliado_dob)
         st.caption(f"Edad calculada: {afiliado_edad_calculada} años")
         
-        datos_afiliado = {
-            'edad': afiliado_edad_calculada,
-            'sexo': afiliado_sexo,
-            'es_invalido': (afiliado_tipo_pension == 'Invalidez')
+        datos_afiliado = Afiliado(
+            edad=afiliado_edad_calculada,
+            sexo=afiliado_sexo,
+            es_invalido=(afiliado_tipo_pension == 'Invalidez')
             # Nota: 'Vejez Anticipada' usa la misma tabla que 'Vejez (Edad Legal)'
-        }
+        )
 
         if afiliado_tipo_pension == 'Vejez Anticipada':
             input_promedio_10_anos_uf = st.number_input(
@@ -241,12 +233,12 @@ with st.sidebar:
         conyuge_edad_calculada = calculate_age(conyuge_dob)
         st.caption(f"Edad cónyuge calculada: {conyuge_edad_calculada} años")
         
-        datos_conyuge = {
-            'edad': conyuge_edad_calculada,
-            'sexo': conyuge_sexo, 
-            'pct_pension': 0.60,
-            'es_invalido': conyuge_es_invalido
-        }
+        datos_conyuge = Conyuge(
+            edad=conyuge_edad_calculada,
+            sexo=conyuge_sexo, 
+            pct_pension=0.60,
+            es_invalido=conyuge_es_invalido
+        )
 
     datos_hijos = []
     num_hijos = st.number_input("Número de Hijos (menores de 18/24)", min_value=0, max_value=10, step=1)
@@ -264,12 +256,20 @@ with st.sidebar:
         h_edad_calculada = calculate_age(h_dob)
         st.caption(f"Edad hijo {i+1} calculada: {h_edad_calculada} años")
         
-        datos_hijos.append({
-            'edad': h_edad_calculada,
-            'sexo': h_sexo,
-            'pct_pension': 0.15,
-            'edad_limite': h_limite
-        })
+        datos_hijos.append(Hijo(
+            edad=h_edad_calculada,
+            sexo=h_sexo,
+            pct_pension=0.15,
+            edad_limite=h_limite
+        ))
+    datos_hijos = tuple(datos_hijos) # V37.0: inmutable/hashable
+
+    # --- INICIO V49.0: TOPE 100% EXACTO POR ESTADO DE BENEFICIARIOS ---
+    check_sobrevivencia_exacta = st.checkbox(
+        "Sobrevivencia exacta (tope 100% por estado)", value=False,
+        help="Aplica el tope de 100% a cada combinación de beneficiarios vivos, en vez de al valor esperado. Relevante en familias numerosas."
+    )
+    # --- FIN V49.0 ---
     
     # --- Constructor de Escenarios V9.0 ---
     st.header("Centro de Cotizaciones")
@@ -330,6 +330,41 @@ with st.sidebar:
         )
     # --- FIN CAMBIO V33.0 ---
 
+    # --- INICIO CAMBIO V51.0 (Tablas generacionales) ---
+    st.subheader("Tablas de Mortalidad")
+    input_tipo_tablas = st.radio(
+        "Tipo de Tablas",
+        ["Estáticas 2020", "Generacionales (mejoramiento por cohorte)"],
+        index=0,
+        help="Las generacionales aplican los factores de mejoramiento AA de las tablas 2020 según el año de nacimiento de cada persona."
+    )
+    input_ano_valorizacion = date.today().year
+    if input_tipo_tablas != "Estáticas 2020":
+        input_ano_valorizacion = st.number_input(
+            "Año de Valorización", min_value=2016, max_value=2040, value=date.today().year, step=1
+        )
+    # --- FIN CAMBIO V51.0 ---
+
+
+# --- INICIO V38.0: DATOS DE MERCADO (MODIFICADO V40.0: mes VTD elegido) ---
+# (AFP_COMMISSIONS ahora vive en cotizacion.py)
+# (V51.0) Con tablas generacionales la versión incluye el año de valorización
+version_datos_mercado = DATOS.version_mes(COL_MES_VTD)
+if input_tipo_tablas == "Estáticas 2020":
+    tablas_cotizacion = TABLAS_DE_MORTALIDAD_REALES
+else:
+    tablas_cotizacion = tablas_generacionales(BASE_DIR, DATOS.version, int(input_ano_valorizacion))
+    version_datos_mercado = f"{version_datos_mercado}|gen{int(input_ano_valorizacion)}"
+
+DATOS_MERCADO = DatosMercado(
+    tablas_mortalidad=tablas_cotizacion,
+    vector_vtd=DATOS.vector_vtd(COL_MES_VTD),
+    df_tasas_venta=DF_TASAS_VENTA,
+    col_mes_vtd=COL_MES_VTD,
+    vtd_details_str=f"VTD Cargado: {COL_MES_VTD} (Hoja {DATOS.hoja_por_mes[COL_MES_VTD]})",
+    version=version_datos_mercado
+)
+# --- FIN V38.0 ---
 
 # --- 4. EL BOTÓN DE CÁLCULO Y LOS RESULTADOS (¡¡REFACTORIZADO V34.0!!) ---
 
@@ -342,519 +377,66 @@ if 'report_data' not in st.session_state:
     st.session_state.report_data = {}
 
 
-if st.button("Generar Informe Comparativo", key="generar_informe"):
-    
-    # --- Lógica Común de Primas y Tasas (V31.0) ---
-    tasa_rp_decimal = input_tasa_rp / 100.0
-    
-    comision_decimal = 0.0
-    if check_incluye_comision:
-        comision_decimal = input_comision_pct / 100.0
+# --- INICIO CAMBIO V38.0 (Cotizador con caché) (MODIFICADO V45.0) ---
+# Toda la lógica de cálculo vive en cotizacion.py; aquí solo se
+# arman los parámetros (fuera del botón: los usa también el Backtest VTD).
+escenarios_activos = tuple(
+    Escenario(nombre, pg, anos, pct)
+    for activo, pg, anos, pct, nombre in (
+        (check_esc_a, a_pg_anos, a_anos_aum, a_pct_aum, "Escenario A"),
+        (check_esc_b, b_pg_anos, b_anos_aum, b_pct_aum, "Escenario B"),
+        (check_esc_c, c_pg_anos, c_anos_aum, c_pct_aum, "Escenario C"),
+    )
+    if activo
+)
 
-    prima_neta_rp = saldo_uf 
-    prima_neta_rvi = saldo_uf * (1 - comision_decimal)
-    
-    # Inicializar listas
-    rp_rows = []
-    rvi_simple_rows = []
-    rvat_rows = []
-    rvd_rows = [] # <-- AÑADIDO V33.0
-    
-    afp_details_str = ""
-    comision_header_str = ""
+parametros = ParametrosCotizacion(
+    input_afiliado_nombre=input_afiliado_nombre,
+    input_valor_uf_clp=input_valor_uf_clp,
+    saldo_uf=saldo_uf,
+    input_afp_nombre=input_afp_nombre,
+    input_tasa_rp=input_tasa_rp,
+    input_metodo_rvi=input_metodo_rvi,
+    input_cia_rvi=input_cia_rvi,
+    check_comparar_todas=check_comparar_todas,
+    check_incluye_comision=check_incluye_comision,
+    input_comision_pct=input_comision_pct,
+    input_valor_pgu_clp=input_valor_pgu_clp,
+    check_incluye_pgu=check_incluye_pgu,
+    check_incluye_bono=check_incluye_bono,
+    input_bonificacion_uf=input_bonificacion_uf,
+    afiliado_tipo_pension=afiliado_tipo_pension,
+    afiliado_edad_calculada=afiliado_edad_calculada,
+    input_pension_referencia_uf=input_pension_referencia_uf,
+    input_promedio_10_anos_uf=input_promedio_10_anos_uf,
+    datos_afiliado=datos_afiliado,
+    datos_conyuge=datos_conyuge,
+    datos_hijos=datos_hijos,
+    check_rp=check_rp,
+    check_rvi_simple=check_rvi_simple,
+    escenarios=escenarios_activos,
+    check_rp_rvd=check_rp_rvd,
+    n_anos_diferimiento=n_anos_diferimiento,
+    check_sobrevivencia_exacta=check_sobrevivencia_exacta
+)
 
-    # --- Lógica PGU/Bono (V29.0 - Sin cambios) ---
-    bonificacion_clp = 0.0
-    valor_pgu_a_sumar = 0.0
-    texto_adicional = [] 
-    
-    if check_incluye_pgu:
-        valor_pgu_a_sumar = input_valor_pgu_clp
-        texto_adicional.append(f"PGU (${input_valor_pgu_clp:,.0f})")
-        
-    if check_incluye_bono:
-        bonificacion_clp = input_bonificacion_uf * input_valor_uf_clp
-        texto_adicional.append("Bonificación")
-    
-    pgu_texto_simple = ""
-    pgu_texto_base = ""
-    
-    if texto_adicional:
-        pgu_texto_simple = f" Pension + {' + '.join(texto_adicional)}" 
-        pgu_texto_base = f" Pension + {' + '.join(texto_adicional)}" 
+
+if st.button("Generar Informe Comparativo", key="generar_informe"):
     
+    try:
+        resultado = cotizar_con_cache(parametros, DATOS_MERCADO, obtener_cache_cotizaciones())
+    except ErrorCotizacion as e:
+        for nivel, texto in e.mensajes:
+            getattr(st, nivel)(texto)
+        for linea in e.args:
+            st.error(linea)
+        st.stop()
     
-    # --- Lógica de Selección de Motor RVI (V30.0 - Sin cambios) ---
-    metodo_rvi_desc = "" 
-    tasa_plana_rvi_final = 0.0 
-    modo_calculo_rvi_final = "" 
+    for nivel, texto in resultado.mensajes:
+        getattr(st, nivel)(texto)
     
-    if input_metodo_rvi == "Tasa de Venta (Promedio Mercado)":
-        
-        # --- INICIO CAMBIO V34.0 ---
-        # Determinar la columna a usar (Vejez o Invalidez)
-        # Esta se usará para el 'input_cia_rvi' (Media Mercado o una Cía. específica)
-        columna_tasa = 'Vejez' # Default
-        if afiliado_tipo_pension == 'Invalidez':
-                 columna_tasa = 'Invalidez total' # Mapeo
-        # --- FIN CAMBIO V34.0 ---
-        
-        try:
-            # input_cia_rvi se define en el sidebar (V34.0)
-            tasa_cia_pct = DF_TASAS_VENTA.loc[input_cia_rvi, columna_tasa]
-            tasa_plana_rvi_final = tasa_cia_pct / 100.0
-            modo_calculo_rvi_final = 'TASA_PLANA' # Usará el motor de tasa plana
-            
-            # La descripción dependerá de si se comparan todas o no
-            if check_comparar_todas:
-                 metodo_rvi_desc = f"Tasa Venta: Comparador (Base Escenarios: {input_cia_rvi} {tasa_cia_pct}%)"
-            else:
-                 metodo_rvi_desc = f"Tasa de Venta: {input_cia_rvi} ({columna_tasa}: {tasa_cia_pct}%)"
-
-        except KeyError:
-            st.error(f"No se encontró la tasa para {input_cia_rvi} / {columna_tasa}")
-            st.stop()
-            
-    else: # "Vector de Descuento (Tarificador CMF)"
-        modo_calculo_rvi_final = 'RVI' # Usará el motor VTD
-        tasa_plana_rvi_final = 0.0 # No se usa
-        metodo_rvi_desc = f"Vector de Descuento (VTD: {COL_MES_VTD})"
-        
-    # --- ¡¡INICIO REFACTOR V32.0: BIFURCACIÓN DE LÓGICA!! ---
-
-    # Si NO hay beneficiarios, el modo Sobrevivencia no tiene sentido.
-    if afiliado_tipo_pension == 'Sobrevivencia' and not incluye_conyuge and num_hijos == 0:
-        st.error("Error en modo Sobrevivencia: Debe ingresar al menos un beneficiario (Cónyuge o Hijos).")
-        st.stop()
-
-
-    # --- RAMA 1: CÁLCULO DE SOBREVIVENCIA ---
-    if afiliado_tipo_pension == 'Sobrevivencia':
-        
-        st.warning("MODO SOBREVIVENCIA: Los cálculos de Retiro Programado, Aumento Temporal y RP-RVD no aplican.")
-        check_rp = False # Forzar a que no se calcule RP
-        check_esc_a = check_esc_b = check_esc_c = False # No aplican escenarios
-        check_rp_rvd = False # No aplica escenario híbrido
-        
-        # 1. Calcular el Factor de Costo
-        factor_sobrevivencia = calcular_factor_sobrevivencia(
-            datos_conyuge, datos_hijos,
-            VECTOR_VTD,
-            TABLAS_DE_MORTALIDAD_REALES,
-            modo_calculo=modo_calculo_rvi_final,
-            tasa_plana_rv=tasa_plana_rvi_final
-        )
-
-        if factor_sobrevivencia == 0:
-            st.error("Error: El factor de sobrevivencia es cero. No se puede calcular la pensión.")
-            st.stop()
-
-        # 2. Calcular la Pensión de Referencia (PR) que el saldo puede financiar
-        pension_ref_uf_financiable = (prima_neta_rvi / factor_sobrevivencia) / 12.0
-        
-        # 3. Determinar la PR Final a Pagar
-        pension_ref_final_uf = 0.0
-        if pension_ref_uf_financiable < input_pension_referencia_uf:
-            pension_ref_final_uf = pension_ref_uf_financiable
-            st.warning(f"Saldo Insuficiente: La PR legal ({input_pension_referencia_uf:.2f} UF) "
-                       f"es mayor a la financiable ({pension_ref_uf_financiable:.2f} UF). "
-                       "Se pagará la pensión financiable.")
-        else:
-            pension_ref_final_uf = input_pension_referencia_uf
-
-        # 4. Poblar las filas del reporte (una fila por beneficiario)
-        
-        modalidad_sob_desc = "PENSIÓN SOBREVIVENCIA"
-        tasa_usada_pct = None # V34.0
-        
-        if modo_calculo_rvi_final == 'TASA_PLANA':
-            modalidad_sob_desc += f" ({input_cia_rvi})"
-            col_tasa = 'Vejez' if afiliado_tipo_pension != 'Invalidez' else 'Invalidez total'
-            tasa_usada_pct = DF_TASAS_VENTA.loc[input_cia_rvi, col_tasa]
-
-
-        # Añadir Cónyuge al reporte
-        if incluye_conyuge:
-            pension_conyuge_uf = pension_ref_final_uf * datos_conyuge['pct_pension']
-            bruto, dscto, liq = calcular_descuentos_clp(pension_conyuge_uf, input_valor_uf_clp)
-            rvi_simple_rows.append({
-                "Modalidad": f"{modalidad_sob_desc} (Cónyuge {datos_conyuge['pct_pension']*100:.0f}%)",
-                "Tasa (%)": tasa_usada_pct, # V34.0
-                "Pensión (UF)": pension_conyuge_uf,
-                "Pensión M. Bruto": bruto, "Dscto. 7% Salud": dscto, "Pensión Liquida": liq
-            })
-            
-        # Añadir Hijos al reporte
-        for i, hijo_data in enumerate(datos_hijos):
-            pension_hijo_uf = pension_ref_final_uf * hijo_data['pct_pension']
-            bruto, dscto, liq = calcular_descuentos_clp(pension_hijo_uf, input_valor_uf_clp)
-            rvi_simple_rows.append({
-                "Modalidad": f"{modalidad_sob_desc} (Hijo {i+1} {hijo_data['pct_pension']*100:.0f}%)",
-                "Tasa (%)": tasa_usada_pct, # V34.0
-                "Pensión (UF)": pension_hijo_uf,
-                "Pensión M. Bruto": bruto, "Dscto. 7% Salud": dscto, "Pensión Liquida": liq
-            })
-
-
-    # --- RAMA 2: CÁLCULO DE VEJEZ, V. ANTICIPADA E INVALIDEZ ---
-    else:
-        
-        # --- NUEVO "GATEKEEPER" V32.0: VEJEZ ANTICIPADA ---
-        if afiliado_tipo_pension == 'Vejez Anticipada':
-            ft_temp, fd_temp = calcular_factores_combinados(
-                datos_afiliado, datos_conyuge, datos_hijos,
-                VECTOR_VTD, TABLAS_DE_MORTALIDAD_REALES,
-                modo_calculo_rvi_final, tasa_plana_rvi_final, 0, 0
-            )
-            factor_total_temp = ft_temp + fd_temp
-            if factor_total_temp == 0:
-                st.error("Error de división por cero al verificar Vejez Anticipada.")
-                st.stop()
-            
-            pension_verificacion_uf = (prima_neta_rvi / factor_total_temp) / 12.0
-            pension_minima_requerida = input_promedio_10_anos_uf * 0.80
-            
-            if pension_verificacion_uf < pension_minima_requerida:
-                st.error(f"AFILIADO NO CALIFICA PARA VEJEZ ANTICIPADA:")
-                st.error(f"  - Pensión Calculada: {pension_verificacion_uf:,.2f} UF")
-                st.error(f"  - Requisito (80% Promedio): {pension_minima_requerida:,.2f} UF")
-                st.stop()
-            else:
-                st.success(f"Afiliado CALIFICA para Vejez Anticipada (Pensión {pension_verificacion_uf:,.2f} UF >= {pension_minima_requerida:,.2f} UF)")
-
-        # --- Tarea 1: Retiro Programado (MODIFICADO V24.1) ---
-        if check_rp:
-            ft_rp, fd_rp = calcular_factores_combinados(
-                datos_afiliado, 
-                datos_conyuge, datos_hijos,
-                None, # No usa VTD
-                TABLAS_DE_MORTALIDAD_REALES,
-                modo_calculo='RP', # Modo RP
-                tasa_plana_rp=tasa_rp_decimal, # Tasa para RP
-                periodo_garantizado_en_anos=0,
-                anos_de_aumento=0
-            )
-            factor_total_rp = ft_rp + fd_rp
-            
-            pension_rp_uf_bruta = (prima_neta_rp / factor_total_rp) / 12.0
-            
-            comision_pct = AFP_COMMISSIONS.get(input_afp_nombre, 0.0) / 100.0
-            comision_uf = pension_rp_uf_bruta * comision_pct
-            pension_rp_uf_neta = pension_rp_uf_bruta - comision_uf
-            
-            bruto_clp, dscto_clp, liq_clp = calcular_descuentos_clp(pension_rp_uf_neta, input_valor_uf_clp)
-            
-            comision_clp = comision_uf * input_valor_uf_clp
-            afp_details_str = f"({input_afp_nombre} - {comision_pct*100:.2f}%)"
-            comision_header_str = f"Desc. {comision_pct*100:.2f}%"
-            
-            rp_rows.append({
-                "Modalidad": "RETIRO PROGRAMADO",
-                "Pensión (UF)": pension_rp_uf_neta,
-                "Pensión M. Bruto": bruto_clp,
-                "Comisión AFP": comision_clp, 
-                "Dscto. 7% Salud": dscto_clp,
-                "Pensión Liquida": liq_clp
-            })
-            
-        # --- Función de ayuda para calcular RVI (MODIFICADA V30.0) ---
-        def calcular_escenario_rvi(prima_a_usar, pg_anos, at_anos, pct_aumento):
-            
-            ft_rv, fd_rv = calcular_factores_combinados(
-                datos_afiliado, 
-                datos_conyuge, datos_hijos,
-                VECTOR_VTD, 
-                TABLAS_DE_MORTALIDAD_REALES,
-                modo_calculo=modo_calculo_rvi_final, 
-                tasa_plana_rp=tasa_plana_rvi_final, 
-                periodo_garantizado_en_anos=pg_anos,
-                anos_de_aumento=at_anos
-            )
-            
-            pct_aumento_decimal = pct_aumento / 100.0
-            denominador = (ft_rv * (1 + pct_aumento_decimal)) + fd_rv
-            
-            if denominador == 0: pension_anual_referencia = 0
-            else: 
-                pension_anual_referencia = prima_a_usar / denominador
-            
-            pension_anual_aumentada = pension_anual_referencia * (1 + pct_aumento_decimal)
-            
-            return {
-                'p_ref_uf': pension_anual_referencia / 12.0,
-                'p_aum_uf': pension_anual_aumentada / 12.0,
-                'anos_aum': at_anos, 'pct_aum': pct_aumento,
-                'pg_anos': pg_anos
-            }
-
-        # --- Tarea 2: RVI Simple (¡¡MODIFICADO V34.0!!) ---
-        if check_rvi_simple:
-            
-            # --- INICIO BLOQUE V34.0 (Comparador) ---
-            if input_metodo_rvi == "Tasa de Venta (Promedio Mercado)" and check_comparar_todas:
-                st.info(f"Modo Comparación: Calculando RVI Simple para las {len(DF_TASAS_VENTA.index)} compañías.")
-                
-                # Determinar la columna a usar (Vejez o Invalidez)
-                columna_tasa = 'Vejez' # Default
-                if afiliado_tipo_pension == 'Invalidez':
-                    columna_tasa = 'Invalidez total'
-                
-                resultados_comparacion = []
-
-                # Iterar por cada compañía en el archivo de tasas
-                for cia_nombre in DF_TASAS_VENTA.index:
-                    try:
-                        tasa_cia_pct = DF_TASAS_VENTA.loc[cia_nombre, columna_tasa]
-                        tasa_plana_loop = tasa_cia_pct / 100.0
-
-                        # 1. Calcular Factores (Motor 1) para esta Cía.
-                        ft_rv, fd_rv = calcular_factores_combinados(
-                            datos_afiliado, 
-                            datos_conyuge, datos_hijos,
-                            VECTOR_VTD, # Se pasa, pero el modo 'TASA_PLANA' lo ignora
-                            TABLAS_DE_MORTALIDAD_REALES,
-                            modo_calculo='TASA_PLANA', # Forzamos modo TASA_PLANA
-                            tasa_plana_rp=tasa_plana_loop, # ¡Usamos la tasa del bucle!
-                            periodo_garantizado_en_anos=0, # RVI Simple
-                            anos_de_aumento=0 # RVI Simple
-                        )
-                        factor_total = ft_rv + fd_rv
-                        if factor_total == 0: continue 
-
-                        # 2. Calcular Pensión
-                        pension_anual_ref = prima_neta_rvi / factor_total
-                        pension_mensual_uf = pension_anual_ref / 12.0
-                        
-                        # 3. Calcular CLP
-                        bruto, dscto, liq = calcular_descuentos_clp(pension_mensual_uf, input_valor_uf_clp)
-
-                        # 4. Guardar resultado
-                        resultados_comparacion.append({
-                            "Modalidad": cia_nombre, # Nombre limpio de la Cía.
-                            "Tasa (%)": tasa_cia_pct,
-                            "Pensión (UF)": pension_mensual_uf,
-                            "Pensión M. Bruto": bruto,
-                            "Dscto. 7% Salud": dscto,
-                            "Pensión Liquida": liq
-                        })
-
-                    except Exception as e:
-                        st.warning(f"No se pudo calcular para {cia_nombre} (Tasa: {columna_tasa}): {e}")
-                
-                # 5. ¡ORDENAR! (De mayor a menor pensión)
-                resultados_ordenados = sorted(resultados_comparacion, key=lambda x: x['Pensión (UF)'], reverse=True)
-                
-                # 6. Poblar rvi_simple_rows
-                rvi_simple_rows.extend(resultados_ordenados) # Añadir todos los resultados
-
-            else:
-                # --- CÓDIGO V33.0 ORIGINAL (Si el comparador NO está activo) ---
-                res = calcular_escenario_rvi(prima_neta_rvi, 0, 0, 0)
-                bruto, dscto, liq = calcular_descuentos_clp(res['p_ref_uf'], input_valor_uf_clp)
-                
-                modalidad_simple_desc = "RVI SIMPLE"
-                tasa_usada_pct = None
-                
-                if modo_calculo_rvi_final == 'TASA_PLANA':
-                     modalidad_simple_desc += f" ({input_cia_rvi})"
-                     # Buscamos la tasa que se usó
-                     col_tasa = 'Vejez' if afiliado_tipo_pension != 'Invalidez' else 'Invalidez total'
-                     tasa_usada_pct = DF_TASAS_VENTA.loc[input_cia_rvi, col_tasa]
-
-                rvi_simple_rows.append({
-                    "Modalidad": modalidad_simple_desc,
-                    "Tasa (%)": tasa_usada_pct, # <-- AÑADIDO V34.0
-                    "Pensión (UF)": res['p_ref_uf'],
-                    "Pensión M. Bruto": bruto,
-                    "Dscto. 7% Salud": dscto,
-                    "Pensión Liquida": liq
-                })
-                
-                # Lógica de PGU/Bono (sin cambios)
-                if check_incluye_pgu or check_incluye_bono:
-                    pgu_total_clp = liq + valor_pgu_a_sumar + bonificacion_clp
-                    rvi_simple_rows.append({
-                        "Modalidad": pgu_texto_simple,
-                        "Pensión Liquida": pgu_total_clp,
-                        "is_bonus_row": True
-                    })
-            # --- FIN BLOQUE V34.0 ---
-        
-        # --- Función para procesar escenarios (MODIFICADO V29.0) ---
-        def procesar_escenario(check, pg_anos, at_anos, pct_aum, nombre_esc):
-            if check:
-                res = calcular_escenario_rvi(prima_neta_rvi, pg_anos, at_anos, pct_aum)
-                if pct_aum == 0:
-                    bruto, dscto, liq = calcular_descuentos_clp(res['p_ref_uf'], input_valor_uf_clp)
-                    modalidad_nombre = f"{nombre_esc} (PG: {pg_anos}a)"
-                    if pg_anos == 0: modalidad_nombre = f"{nombre_esc} (Simple)"
-                    
-                    rvi_simple_rows.append({
-                        "Modalidad": modalidad_nombre,
-                        "Pensión (UF)": res['p_ref_uf'],
-                        "Pensión M. Bruto": bruto,
-                        "Dscto. 7% Salud": dscto,
-                        "Pensión Liquida": liq
-                    })
-                    
-                    if check_incluye_pgu or check_incluye_bono:
-                        pgu_total_clp = liq + valor_pgu_a_sumar + bonificacion_clp
-                        rvi_simple_rows.append({
-                            "Modalidad": pgu_texto_simple,
-                            "Pensión Liquida": pgu_total_clp,
-                            "is_bonus_row": True
-                        })
-                else:
-                    bruto_ref, dscto_ref, liq_ref = calcular_descuentos_clp(res['p_ref_uf'], input_valor_uf_clp)
-                    bruto_aum, dscto_aum, liq_aum = calcular_descuentos_clp(res['p_aum_uf'], input_valor_uf_clp)
-                    
-                    modalidad_texto_aumentado = f"R. V. Aumentado {at_anos * 12} meses - Garantizado {pg_anos * 12} meses."
-                    rvat_rows.append({
-                        "Modalidad": modalidad_texto_aumentado,
-                        "Pensión (UF)": res['p_aum_uf'],
-                        "Pensión M. Bruto": bruto_aum,
-                        "Dscto. 7% Salud": dscto_aum,
-                        "Pensión Liquida": liq_aum
-                    })
-                    
-                    if check_incluye_pgu or check_incluye_bono:
-                        pgu_total_clp_aumentada = liq_aum + valor_pgu_a_sumar + bonificacion_clp
-                        rvat_rows.append({
-                            "Modalidad": pgu_texto_base, 
-                            "Pensión Liquida": pgu_total_clp_aumentada,
-                            "is_bonus_row": True 
-                        })
-                    
-                    rvat_rows.append({
-                        "Modalidad": f" - P. BASE (desde mes {at_anos * 12 + 1}) Pension Definitiva",
-                        "Pensión (UF)": res['p_ref_uf'],
-                        "Pensión M. Bruto": bruto_ref,
-                        "Dscto. 7% Salud": dscto_ref,
-                        "Pensión Liquida": liq_ref
-                    })
-                    
-                    if check_incluye_pgu or check_incluye_bono:
-                        pgu_total_clp_base = liq_ref + valor_pgu_a_sumar + bonificacion_clp
-                        rvat_rows.append({
-                            "Modalidad": pgu_texto_base,
-                            "Pensión Liquida": pgu_total_clp_base,
-                            "is_bonus_row": True 
-                        })
-        
-        # --- Tareas 3, 4, 5 (usando la nueva función) ---
-        procesar_escenario(check_esc_a, a_pg_anos, a_anos_aum, a_pct_aum, "Escenario A")
-        procesar_escenario(check_esc_b, b_pg_anos, b_anos_aum, b_pct_aum, "Escenario B")
-        procesar_escenario(check_esc_c, c_pg_anos, c_anos_aum, c_pct_aum, "Escenario C")
-
-        # --- INICIO TAREA 6 (V33.0): RP con RVD ---
-        if check_rp_rvd:
-            
-            # 1. Calcular Factor Temporal de RP (ft_rp)
-            (ft_rp, _) = calcular_factores_combinados(
-                datos_afiliado, 
-                datos_conyuge, datos_hijos,
-                None, # No usa VTD
-                TABLAS_DE_MORTALIDAD_REALES,
-                modo_calculo='RP',
-                tasa_plana_rp=tasa_rp_decimal,
-                periodo_garantizado_en_anos=0,
-                anos_de_aumento=n_anos_diferimiento # N años
-            )
-            
-            # 2. Calcular Factor Diferido de RVI (fd_rvi)
-            (_, fd_rvi) = calcular_factores_combinados(
-                datos_afiliado, 
-                datos_conyuge, datos_hijos,
-                VECTOR_VTD, 
-                TABLAS_DE_MORTALIDAD_REALES,
-                modo_calculo=modo_calculo_rvi_final,
-                tasa_plana_rp=tasa_plana_rvi_final,
-                periodo_garantizado_en_anos=0, # RVD simple
-                anos_de_aumento=n_anos_diferimiento # N años
-            )
-
-            # 3. Calcular Factor Híbrido Ajustado por comisión
-            denominador_comision = (1 - comision_decimal)
-            if denominador_comision == 0:
-                st.error("Error: Comisión del 100% no es válida.")
-                st.stop()
-                
-            factor_hibrido_ajustado = ft_rp + (fd_rvi / denominador_comision)
-            
-            if factor_hibrido_ajustado <= 0:
-                st.error("Error: Factor híbrido es cero o negativo.")
-                st.stop()
-
-            # 4. Calcular Pensión
-            pension_anual_uf = prima_neta_rp / factor_hibrido_ajustado
-            pension_mensual_uf = pension_anual_uf / 12.0
-            
-            # 5. Calcular valores en CLP para ambos períodos
-            
-            # --- Período RP (Paga 7% salud + Comisión AFP) ---
-            comision_pct_afp = AFP_COMMISSIONS.get(input_afp_nombre, 0.0) / 100.0
-            comision_uf_afp = pension_mensual_uf * comision_pct_afp
-            pension_uf_neta_rp = pension_mensual_uf - comision_uf_afp
-            
-            bruto_clp_rp, dscto_clp_rp, liq_clp_rp = calcular_descuentos_clp(
-                pension_uf_neta_rp, input_valor_uf_clp
-            )
-            comision_clp_afp = comision_uf_afp * input_valor_uf_clp
-            
-            # --- Período RVD (Paga SÓLO 7% salud) ---
-            bruto_clp_rvd, dscto_clp_rvd, liq_clp_rvd = calcular_descuentos_clp(
-                pension_mensual_uf, input_valor_uf_clp
-            )
-
-            # 6. Añadir a las filas del reporte
-            rvd_rows.append({
-                "Modalidad": f"RP-RVD (Meses 1 a {n_anos_diferimiento * 12})",
-                "Pensión (UF)": pension_uf_neta_rp, # Neta de AFP
-                "Pensión M. Bruto": bruto_clp_rp,
-                "Comisión AFP": comision_clp_afp, 
-                "Dscto. 7% Salud": dscto_clp_rp,
-                "Pensión Liquida": liq_clp_rp
-            })
-            
-            rvd_rows.append({
-                "Modalidad": f" - (P. RVD desde mes {n_anos_diferimiento * 12 + 1})",
-                "Pensión (UF)": pension_mensual_uf, # Bruta (sin AFP)
-                "Pensión M. Bruto": bruto_clp_rvd,
-                "Comisión AFP": 0.0, # No hay comisión AFP
-                "Dscto. 7% Salud": dscto_clp_rvd,
-                "Pensión Liquida": liq_clp_rvd
-            })
-        # --- FIN TAREA 6 (V33.0) ---
-
-    # --- FIN REFACTOR V32.0 ---
-    
-    # --- Guardar los datos para el constructor de PDF (MODIFICADO V34.0) ---
-    report_data = {
-        "input_afiliado_nombre": input_afiliado_nombre,
-        "input_valor_uf_clp": input_valor_uf_clp,
-        "saldo_uf": saldo_uf,
-        "afiliado_edad_calculada": afiliado_edad_calculada,
-        "afiliado_tipo_pension": afiliado_tipo_pension, # V32
-        "es_sobrevivencia": (afiliado_tipo_pension == 'Sobrevivencia'), # V32
-        "incluye_conyuge": incluye_conyuge,
-        "datos_conyuge": datos_conyuge, 
-        "datos_hijos": datos_hijos,
-        "afp_details_str": afp_details_str,
-        "comision_header_str": comision_header_str, 
-        "rp_rows": rp_rows,
-        "rvi_simple_rows": rvi_simple_rows,
-        "rvat_rows": rvat_rows,
-        "rvd_rows": rvd_rows, # V33
-        "vtd_details": vtd_details_str, 
-        "metodo_rvi_desc": metodo_rvi_desc, # V30/V34
-        "check_incluye_pgu": check_incluye_pgu,
-        "check_incluye_bono": check_incluye_bono,
-        "input_valor_pgu_clp": input_valor_pgu_clp,
-        "input_bonificacion_uf": input_bonificacion_uf,
-        "check_incluye_comision": check_incluye_comision, # P3
-        "input_comision_pct": input_comision_pct, # P3
-        "prima_neta_rvi": prima_neta_rvi # P3
-    }
+    report_data = resultado.report_data
+    # --- FIN CAMBIO V38.0 ---
     
     try:
         pdf_bytes = create_native_pdf_report(report_data)
@@ -888,8 +470,9 @@ if st.session_state.report_generated:
     # --- FIN V32.0 ---
     
     if data['incluye_conyuge']:
-        tipo_conyuge = "Inválido" if data['datos_conyuge']['es_invalido'] else ""
-        st.markdown(f"**Beneficiario Conyuge:** `{data['datos_conyuge']['edad']} años {tipo_conyuge}`") 
+        conyuge = como_conyuge(data['datos_conyuge'])
+        tipo_conyuge = "Inválido" if conyuge.es_invalido else ""
+        st.markdown(f"**Beneficiario Conyuge:** `{conyuge.edad} años {tipo_conyuge}`") 
     
     st.markdown(f"**Saldo Acumulado (Bruto):** `{data['saldo_uf']:,.0f} UF`".replace(",", ".")) 
     
@@ -1011,3 +594,206 @@ if st.session_state.report_generated:
             mime="application/pdf",
             key="download_button"
         )
+
+
+# --- INICIO V45.0: BACKTEST HISTÓRICO CONTRA TODOS LOS MESES DEL VTD ---
+st.markdown("---")
+st.subheader("Backtest Histórico (VTD)")
+st.caption(
+    f"Pensión (UF) del perfil ingresado valorizada con cada uno de los {len(DATOS.meses_vtd)} meses "
+    f"del VTD publicados ({DATOS.meses_vtd[0]} a {DATOS.mes_vtd_reciente}). La RVI se calcula siempre con el VTD."
+)
+if st.button("Calcular Backtest VTD", key="calcular_backtest"):
+    df_backtest = backtest_vtd(parametros, DATOS)
+    columnas_pension = [c for c in df_backtest.columns if c != "Fecha"]
+    if columnas_pension:
+        st.line_chart(df_backtest.set_index("Fecha")[columnas_pension])
+        st.dataframe(df_backtest.style.format("{:,.2f}", subset=columnas_pension))
+    else:
+        st.info("No hay modalidades activas para el backtest.")
+# --- FIN V45.0 ---
+
+
+# --- INICIO V46.0: GRILLA DE PRODUCTOS (TODOS LOS P.G. / AUMENTOS / RVD) ---
+st.markdown("---")
+st.subheader("Grilla de Productos")
+st.caption(
+    "Pensión de RVI para todo P.G. (0 a 25 años) x años de aumento (1 a 25) x % de aumento, "
+    "y de RP con RVD para cada año de diferimiento, con el método RVI seleccionado."
+)
+grilla_pct_aumento = st.select_slider(
+    "% Aumento a mostrar", options=list(RANGO_PCT_AUMENTO), value=50, key="grilla_pct"
+)
+if st.button("Calcular Grilla de Productos", key="calcular_grilla"):
+    try:
+        df_grilla = grilla_rvi(parametros, DATOS_MERCADO)
+        df_grilla_rvd = grilla_rvd(parametros, DATOS_MERCADO)
+    except ErrorCotizacion as e:
+        st.error(str(e))
+    else:
+        columna_grilla = "Pensión Aumentada (UF)" if grilla_pct_aumento > 0 else "Pensión Base (UF)"
+        df_corte = df_grilla[df_grilla["% Aumento"] == grilla_pct_aumento]
+        st.altair_chart(
+            alt.Chart(df_corte).mark_rect().encode(
+                x=alt.X("Años Aumento:O"),
+                y=alt.Y("PG (años):O"),
+                color=alt.Color(f"{columna_grilla}:Q", scale=alt.Scale(scheme="viridis")),
+                tooltip=["PG (años)", "Años Aumento", alt.Tooltip(f"{columna_grilla}:Q", format=",.2f")]
+            ),
+            use_container_width=True
+        )
+        st.dataframe(
+            df_corte.pivot(index="PG (años)", columns="Años Aumento", values=columna_grilla)
+            .style.format("{:,.2f}")
+        )
+        st.dataframe(df_grilla_rvd.style.format({
+            "Pensión RP neta AFP (UF)": "{:,.2f}",
+            "Pensión RVD (UF)": "{:,.2f}",
+            "Líquido RP ($)": "${:,.0f}",
+            "Líquido RVD ($)": "${:,.0f}",
+        }), hide_index=True)
+# --- FIN V46.0 ---
+
+
+# --- INICIO V47.0: RECOMENDADOR DE MODALIDADES ---
+st.markdown("---")
+st.subheader("Recomendador de Modalidades")
+st.caption(
+    "Evalúa RP, RVI (todas las compañías, P.G., aumentos) y RP con RVD, aplica las restricciones "
+    "y muestra las alternativas no dominadas en líquido inicial, líquido permanente y meses garantizados."
+)
+col_rec1, col_rec2, col_rec3 = st.columns(3)
+with col_rec1:
+    rec_liquido_minimo = st.number_input(
+        "Líquido mensual mínimo ($)", min_value=0, value=0, step=10000, key="rec_liquido_minimo"
+    )
+with col_rec2:
+    rec_meses_minimos = st.number_input(
+        "Meses garantizados mínimos", min_value=0, max_value=300, value=0, step=12, key="rec_meses_minimos"
+    )
+with col_rec3:
+    rec_exigir_va = st.checkbox(
+        "Exigir test Vejez Anticipada (80%)",
+        value=(afiliado_tipo_pension == 'Vejez Anticipada'), key="rec_exigir_va"
+    )
+if st.button("Recomendar Modalidades", key="recomendar_modalidades"):
+    try:
+        df_recomendadas = recomendar_modalidades(parametros, DATOS_MERCADO, RestriccionesAsesor(
+            liquido_minimo_clp=rec_liquido_minimo,
+            meses_garantizados_minimos=rec_meses_minimos,
+            exigir_vejez_anticipada=rec_exigir_va
+        ))
+    except ErrorCotizacion as e:
+        st.error(str(e))
+    else:
+        st.caption(
+            f"Combinaciones evaluadas: {df_recomendadas.attrs['evaluadas']:,} | "
+            f"Cumplen restricciones: {df_recomendadas.attrs['factibles']:,} | "
+            f"Frente de Pareto: {len(df_recomendadas):,}"
+        )
+        if df_recomendadas.empty:
+            st.warning("Ninguna modalidad cumple las restricciones indicadas.")
+        else:
+            st.dataframe(df_recomendadas.style.format({
+                "Pensión Inicial (UF)": "{:,.2f}",
+                "Pensión Permanente (UF)": "{:,.2f}",
+                "Líquido Inicial ($)": "${:,.0f}",
+                "Líquido Permanente ($)": "${:,.0f}",
+            }), use_container_width=True)
+# --- FIN V47.0 ---
+
+
+# --- INICIO V48.0: EDAD MÍNIMA PARA VEJEZ ANTICIPADA ---
+if afiliado_tipo_pension == 'Vejez Anticipada':
+    st.markdown("---")
+    st.subheader("Edad Mínima para Vejez Anticipada")
+    st.caption(
+        "Proyecta el saldo a cada edad hasta la edad legal y valoriza la RVI Simple "
+        "(método RVI seleccionado) para encontrar la primera edad que cumple el 80% del promedio."
+    )
+    col_va1, col_va2 = st.columns(2)
+    with col_va1:
+        va_aporte_mensual = st.number_input(
+            "Aporte mensual mientras posterga (UF)", min_value=0.0, value=0.0, step=0.5, key="va_aporte"
+        )
+    with col_va2:
+        va_rentabilidad = st.number_input(
+            "Rentabilidad real anual del fondo (%)", min_value=-10.0, max_value=15.0, value=3.0, step=0.5, key="va_rentabilidad"
+        )
+    if st.button("Calcular Edad Mínima", key="calcular_edad_va"):
+        try:
+            df_trayectoria = trayectoria_vejez_anticipada(
+                parametros, DATOS_MERCADO, SupuestosProyeccion(va_aporte_mensual, va_rentabilidad)
+            )
+        except ErrorCotizacion as e:
+            st.error(str(e))
+        else:
+            edad_minima = df_trayectoria.attrs['edad_minima']
+            if edad_minima is None:
+                st.warning("Con estos supuestos el afiliado no califica antes de la edad legal.")
+            elif edad_minima == afiliado_edad_calculada:
+                st.success(f"El afiliado califica hoy ({edad_minima} años).")
+            else:
+                st.success(f"Edad mínima para Vejez Anticipada: {edad_minima} años.")
+            st.line_chart(df_trayectoria.set_index("Edad")[["Pensión RVI (UF)", "Requisito 80% (UF)"]])
+            st.dataframe(df_trayectoria.style.format({
+                "Saldo Proyectado (UF)": "{:,.2f}",
+                "Pensión RVI (UF)": "{:,.2f}",
+                "Requisito 80% (UF)": "{:,.2f}",
+            }), hide_index=True)
+# --- FIN V48.0 ---
+
+
+# --- INICIO V50.0: CRONOGRAMA DE PAGOS DE SOBREVIVENCIA ---
+if afiliado_tipo_pension == 'Sobrevivencia' and (datos_conyuge is not None or datos_hijos):
+    st.markdown("---")
+    st.subheader("Cronograma de Pagos de Sobrevivencia")
+    st.caption(
+        "Pago esperado y condicional (beneficiario vivo y con derecho) por beneficiario, sobre la "
+        "Pensión de Referencia ingresada; los hijos dejan de cobrar al cumplir su edad límite."
+    )
+    frecuencia_cronograma = st.radio(
+        "Frecuencia", ['anual', 'mensual'], horizontal=True, key="frecuencia_cronograma"
+    )
+    if st.button("Calcular Cronograma", key="calcular_cronograma"):
+        df_cronograma = cronograma_sobrevivencia(parametros, DATOS_MERCADO, frecuencia_cronograma)
+        st.line_chart(
+            df_cronograma.pivot_table(index="ano", columns="beneficiario", values="pago_esperado_uf", aggfunc="first")
+        )
+        st.dataframe(df_cronograma, hide_index=True)
+        st.download_button(
+            "Descargar Cronograma (CSV)",
+            df_cronograma.to_csv(index=False).encode('utf-8'),
+            file_name=f"cronograma_sobrevivencia_{frecuencia_cronograma}.csv",
+            mime="text/csv",
+            key="descargar_cronograma"
+        )
+# --- FIN V50.0 ---
+
+
+# --- INICIO V52.0: ESTRÉS DE LONGEVIDAD ---
+st.markdown("---")
+st.subheader("Estrés de Longevidad")
+st.caption(
+    "Factores bajo shocks de mortalidad (qx x 0.9 / 0.8, +1 / +3 años de longevidad, inválidos con "
+    "tabla Vejez) para la misma familia, y el cambio porcentual en factor y pensión por modalidad."
+)
+if st.button("Calcular Estrés", key="calcular_estres"):
+    try:
+        df_estres = estres_cotizacion(parametros, DATOS_MERCADO)
+    except ErrorCotizacion as e:
+        st.error(str(e))
+    else:
+        st.dataframe(
+            df_estres.pivot_table(index="escenario", columns="modalidad", values="delta_pension_pct", sort=False)
+            .style.format("{:+.2f}%"),
+            use_container_width=True
+        )
+        st.dataframe(df_estres.style.format({
+            "factor_base": "{:,.4f}",
+            "factor": "{:,.4f}",
+            "delta_factor": "{:+,.4f}",
+            "delta_factor_pct": "{:+.2f}%",
+            "delta_pension_pct": "{:+.2f}%",
+        }), hide_index=True)
+# --- FIN V52.0 ---
@@ -3,6 +3,7 @@ import pandas as pd
 import sys
 from datetime import date
 from fpdf import FPDF # Importación de V20.0
+from registro_datos import obtener_registro
 
 # --- 0. FUNCIÓN AYUDANTE PARA CALCULAR EDAD ---
 def calculate_age(born):
@@ -15,149 +16,8 @@ def calculate_age(born):
 
 # --- 1. LOS MOTORES (CEREBRO) ---
 
-@st.cache_data
-def cargar_tablas_de_mortalidad_reales(arch_h_vejez, arch_m_vejez, arch_h_inv, arch_m_inv):
-    """
-    Carga las 4 Tablas de Mortalidad 2020 (Vejez e Invalidez)
-    desde los archivos Excel oficiales. (Pilar 2)
-    """
-    try:
-        # 1. Cargar Vejez
-        df_h_vejez = pd.read_excel(
-            arch_h_vejez, sheet_name='CB-2020, Hombres', skiprows=6, index_col='Edad'
-        )
-        df_m_vejez = pd.read_excel(
-            arch_m_vejez, sheet_name='B-2020, Mujeres', skiprows=6, index_col='Edad'
-        )
-        
-        # 2. Cargar Invalidez
-        df_h_inv = pd.read_excel(
-            arch_h_inv, sheet_name='MI-2020, Hombres', skiprows=6, index_col='Edad'
-        )
-        df_m_inv = pd.read_excel(
-            arch_m_inv, sheet_name='MI-2020, Mujeres', skiprows=6, index_col='Edad'
-        )
-
-        # 3. Crear el diccionario anidado
-        # (1 - qx) es la probabilidad de supervivencia
-        tablas_anidadas = {
-            'Vejez': {
-                'Hombre': (1 - df_h_vejez['Tasas de mortalidad qx']).to_dict(),
-                'Mujer': (1 - df_m_vejez['Tasas de mortalidad qx']).to_dict()
-            },
-            'Invalidez': {
-                'Hombre': (1 - df_h_inv['Tasas de mortalidad qx']).to_dict(),
-                'Mujer': (1 - df_m_inv['Tasas de mortalidad qx']).to_dict()
-            }
-        }
-        
-        # 4. Regla especial: Beneficiarias no inválidas usan B-2020 (Vejez Mujer)
-        tablas_anidadas['Beneficiaria'] = tablas_anidadas['Vejez']['Mujer']
-        
-        return tablas_anidadas
-        
-    except FileNotFoundError as e:
-        st.error(f"Error: No se encontró un archivo de tabla de mortalidad. {e}")
-        return None
-    except Exception as e:
-        st.error(f"Error al leer Excel. Revisa los nombres de las hojas. Error: {e}")
-        return None
-
-@st.cache_data
-def cargar_vector_vtd(archivo_etti_cmf, hoja, col_mes, col_metrica):
-    """
-    Carga el Vector de Tasas de Descuento (VTD) V28.0
-    Fuerza la lectura de todo como string (dtype=str) para
-    evitar la conversión automática de 'oct-25' a Timestamp.
-    """
-    try:
-        # --- INICIO PARCHE V27.0 ---
-        df_etti_full = pd.read_excel(
-            archivo_etti_cmf,
-            sheet_name=hoja,
-            skiprows=0, 
-            header=[0, 1], 
-            index_col=0, 
-            dtype=str 
-        )
-        df_etti_full.index.name = "Plazo"
-        
-        df_etti_full.index = df_etti_full.index.astype(int)
-        # --- FIN PARCHE V27.0 ---
-
-        # --- Limpieza V24.2 ---
-        level_0 = df_etti_full.columns.get_level_values(0)
-        cleaned_level_0 = [col.strip() if isinstance(col, str) else col for col in level_0]
-        
-        level_1 = df_etti_full.columns.get_level_values(1)
-        cleaned_level_1 = [col.strip() if isinstance(col, str) else col for col in level_1]
-        
-        df_etti_full.columns = pd.MultiIndex.from_arrays([cleaned_level_0, cleaned_level_1])
-        # --- FIN LIMPIEZA ---
-
-        vector_series = df_etti_full.loc[:, (col_mes, col_metrica)]
-
-        vector_series = vector_series.str.replace('%', '', regex=False) \
-                                     .str.replace(',', '.', regex=False) \
-                                     .astype(float) / 100.0
-            
-        vector_series = vector_series.dropna()
-        vtd_dict = vector_series.to_dict()
-
-        max_plazo_cargado = max(vtd_dict.keys())
-        tasa_largo_plazo = vtd_dict[max_plazo_cargado]
-        
-        for t in range(int(max_plazo_cargado) + 1, 111): # Rellenar hasta edad 110
-            vtd_dict[t] = tasa_largo_plazo
-            
-        return vtd_dict
-
-    # --- INICIO BLOQUE DEBUG V24.5 ---
-    except KeyError:
-        st.error(f"Error al leer VTD: No se encontró la columna '{col_mes}' / '{col_metrica}' en la hoja '{hoja}'.")
-        st.error("¡MODO DEBUG! Nombres de columna leídos desde el Excel:")
-        try:
-            st.warning(df_etti_full.columns.to_list())
-        except Exception as e_debug:
-            st.error(f"Error durante el debug: {e_debug}")
-        
-        st.error("VERIFICA que los nombres en el script (líneas 207-209) coincidan 100% con lo que se muestra en la lista de arriba.")
-        return None
-    # --- FIN BLOQUE DEBUG V24.5 ---
-        
-    except FileNotFoundError:
-        st.error(f"Error: No se encontró el archivo '{archivo_etti_cmf}'.")
-        return None
-    except Exception as e:
-        st.error(f"Error al procesar el archivo VTD: {e}")
-        return None
-
-# --- INICIO FUNCIÓN V31.0 ---
-@st.cache_data
-def cargar_tasas_de_venta(archivo_tasas_venta):
-    """
-    Carga el archivo de Tasas de Venta Promedio (svtas_rv.xlsx)
-    publicado por la CMF.
-    """
-    try:
-        df_tasas = pd.read_excel(
-            archivo_tasas_venta,
-            sheet_name='Informe SVTAS', # <-- ¡CORRECCIÓN V31.0!
-            skiprows=0, 
-            index_col=0 
-        )
-        df_tasas.index = df_tasas.index.str.strip()
-        df_tasas = df_tasas.replace({',': '.'}, regex=True).astype(float)
-        
-        return df_tasas
-        
-    except FileNotFoundError:
-        st.error(f"Error: No se encontró el archivo '{archivo_tasas_venta}'.")
-        return None
-    except Exception as e:
-        st.error(f"Error al procesar el archivo de Tasas de Venta: {e}")
-        return None
-# --- FIN FUNCIÓN V31.0 ---
+# --- V41.0: Los cargadores de Excel se reemplazaron por el registro de datos
+# compartido del proceso (registro_datos.py), el mismo que usa app.py. ---
 
 
 def obtener_prob_supervivencia(sexo, edad, es_invalido, tablas_mortalidad):
@@ -595,47 +455,25 @@ def create_native_pdf_report(data):
 st.title("🤖 Calculadora de Pensiones 34.0") # Título actualizado
 st.subheader("Centro de Cotizaciones y Generador de Informes")
 
-# --- Nombres de archivos Excel ---
+# --- INICIO CAMBIO V41.0 (Registro de datos compartido e inmutable) ---
+# Tablas de mortalidad, VTD y tasas de venta vienen del registro del proceso:
+# un solo objeto de solo lectura para todas las sesiones (sin copias por rerun)
+# que se recarga solo cuando cambian los xlsx.
+REGISTRO_DATOS = obtener_registro()
+DATOS = REGISTRO_DATOS.instantanea()
+if DATOS is None:
+    st.error(f"Falla crítica: No se pudieron cargar los archivos de datos (tablas, VTD o tasas de venta). {REGISTRO_DATOS.ultimo_error}")
+    st.stop()
 
-# Pilar 2: Tablas de Mortalidad (4 tablas)
-ARCHIVO_H_VEJEZ = 'CB-H-2020.xlsx'
-ARCHIVO_M_VEJEZ = 'B-M-2020.xlsx'
-ARCHIVO_H_INV = 'I-H-2020.xlsx'
-ARCHIVO_M_INV = 'I-M-2020.xlsx'
+TABLAS_DE_MORTALIDAD_REALES = DATOS.tablas_mortalidad
 
-TABLAS_DE_MORTALIDAD_REALES = cargar_tablas_de_mortalidad_reales(
-    ARCHIVO_H_VEJEZ, ARCHIVO_M_VEJEZ, ARCHIVO_H_INV, ARCHIVO_M_INV
-)
-if not TABLAS_DE_MORTALIDAD_REALES:
-    st.stop()
+COL_MES_VTD = DATOS.mes_vtd_reciente
+HOJA_VTD = DATOS.hoja_por_mes[COL_MES_VTD]
+VECTOR_VTD = DATOS.vector_vtd(COL_MES_VTD)
+vtd_details_str = f"VTD Cargado: {COL_MES_VTD} (Hoja {HOJA_VTD})"
 
-# --- INICIO PILAR 1 (VTD) V28.0 ---
-ARCHIVO_ETTI = 'VTD 2020-2025.xlsx' 
-
-HOJA_VTD = 'SR 2025' 
-COL_MES_VTD = 'oct-25'
-COL_METRICA_VTD = 'Spot Rate' 
-
-VECTOR_VTD = cargar_vector_vtd(
-    ARCHIVO_ETTI, 
-    hoja=HOJA_VTD, 
-    col_mes=COL_MES_VTD, 
-    col_metrica=COL_METRICA_VTD
-)
-if not VECTOR_VTD:
-    st.error("Falla crítica: No se pudo cargar el Vector de Tasas de Descuento (VTD).")
-    st.stop()
-else:
-    vtd_details_str = f"VTD Cargado: {COL_MES_VTD} (Hoja {HOJA_VTD})"
-# --- FIN PILAR 1 V28.0 ---
-
-# --- INICIO CARGA V30.0 (TASAS DE VENTA) ---
-ARCHIVO_TASAS_VENTA = 'svtas_rv.xlsx'
-DF_TASAS_VENTA = cargar_tasas_de_venta(ARCHIVO_TASAS_VENTA)
-if DF_TASAS_VENTA is None:
-    st.error("Falla crítica: No se pudo cargar el archivo de Tasas de Venta (svtas_rv.xlsx).")
-    st.stop()
-# --- FIN CARGA V30.0 ---
+DF_TASAS_VENTA = DATOS.df_tasas_venta
+# --- FIN CAMBIO V41.0 ---
 
 
 # --- Diccionario de Comisiones AFP ---
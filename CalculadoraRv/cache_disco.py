@@ -0,0 +1,164 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+import numpy as np
+
+# --- CACHÉ EN DISCO V39.0: DATOS DERIVADOS DE LOS EXCEL ---
+# Cada entrada es un directorio con arreglos NumPy (.npy) y un
+# 'manifiesto.json'. El nombre del directorio es el hash de:
+#   cargador + huella (SHA-256) de cada xlsx + parámetros del cargador.
+# Si cualquier xlsx cambia, cambia la llave y la entrada se reconstruye
+# (invalidación automática). Todos los procesos/workers leen las mismas
+# entradas con memory-mapping (np.load(mmap_mode='r')): se parsea el
+# Excel una sola vez y las páginas se comparten entre procesos.
+
+VERSION_FORMATO = 1
+
+DIRECTORIO_CACHE_DEFECTO = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '.cache_datos'
+)
+
+ARCHIVO_MANIFIESTO = 'manifiesto.json'
+
+# --- HUELLA (VERSIÓN) DE ARCHIVOS DE DATOS (V38.0, movido desde utils.py) ---
+_HUELLAS_ARCHIVOS = {}
+
+def huella_archivo(ruta):
+    """
+    Hash SHA-256 del contenido de un archivo. Se recalcula solo si cambia
+    su fecha de modificación o tamaño (un 'stat' por llamada).
+    """
+    estado = os.stat(ruta)
+    marca = (estado.st_mtime_ns, estado.st_size)
+    guardada = _HUELLAS_ARCHIVOS.get(ruta)
+    if guardada and guardada[0] == marca:
+        return guardada[1]
+    h = hashlib.sha256()
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(1 << 20), b''):
+            h.update(bloque)
+    huella = h.hexdigest()
+    _HUELLAS_ARCHIVOS[ruta] = (marca, huella)
+    return huella
+
+def huella_archivos(*rutas):
+    """Huella combinada de varios archivos (cambia si cambia cualquiera)."""
+    h = hashlib.sha256()
+    for ruta in rutas:
+        h.update(os.path.basename(ruta).encode('utf-8'))
+        h.update(huella_archivo(ruta).encode('ascii'))
+    return h.hexdigest()
+
+
+def directorio_cache_datos():
+    """Directorio de la caché (variable CALCULADORA_CACHE_DATOS o '.cache_datos')."""
+    return os.environ.get('CALCULADORA_CACHE_DATOS', DIRECTORIO_CACHE_DEFECTO)
+
+
+class CacheDisco:
+    """
+    Caché compartida en disco de arreglos derivados de archivos de datos.
+    Uso:
+        arrays, meta = cache.obtener('tablas', [archivo, ...], {'hoja': ...}, construir)
+    donde construir() devuelve (dict nombre -> np.ndarray, meta JSON-serializable).
+    """
+
+    def __init__(self, directorio=None):
+        self.directorio = directorio or directorio_cache_datos()
+
+    def clave(self, cargador, archivos, parametros):
+        descriptor = {
+            'formato': VERSION_FORMATO,
+            'cargador': cargador,
+            'archivos': [huella_archivo(ruta) for ruta in archivos],
+            'parametros': parametros,
+        }
+        canonico = json.dumps(descriptor, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(canonico.encode('utf-8')).hexdigest()
+
+    def _ruta_entrada(self, clave):
+        return os.path.join(self.directorio, clave)
+
+    def leer(self, clave):
+        """Devuelve (arrays mapeados en memoria, meta) o None si no existe."""
+        ruta = self._ruta_entrada(clave)
+        try:
+            with open(os.path.join(ruta, ARCHIVO_MANIFIESTO), 'r', encoding='utf-8') as f:
+                manifiesto = json.load(f)
+            arrays = {
+                nombre: np.load(os.path.join(ruta, f"{nombre}.npy"), mmap_mode='r', allow_pickle=False)
+                for nombre in manifiesto['arrays']
+            }
+        except (OSError, ValueError, KeyError):
+            return None
+        return arrays, manifiesto.get('meta', {})
+
+    def escribir(self, clave, cargador, archivos, parametros, arrays, meta):
+        """
+        Escribe la entrada en un directorio temporal y la publica con un
+        rename atómico. Si otro proceso la publicó antes, se descarta la propia.
+        """
+        os.makedirs(self.directorio, exist_ok=True)
+        temporal = tempfile.mkdtemp(prefix=f".{clave[:12]}-", dir=self.directorio)
+        try:
+            for nombre, arreglo in arrays.items():
+                np.save(os.path.join(temporal, f"{nombre}.npy"), np.ascontiguousarray(arreglo), allow_pickle=False)
+            manifiesto = {
+                'formato': VERSION_FORMATO,
+                'cargador': cargador,
+                'archivos': {os.path.basename(r): huella_archivo(r) for r in archivos},
+                'parametros': parametros,
+                'arrays': sorted(arrays),
+                'meta': meta,
+                'creado': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            }
+            with open(os.path.join(temporal, ARCHIVO_MANIFIESTO), 'w', encoding='utf-8') as f:
+                json.dump(manifiesto, f, ensure_ascii=False, indent=1, default=str)
+            try:
+                os.rename(temporal, self._ruta_entrada(clave))
+            except OSError:
+                pass # Ya existe (otro worker la escribió): usamos esa
+        finally:
+            if os.path.isdir(temporal):
+                shutil.rmtree(temporal, ignore_errors=True)
+        self._podar_obsoletas(cargador, archivos, parametros, clave)
+
+    def _podar_obsoletas(self, cargador, archivos, parametros, clave_vigente):
+        """Borra entradas del mismo cargador/parámetros con archivos antiguos."""
+        try:
+            entradas = list(os.scandir(self.directorio))
+        except OSError:
+            return
+        for entrada in entradas:
+            if entrada.name == clave_vigente or entrada.name.startswith('.') or not entrada.is_dir():
+                continue
+            try:
+                with open(os.path.join(entrada.path, ARCHIVO_MANIFIESTO), 'r', encoding='utf-8') as f:
+                    manifiesto = json.load(f)
+            except (OSError, ValueError):
+                continue
+            mismos_archivos = set(manifiesto.get('archivos', {})) == {os.path.basename(r) for r in archivos}
+            if (manifiesto.get('cargador') == cargador and mismos_archivos
+                    and manifiesto.get('parametros') == parametros):
+                # Los lectores con mmap abierto no se ven afectados (Linux)
+                shutil.rmtree(entrada.path, ignore_errors=True)
+
+    def obtener(self, cargador, archivos, parametros, construir):
+        """
+        Lee la entrada vigente o la construye (parseando los Excel) y la guarda.
+        Si el disco no es escribible, devuelve lo construido sin cachear.
+        """
+        clave = self.clave(cargador, archivos, parametros)
+        encontrado = self.leer(clave)
+        if encontrado is not None:
+            return encontrado
+
+        arrays, meta = construir()
+        try:
+            self.escribir(clave, cargador, archivos, parametros, arrays, meta)
+        except OSError:
+            return arrays, meta
+        return self.leer(clave) or (arrays, meta)
@@ -0,0 +1,131 @@
+import json
+import time
+import random
+import asyncio
+import argparse
+from collections import Counter
+from urllib.parse import urlsplit
+import numpy as np
+
+# --- PRUEBA DE CARGA V58.0: SERVICIO DE COTIZACIÓN ---
+# Cliente asyncio (solo biblioteca estándar) que envía cotizaciones
+# aleatorias al servicio (servicio_cotizacion.py) con N conexiones
+# keep-alive en paralelo y reporta throughput y percentiles de latencia.
+# Ejemplo:
+#   python servicio_cotizacion.py --puerto 8080 &
+#   python carga_servicio.py --url http://127.0.0.1:8080 --solicitudes 2000 --concurrencia 32
+# 'solicitud' y 'cliente' son el cliente HTTP que reutiliza prueba_carga.py.
+
+
+def cuerpo_aleatorio(rng, ruta='/cotizar'):
+    """Cotización aleatoria (JSON de la API) con afiliado, cónyuge e hijos plausibles."""
+    edad = rng.randint(60, 75)
+    cuerpo = {
+        'nombre': 'PRUEBA DE CARGA',
+        'saldo_uf': round(rng.uniform(800, 8000), 1),
+        'afp': 'AFP HABITAT',
+        'metodo_rvi': rng.choice(('tasa_venta', 'vtd')),
+        'tipo_pension': rng.choice(('Vejez (Edad Legal)', 'Invalidez')),
+        'afiliado': {'edad': edad, 'sexo': rng.choice(('Hombre', 'Mujer'))},
+        'escenarios': [{'pg_anos': 10, 'anos_aumento': 1, 'pct_aumento': 0}] if rng.random() < 0.5 else [],
+    }
+    if rng.random() < 0.6:
+        cuerpo['conyuge'] = {'edad': max(edad + rng.randint(-8, 4), 40), 'sexo': rng.choice(('Hombre', 'Mujer'))}
+    if rng.random() < 0.2:
+        cuerpo['hijos'] = [{'edad': rng.randint(5, 20), 'sexo': rng.choice(('Hombre', 'Mujer'))}]
+    if ruta == '/sobrevivencia':
+        cuerpo['pension_referencia_uf'] = 20.0
+        cuerpo.setdefault('conyuge', {'edad': edad, 'sexo': 'Mujer'})
+    return cuerpo
+
+
+async def solicitud(reader, writer, host, ruta, cuerpo):
+    """Envía un POST JSON por la conexión keep-alive; devuelve el estado HTTP."""
+    datos = json.dumps(cuerpo).encode('utf-8')
+    writer.write(
+        f"POST {ruta} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(datos)}\r\n\r\n".encode('latin-1') + datos
+    )
+    await writer.drain()
+    estado = int((await reader.readline()).split()[1])
+    largo = 0
+    while True:
+        cabecera = await reader.readline()
+        if cabecera in (b'\r\n', b'\n', b''):
+            break
+        nombre, _, valor = cabecera.decode('latin-1').partition(':')
+        if nombre.strip().lower() == 'content-length':
+            largo = int(valor)
+    await reader.readexactly(largo)
+    return estado
+
+
+async def cliente(host, puerto, solicitudes, latencias, estados):
+    """
+    Un cliente keep-alive que envía en orden las 'solicitudes' (pares
+    (ruta, cuerpo)); agrega la latencia (s) y el estado de cada una a
+    'latencias' y 'estados' (Counter). Si se corta la conexión se reconecta.
+    """
+    reader, writer = await asyncio.open_connection(host, puerto)
+    try:
+        for ruta, cuerpo in solicitudes:
+            inicio = time.perf_counter()
+            try:
+                estado = await solicitud(reader, writer, host, ruta, cuerpo)
+            except (ConnectionError, asyncio.IncompleteReadError, ValueError, IndexError):
+                estados['sin respuesta'] += 1
+                writer.close()
+                reader, writer = await asyncio.open_connection(host, puerto)
+                continue
+            latencias.append(time.perf_counter() - inicio)
+            estados[estado] += 1
+    finally:
+        writer.close()
+
+
+async def prueba_carga(url, solicitudes=1000, concurrencia=32, ruta='/cotizar', semilla=0):
+    """
+    Envía 'solicitudes' cotizaciones repartidas en 'concurrencia' conexiones.
+    Devuelve solicitudes por segundo, percentiles de latencia (ms) y estados HTTP.
+    """
+    partes = urlsplit(url)
+    rng = random.Random(semilla)
+    cuerpos = [cuerpo_aleatorio(rng, ruta) for _ in range(solicitudes)]
+    latencias = []
+    estados = Counter()
+    inicio = time.perf_counter()
+    await asyncio.gather(*[
+        cliente(partes.hostname, partes.port or 80, [(ruta, c) for c in cuerpos[k::concurrencia]], latencias, estados)
+        for k in range(concurrencia)
+    ])
+    segundos = time.perf_counter() - inicio
+    ms = np.asarray(latencias) * 1000.0
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99]) if len(ms) else (np.nan,) * 3
+    return {
+        'ruta': ruta,
+        'solicitudes': solicitudes,
+        'concurrencia': concurrencia,
+        'segundos': round(segundos, 3),
+        'por_segundo': round(len(ms) / segundos, 1),
+        'p50_ms': round(float(p50), 2),
+        'p95_ms': round(float(p95), 2),
+        'p99_ms': round(float(p99), 2),
+        'max_ms': round(float(ms.max()), 2) if len(ms) else None,
+        'estados': {str(k): v for k, v in sorted(estados.items(), key=str)},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prueba de carga del servicio de cotización.")
+    parser.add_argument('--url', default='http://127.0.0.1:8080')
+    parser.add_argument('--solicitudes', type=int, default=1000)
+    parser.add_argument('--concurrencia', type=int, default=32)
+    parser.add_argument('--ruta', default='/cotizar', choices=('/cotizar', '/comparar', '/sobrevivencia', '/pdf'))
+    parser.add_argument('--semilla', type=int, default=0)
+    args = parser.parse_args(argv)
+    resumen = asyncio.run(prueba_carga(args.url, args.solicitudes, args.concurrencia, args.ruta, args.semilla))
+    print(json.dumps(resumen, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,232 @@
+import re
+import numpy as np
+import pandas as pd
+
+from utils import calcular_descuentos_clp
+from cotizacion import AFP_COMMISSIONS
+from modelos import Afiliado, Conyuge, Hijo, PCT_PENSION_CONYUGE, PCT_PENSION_HIJO
+from motor_vectorial import N_PLAZOS, flujos_esperados, flujos_sobrevivencia, vector_descuento
+
+# --- VALORIZACIÓN DE CARTERA V43.0: PERFILES DE RIESGO ÚNICOS ---
+# Los factores de 'calcular_factores_combinados' no dependen del saldo, la
+# AFP ni la comisión. En una cartera grande muchos afiliados comparten el
+# mismo perfil (edad, sexo, invalidez, cónyuge, hijos): se agrupan por perfil
+# canónico, se valoriza cada perfil UNA vez (matriz de flujos x descuento) y
+# los factores se reparten a los afiliados antes de aplicar saldo, comisión
+# y conversión a pesos (todo vectorizado).
+#
+# Columnas de entrada (una fila por afiliado):
+#   edad, sexo, es_invalido, saldo_uf (edad vacía = causante fallecido, solo sobrevivencia)
+#   afp (opcional, para la comisión del Retiro Programado)
+#   comision_pct (opcional, comisión de intermediación RVI en %)
+#   conyuge_edad, conyuge_sexo, conyuge_invalido, conyuge_pct (opcionales; edad vacía = sin cónyuge)
+#   hijo_1_edad, hijo_1_sexo, hijo_1_pct, hijo_1_edad_limite, hijo_2_edad, ... (opcionales)
+
+_PATRON_HIJO = re.compile(r'^hijo_(\d+)_edad$')
+
+VALORES_VERDADEROS = {'true', 'si', 'sí', 's', '1', 'x', 'invalido', 'inválido'}
+
+
+def _a_bool(valor):
+    if isinstance(valor, str):
+        return valor.strip().lower() in VALORES_VERDADEROS
+    if valor is None or (isinstance(valor, float) and np.isnan(valor)):
+        return False
+    return bool(valor)
+
+
+def _vacio(valor):
+    return valor is None or (isinstance(valor, float) and np.isnan(valor)) or valor == ''
+
+
+def columna(df, nombre, defecto):
+    """Valores de una columna opcional de la cartera (lista), o 'defecto' por fila si no está."""
+    if nombre in df.columns:
+        return df[nombre].tolist()
+    return [defecto] * len(df)
+
+
+def columna_numerica(df, nombre, defecto=0.0):
+    """Columna opcional como arreglo float; celdas vacías o no numéricas = 'defecto'."""
+    return np.nan_to_num(
+        pd.to_numeric(pd.Series(columna(df, nombre, defecto)), errors='coerce').to_numpy(dtype=float),
+        nan=defecto
+    )
+
+
+def grupos_desde_dataframe(df):
+    """Convierte las filas de la cartera en (Afiliado, Conyuge | None, (Hijo, ...))."""
+    indices_hijos = sorted(
+        int(m.group(1)) for m in map(_PATRON_HIJO.match, df.columns) if m
+    )
+    edades = columna(df, 'edad', None)
+    sexos = columna(df, 'sexo', None)
+    invalidos = columna(df, 'es_invalido', False)
+    c_edades = columna(df, 'conyuge_edad', None)
+    c_sexos = columna(df, 'conyuge_sexo', None)
+    c_invalidos = columna(df, 'conyuge_invalido', False)
+    c_pcts = columna(df, 'conyuge_pct', PCT_PENSION_CONYUGE)
+    hijos_cols = [
+        (
+            columna(df, f'hijo_{i}_edad', None),
+            columna(df, f'hijo_{i}_sexo', None),
+            columna(df, f'hijo_{i}_pct', PCT_PENSION_HIJO),
+            columna(df, f'hijo_{i}_edad_limite', 24),
+        )
+        for i in indices_hijos
+    ]
+
+    grupos = []
+    for fila in range(len(df)):
+        # Sin edad de afiliado (causante de sobrevivencia): afiliado None
+        afiliado = None
+        if not _vacio(edades[fila]):
+            afiliado = Afiliado(int(edades[fila]), sexos[fila], _a_bool(invalidos[fila]))
+        conyuge = None
+        if not _vacio(c_edades[fila]):
+            conyuge = Conyuge(
+                int(c_edades[fila]), c_sexos[fila],
+                PCT_PENSION_CONYUGE if _vacio(c_pcts[fila]) else float(c_pcts[fila]),
+                _a_bool(c_invalidos[fila])
+            )
+        hijos = tuple(
+            Hijo(
+                int(h_edades[fila]), h_sexos[fila],
+                PCT_PENSION_HIJO if _vacio(h_pcts[fila]) else float(h_pcts[fila]),
+                24 if _vacio(h_limites[fila]) else int(h_limites[fila])
+            )
+            for h_edades, h_sexos, h_pcts, h_limites in hijos_cols
+            if not _vacio(h_edades[fila])
+        )
+        grupos.append((afiliado, conyuge, hijos))
+    return grupos
+
+
+def perfil_canonico(afiliado, conyuge, hijos):
+    """
+    Llave del perfil de riesgo. El orden de los hijos no cambia los flujos,
+    así que se ordenan para que familias equivalentes compartan perfil.
+    """
+    hijos = tuple(sorted(hijos, key=lambda h: (h.edad, h.sexo, h.pct_pension, h.edad_limite)))
+    return (afiliado, conyuge, hijos)
+
+
+def agrupar_perfiles(grupos):
+    """
+    Devuelve (perfiles únicos, índice (N,) del perfil de cada grupo), como
+    np.unique(..., return_inverse=True) pero para registros.
+    """
+    posicion = {}
+    perfiles = []
+    indice = np.empty(len(grupos), dtype=np.int64)
+    for i, grupo in enumerate(grupos):
+        perfil = perfil_canonico(*grupo)
+        j = posicion.get(perfil)
+        if j is None:
+            j = posicion[perfil] = len(perfiles)
+            perfiles.append(perfil)
+        indice[i] = j
+    return perfiles, indice
+
+
+def matriz_flujos(perfiles, tablas_mortalidad, periodo_garantizado_en_anos=0, exacto=False):
+    """
+    (U, 111): flujos esperados de cada perfil (rellenos con 0 tras la edad 110).
+    (V53.0) Sin afiliado (causante fallecido) son los flujos de sobrevivencia.
+    """
+    flujos = np.zeros((len(perfiles), N_PLAZOS), dtype=float)
+    for j, (afiliado, conyuge, hijos) in enumerate(perfiles):
+        if afiliado is None:
+            f = flujos_sobrevivencia(conyuge, hijos, tablas_mortalidad, exacto=exacto)
+            if periodo_garantizado_en_anos > 0:
+                f = np.maximum(f, (np.arange(len(f)) < periodo_garantizado_en_anos).astype(float))
+        else:
+            f = flujos_esperados(afiliado, conyuge, hijos, tablas_mortalidad, periodo_garantizado_en_anos, exacto)
+        flujos[j, :len(f)] = f
+    return flujos
+
+
+def factores_perfiles(flujos, descuento, anos_de_aumento=0, pct_aumento=0.0):
+    """
+    Factor de cada perfil para un vector de descuento: (ft * (1 + %aumento)) + fd,
+    igual que 'calcular_escenario_rvi' de cotizacion.py.
+    """
+    corte = min(max(int(anos_de_aumento), 0), flujos.shape[1])
+    factor_temporal = flujos[:, :corte] @ descuento[:corte]
+    factor_diferido = flujos[:, corte:] @ descuento[corte:]
+    return factor_temporal * (1 + pct_aumento / 100.0) + factor_diferido
+
+
+def pension_mensual(prima, factor):
+    """
+    Pensión mensual (UF): prima / factor / 12, con la forma que resulta de
+    combinar prima y factor (escalares o arreglos). Un factor que no es
+    positivo no financia pensión y da 0, como el cotizador.
+    """
+    factor = np.asarray(factor, dtype=float)
+    pension = np.zeros(np.broadcast_shapes(np.shape(prima), factor.shape))
+    np.divide(prima, factor, out=pension, where=factor > 0)
+    return pension / 12.0
+
+
+def valorizar_cartera(
+    df_cartera,
+    tablas_mortalidad,
+    valor_uf_clp,
+    tasa_rp_pct,
+    vector_vtd=None,
+    tasa_venta_pct=None,
+    periodo_garantizado_en_anos=0,
+    anos_de_aumento=0,
+    pct_aumento=0.0,
+    incluye_rp=True,
+    incluye_rvi=True
+    ):
+    """
+    Valoriza RP y RVI de todos los afiliados de la cartera.
+    - RVI con tasa de venta si se indica 'tasa_venta_pct'; si no, con el VTD.
+    Devuelve un DataFrame (mismo índice que la entrada) con factores, pensiones
+    en UF y montos en pesos. En .attrs queda el número de perfiles únicos.
+    """
+    grupos = grupos_desde_dataframe(df_cartera)
+    perfiles, indice = agrupar_perfiles(grupos)
+
+    saldo = df_cartera['saldo_uf'].to_numpy(dtype=float)
+    comision_rvi = columna_numerica(df_cartera, 'comision_pct') / 100.0
+    comision_afp = np.array(
+        [AFP_COMMISSIONS.get(afp, 0.0) for afp in columna(df_cartera, 'afp', None)], dtype=float
+    ) / 100.0
+
+    resultado = pd.DataFrame(index=df_cartera.index)
+    resultado['perfil'] = indice
+
+    if incluye_rp:
+        flujos_rp = matriz_flujos(perfiles, tablas_mortalidad, 0)
+        factor_rp = factores_perfiles(flujos_rp, vector_descuento('RP', tasa_rp_pct / 100.0))[indice]
+        pension_bruta = pension_mensual(saldo, factor_rp)
+        pension_rp_uf = pension_bruta - pension_bruta * comision_afp
+        bruto, dscto, liq = calcular_descuentos_clp(pension_rp_uf, valor_uf_clp)
+        resultado['factor_rp'] = factor_rp
+        resultado['pension_rp_uf'] = pension_rp_uf
+        resultado['comision_afp_clp'] = pension_bruta * comision_afp * valor_uf_clp
+        resultado['pension_rp_bruto_clp'] = bruto
+        resultado['pension_rp_liquida_clp'] = liq
+
+    if incluye_rvi:
+        if tasa_venta_pct is not None:
+            descuento_rvi = vector_descuento('TASA_PLANA', tasa_venta_pct / 100.0)
+        else:
+            descuento_rvi = vector_descuento('RVI', vector_vtd=vector_vtd)
+        flujos_rvi = matriz_flujos(perfiles, tablas_mortalidad, periodo_garantizado_en_anos)
+        factor_rvi = factores_perfiles(flujos_rvi, descuento_rvi, anos_de_aumento, pct_aumento)[indice]
+        pension_rvi_uf = pension_mensual(saldo * (1 - comision_rvi), factor_rvi)
+        bruto, dscto, liq = calcular_descuentos_clp(pension_rvi_uf, valor_uf_clp)
+        resultado['factor_rvi'] = factor_rvi
+        resultado['pension_rvi_uf'] = pension_rvi_uf
+        resultado['pension_rvi_aumentada_uf'] = pension_rvi_uf * (1 + pct_aumento / 100.0)
+        resultado['pension_rvi_bruto_clp'] = bruto
+        resultado['pension_rvi_liquida_clp'] = liq
+
+    resultado.attrs['afiliados'] = len(grupos)
+    resultado.attrs['perfiles_unicos'] = len(perfiles)
+    return resultado
@@ -0,0 +1,9 @@
+import pytest
+
+from registro_datos import BASE_DIR, obtener_registro
+
+
+@pytest.fixture(scope='session')
+def instantanea():
+    """Datos reales del repositorio (tablas, VTD y tasas de venta), sin hilo de vigilancia."""
+    return obtener_registro(BASE_DIR, vigilar=False).instantanea()
@@ -0,0 +1,875 @@
+import os
+import json
+import pickle
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, asdict, field
+from typing import Any
+
+from utils import calcular_descuentos_clp
+from cache_disco import huella_archivos
+from calculo_motor import (
+    calcular_factores_combinados,
+    calcular_factor_sobrevivencia
+)
+from modelos import PCT_VEJEZ_ANTICIPADA
+from motor_vectorial import flujos_esperados, matriz_descuento_tasas
+
+# --- COTIZADOR V38.0: LÓGICA DEL INFORME FUERA DE LA INTERFAZ ---
+# Antes este cálculo vivía dentro del botón 'Generar Informe' de app.py.
+# Ahora es una función pura (sin Streamlit) que se puede memorizar y
+# reutilizar desde cualquier interfaz.
+
+# --- Diccionario de Comisiones AFP ---
+AFP_COMMISSIONS = {
+    "AFP PLANVITAL": 0.00,
+    "AFP HABITAT": 0.95,
+    "AFP CAPITAL": 1.25,
+    "AFP CUPRUM": 1.25,
+    "AFP MODELO": 1.20,
+    "AFP PROVIDA": 1.25,
+    "AFP UNO": 1.20,
+}
+
+METODO_TASA_VENTA = "Tasa de Venta (Promedio Mercado)"
+METODO_VTD = "Vector de Descuento (Tarificador CMF)"
+
+
+class ErrorCotizacion(Exception):
+    """
+    Error que detiene la cotización. Cada argumento es una línea a mostrar
+    con st.error. 'mensajes' guarda los avisos emitidos antes del error.
+    """
+    def __init__(self, *lineas, mensajes=None):
+        super().__init__(*lineas)
+        self.mensajes = mensajes or []
+
+
+@dataclass(frozen=True)
+class Escenario:
+    """Escenario personalizado (A, B, C) de RVI con P.G. y/o Aumento Temporal."""
+    nombre: str
+    pg_anos: int
+    anos_aumento: int
+    pct_aumento: int
+
+
+@dataclass(frozen=True)
+class ParametrosCotizacion:
+    """Todos los datos ingresados en el panel lateral (ver app.py)."""
+    input_afiliado_nombre: str
+    input_valor_uf_clp: float
+    saldo_uf: float
+    input_afp_nombre: str
+    input_tasa_rp: float
+    input_metodo_rvi: str
+    input_cia_rvi: Any
+    check_comparar_todas: bool
+    check_incluye_comision: bool
+    input_comision_pct: float
+    input_valor_pgu_clp: float
+    check_incluye_pgu: bool
+    check_incluye_bono: bool
+    input_bonificacion_uf: float
+    afiliado_tipo_pension: str
+    afiliado_edad_calculada: int
+    input_pension_referencia_uf: float
+    input_promedio_10_anos_uf: float
+    datos_afiliado: Any          # modelos.Afiliado o None (Sobrevivencia)
+    datos_conyuge: Any           # modelos.Conyuge o None
+    datos_hijos: tuple           # tupla de modelos.Hijo
+    check_rp: bool
+    check_rvi_simple: bool
+    escenarios: tuple            # Escenarios ACTIVOS, en orden (A, B, C)
+    check_rp_rvd: bool
+    n_anos_diferimiento: int
+    check_sobrevivencia_exacta: bool = False # V49.0: tope 100% por estado de beneficiarios
+
+
+@dataclass(frozen=True)
+class DatosMercado:
+    """Tablas y tasas con que se cotiza, y su versión (para la caché)."""
+    tablas_mortalidad: Any
+    vector_vtd: Any
+    df_tasas_venta: Any
+    col_mes_vtd: str
+    vtd_details_str: str
+    version: str
+
+
+@dataclass
+class ResultadoCotizacion:
+    report_data: dict
+    mensajes: list = field(default_factory=list) # [(nivel, texto)] p.ej. ('warning', '...')
+
+
+# --- INICIO CAMBIO V44.0 (Etapa de factores + etapa de escala) ---
+# Los factores actuariales no dependen del saldo, de las comisiones, del
+# valor UF ni de PGU/Bono (la prima se aplica después: prima / factor).
+# La cotización se separa en:
+#   calcular_factores_cotizacion -> llamadas a los motores (cacheable)
+#   escalar_cotizacion           -> primas, comisiones, CLP y filas PGU/Bono
+# Así, cambiar el saldo o la comisión solo recalcula la etapa de escala.
+
+# Campos que solo intervienen en la etapa de escala (o solo en el informe)
+CAMPOS_DE_ESCALA = (
+    'input_afiliado_nombre',
+    'input_valor_uf_clp',
+    'saldo_uf',
+    'input_afp_nombre',
+    'check_incluye_comision',
+    'input_comision_pct',
+    'input_valor_pgu_clp',
+    'check_incluye_pgu',
+    'check_incluye_bono',
+    'input_bonificacion_uf',
+    'afiliado_edad_calculada',
+    'input_pension_referencia_uf',
+    'input_promedio_10_anos_uf',
+)
+
+
+@dataclass
+class FactoresCotizacion:
+    """Resultado de la etapa de factores (todo lo que sale de los motores)."""
+    metodo_rvi_desc: str
+    modo_calculo_rvi: str
+    tasa_rvi_pct: Any = None             # Tasa de venta usada (None con VTD)
+    factor_sobrevivencia: Any = None
+    factores_rp: Any = None              # (ft, fd) Retiro Programado
+    factores_rvi_simple: Any = None      # (ft, fd) RVI sin P.G. ni aumento
+    factores_escenarios: tuple = ()      # (ft, fd) por escenario, en orden
+    comparador: tuple = ()               # (cia, tasa %, factor) por compañía
+    factores_rvd: Any = None             # (ft RP, fd RVI) a N años
+    mensajes: list = field(default_factory=list)
+
+
+# --- INICIO CAMBIO V57.0 (Motores reemplazables en la etapa de factores) ---
+# La etapa de factores llama a los motores por medio de un MotorFactores. El
+# de por defecto son los motores de calculo_motor.py (flujos cacheados perfil
+# a perfil); micro_lotes.py arma uno por lote que calcula los flujos de todas
+# las familias del lote en una pasada, con los mismos resultados.
+@dataclass(frozen=True)
+class MotorFactores:
+    """Funciones de motor de la etapa de factores (misma firma que las originales)."""
+    factores_combinados: Any = calcular_factores_combinados
+    factor_sobrevivencia: Any = calcular_factor_sobrevivencia
+    flujos_esperados: Any = flujos_esperados
+
+
+MOTOR_POR_PERFIL = MotorFactores()
+# --- FIN CAMBIO V57.0 ---
+
+
+def calcular_factores_cotizacion(p, datos, motor=MOTOR_POR_PERFIL):
+    """
+    Etapa 1: calcula los factores de todas las modalidades pedidas.
+    Lanza ErrorCotizacion si el cálculo no puede continuar.
+    (V57.0) 'motor': MotorFactores con que se calculan (ver micro_lotes.py).
+    """
+    VECTOR_VTD = datos.vector_vtd
+    TABLAS_DE_MORTALIDAD_REALES = datos.tablas_mortalidad
+    DF_TASAS_VENTA = datos.df_tasas_venta
+
+    mensajes = []
+
+    def _detener(*lineas):
+        raise ErrorCotizacion(*lineas, mensajes=mensajes)
+
+    datos_afiliado = p.datos_afiliado
+    datos_conyuge = p.datos_conyuge
+    datos_hijos = p.datos_hijos
+    afiliado_tipo_pension = p.afiliado_tipo_pension
+    input_cia_rvi = p.input_cia_rvi
+
+    tasa_rp_decimal = p.input_tasa_rp / 100.0
+
+    # --- Lógica de Selección de Motor RVI (V30.0 - Sin cambios) ---
+    metodo_rvi_desc = ""
+    tasa_plana_rvi_final = 0.0
+    modo_calculo_rvi_final = ""
+    tasa_usada_pct = None
+
+    if p.input_metodo_rvi == METODO_TASA_VENTA:
+
+        # Determinar la columna a usar (Vejez o Invalidez)
+        # Esta se usará para el 'input_cia_rvi' (Media Mercado o una Cía. específica)
+        columna_tasa = 'Vejez' # Default
+        if afiliado_tipo_pension == 'Invalidez':
+                 columna_tasa = 'Invalidez total' # Mapeo
+
+        try:
+            tasa_cia_pct = DF_TASAS_VENTA.loc[input_cia_rvi, columna_tasa]
+            tasa_plana_rvi_final = tasa_cia_pct / 100.0
+            modo_calculo_rvi_final = 'TASA_PLANA' # Usará el motor de tasa plana
+            tasa_usada_pct = tasa_cia_pct # V34.0
+
+            # La descripción dependerá de si se comparan todas o no
+            if p.check_comparar_todas:
+                 metodo_rvi_desc = f"Tasa Venta: Comparador (Base Escenarios: {input_cia_rvi} {tasa_cia_pct}%)"
+            else:
+                 metodo_rvi_desc = f"Tasa de Venta: {input_cia_rvi} ({columna_tasa}: {tasa_cia_pct}%)"
+
+        except KeyError:
+            _detener(f"No se encontró la tasa para {input_cia_rvi} / {columna_tasa}")
+
+    else: # "Vector de Descuento (Tarificador CMF)"
+        modo_calculo_rvi_final = 'RVI' # Usará el motor VTD
+        tasa_plana_rvi_final = 0.0 # No se usa
+        metodo_rvi_desc = f"Vector de Descuento (VTD: {datos.col_mes_vtd})"
+
+    factores = FactoresCotizacion(
+        metodo_rvi_desc=metodo_rvi_desc,
+        modo_calculo_rvi=modo_calculo_rvi_final,
+        tasa_rvi_pct=tasa_usada_pct,
+        mensajes=mensajes
+    )
+
+    # Si NO hay beneficiarios, el modo Sobrevivencia no tiene sentido.
+    if afiliado_tipo_pension == 'Sobrevivencia' and datos_conyuge is None and len(datos_hijos) == 0:
+        _detener("Error en modo Sobrevivencia: Debe ingresar al menos un beneficiario (Cónyuge o Hijos).")
+
+    # --- RAMA 1: CÁLCULO DE SOBREVIVENCIA ---
+    if afiliado_tipo_pension == 'Sobrevivencia':
+
+        mensajes.append(('warning', "MODO SOBREVIVENCIA: Los cálculos de Retiro Programado, Aumento Temporal y RP-RVD no aplican."))
+
+        factores.factor_sobrevivencia = motor.factor_sobrevivencia(
+            datos_conyuge, datos_hijos,
+            VECTOR_VTD,
+            TABLAS_DE_MORTALIDAD_REALES,
+            modo_calculo=modo_calculo_rvi_final,
+            tasa_plana_rv=tasa_plana_rvi_final,
+            sobrevivencia_exacta=p.check_sobrevivencia_exacta
+        )
+
+        if factores.factor_sobrevivencia == 0:
+            _detener("Error: El factor de sobrevivencia es cero. No se puede calcular la pensión.")
+
+        return factores
+
+    # --- RAMA 2: CÁLCULO DE VEJEZ, V. ANTICIPADA E INVALIDEZ ---
+    def factores_rvi(pg_anos, at_anos):
+        return motor.factores_combinados(
+            datos_afiliado,
+            datos_conyuge, datos_hijos,
+            VECTOR_VTD,
+            TABLAS_DE_MORTALIDAD_REALES,
+            modo_calculo=modo_calculo_rvi_final,
+            tasa_plana_rp=tasa_plana_rvi_final,
+            periodo_garantizado_en_anos=pg_anos,
+            anos_de_aumento=at_anos,
+            sobrevivencia_exacta=p.check_sobrevivencia_exacta
+        )
+
+    # RVI Simple (también se usa para verificar Vejez Anticipada)
+    factores.factores_rvi_simple = factores_rvi(0, 0)
+
+    # --- Tarea 1: Retiro Programado (MODIFICADO V24.1) ---
+    if p.check_rp:
+        factores.factores_rp = motor.factores_combinados(
+            datos_afiliado,
+            datos_conyuge, datos_hijos,
+            None, # No usa VTD
+            TABLAS_DE_MORTALIDAD_REALES,
+            modo_calculo='RP', # Modo RP
+            tasa_plana_rp=tasa_rp_decimal, # Tasa para RP
+            periodo_garantizado_en_anos=0,
+            anos_de_aumento=0,
+            sobrevivencia_exacta=p.check_sobrevivencia_exacta
+        )
+
+    # --- Tarea 2: Comparador de Compañías (V34.0 / V42.0) ---
+    if p.check_rvi_simple and p.input_metodo_rvi == METODO_TASA_VENTA and p.check_comparar_todas:
+        mensajes.append(('info', f"Modo Comparación: Calculando RVI Simple para las {len(DF_TASAS_VENTA.index)} compañías."))
+
+        # Determinar la columna a usar (Vejez o Invalidez)
+        columna_tasa = 'Vejez' # Default
+        if afiliado_tipo_pension == 'Invalidez':
+            columna_tasa = 'Invalidez total'
+
+        # Los flujos de la RVI Simple no dependen de la tasa: se
+        # calculan una vez y se valorizan con todas las tasas juntas.
+        try:
+            tasas_cias_pct = DF_TASAS_VENTA[columna_tasa]
+            flujos_rvi = motor.flujos_esperados(
+                datos_afiliado, datos_conyuge, datos_hijos,
+                TABLAS_DE_MORTALIDAD_REALES, 0, # RVI Simple
+                exacto=p.check_sobrevivencia_exacta
+            )
+            factores_cias = matriz_descuento_tasas(
+                tasas_cias_pct.to_numpy() / 100.0, n=len(flujos_rvi)
+            ) @ flujos_rvi
+            factores.comparador = tuple(
+                (cia_nombre, tasa_cia_pct, float(factor_total))
+                for cia_nombre, tasa_cia_pct, factor_total
+                in zip(tasas_cias_pct.index, tasas_cias_pct, factores_cias)
+            )
+        except Exception as e:
+            mensajes.append(('warning', f"No se pudo calcular el comparador (Tasa: {columna_tasa}): {e}"))
+
+    # --- Tareas 3, 4, 5 (Escenarios A, B, C activos) ---
+    factores.factores_escenarios = tuple(
+        factores_rvi(esc.pg_anos, esc.anos_aumento) for esc in p.escenarios
+    )
+
+    # --- TAREA 6 (V33.0): RP con RVD ---
+    if p.check_rp_rvd:
+        n_anos_diferimiento = p.n_anos_diferimiento
+
+        # 1. Calcular Factor Temporal de RP (ft_rp)
+        (ft_rp, _) = motor.factores_combinados(
+            datos_afiliado,
+            datos_conyuge, datos_hijos,
+            None, # No usa VTD
+            TABLAS_DE_MORTALIDAD_REALES,
+            modo_calculo='RP',
+            tasa_plana_rp=tasa_rp_decimal,
+            periodo_garantizado_en_anos=0,
+            anos_de_aumento=n_anos_diferimiento, # N años
+            sobrevivencia_exacta=p.check_sobrevivencia_exacta
+        )
+
+        # 2. Calcular Factor Diferido de RVI (fd_rvi)
+        (_, fd_rvi) = factores_rvi(0, n_anos_diferimiento) # RVD simple, N años
+
+        factores.factores_rvd = (ft_rp, fd_rvi)
+
+    return factores
+
+
+def escalar_cotizacion(p, datos, factores):
+    """
+    Etapa 2: aplica saldo, comisiones, valor UF y PGU/Bono a los factores
+    y arma el informe (Tablas 1 a 4). Es barata: no llama a los motores.
+    Lanza ErrorCotizacion si el cálculo no puede continuar.
+    """
+    mensajes = []
+
+    def _detener(*lineas):
+        raise ErrorCotizacion(*lineas, mensajes=mensajes)
+
+    datos_conyuge = p.datos_conyuge
+    datos_hijos = p.datos_hijos
+    incluye_conyuge = datos_conyuge is not None
+    afiliado_tipo_pension = p.afiliado_tipo_pension
+    input_valor_uf_clp = p.input_valor_uf_clp
+    input_cia_rvi = p.input_cia_rvi
+    check_incluye_pgu = p.check_incluye_pgu
+    check_incluye_bono = p.check_incluye_bono
+
+    modo_calculo_rvi_final = factores.modo_calculo_rvi
+
+    # --- Lógica Común de Primas y Tasas (V31.0) ---
+    comision_decimal = 0.0
+    if p.check_incluye_comision:
+        comision_decimal = p.input_comision_pct / 100.0
+
+    prima_neta_rp = p.saldo_uf
+    prima_neta_rvi = p.saldo_uf * (1 - comision_decimal)
+
+    # Inicializar listas
+    rp_rows = []
+    rvi_simple_rows = []
+    rvat_rows = []
+    rvd_rows = [] # <-- AÑADIDO V33.0
+
+    afp_details_str = ""
+    comision_header_str = ""
+
+    # --- Lógica PGU/Bono (V29.0 - Sin cambios) ---
+    bonificacion_clp = 0.0
+    valor_pgu_a_sumar = 0.0
+    texto_adicional = []
+
+    if check_incluye_pgu:
+        valor_pgu_a_sumar = p.input_valor_pgu_clp
+        texto_adicional.append(f"PGU (${p.input_valor_pgu_clp:,.0f})")
+
+    if check_incluye_bono:
+        bonificacion_clp = p.input_bonificacion_uf * input_valor_uf_clp
+        texto_adicional.append("Bonificación")
+
+    pgu_texto_simple = ""
+    pgu_texto_base = ""
+
+    if texto_adicional:
+        pgu_texto_simple = f" Pension + {' + '.join(texto_adicional)}"
+        pgu_texto_base = f" Pension + {' + '.join(texto_adicional)}"
+
+    def fila_bonus(texto, liquido):
+        return {
+            "Modalidad": texto,
+            "Pensión Liquida": liquido + valor_pgu_a_sumar + bonificacion_clp,
+            "is_bonus_row": True
+        }
+
+    # --- RAMA 1: CÁLCULO DE SOBREVIVENCIA ---
+    if afiliado_tipo_pension == 'Sobrevivencia':
+        mensajes.extend(factores.mensajes)
+
+        # 2. Calcular la Pensión de Referencia (PR) que el saldo puede financiar
+        pension_ref_uf_financiable = (prima_neta_rvi / factores.factor_sobrevivencia) / 12.0
+
+        # 3. Determinar la PR Final a Pagar
+        pension_ref_final_uf = 0.0
+        if pension_ref_uf_financiable < p.input_pension_referencia_uf:
+            pension_ref_final_uf = pension_ref_uf_financiable
+            mensajes.append(('warning', f"Saldo Insuficiente: La PR legal ({p.input_pension_referencia_uf:.2f} UF) "
+                       f"es mayor a la financiable ({pension_ref_uf_financiable:.2f} UF). "
+                       "Se pagará la pensión financiable."))
+        else:
+            pension_ref_final_uf = p.input_pension_referencia_uf
+
+        # 4. Poblar las filas del reporte (una fila por beneficiario)
+        modalidad_sob_desc = "PENSIÓN SOBREVIVENCIA"
+        if modo_calculo_rvi_final == 'TASA_PLANA':
+            modalidad_sob_desc += f" ({input_cia_rvi})"
+
+        # Añadir Cónyuge al reporte
+        if incluye_conyuge:
+            pension_conyuge_uf = pension_ref_final_uf * datos_conyuge.pct_pension
+            bruto, dscto, liq = calcular_descuentos_clp(pension_conyuge_uf, input_valor_uf_clp)
+            rvi_simple_rows.append({
+                "Modalidad": f"{modalidad_sob_desc} (Cónyuge {datos_conyuge.pct_pension*100:.0f}%)",
+                "Tasa (%)": factores.tasa_rvi_pct, # V34.0
+                "Pensión (UF)": pension_conyuge_uf,
+                "Pensión M. Bruto": bruto, "Dscto. 7% Salud": dscto, "Pensión Liquida": liq
+            })
+
+        # Añadir Hijos al reporte
+        for i, hijo_data in enumerate(datos_hijos):
+            pension_hijo_uf = pension_ref_final_uf * hijo_data.pct_pension
+            bruto, dscto, liq = calcular_descuentos_clp(pension_hijo_uf, input_valor_uf_clp)
+            rvi_simple_rows.append({
+                "Modalidad": f"{modalidad_sob_desc} (Hijo {i+1} {hijo_data.pct_pension*100:.0f}%)",
+                "Tasa (%)": factores.tasa_rvi_pct, # V34.0
+                "Pensión (UF)": pension_hijo_uf,
+                "Pensión M. Bruto": bruto, "Dscto. 7% Salud": dscto, "Pensión Liquida": liq
+            })
+
+    # --- RAMA 2: CÁLCULO DE VEJEZ, V. ANTICIPADA E INVALIDEZ ---
+    else:
+
+        # --- Función de ayuda para calcular RVI (MODIFICADA V44.0: recibe los factores) ---
+        def calcular_escenario_rvi(prima_a_usar, factores_rv, pg_anos, at_anos, pct_aumento):
+            ft_rv, fd_rv = factores_rv
+
+            pct_aumento_decimal = pct_aumento / 100.0
+            denominador = (ft_rv * (1 + pct_aumento_decimal)) + fd_rv
+
+            if denominador == 0: pension_anual_referencia = 0
+            else:
+                pension_anual_referencia = prima_a_usar / denominador
+
+            pension_anual_aumentada = pension_anual_referencia * (1 + pct_aumento_decimal)
+
+            return {
+                'p_ref_uf': pension_anual_referencia / 12.0,
+                'p_aum_uf': pension_anual_aumentada / 12.0,
+                'anos_aum': at_anos, 'pct_aum': pct_aumento,
+                'pg_anos': pg_anos
+            }
+
+        # --- NUEVO "GATEKEEPER" V32.0: VEJEZ ANTICIPADA ---
+        if afiliado_tipo_pension == 'Vejez Anticipada':
+            ft_temp, fd_temp = factores.factores_rvi_simple
+            factor_total_temp = ft_temp + fd_temp
+            if factor_total_temp == 0:
+                _detener("Error de división por cero al verificar Vejez Anticipada.")
+
+            pension_verificacion_uf = (prima_neta_rvi / factor_total_temp) / 12.0
+            pension_minima_requerida = p.input_promedio_10_anos_uf * PCT_VEJEZ_ANTICIPADA
+
+            if pension_verificacion_uf < pension_minima_requerida:
+                _detener(
+                    f"AFILIADO NO CALIFICA PARA VEJEZ ANTICIPADA:",
+                    f"  - Pensión Calculada: {pension_verificacion_uf:,.2f} UF",
+                    f"  - Requisito (80% Promedio): {pension_minima_requerida:,.2f} UF"
+                )
+            else:
+                mensajes.append(('success', f"Afiliado CALIFICA para Vejez Anticipada (Pensión {pension_verificacion_uf:,.2f} UF >= {pension_minima_requerida:,.2f} UF)"))
+
+        mensajes.extend(factores.mensajes)
+
+        # --- Tarea 1: Retiro Programado (MODIFICADO V24.1) ---
+        if factores.factores_rp is not None:
+            ft_rp, fd_rp = factores.factores_rp
+            factor_total_rp = ft_rp + fd_rp
+
+            pension_rp_uf_bruta = (prima_neta_rp / factor_total_rp) / 12.0
+
+            comision_pct = AFP_COMMISSIONS.get(p.input_afp_nombre, 0.0) / 100.0
+            comision_uf = pension_rp_uf_bruta * comision_pct
+            pension_rp_uf_neta = pension_rp_uf_bruta - comision_uf
+
+            bruto_clp, dscto_clp, liq_clp = calcular_descuentos_clp(pension_rp_uf_neta, input_valor_uf_clp)
+
+            comision_clp = comision_uf * input_valor_uf_clp
+            afp_details_str = f"({p.input_afp_nombre} - {comision_pct*100:.2f}%)"
+            comision_header_str = f"Desc. {comision_pct*100:.2f}%"
+
+            rp_rows.append({
+                "Modalidad": "RETIRO PROGRAMADO",
+                "Pensión (UF)": pension_rp_uf_neta,
+                "Pensión M. Bruto": bruto_clp,
+                "Comisión AFP": comision_clp,
+                "Dscto. 7% Salud": dscto_clp,
+                "Pensión Liquida": liq_clp
+            })
+
+        # --- Tarea 2: RVI Simple (¡¡MODIFICADO V34.0!!) ---
+        if p.check_rvi_simple:
+
+            # --- INICIO BLOQUE V34.0 (Comparador) ---
+            if p.input_metodo_rvi == METODO_TASA_VENTA and p.check_comparar_todas:
+                resultados_comparacion = []
+
+                for cia_nombre, tasa_cia_pct, factor_total in factores.comparador:
+                    if factor_total == 0: continue
+
+                    # 2. Calcular Pensión
+                    pension_anual_ref = prima_neta_rvi / factor_total
+                    pension_mensual_uf = pension_anual_ref / 12.0
+
+                    # 3. Calcular CLP
+                    bruto, dscto, liq = calcular_descuentos_clp(pension_mensual_uf, input_valor_uf_clp)
+
+                    # 4. Guardar resultado
+                    resultados_comparacion.append({
+                        "Modalidad": cia_nombre, # Nombre limpio de la Cía.
+                        "Tasa (%)": tasa_cia_pct,
+                        "Pensión (UF)": pension_mensual_uf,
+                        "Pensión M. Bruto": bruto,
+                        "Dscto. 7% Salud": dscto,
+                        "Pensión Liquida": liq
+                    })
+
+                # 5. ¡ORDENAR! (De mayor a menor pensión)
+                resultados_ordenados = sorted(resultados_comparacion, key=lambda x: x['Pensión (UF)'], reverse=True)
+
+                # 6. Poblar rvi_simple_rows
+                rvi_simple_rows.extend(resultados_ordenados) # Añadir todos los resultados
+
+            else:
+                # --- CÓDIGO V33.0 ORIGINAL (Si el comparador NO está activo) ---
+                res = calcular_escenario_rvi(prima_neta_rvi, factores.factores_rvi_simple, 0, 0, 0)
+                bruto, dscto, liq = calcular_descuentos_clp(res['p_ref_uf'], input_valor_uf_clp)
+
+                modalidad_simple_desc = "RVI SIMPLE"
+                if modo_calculo_rvi_final == 'TASA_PLANA':
+                     modalidad_simple_desc += f" ({input_cia_rvi})"
+
+                rvi_simple_rows.append({
+                    "Modalidad": modalidad_simple_desc,
+                    "Tasa (%)": factores.tasa_rvi_pct, # <-- AÑADIDO V34.0
+                    "Pensión (UF)": res['p_ref_uf'],
+                    "Pensión M. Bruto": bruto,
+                    "Dscto. 7% Salud": dscto,
+                    "Pensión Liquida": liq
+                })
+
+                # Lógica de PGU/Bono (sin cambios)
+                if check_incluye_pgu or check_incluye_bono:
+                    rvi_simple_rows.append(fila_bonus(pgu_texto_simple, liq))
+            # --- FIN BLOQUE V34.0 ---
+
+        # --- Función para procesar escenarios (MODIFICADO V29.0) ---
+        def procesar_escenario(factores_esc, pg_anos, at_anos, pct_aum, nombre_esc):
+            res = calcular_escenario_rvi(prima_neta_rvi, factores_esc, pg_anos, at_anos, pct_aum)
+            if pct_aum == 0:
+                bruto, dscto, liq = calcular_descuentos_clp(res['p_ref_uf'], input_valor_uf_clp)
+                modalidad_nombre = f"{nombre_esc} (PG: {pg_anos}a)"
+                if pg_anos == 0: modalidad_nombre = f"{nombre_esc} (Simple)"
+
+                rvi_simple_rows.append({
+                    "Modalidad": modalidad_nombre,
+                    "Pensión (UF)": res['p_ref_uf'],
+                    "Pensión M. Bruto": bruto,
+                    "Dscto. 7% Salud": dscto,
+                    "Pensión Liquida": liq
+                })
+
+                if check_incluye_pgu or check_incluye_bono:
+                    rvi_simple_rows.append(fila_bonus(pgu_texto_simple, liq))
+            else:
+                bruto_ref, dscto_ref, liq_ref = calcular_descuentos_clp(res['p_ref_uf'], input_valor_uf_clp)
+                bruto_aum, dscto_aum, liq_aum = calcular_descuentos_clp(res['p_aum_uf'], input_valor_uf_clp)
+
+                modalidad_texto_aumentado = f"R. V. Aumentado {at_anos * 12} meses - Garantizado {pg_anos * 12} meses."
+                rvat_rows.append({
+                    "Modalidad": modalidad_texto_aumentado,
+                    "Pensión (UF)": res['p_aum_uf'],
+                    "Pensión M. Bruto": bruto_aum,
+                    "Dscto. 7% Salud": dscto_aum,
+                    "Pensión Liquida": liq_aum
+                })
+
+                if check_incluye_pgu or check_incluye_bono:
+                    rvat_rows.append(fila_bonus(pgu_texto_base, liq_aum))
+
+                rvat_rows.append({
+                    "Modalidad": f" - P. BASE (desde mes {at_anos * 12 + 1}) Pension Definitiva",
+                    "Pensión (UF)": res['p_ref_uf'],
+                    "Pensión M. Bruto": bruto_ref,
+                    "Dscto. 7% Salud": dscto_ref,
+                    "Pensión Liquida": liq_ref
+                })
+
+                if check_incluye_pgu or check_incluye_bono:
+                    rvat_rows.append(fila_bonus(pgu_texto_base, liq_ref))
+
+        # --- Tareas 3, 4, 5 (Escenarios A, B, C activos) ---
+        for esc, factores_esc in zip(p.escenarios, factores.factores_escenarios):
+            procesar_escenario(factores_esc, esc.pg_anos, esc.anos_aumento, esc.pct_aumento, esc.nombre)
+
+        # --- INICIO TAREA 6 (V33.0): RP con RVD ---
+        if factores.factores_rvd is not None:
+            n_anos_diferimiento = p.n_anos_diferimiento
+            ft_rp, fd_rvi = factores.factores_rvd
+
+            # 3. Calcular Factor Híbrido Ajustado por comisión
+            denominador_comision = (1 - comision_decimal)
+            if denominador_comision == 0:
+                _detener("Error: Comisión del 100% no es válida.")
+
+            factor_hibrido_ajustado = ft_rp + (fd_rvi / denominador_comision)
+
+            if factor_hibrido_ajustado <= 0:
+                _detener("Error: Factor híbrido es cero o negativo.")
+
+            # 4. Calcular Pensión
+            pension_anual_uf = prima_neta_rp / factor_hibrido_ajustado
+            pension_mensual_uf = pension_anual_uf / 12.0
+
+            # 5. Calcular valores en CLP para ambos períodos
+
+            # --- Período RP (Paga 7% salud + Comisión AFP) ---
+            comision_pct_afp = AFP_COMMISSIONS.get(p.input_afp_nombre, 0.0) / 100.0
+            comision_uf_afp = pension_mensual_uf * comision_pct_afp
+            pension_uf_neta_rp = pension_mensual_uf - comision_uf_afp
+
+            bruto_clp_rp, dscto_clp_rp, liq_clp_rp = calcular_descuentos_clp(
+                pension_uf_neta_rp, input_valor_uf_clp
+            )
+            comision_clp_afp = comision_uf_afp * input_valor_uf_clp
+
+            # --- Período RVD (Paga SÓLO 7% salud) ---
+            bruto_clp_rvd, dscto_clp_rvd, liq_clp_rvd = calcular_descuentos_clp(
+                pension_mensual_uf, input_valor_uf_clp
+            )
+
+            # 6. Añadir a las filas del reporte
+            rvd_rows.append({
+                "Modalidad": f"RP-RVD (Meses 1 a {n_anos_diferimiento * 12})",
+                "Pensión (UF)": pension_uf_neta_rp, # Neta de AFP
+                "Pensión M. Bruto": bruto_clp_rp,
+                "Comisión AFP": comision_clp_afp,
+                "Dscto. 7% Salud": dscto_clp_rp,
+                "Pensión Liquida": liq_clp_rp
+            })
+
+            rvd_rows.append({
+                "Modalidad": f" - (P. RVD desde mes {n_anos_diferimiento * 12 + 1})",
+                "Pensión (UF)": pension_mensual_uf, # Bruta (sin AFP)
+                "Pensión M. Bruto": bruto_clp_rvd,
+                "Comisión AFP": 0.0, # No hay comisión AFP
+                "Dscto. 7% Salud": dscto_clp_rvd,
+                "Pensión Liquida": liq_clp_rvd
+            })
+        # --- FIN TAREA 6 (V33.0) ---
+
+    # --- Datos para el constructor de PDF y la pantalla (MODIFICADO V34.0) ---
+    report_data = {
+        "input_afiliado_nombre": p.input_afiliado_nombre,
+        "input_valor_uf_clp": input_valor_uf_clp,
+        "saldo_uf": p.saldo_uf,
+        "afiliado_edad_calculada": p.afiliado_edad_calculada,
+        "afiliado_tipo_pension": afiliado_tipo_pension, # V32
+        "es_sobrevivencia": (afiliado_tipo_pension == 'Sobrevivencia'), # V32
+        "incluye_conyuge": incluye_conyuge,
+        "datos_conyuge": datos_conyuge,
+        "datos_hijos": datos_hijos,
+        "afp_details_str": afp_details_str,
+        "comision_header_str": comision_header_str,
+        "rp_rows": rp_rows,
+        "rvi_simple_rows": rvi_simple_rows,
+        "rvat_rows": rvat_rows,
+        "rvd_rows": rvd_rows, # V33
+        "vtd_details": datos.vtd_details_str,
+        "metodo_rvi_desc": factores.metodo_rvi_desc, # V30/V34
+        "check_incluye_pgu": check_incluye_pgu,
+        "check_incluye_bono": check_incluye_bono,
+        "input_valor_pgu_clp": p.input_valor_pgu_clp,
+        "input_bonificacion_uf": p.input_bonificacion_uf,
+        "check_incluye_comision": p.check_incluye_comision, # P3
+        "input_comision_pct": p.input_comision_pct, # P3
+        "prima_neta_rvi": prima_neta_rvi # P3
+    }
+
+    return ResultadoCotizacion(report_data, mensajes)
+
+
+def calcular_cotizacion(p, datos):
+    """
+    Calcula el informe comparativo completo (Tablas 1 a 4): etapa de
+    factores + etapa de escala. Lanza ErrorCotizacion si no puede continuar.
+    """
+    return escalar_cotizacion(p, datos, calcular_factores_cotizacion(p, datos))
+
+# --- FIN CAMBIO V44.0 ---
+
+
+# --- INICIO V38.0: CACHÉ DE COTIZACIONES ---
+
+# El nombre del afiliado solo aparece en el informe; no cambia el cálculo.
+CAMPOS_NO_TARIFICADOS = ('input_afiliado_nombre',)
+
+# Versión del código que calcula (módulos del motor). Entra en la llave
+# para que un resultado persistido por una versión anterior del motor no
+# se sirva después de un despliegue (la caché en disco sobrevive reinicios).
+MODULOS_MOTOR = (
+    'cotizacion.py', 'calculo_motor.py', 'motor_vectorial.py',
+    'mortalidad_generacional.py', 'modelos.py', 'utils.py',
+)
+VERSION_MOTOR = huella_archivos(
+    *(os.path.join(os.path.dirname(os.path.abspath(__file__)), m) for m in MODULOS_MOTOR)
+)
+
+
+def clave_cotizacion(parametros, version_datos, excluir=CAMPOS_NO_TARIFICADOS):
+    """
+    Hash canónico (SHA-256) de todo lo que determina el resultado:
+    afiliado, beneficiarios, AFP, comisión, escenarios... la versión
+    de los datos (mes VTD, archivos de tablas y tasas de venta) y la del
+    motor (VERSION_MOTOR).
+    'excluir' indica los campos que no forman parte de la llave.
+    """
+    entrada = asdict(parametros)
+    for campo in excluir:
+        entrada.pop(campo, None)
+    canonico = json.dumps(
+        {'parametros': entrada, 'datos': version_datos, 'motor': VERSION_MOTOR},
+        sort_keys=True, ensure_ascii=False, separators=(',', ':'), default=str
+    )
+    return hashlib.sha256(canonico.encode('utf-8')).hexdigest()
+
+
+def clave_factores(parametros, version_datos):
+    """Llave de la etapa de factores (V44.0): ignora saldo, comisiones, UF, PGU/Bono."""
+    return clave_cotizacion(parametros, version_datos, excluir=CAMPOS_DE_ESCALA)
+
+
+class CacheCotizaciones:
+    """
+    Caché LRU de resultados de cotización (segura entre hilos).
+    (V44.0) cotizar_con_cache guarda aquí los FactoresCotizacion.
+    - max_entradas: límite en memoria (se descarta la menos usada).
+    - directorio: si se indica, persiste cada resultado en disco (pickle)
+      para sobrevivir reinicios; max_archivos limita su tamaño.
+      Los archivos se deserializan con pickle: el directorio debe ser de
+      confianza (solo escribible por el servicio), nunca compartido.
+      Un archivo ilegible o de otra versión del código cuenta como fallo.
+    """
+
+    def __init__(self, max_entradas=256, directorio=None, max_archivos=5000):
+        self.max_entradas = max_entradas
+        self.directorio = directorio
+        self.max_archivos = max_archivos
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+        self._escrituras = 0
+        self.aciertos = 0
+        self.fallos = 0
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+
+    def __len__(self):
+        return len(self._entradas)
+
+    def _ruta(self, clave):
+        return os.path.join(self.directorio, f"{clave}.pkl")
+
+    def obtener(self, clave):
+        with self._lock:
+            resultado = self._entradas.get(clave)
+            if resultado is not None:
+                self._entradas.move_to_end(clave)
+                self.aciertos += 1
+                return resultado
+
+        if self.directorio:
+            try:
+                with open(self._ruta(clave), 'rb') as f:
+                    resultado = pickle.load(f)
+            except Exception: # Corrupto o de clases renombradas/eliminadas: se recalcula
+                resultado = None
+            if resultado is not None:
+                self._guardar_en_memoria(clave, resultado)
+                with self._lock:
+                    self.aciertos += 1
+                return resultado
+
+        with self._lock:
+            self.fallos += 1
+        return None
+
+    def guardar(self, clave, resultado):
+        self._guardar_en_memoria(clave, resultado)
+        if self.directorio:
+            ruta = self._ruta(clave)
+            temporal = f"{ruta}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                with open(temporal, 'wb') as f:
+                    pickle.dump(resultado, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(temporal, ruta) # Escritura atómica
+            except OSError:
+                return
+            self._escrituras += 1
+            if self._escrituras % 100 == 0:
+                self._podar_disco()
+
+    def _guardar_en_memoria(self, clave, resultado):
+        with self._lock:
+            self._entradas[clave] = resultado
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+
+    def _podar_disco(self):
+        """Borra los archivos más antiguos si se supera max_archivos."""
+        try:
+            archivos = [e for e in os.scandir(self.directorio) if e.name.endswith('.pkl')]
+        except OSError:
+            return
+        exceso = len(archivos) - self.max_archivos
+        if exceso <= 0:
+            return
+        archivos.sort(key=lambda e: e.stat().st_mtime)
+        for entrada in archivos[:exceso]:
+            try:
+                os.remove(entrada.path)
+            except OSError:
+                pass
+
+    def limpiar(self):
+        with self._lock:
+            self._entradas.clear()
+
+
+def cotizar_con_cache(parametros, datos, cache, motor=MOTOR_POR_PERFIL):
+    """
+    (MODIFICADO V44.0) La caché guarda la etapa de factores. Si ya se
+    calcularon para el mismo afiliado/modalidades/datos, solo se ejecuta la
+    etapa de escala (saldo, comisiones, UF, PGU/Bono). Los errores
+    (ErrorCotizacion) no se guardan.
+    """
+    clave = clave_factores(parametros, datos.version)
+    factores = cache.obtener(clave)
+    if factores is None:
+        factores = calcular_factores_cotizacion(parametros, datos, motor)
+        cache.guardar(clave, factores)
+    return escalar_cotizacion(parametros, datos, factores)
+
+# --- FIN V38.0 ---
@@ -0,0 +1,195 @@
+import numpy as np
+import pandas as pd
+
+from cartera import grupos_desde_dataframe
+from modelos import LoteGrupos
+from mortalidad_generacional import TablasGeneracionales
+from motor_vectorial import EDAD_MAXIMA, matriz_px
+
+# --- CRONOGRAMA DE PAGOS DE SOBREVIVENCIA V50.0 ---
+# 'calcular_factor_sobrevivencia' entrega un solo factor. Aquí se entrega,
+# por beneficiario y por año (o mes), el pago esperado y el pago condicional
+# (dado que el beneficiario está vivo y con derecho), con los hijos que dejan
+# de cobrar al cumplir 'edad_limite' y el tope de 100% re-evaluado cada año:
+#   - modo estándar: tope sobre valores esperados, como los motores; cada
+#     beneficiario recibe pct * p_cobro * min(1, 1 / sum(pct * p_cobro))
+#   - modo exacto (V49.0): en cada estado vivo/muerto con suma > 100% los
+#     pagos se reducen a prorrata (pct / suma)
+# La suma de los pagos esperados de una familia es exactamente el flujo de
+# 'flujos_sobrevivencia' (estándar o exacto).
+# Todo se calcula con arreglos (familias, beneficiarios, años) sobre un
+# LoteGrupos (modelos.py): sin ciclos por familia. El modo exacto agrupa las
+# familias por número de beneficiarios y las procesa en bloques.
+
+MAX_ELEMENTOS_BLOQUE = 4_000_000 # familias x estados x años por bloque (modo exacto)
+
+
+def _supervivencia_lote(px, tabla, sexo, edad, n, edad_maxima=EDAD_MAXIMA):
+    """
+    (..., n): probabilidad acumulada de seguir vivo para arreglos de tabla
+    (0 Vejez, 1 Invalidez), sexo y edad; misma regla que motor_vectorial.
+    Con TablasGeneracionales cada persona usa la fila de su cohorte.
+    """
+    edades = edad[..., None] + np.arange(n - 1)
+    if isinstance(px, TablasGeneracionales):
+        cohorte = px.indice_cohorte(edad)[..., None]
+        px_personas = px.px_cohortes[tabla[..., None], sexo[..., None], cohorte, np.clip(edades, 0, px.px_cohortes.shape[-1] - 1)]
+    else:
+        px_personas = px[tabla[..., None], sexo[..., None], np.clip(edades, 0, px.shape[-1] - 1)]
+    q = np.where(edades < edad_maxima, px_personas, 0.0)
+    s = np.ones(edad.shape + (n,), dtype=float)
+    np.cumprod(q, axis=-1, out=s[..., 1:])
+    return s
+
+
+def columnas_beneficiarios(lote):
+    """
+    Beneficiarios del lote como arreglos (F, B) con B = 1 (cónyuge) + hijos:
+    (presente, pct, edad, sexo, tabla, edad límite).
+    """
+    presente = np.concatenate([lote.c_presente[:, None], lote.h_presente], axis=1)
+    pct = np.where(presente, np.concatenate([lote.c_pct[:, None], lote.h_pct], axis=1), 0.0)
+    edad = np.concatenate([lote.c_edad[:, None], lote.h_edad], axis=1)
+    sexo = np.concatenate([lote.c_sexo[:, None], lote.h_sexo], axis=1)
+    # Los hijos se asumen no-inválidos (tabla Vejez)
+    tabla = np.concatenate([lote.c_invalido[:, None], np.zeros_like(lote.h_presente)], axis=1).astype(np.int64)
+    limite = np.concatenate([np.full((len(lote), 1), np.iinfo(np.int64).max), lote.h_limite], axis=1)
+    return presente, pct, edad, sexo, tabla, limite
+
+
+def arreglos_beneficiarios(lote, px, n, edad_maxima=EDAD_MAXIMA):
+    """
+    Beneficiarios del lote como arreglos (F, B) con B = 1 (cónyuge) + hijos:
+    (presente, pct, edad, p_cobro (F, B, n)).
+    """
+    presente, pct, edad, sexo, tabla, limite = columnas_beneficiarios(lote)
+    p_cobro = _supervivencia_lote(px, tabla, sexo, edad, n, edad_maxima)
+    en_edad = edad[..., None] + np.arange(n) < limite[..., None]
+    p_cobro = np.where(presente[..., None] & en_edad, p_cobro, 0.0)
+    return presente, pct, edad, p_cobro
+
+
+def _reparto_estandar(pct, p_cobro):
+    """Pago esperado (F, B, n) con el tope aplicado a los valores esperados."""
+    esperado = pct[..., None] * p_cobro
+    total = esperado.sum(axis=1, keepdims=True)
+    factor = np.ones_like(total)
+    np.divide(1.0, total, out=factor, where=total > 1.0)
+    return esperado * factor
+
+
+def _correccion_exacta_bloque(pct, p_cobro):
+    """
+    Reducción esperada (F, k, n) del pago de cada beneficiario por el tope,
+    para familias con los mismos k beneficiarios presentes (ya compactados).
+    """
+    F, k, n = p_cobro.shape
+    estados = ((np.arange(2 ** k)[:, None] >> np.arange(k)) & 1).astype(bool)
+    suma = pct @ estados.T # (F, 2^k)
+    # Solo los estados con suma > 100% (en alguna familia del bloque) corrigen
+    utiles = (suma > 1.0 + 1e-12).any(axis=0)
+    estados, suma = estados[utiles], suma[:, utiles]
+    correccion = np.zeros((F, k, n), dtype=float)
+    if len(estados) == 0:
+        return correccion
+
+    bloque = max(1, MAX_ELEMENTOS_BLOQUE // (len(estados) * n))
+    for inicio in range(0, F, bloque):
+        fin = min(inicio + bloque, F)
+        prob_estado = np.ones((fin - inicio, len(estados), n), dtype=float)
+        for b in range(k):
+            a = p_cobro[inicio:fin, b][:, None, :]
+            prob_estado *= np.where(estados[None, :, b, None], a, 1.0 - a)
+        s = suma[inicio:fin]
+        reduccion = np.where(s > 1.0, 1.0 - 1.0 / np.maximum(s, 1.0), 0.0) # (f, M)
+        pesos = estados[None, :, :] * pct[inicio:fin, None, :] * reduccion[:, :, None] # (f, M, k)
+        correccion[inicio:fin] = np.einsum('fmk,fmn->fkn', pesos, prob_estado)
+    return correccion
+
+
+def _reparto_exacto(presente, pct, p_cobro):
+    """Pago esperado (F, B, n) con el tope aplicado en cada estado vivo/muerto."""
+    esperado = pct[..., None] * p_cobro
+    # Compactar: beneficiarios presentes primero (orden estable)
+    orden = np.argsort(~presente, axis=1, kind='stable')
+    pct_c = np.take_along_axis(pct, orden, axis=1)
+    p_c = np.take_along_axis(p_cobro, orden[..., None], axis=1)
+    cantidad = presente.sum(axis=1)
+
+    correccion_c = np.zeros_like(p_c)
+    for k in np.unique(cantidad):
+        familias = np.flatnonzero((cantidad == k) & (pct.sum(axis=1) > 1.0))
+        if k < 2 or len(familias) == 0:
+            continue
+        correccion_c[familias, :k] = _correccion_exacta_bloque(pct_c[familias, :k], p_c[familias, :k])
+
+    correccion = np.zeros_like(correccion_c)
+    np.put_along_axis(correccion, orden[..., None], correccion_c, axis=1)
+    return esperado - correccion
+
+
+def cronograma_lote(grupos, tablas_mortalidad, pensiones_referencia_uf, exacto=False, frecuencia='anual', edad_maxima=EDAD_MAXIMA):
+    """
+    Cronograma de pagos de sobrevivencia de muchas familias a la vez.
+    - grupos: iterable de (afiliado, conyuge, hijos); el afiliado (causante) se ignora
+    - pensiones_referencia_uf: PR (UF mensuales) por familia, o un número
+    - frecuencia: 'anual' (una fila por año) o 'mensual' (una fila por mes;
+      las probabilidades son anuales y se mantienen dentro de cada año)
+    Devuelve un DataFrame 'largo' con una fila por familia, beneficiario y
+    periodo en que el beneficiario aún puede cobrar.
+    """
+    lote = LoteGrupos.desde_registros(grupos)
+    n = edad_maxima + 1
+    presente, pct, edad, p_cobro = arreglos_beneficiarios(lote, matriz_px(tablas_mortalidad), n, edad_maxima)
+    if exacto:
+        esperado = _reparto_exacto(presente, pct, p_cobro)
+    else:
+        esperado = _reparto_estandar(pct, p_cobro)
+    condicional = np.zeros_like(esperado)
+    np.divide(esperado, p_cobro, out=condicional, where=p_cobro > 0)
+
+    pr = np.broadcast_to(np.asarray(pensiones_referencia_uf, dtype=float), (len(lote),))
+    familia, beneficiario, ano = np.nonzero(p_cobro > 0)
+    resultado = pd.DataFrame({
+        "familia": familia,
+        "beneficiario": np.where(beneficiario == 0, "Cónyuge", np.char.add("Hijo ", beneficiario.astype(str))),
+        "ano": ano,
+        "edad": edad[familia, beneficiario] + ano,
+        "pct_pension": pct[familia, beneficiario],
+        "prob_cobro": p_cobro[familia, beneficiario, ano],
+        "pago_condicional_uf": condicional[familia, beneficiario, ano] * pr[familia],
+        "pago_esperado_uf": esperado[familia, beneficiario, ano] * pr[familia],
+    })
+    if frecuencia == 'mensual':
+        resultado = resultado.loc[resultado.index.repeat(12)].reset_index(drop=True)
+        resultado.insert(3, "mes", resultado["ano"] * 12 + np.tile(np.arange(1, 13), len(resultado) // 12))
+    elif frecuencia != 'anual':
+        raise ValueError(f"Frecuencia no soportada: {frecuencia}")
+    return resultado
+
+
+def cronograma_sobrevivencia(p, datos, frecuencia='anual'):
+    """Cronograma de la familia de 'p' (cotizacion.ParametrosCotizacion) sobre su PR."""
+    return cronograma_lote(
+        [(None, p.datos_conyuge, p.datos_hijos)],
+        datos.tablas_mortalidad,
+        p.input_pension_referencia_uf,
+        exacto=p.check_sobrevivencia_exacta,
+        frecuencia=frecuencia
+    ).drop(columns="familia")
+
+
+def cronograma_cartera(df_familias, tablas_mortalidad, exacto=False, frecuencia='anual'):
+    """
+    Cronograma de un archivo de familias (columnas de beneficiarios de
+    cartera.py + 'pension_referencia_uf'). 'familia' es el índice de la fila.
+    """
+    resultado = cronograma_lote(
+        grupos_desde_dataframe(df_familias),
+        tablas_mortalidad,
+        df_familias['pension_referencia_uf'].to_numpy(dtype=float),
+        exacto=exacto,
+        frecuencia=frecuencia
+    )
+    resultado["familia"] = df_familias.index.to_numpy()[resultado["familia"].to_numpy()]
+    return resultado
@@ -0,0 +1,264 @@
+from dataclasses import dataclass
+from typing import Any
+import numpy as np
+import pandas as pd
+
+from cartera import agrupar_perfiles, grupos_desde_dataframe
+from cronograma_sobrevivencia import columnas_beneficiarios
+from grilla_productos import vector_descuento_rvi
+from modelos import LoteGrupos
+from mortalidad_generacional import TablasGeneracionales
+from motor_vectorial import EDAD_MAXIMA, N_PLAZOS, matriz_px, vector_descuento
+
+# --- ESTRÉS DE LONGEVIDAD V52.0: MUCHOS SHOCKS EN UNA PASADA ---
+# Cada escenario de estrés es una transformación del arreglo px:
+#   - factor_qx: qx * factor (0.8 = 20% menos mortalidad)
+#   - desplazamiento_anos: k años más de longevidad. Con tablas estáticas
+#     la persona se valoriza con la tasa de k años menos de edad; con tablas
+#     generacionales, con la cohorte nacida k años después
+#   - invalidos_con_tabla_vejez: los inválidos se valorizan con la tabla Vejez
+# Se arma un tensor px[escenario, tabla, sexo, cohorte, edad] (las tablas
+# estáticas tienen una sola 'cohorte') y los flujos de todos los perfiles se
+# calculan a la vez como un tensor (escenario, perfil, año). Los factores de
+# cada modalidad salen de productos con el descuento, y se informa la
+# diferencia contra las tablas sin estrés.
+# El tope de 100% de sobrevivencia se aplica sobre valores esperados (como
+# los motores sin el modo exacto V49.0).
+
+MAX_ELEMENTOS_BLOQUE = 8_000_000 # escenarios x perfiles x personas x años por bloque
+
+
+@dataclass(frozen=True)
+class EscenarioEstres:
+    """Un shock de longevidad sobre las tablas de mortalidad."""
+    nombre: str
+    factor_qx: float = 1.0
+    desplazamiento_anos: int = 0
+    invalidos_con_tabla_vejez: bool = False
+
+
+@dataclass(frozen=True, eq=False)
+class ModalidadEstres:
+    """Una modalidad a valorizar: descuento (n,) y forma del pago."""
+    nombre: str
+    descuento: Any
+    periodo_garantizado: int = 0
+    anos_aumento: int = 0
+    pct_aumento: float = 0.0
+
+
+ESCENARIOS_ESTANDAR = (
+    EscenarioEstres("qx x 0.9", factor_qx=0.9),
+    EscenarioEstres("qx x 0.8", factor_qx=0.8),
+    EscenarioEstres("Longevidad +1 año", desplazamiento_anos=1),
+    EscenarioEstres("Longevidad +3 años", desplazamiento_anos=3),
+    EscenarioEstres("Inválidos con tabla Vejez", invalidos_con_tabla_vejez=True),
+)
+
+
+def _px_con_cohortes(px):
+    """px como (tabla, sexo, cohorte, edad) y si el eje de cohortes es real."""
+    if isinstance(px, TablasGeneracionales):
+        return px.px_cohortes, True
+    return px[:, :, None, :], False
+
+
+def tensor_px_estres(px, escenarios):
+    """
+    px[escenario, tabla, sexo, cohorte, edad] para cada escenario. Las edades
+    sin dato (px = 0) siguen sin dato en todos los escenarios.
+    """
+    base, generacional = _px_con_cohortes(px)
+    edades = np.arange(base.shape[-1])
+    cohortes = np.arange(base.shape[-2])
+    tensor = np.empty((len(escenarios),) + base.shape, dtype=float)
+    for s, escenario in enumerate(escenarios):
+        px_s = base[[0, 0]] if escenario.invalidos_con_tabla_vejez else base
+        con_dato = px_s > 0
+        k = int(escenario.desplazamiento_anos)
+        if k and generacional:
+            px_s = px_s[:, :, np.clip(cohortes + k, 0, len(cohortes) - 1)]
+        elif k:
+            px_s = px_s[..., np.clip(edades - k, 0, len(edades) - 1)]
+        qx = np.minimum((1.0 - px_s) * escenario.factor_qx, 1.0)
+        tensor[s] = np.where(con_dato, 1.0 - qx, 0.0)
+    return tensor
+
+
+def _supervivencia_estres(tensor, tabla, sexo, cohorte, edad, n, edad_maxima=EDAD_MAXIMA):
+    """(S, ..., n): probabilidad acumulada de seguir vivo en cada escenario."""
+    edades = edad[..., None] + np.arange(n - 1)
+    px_personas = tensor[
+        :, tabla[..., None], sexo[..., None], cohorte[..., None], np.clip(edades, 0, tensor.shape[-1] - 1)
+    ]
+    q = np.where(edades < edad_maxima, px_personas, 0.0)
+    s = np.ones((len(tensor),) + edad.shape + (n,), dtype=float)
+    np.cumprod(q, axis=-1, out=s[..., 1:])
+    return s
+
+
+def _indice_cohorte(px, edad):
+    """Índice del eje de cohortes del tensor (0 con tablas estáticas)."""
+    if isinstance(px, TablasGeneracionales):
+        return px.indice_cohorte(edad)
+    return np.zeros_like(edad)
+
+
+def largo_flujos(lote, n=N_PLAZOS):
+    """(U,): años con flujo de cada perfil (hasta la edad 110 del afiliado; n sin afiliado)."""
+    return np.where(lote.a_presente, np.maximum(EDAD_MAXIMA - lote.a_edad + 1, 0), n)
+
+
+def componentes_flujos(lote, tensor, px, n=N_PLAZOS, pago_sobrevivencia=None):
+    """
+    (s_afiliado, pago_sobrevivencia), cada uno (S, U, n): probabilidad de que
+    el afiliado esté vivo (0 sin afiliado) y % de pensión esperado de los
+    beneficiarios con el tope de 100%, ambos en 0 desde 'largo_flujos'.
+    'pago_sobrevivencia' (U, n) permite entregar uno ya calculado (p.ej. el
+    exacto de motor_vectorial.flujos_sobrevivencia).
+    """
+    vigente = np.arange(n) < largo_flujos(lote, n)[:, None]
+    s_afiliado = _supervivencia_estres(
+        tensor, lote.a_invalido.astype(np.int64), lote.a_sexo, _indice_cohorte(px, lote.a_edad), lote.a_edad, n
+    )
+    s_afiliado = np.where(lote.a_presente[:, None] & vigente, s_afiliado, 0.0)
+
+    if pago_sobrevivencia is None:
+        presente, pct, edad, sexo, tabla, limite = columnas_beneficiarios(lote)
+        p_cobro = _supervivencia_estres(tensor, tabla, sexo, _indice_cohorte(px, edad), edad, n)
+        en_edad = presente[..., None] & (edad[..., None] + np.arange(n) < limite[..., None])
+        pago_sobrevivencia = np.minimum(np.einsum('ub,subn->sun', pct, p_cobro * en_edad), 1.0)
+    pago_sobrevivencia = np.broadcast_to(np.where(vigente, pago_sobrevivencia, 0.0), s_afiliado.shape)
+    return s_afiliado, pago_sobrevivencia
+
+
+def flujos_estres(lote, tensor, px, n=N_PLAZOS):
+    """
+    (S, U, n): flujos esperados (sin periodo garantizado) de cada perfil del
+    lote en cada escenario; rellenos con 0 tras la edad 110 del afiliado,
+    igual que cartera.matriz_flujos.
+    """
+    s_afiliado, pago_sobrevivencia = componentes_flujos(lote, tensor, px, n)
+    return s_afiliado + pago_sobrevivencia * (1.0 - s_afiliado)
+
+
+def factores_modalidades(flujos, modalidades):
+    """
+    (..., M): factor de cada modalidad, (ft * (1 + %aumento)) + fd como en
+    cartera.factores_perfiles, con el periodo garantizado sobre los flujos.
+    """
+    n = flujos.shape[-1]
+    t = np.arange(n)
+    factores = np.empty(flujos.shape[:-1] + (len(modalidades),), dtype=float)
+    for m, modalidad in enumerate(modalidades):
+        pagos = np.maximum(flujos, (t < modalidad.periodo_garantizado).astype(float))
+        pesos = np.asarray(modalidad.descuento, dtype=float)[:n] * np.where(
+            t < modalidad.anos_aumento, 1 + modalidad.pct_aumento / 100.0, 1.0
+        )
+        factores[..., m] = pagos @ pesos
+    return factores
+
+
+def factores_estres(grupos, tablas_mortalidad, escenarios, modalidades):
+    """
+    (base (N, M), estresados (S, N, M)): factores de cada grupo y modalidad
+    sin estrés y bajo cada escenario. Los perfiles únicos se procesan en
+    bloques de a lo más MAX_ELEMENTOS_BLOQUE elementos del tensor.
+    """
+    perfiles, indice = agrupar_perfiles(grupos)
+    px = matriz_px(tablas_mortalidad)
+    tensor = tensor_px_estres(px, (EscenarioEstres("Base"),) + tuple(escenarios))
+
+    personas = 2 + max((len(hijos) for _, _, hijos in perfiles), default=0)
+    bloque = max(1, MAX_ELEMENTOS_BLOQUE // (len(tensor) * personas * N_PLAZOS))
+    factores = np.empty((len(tensor), len(perfiles), len(modalidades)), dtype=float)
+    for inicio in range(0, len(perfiles), bloque):
+        sub = LoteGrupos.desde_registros(perfiles[inicio:inicio + bloque])
+        factores[:, inicio:inicio + len(sub)] = factores_modalidades(flujos_estres(sub, tensor, px), modalidades)
+    return factores[0][indice], factores[1:][:, indice]
+
+
+def flujos_lote(perfiles, tablas_mortalidad):
+    """
+    (U, 111): flujos esperados (sin periodo garantizado, tope estándar) de
+    los perfiles, calculados como tensor en bloques; mismos valores que
+    cartera.matriz_flujos sin recorrer los perfiles uno a uno.
+    """
+    px = matriz_px(tablas_mortalidad)
+    tensor = tensor_px_estres(px, (EscenarioEstres("Base"),))
+    personas = 2 + max((len(hijos) for _, _, hijos in perfiles), default=0)
+    bloque = max(1, MAX_ELEMENTOS_BLOQUE // (personas * N_PLAZOS))
+    flujos = np.empty((len(perfiles), N_PLAZOS), dtype=float)
+    for inicio in range(0, len(perfiles), bloque):
+        sub = LoteGrupos.desde_registros(perfiles[inicio:inicio + bloque])
+        flujos[inicio:inicio + len(sub)] = flujos_estres(sub, tensor, px)[0]
+    return flujos
+
+
+def _tabla_deltas(base, estresados, escenarios, modalidades, etiquetas):
+    """DataFrame largo: una fila por grupo, escenario y modalidad."""
+    S, N, M = estresados.shape
+    factor = estresados.ravel()
+    factor_base = np.broadcast_to(base, estresados.shape).ravel()
+    razon_factor = np.ones_like(factor)
+    np.divide(factor, factor_base, out=razon_factor, where=factor_base > 0)
+    razon_pension = np.ones_like(factor)
+    np.divide(factor_base, factor, out=razon_pension, where=factor > 0)
+    return pd.DataFrame({
+        "grupo": np.tile(np.repeat(np.asarray(etiquetas), M), S),
+        "escenario": pd.Categorical.from_codes(np.repeat(np.arange(S), N * M), [e.nombre for e in escenarios]),
+        "modalidad": pd.Categorical.from_codes(np.tile(np.arange(M), S * N), [m.nombre for m in modalidades]),
+        "factor_base": factor_base,
+        "factor": factor,
+        "delta_factor": factor - factor_base,
+        "delta_factor_pct": (razon_factor - 1) * 100,
+        "delta_pension_pct": (razon_pension - 1) * 100,
+    })
+
+
+def estres_cartera(df_cartera, tablas_mortalidad, modalidades, escenarios=ESCENARIOS_ESTANDAR):
+    """
+    Deltas de factor por afiliado (índice de la cartera, columnas de
+    cartera.py), escenario y modalidad.
+    """
+    base, estresados = factores_estres(grupos_desde_dataframe(df_cartera), tablas_mortalidad, escenarios, modalidades)
+    return _tabla_deltas(base, estresados, escenarios, modalidades, df_cartera.index.to_numpy())
+
+
+def resumen_estres(deltas, pesos=None):
+    """
+    Por escenario y modalidad: suma de factores base y estresados y el cambio
+    porcentual. 'pesos' (por fila de 'deltas', p.ej. la pensión anual de cada
+    afiliado) convierte los factores en reservas.
+    """
+    ponderado = deltas[["escenario", "modalidad"]].copy()
+    w = 1.0 if pesos is None else np.asarray(pesos, dtype=float)
+    ponderado["base"] = deltas["factor_base"].to_numpy() * w
+    ponderado["estresado"] = deltas["factor"].to_numpy() * w
+    resumen = ponderado.groupby(["escenario", "modalidad"], sort=False, observed=True)[["base", "estresado"]].sum()
+    resumen["delta"] = resumen["estresado"] - resumen["base"]
+    resumen["delta_pct"] = resumen["delta"] / resumen["base"].where(resumen["base"] != 0) * 100
+    return resumen
+
+
+def modalidades_cotizacion(p, datos):
+    """RP (TITRP), RVI Simple y los escenarios activos de una cotización."""
+    modalidades = []
+    if p.datos_afiliado is not None:
+        modalidades.append(ModalidadEstres("Retiro Programado", vector_descuento('RP', p.input_tasa_rp / 100.0)))
+    descuento_rvi = vector_descuento_rvi(p, datos, N_PLAZOS)
+    modalidades.append(ModalidadEstres("RVI Simple", descuento_rvi))
+    for esc in p.escenarios:
+        modalidades.append(ModalidadEstres(
+            f"RVI {esc.nombre}", descuento_rvi, esc.pg_anos, esc.anos_aumento, esc.pct_aumento
+        ))
+    return modalidades
+
+
+def estres_cotizacion(p, datos, escenarios=ESCENARIOS_ESTANDAR):
+    """Deltas de factor y de pensión de la familia de la cotización, por escenario y modalidad."""
+    modalidades = modalidades_cotizacion(p, datos)
+    grupo = (p.datos_afiliado, p.datos_conyuge, tuple(p.datos_hijos))
+    base, estresados = factores_estres([grupo], datos.tablas_mortalidad, escenarios, modalidades)
+    deltas = _tabla_deltas(base, estresados, escenarios, modalidades, [0]).drop(columns="grupo")
+    return deltas.astype({"escenario": str, "modalidad": str})
@@ -0,0 +1,442 @@
+import os
+import sys
+import json
+import time
+import uuid
+import shutil
+import argparse
+import subprocess
+from dataclasses import replace
+import numpy as np
+import pandas as pd
+
+from registro_datos import BASE_DIR, NOMBRE_TASAS_VENTA, obtener_registro
+from valorizacion_por_lotes import (
+    FILAS_POR_LOTE,
+    PREFIJO_PARTE,
+    ConfiguracionLotes,
+    borrar_partes,
+    leer_lotes,
+    pa,
+    pq,
+    requerir_pyarrow,
+    valorizar_por_lotes,
+)
+
+# --- FRAGMENTOS DE CARTERA V56.0: REPARTIR UNA CORRIDA ENTRE MÁQUINAS ---
+# 1. dividir:  la cartera se reparte en N fragmentos de forma determinista
+#    (hash de la columna id) y se escribe un 'manifiesto.json' con la
+#    versión de los datos (tablas + VTD + tasas), el mes VTD, la huella del
+#    archivo de tasas de venta, las opciones de valorización y, por
+#    fragmento, filas y checksum de los ids. Cada división tiene un
+#    'id_manifiesto' propio y borra los resultados de divisiones anteriores.
+# 2. ejecutar: cualquier fragmento se valoriza por separado (otra máquina u
+#    otro proceso) con valorizacion_por_lotes.py. Antes se verifica que los
+#    datos cargados sean los del manifiesto; al terminar se deja un
+#    'resultado.json' con el id del manifiesto, filas, checksums y totales.
+# 3. fusionar: se valida cada fragmento (id del manifiesto, filas, checksum
+#    de ids y de la salida) y se suman los totales; opcionalmente se unen
+#    las salidas.
+# Los checksums son sumas (módulo 2^64) de pd.util.hash_pandas_object: no
+# dependen del orden de las filas.
+# En una sola máquina: 'python fragmentos_cartera.py dividir ...', luego
+# 'ejecutar' para cada fragmento (o ejecutar_locales) y 'fusionar'.
+
+VERSION_MANIFIESTO = 2 # V2: 'id_manifiesto' también en cada resultado.json
+ARCHIVO_MANIFIESTO = 'manifiesto.json'
+ARCHIVO_RESULTADO = 'resultado.json'
+COLUMNA_FILA = 'fila_cartera' # Id por defecto: fila de la cartera original
+
+
+class ErrorFragmentos(Exception):
+    """Manifiesto, datos o salidas de fragmentos inconsistentes."""
+
+
+def _exigir_pyarrow(ruta):
+    """Sin pyarrow no se lee ni escribe Parquet: se avisa antes de empezar."""
+    try:
+        requerir_pyarrow(ruta)
+    except ImportError as e:
+        raise ErrorFragmentos(str(e)) from e
+
+
+def _checksum(valores):
+    """Checksum independiente del orden de una Serie o DataFrame."""
+    hashes = pd.util.hash_pandas_object(valores, index=False).to_numpy(dtype=np.uint64)
+    return f"{int(np.add.reduce(hashes, dtype=np.uint64)):016x}"
+
+
+def _sumar_checksums(checksums):
+    return f"{sum(int(c, 16) for c in checksums) % (1 << 64):016x}"
+
+
+def asignar_fragmento(ids, n_fragmentos):
+    """Fragmento (0..n-1) de cada id; estable entre procesos y máquinas."""
+    hashes = pd.util.hash_pandas_object(pd.Series(ids), index=False).to_numpy(dtype=np.uint64)
+    return (hashes % np.uint64(n_fragmentos)).astype(np.int64)
+
+
+def _escribir_json(ruta, contenido):
+    temporal = f"{ruta}.tmp{os.getpid()}"
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(contenido, f, indent=2, ensure_ascii=False)
+    os.replace(temporal, ruta) # Atómico: nunca queda un JSON a medias
+
+
+def leer_manifiesto(directorio):
+    with open(os.path.join(directorio, ARCHIVO_MANIFIESTO), encoding='utf-8') as f:
+        manifiesto = json.load(f)
+    if manifiesto.get('version_manifiesto') != VERSION_MANIFIESTO:
+        raise ErrorFragmentos(f"Versión de manifiesto no soportada: {manifiesto.get('version_manifiesto')}")
+    return manifiesto
+
+
+def _version_datos(datos, mes_vtd):
+    return {
+        'datos_version': datos.version,
+        'mes_vtd': mes_vtd,
+        'version_mes': datos.version_mes(mes_vtd),
+        'tasas_version': datos.archivos[NOMBRE_TASAS_VENTA],
+    }
+
+
+def _version_datos_manifiesto(manifiesto):
+    return {k: manifiesto[k] for k in ('datos_version', 'mes_vtd', 'version_mes', 'tasas_version')}
+
+
+def _directorio_fragmento(directorio, numero):
+    return os.path.join(directorio, f"fragmento-{numero:03d}")
+
+
+class _EscritorFragmento:
+    """Agrega filas a la entrada de un fragmento (Parquet o CSV) lote a lote."""
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self.escritor = None
+        self.filas = 0
+        self.checksums = []
+
+    def agregar(self, df, columna_id):
+        if df.empty:
+            return
+        if self.ruta.endswith('.parquet'):
+            tabla = pa.Table.from_pandas(df, preserve_index=False)
+            if self.escritor is None:
+                self.escritor = pq.ParquetWriter(self.ruta, tabla.schema)
+            self.escritor.write_table(tabla.cast(self.escritor.schema))
+        else:
+            df.to_csv(self.ruta, mode='a', header=self.filas == 0, index=False)
+        self.filas += len(df)
+        self.checksums.append(_checksum(df[columna_id]))
+
+    def cerrar(self):
+        if self.escritor is not None:
+            self.escritor.close()
+
+
+def dividir_cartera(
+    ruta_entrada,
+    directorio,
+    n_fragmentos,
+    datos,
+    mes_vtd=None,
+    columna_id=None,
+    opciones_valorizacion=None,
+    filas_por_lote=FILAS_POR_LOTE
+    ):
+    """
+    Reparte la cartera en 'n_fragmentos' archivos de entrada y escribe el
+    manifiesto. Sin 'columna_id' se agrega COLUMNA_FILA (fila original).
+    'opciones_valorizacion' (JSON) se pasa tal cual a valorizar_cartera.
+    """
+    mes_vtd = mes_vtd or datos.mes_vtd_reciente
+    if mes_vtd not in datos.meses_vtd:
+        raise ErrorFragmentos(f"El mes VTD '{mes_vtd}' no está en los datos cargados.")
+    _exigir_pyarrow(ruta_entrada)
+    os.makedirs(directorio, exist_ok=True)
+    extension = '.parquet' if ruta_entrada.lower().endswith('.parquet') else '.csv'
+    escritores = []
+    for numero in range(n_fragmentos):
+        directorio_fragmento = _directorio_fragmento(directorio, numero)
+        if os.path.isdir(directorio_fragmento):
+            shutil.rmtree(directorio_fragmento) # Entrada, salida y resultado de una división anterior
+        os.makedirs(directorio_fragmento)
+        escritores.append(_EscritorFragmento(os.path.join(directorio_fragmento, f"entrada{extension}")))
+
+    columna = columna_id or COLUMNA_FILA
+    filas = 0
+    try:
+        for lote in leer_lotes(ruta_entrada, filas_por_lote):
+            if columna_id is None:
+                lote.insert(0, COLUMNA_FILA, np.arange(filas, filas + len(lote)))
+            filas += len(lote)
+            fragmento = asignar_fragmento(lote[columna], n_fragmentos)
+            for numero, escritor in enumerate(escritores):
+                escritor.agregar(lote[fragmento == numero], columna)
+    finally:
+        for escritor in escritores:
+            escritor.cerrar()
+
+    manifiesto = {
+        'version_manifiesto': VERSION_MANIFIESTO,
+        'id_manifiesto': uuid.uuid4().hex,
+        'creado_en': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'entrada': os.path.basename(ruta_entrada),
+        'filas': filas,
+        'n_fragmentos': n_fragmentos,
+        'columna_id': columna,
+        **_version_datos(datos, mes_vtd),
+        'opciones_valorizacion': opciones_valorizacion or {},
+        'fragmentos': [
+            {
+                'numero': numero,
+                'entrada': os.path.relpath(escritor.ruta, directorio),
+                'filas': escritor.filas,
+                'checksum_ids': _sumar_checksums(escritor.checksums),
+            }
+            for numero, escritor in enumerate(escritores)
+        ],
+    }
+    _escribir_json(os.path.join(directorio, ARCHIVO_MANIFIESTO), manifiesto)
+    return manifiesto
+
+
+def _partes_salida(directorio_salida):
+    return sorted(
+        os.path.join(directorio_salida, nombre)
+        for nombre in os.listdir(directorio_salida) if nombre.startswith(PREFIJO_PARTE)
+    )
+
+
+def _leer_parte(ruta):
+    _exigir_pyarrow(ruta)
+    return pd.read_parquet(ruta) if ruta.endswith('.parquet') else pd.read_csv(ruta)
+
+
+def resumir_salida(directorio_salida, columna_id):
+    """Filas, checksum de ids, checksum de todo el resultado y totales (parte por parte)."""
+    filas = 0
+    checksums_ids, checksums = [], []
+    totales = {}
+    for ruta in _partes_salida(directorio_salida):
+        parte = _leer_parte(ruta).drop(columns='fila') # 'fila' es local al fragmento
+        filas += len(parte)
+        checksums_ids.append(_checksum(parte[columna_id]))
+        checksums.append(_checksum(parte))
+        for columna, suma in parte.drop(columns=columna_id).select_dtypes('number').sum().items():
+            totales[columna] = totales.get(columna, 0.0) + float(suma)
+    return {
+        'filas': filas,
+        'checksum_ids': _sumar_checksums(checksums_ids),
+        'checksum_salida': _sumar_checksums(checksums),
+        'totales': totales,
+    }
+
+
+def ejecutar_fragmento(directorio, numero, datos, configuracion=None, progreso=None):
+    """
+    Valoriza un fragmento con los datos dados (deben coincidir con los del
+    manifiesto) y escribe su 'resultado.json'.
+    """
+    manifiesto = leer_manifiesto(directorio)
+    esperado = _version_datos_manifiesto(manifiesto)
+    if esperado['mes_vtd'] not in datos.meses_vtd or _version_datos(datos, esperado['mes_vtd']) != esperado:
+        raise ErrorFragmentos(f"Los datos cargados (versión {datos.version}) no son los del manifiesto: {esperado}")
+
+    fragmento = manifiesto['fragmentos'][numero]
+    directorio_fragmento = _directorio_fragmento(directorio, numero)
+    directorio_salida = os.path.join(directorio_fragmento, 'salida')
+    os.makedirs(directorio_salida, exist_ok=True)
+    borrar_partes(directorio_salida) # Una re-ejecución reemplaza la salida anterior (también sin filas)
+    configuracion = replace(configuracion or ConfiguracionLotes(), columna_id=manifiesto['columna_id'])
+
+    inicio = time.perf_counter()
+    if fragmento['filas']:
+        valorizar_por_lotes(
+            os.path.join(directorio, fragmento['entrada']), directorio_salida,
+            configuracion=configuracion, progreso=progreso,
+            tablas_mortalidad=datos.tablas_mortalidad,
+            vector_vtd=datos.vector_vtd(manifiesto['mes_vtd']),
+            **manifiesto['opciones_valorizacion']
+        )
+    resultado = {
+        'id_manifiesto': manifiesto['id_manifiesto'],
+        'numero': numero,
+        'segundos': time.perf_counter() - inicio,
+        **resumir_salida(directorio_salida, manifiesto['columna_id']),
+    }
+    _escribir_json(os.path.join(directorio_fragmento, ARCHIVO_RESULTADO), resultado)
+    return resultado
+
+
+def validar_fragmentos(directorio):
+    """
+    Verifica cada fragmento contra el manifiesto y contra su propia salida.
+    Devuelve (errores, resultados leídos).
+    """
+    manifiesto = leer_manifiesto(directorio)
+    errores = []
+    resultados = []
+    for fragmento in manifiesto['fragmentos']:
+        numero = fragmento['numero']
+        directorio_fragmento = _directorio_fragmento(directorio, numero)
+        ruta_resultado = os.path.join(directorio_fragmento, ARCHIVO_RESULTADO)
+        if not os.path.exists(ruta_resultado):
+            errores.append(f"Fragmento {numero}: sin resultado (no se ha ejecutado).")
+            continue
+        with open(ruta_resultado, encoding='utf-8') as f:
+            resultado = json.load(f)
+        if resultado.get('id_manifiesto') != manifiesto['id_manifiesto']:
+            errores.append(f"Fragmento {numero}: el resultado es de otra división de la cartera; vuelva a ejecutarlo.")
+            continue
+        resultados.append(resultado)
+        if resultado['filas'] != fragmento['filas']:
+            errores.append(f"Fragmento {numero}: {resultado['filas']} filas de salida, se esperaban {fragmento['filas']}.")
+        if resultado['checksum_ids'] != fragmento['checksum_ids']:
+            errores.append(f"Fragmento {numero}: los ids de la salida no son los de la entrada.")
+        actual = resumir_salida(os.path.join(directorio_fragmento, 'salida'), manifiesto['columna_id'])
+        if actual['checksum_salida'] != resultado['checksum_salida']:
+            errores.append(f"Fragmento {numero}: la salida cambió después de ejecutarse.")
+    return errores, resultados
+
+
+def fusionar_fragmentos(directorio, ruta_salida=None):
+    """
+    Valida todos los fragmentos y suma sus totales. Con 'ruta_salida'
+    (.parquet o .csv) une las salidas parte por parte en un solo archivo.
+    Lanza ErrorFragmentos con la lista de problemas si algo no cuadra.
+    """
+    if ruta_salida is not None:
+        _exigir_pyarrow(ruta_salida)
+    manifiesto = leer_manifiesto(directorio)
+    errores, resultados = validar_fragmentos(directorio)
+    filas = sum(r['filas'] for r in resultados)
+    if not errores and filas != manifiesto['filas']:
+        errores.append(f"Total de filas {filas} distinto de la cartera ({manifiesto['filas']}).")
+    if errores:
+        raise ErrorFragmentos("\n".join(errores))
+
+    totales = {}
+    for resultado in resultados:
+        for columna, suma in resultado['totales'].items():
+            totales[columna] = totales.get(columna, 0.0) + suma
+    resumen = {
+        'filas': filas,
+        'n_fragmentos': manifiesto['n_fragmentos'],
+        'checksum_ids': _sumar_checksums(r['checksum_ids'] for r in resultados),
+        'checksum_salida': _sumar_checksums(r['checksum_salida'] for r in resultados),
+        'totales': totales,
+        **_version_datos_manifiesto(manifiesto),
+    }
+
+    if ruta_salida is not None:
+        escritor = None
+        if os.path.exists(ruta_salida):
+            os.remove(ruta_salida)
+        try:
+            for resultado in resultados:
+                salida = os.path.join(_directorio_fragmento(directorio, resultado['numero']), 'salida')
+                for ruta in _partes_salida(salida):
+                    parte = _leer_parte(ruta).drop(columns='fila')
+                    if ruta_salida.endswith('.parquet'):
+                        tabla = pa.Table.from_pandas(parte, preserve_index=False)
+                        if escritor is None:
+                            escritor = pq.ParquetWriter(ruta_salida, tabla.schema)
+                        escritor.write_table(tabla.cast(escritor.schema))
+                    else:
+                        parte.to_csv(ruta_salida, mode='a', header=not os.path.exists(ruta_salida), index=False)
+        finally:
+            if escritor is not None:
+                escritor.close()
+        resumen['salida'] = ruta_salida
+    return resumen
+
+
+def ejecutar_locales(directorio, procesos=None, directorio_datos=BASE_DIR):
+    """
+    Ejecuta todos los fragmentos como procesos independientes en esta
+    máquina (a lo más 'procesos' a la vez). Devuelve los códigos de salida.
+    """
+    manifiesto = leer_manifiesto(directorio)
+    pendientes = list(range(manifiesto['n_fragmentos']))
+    procesos = procesos or os.cpu_count() or 1
+    activos = {}
+    codigos = {}
+    while pendientes or activos:
+        while pendientes and len(activos) < procesos:
+            numero = pendientes.pop(0)
+            activos[numero] = subprocess.Popen(
+                [sys.executable, os.path.abspath(__file__), '--datos', directorio_datos, 'ejecutar', directorio, str(numero)]
+            )
+        for numero, proceso in list(activos.items()):
+            if proceso.poll() is not None:
+                codigos[numero] = proceso.returncode
+                del activos[numero]
+        time.sleep(0.05)
+    return codigos
+
+
+def _instantanea(directorio_datos):
+    datos = obtener_registro(directorio_datos, vigilar=False).instantanea()
+    if datos is None:
+        raise ErrorFragmentos(f"No se pudieron cargar los datos de {directorio_datos}.")
+    return datos
+
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description="Valorización de carteras repartida en fragmentos.")
+    parser.add_argument('--datos', default=BASE_DIR, help="Directorio con tablas, VTD y tasas de venta.")
+    sub = parser.add_subparsers(dest='comando', required=True)
+
+    dividir = sub.add_parser('dividir', help="Reparte la cartera y escribe el manifiesto.")
+    dividir.add_argument('entrada')
+    dividir.add_argument('directorio')
+    dividir.add_argument('-n', '--fragmentos', type=int, required=True)
+    dividir.add_argument('--mes-vtd')
+    dividir.add_argument('--columna-id')
+    dividir.add_argument('--opciones', default='{}', help="JSON con las opciones de valorizar_cartera.")
+
+    ejecutar = sub.add_parser('ejecutar', help="Valoriza un fragmento.")
+    ejecutar.add_argument('directorio')
+    ejecutar.add_argument('numero', type=int)
+    ejecutar.add_argument('--filas-por-lote', type=int, default=FILAS_POR_LOTE)
+    ejecutar.add_argument('--memoria-maxima-mb', type=float)
+
+    locales = sub.add_parser('ejecutar-locales', help="Valoriza todos los fragmentos como procesos locales.")
+    locales.add_argument('directorio')
+    locales.add_argument('--procesos', type=int)
+
+    fusionar = sub.add_parser('fusionar', help="Valida los fragmentos y une las salidas.")
+    fusionar.add_argument('directorio')
+    fusionar.add_argument('--salida')
+
+    args = parser.parse_args(argumentos)
+    try:
+        if args.comando == 'dividir':
+            resultado = dividir_cartera(
+                args.entrada, args.directorio, args.fragmentos, _instantanea(args.datos),
+                args.mes_vtd, args.columna_id, json.loads(args.opciones)
+            )
+            resultado = {k: v for k, v in resultado.items() if k != 'fragmentos'}
+        elif args.comando == 'ejecutar':
+            resultado = ejecutar_fragmento(
+                args.directorio, args.numero, _instantanea(args.datos),
+                ConfiguracionLotes(args.filas_por_lote, args.memoria_maxima_mb)
+            )
+        elif args.comando == 'ejecutar-locales':
+            resultado = ejecutar_locales(args.directorio, args.procesos, args.datos)
+            if any(resultado.values()):
+                print(json.dumps(resultado))
+                return 1
+        else:
+            resultado = fusionar_fragmentos(args.directorio, args.salida)
+    except ErrorFragmentos as e:
+        print(str(e), file=sys.stderr)
+        return 1
+    print(json.dumps(resultado, indent=2, ensure_ascii=False))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
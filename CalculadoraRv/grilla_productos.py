@@ -0,0 +1,150 @@
+import numpy as np
+import pandas as pd
+
+from utils import calcular_descuentos_clp
+from cotizacion import AFP_COMMISSIONS, METODO_TASA_VENTA, ErrorCotizacion
+from motor_vectorial import flujos_esperados, vector_descuento
+
+# --- GRILLA DE PRODUCTOS V46.0: TODOS LOS P.G. / AUMENTOS / DIFERIMIENTOS ---
+# Con el periodo garantizado, el flujo del año t es 1 si t < PG y el pago
+# contingente c[t] si no (c[t] <= 1). Con las sumas acumuladas de los pagos
+# descontados
+#     V[k] = sum_{t<k} d[t] * c[t]      W[k] = sum_{t<k} d[t]
+# cada combinación (PG, años de aumento) sale en O(1):
+#     m  = min(PG, años), M = max(PG, años)
+#     ft = W[m] + V[años] - V[m]
+#     fd = W[M] - W[años] + V[L] - V[M]
+# y para RP-RVD a N años: ft_rp = V_rp[N], fd_rvi = V_rvi[L] - V_rvi[N].
+# Toda la grilla se valoriza con operaciones vectorizadas (milisegundos).
+
+# Rangos por defecto (los mismos de los controles de app.py)
+RANGO_PG = range(0, 26)
+RANGO_ANOS_AUMENTO = range(1, 26)
+RANGO_PCT_AUMENTO = range(0, 101, 10)
+RANGO_DIFERIMIENTO = range(1, 11)
+
+
+def vector_descuento_rvi(p, datos, n):
+    """
+    Descuento de la Renta Vitalicia según el método elegido en la cotización:
+    tasa de venta de la compañía (columna Vejez o Invalidez) o VTD.
+    """
+    if p.input_metodo_rvi == METODO_TASA_VENTA:
+        columna_tasa = 'Invalidez total' if p.afiliado_tipo_pension == 'Invalidez' else 'Vejez'
+        try:
+            tasa_cia_pct = datos.df_tasas_venta.loc[p.input_cia_rvi, columna_tasa]
+        except KeyError:
+            raise ErrorCotizacion(f"No se encontró la tasa para {p.input_cia_rvi} / {columna_tasa}")
+        return vector_descuento('TASA_PLANA', tasa_cia_pct / 100.0, n=n)
+    return vector_descuento('RVI', vector_vtd=datos.vector_vtd, n=n)
+
+
+def sumas_descontadas(flujos, descuento):
+    """
+    (V, W) con V[k] = sum_{t<k} d*c y W[k] = sum_{t<k} d (V[0] = W[0] = 0).
+    'descuento' puede ser un vector (n,) o una matriz (K, n) de curvas.
+    """
+    n = len(flujos)
+    descuento = np.asarray(descuento)[..., :n]
+    ceros = np.zeros(descuento.shape[:-1] + (1,))
+    V = np.concatenate((ceros, np.cumsum(descuento * flujos, axis=-1)), axis=-1)
+    W = np.concatenate((ceros, np.cumsum(descuento, axis=-1)), axis=-1)
+    return V, W
+
+
+def factores_grilla(V, W, pg, anos):
+    """
+    (ft, fd) para cada par (PG, años de aumento); pg y anos se combinan por
+    broadcasting (p.ej. pg[:, None] y anos[None, :]). Con V y W de (K, L+1)
+    el resultado lleva delante el eje de las K curvas.
+    """
+    L = V.shape[-1] - 1
+    pg = np.minimum(np.asarray(pg), L)
+    anos = np.minimum(np.asarray(anos), L)
+    m = np.minimum(pg, anos)
+    M = np.maximum(pg, anos)
+    ft = W[..., m] + V[..., anos] - V[..., m]
+    total = V[..., L].reshape(V.shape[:-1] + (1,) * m.ndim)
+    fd = W[..., M] - W[..., anos] + total - V[..., M]
+    return ft, fd
+
+
+def _exigir_afiliado(p):
+    if p.datos_afiliado is None:
+        raise ErrorCotizacion("La grilla de productos no aplica en modo Sobrevivencia.")
+
+
+def _prima_neta_rvi(p):
+    comision_decimal = p.input_comision_pct / 100.0 if p.check_incluye_comision else 0.0
+    return p.saldo_uf * (1 - comision_decimal), comision_decimal
+
+
+def grilla_rvi(p, datos, pgs=RANGO_PG, anos_aumento=RANGO_ANOS_AUMENTO, pcts_aumento=RANGO_PCT_AUMENTO):
+    """
+    Pensiones de RVI para todas las combinaciones (PG, años de aumento, %
+    aumento). Devuelve un DataFrame 'largo' (una fila por combinación).
+    """
+    _exigir_afiliado(p)
+    flujos = flujos_esperados(
+        p.datos_afiliado, p.datos_conyuge, p.datos_hijos, datos.tablas_mortalidad, 0, p.check_sobrevivencia_exacta
+    )
+    V, W = sumas_descontadas(flujos, vector_descuento_rvi(p, datos, max(len(flujos), 1)))
+
+    pg = np.asarray(pgs)[:, None, None]
+    anos = np.asarray(anos_aumento)[None, :, None]
+    pct = np.asarray(pcts_aumento, dtype=float)[None, None, :] / 100.0
+
+    ft, fd = factores_grilla(V, W, pg, anos)
+    denominador = ft * (1 + pct) + fd
+    prima_neta_rvi, _ = _prima_neta_rvi(p)
+    pension_ref = np.zeros(denominador.shape)
+    np.divide(prima_neta_rvi, denominador, out=pension_ref, where=denominador != 0)
+    pension_ref /= 12.0
+    pension_aum = pension_ref * (1 + pct)
+
+    forma = pension_ref.shape
+    _, _, liquido_aum = calcular_descuentos_clp(pension_aum, p.input_valor_uf_clp)
+    _, _, liquido_ref = calcular_descuentos_clp(pension_ref, p.input_valor_uf_clp)
+    return pd.DataFrame({
+        "PG (años)": np.broadcast_to(pg, forma).ravel(),
+        "Años Aumento": np.broadcast_to(anos, forma).ravel(),
+        "% Aumento": np.broadcast_to(np.asarray(pcts_aumento)[None, None, :], forma).ravel(),
+        "Pensión Aumentada (UF)": pension_aum.ravel(),
+        "Pensión Base (UF)": pension_ref.ravel(),
+        "Líquido Aumentado ($)": liquido_aum.ravel(),
+        "Líquido Base ($)": liquido_ref.ravel(),
+    })
+
+
+def grilla_rvd(p, datos, diferimientos=RANGO_DIFERIMIENTO):
+    """Pensiones de RP con RVD para cada número de años de diferimiento N."""
+    _exigir_afiliado(p)
+    prima_neta_rvi, comision_decimal = _prima_neta_rvi(p)
+    if comision_decimal >= 1:
+        raise ErrorCotizacion("Error: Comisión del 100% no es válida.")
+
+    flujos = flujos_esperados(
+        p.datos_afiliado, p.datos_conyuge, p.datos_hijos, datos.tablas_mortalidad, 0, p.check_sobrevivencia_exacta
+    )
+    n = max(len(flujos), 1)
+    V_rp, _ = sumas_descontadas(flujos, vector_descuento('RP', p.input_tasa_rp / 100.0, n=n))
+    V_rvi, _ = sumas_descontadas(flujos, vector_descuento_rvi(p, datos, n))
+
+    L = len(flujos)
+    N = np.minimum(np.asarray(diferimientos), L)
+    factor_hibrido = V_rp[N] + (V_rvi[L] - V_rvi[N]) / (1 - comision_decimal)
+    pension = np.zeros(factor_hibrido.shape)
+    np.divide(p.saldo_uf, factor_hibrido, out=pension, where=factor_hibrido > 0)
+    pension /= 12.0
+
+    comision_afp = AFP_COMMISSIONS.get(p.input_afp_nombre, 0.0) / 100.0
+    pension_rp_neta = pension - pension * comision_afp
+    _, _, liquido_rp = calcular_descuentos_clp(pension_rp_neta, p.input_valor_uf_clp)
+    _, _, liquido_rvd = calcular_descuentos_clp(pension, p.input_valor_uf_clp)
+    return pd.DataFrame({
+        "Años RP (N)": np.asarray(diferimientos),
+        "Pensión RP neta AFP (UF)": pension_rp_neta,
+        "Pensión RVD (UF)": pension,
+        "Líquido RP ($)": liquido_rp,
+        "Líquido RVD ($)": liquido_rvd,
+    })
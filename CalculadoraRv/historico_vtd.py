@@ -0,0 +1,97 @@
+import threading
+import numpy as np
+import pandas as pd
+
+from cartera import pension_mensual
+from cotizacion import AFP_COMMISSIONS
+from motor_vectorial import (
+    flujos_esperados,
+    flujos_sobrevivencia,
+    matriz_descuento_vtd,
+    valorizar,
+    vector_descuento
+)
+from utils import clave_mes_vtd
+
+# --- BACKTEST HISTÓRICO V45.0: UN PERFIL CONTRA TODOS LOS MESES DEL VTD ---
+# Con los flujos esperados del perfil (motor_vectorial.py) y una matriz de
+# descuento (meses x plazos) armada una vez por versión de datos, la pensión
+# de cada modalidad en los ~70 meses publicados sale de un solo producto
+# matriz-vector por modalidad. Siempre se valoriza con el VTD (no con tasas
+# de venta, que solo existen para el mes vigente).
+
+_MATRICES_POR_VERSION = {}
+_LOCK_MATRICES = threading.Lock()
+
+
+def matriz_descuento_meses(instantanea):
+    """
+    (meses, matriz (M, 111)) con una fila de descuento por mes VTD de la
+    instantánea, en orden cronológico. Se arma una vez por versión de datos.
+    """
+    with _LOCK_MATRICES:
+        matriz = _MATRICES_POR_VERSION.get(instantanea.version)
+        if matriz is None:
+            matriz = matriz_descuento_vtd(instantanea.vector_vtd(mes) for mes in instantanea.meses_vtd)
+            matriz.flags.writeable = False
+            _MATRICES_POR_VERSION.clear() # Solo interesa la versión vigente
+            _MATRICES_POR_VERSION[instantanea.version] = matriz
+    return instantanea.meses_vtd, matriz
+
+
+def backtest_vtd(p, instantanea):
+    """
+    Pensión mensual (UF) del perfil de 'p' (cotizacion.ParametrosCotizacion)
+    en cada mes del VTD. Devuelve un DataFrame indexado por mes ('oct-25'),
+    con la columna 'Fecha' y una columna por modalidad activa.
+    """
+    meses, descuentos = matriz_descuento_meses(instantanea)
+    tablas = instantanea.tablas_mortalidad
+
+    comision_decimal = p.input_comision_pct / 100.0 if p.check_incluye_comision else 0.0
+    prima_neta_rp = p.saldo_uf
+    prima_neta_rvi = p.saldo_uf * (1 - comision_decimal)
+
+    columnas = {}
+
+    if p.afiliado_tipo_pension == 'Sobrevivencia':
+        flujos = flujos_sobrevivencia(p.datos_conyuge, p.datos_hijos, tablas, exacto=p.check_sobrevivencia_exacta)
+        factor = descuentos @ flujos
+        columnas["Pensión Sobrevivencia (PR financiable)"] = pension_mensual(prima_neta_rvi, factor)
+    else:
+        afiliado, conyuge, hijos = p.datos_afiliado, p.datos_conyuge, p.datos_hijos
+        exacto = p.check_sobrevivencia_exacta
+
+        if p.check_rp:
+            # La RP usa la TITRP (no el VTD): línea de referencia constante
+            flujos_rp = flujos_esperados(afiliado, conyuge, hijos, tablas, 0, exacto)
+            ft_rp, fd_rp = valorizar(flujos_rp, vector_descuento('RP', p.input_tasa_rp / 100.0))
+            pension_rp = pension_mensual(prima_neta_rp, ft_rp + fd_rp)
+            comision_afp = AFP_COMMISSIONS.get(p.input_afp_nombre, 0.0) / 100.0
+            columnas["Retiro Programado"] = np.full(len(meses), pension_rp - pension_rp * comision_afp)
+
+        if p.check_rvi_simple:
+            ft, fd = valorizar(flujos_esperados(afiliado, conyuge, hijos, tablas, 0, exacto), descuentos)
+            columnas["RVI Simple"] = pension_mensual(prima_neta_rvi, ft + fd)
+
+        for esc in p.escenarios:
+            flujos = flujos_esperados(afiliado, conyuge, hijos, tablas, esc.pg_anos, exacto)
+            ft, fd = valorizar(flujos, descuentos, esc.anos_aumento)
+            pct = esc.pct_aumento / 100.0
+            pension_ref = pension_mensual(prima_neta_rvi, ft * (1 + pct) + fd)
+            if esc.pct_aumento == 0:
+                columnas[f"{esc.nombre} (PG: {esc.pg_anos}a)"] = pension_ref
+            else:
+                columnas[f"{esc.nombre} (Aumentada)"] = pension_ref * (1 + pct)
+                columnas[f"{esc.nombre} (Base)"] = pension_ref
+
+        if p.check_rp_rvd and comision_decimal < 1:
+            n = p.n_anos_diferimiento
+            flujos = flujos_esperados(afiliado, conyuge, hijos, tablas, 0, exacto)
+            ft_rp, _ = valorizar(flujos, vector_descuento('RP', p.input_tasa_rp / 100.0), n)
+            _, fd_rvi = valorizar(flujos, descuentos, n)
+            columnas["RP-RVD"] = pension_mensual(prima_neta_rp, ft_rp + fd_rvi / (1 - comision_decimal))
+
+    resultado = pd.DataFrame(columnas, index=pd.Index(meses, name="Mes VTD"))
+    resultado.insert(0, "Fecha", [pd.Timestamp(*clave_mes_vtd(mes), 1) for mes in meses])
+    return resultado
@@ -0,0 +1,112 @@
+import os
+import time
+import atexit
+import logging
+import argparse
+import threading
+from urllib.request import urlopen
+
+from precalentamiento import desmarcar_listo, marcar_listo, precalentar_motor
+from registro_datos import BASE_DIR, obtener_registro
+from servicio_cotizacion import datos_mercado
+
+# --- LANZADOR DE LA APP V60.0: PRECALENTAR ANTES DE RECIBIR ASESORES ---
+# El script de Streamlit (app.py) solo corre cuando se conecta una sesión:
+# precalentar ahí hacía pagar el arranque en frío al primer asesor y la
+# sonda de readiness no se cumplía hasta esa primera visita. Este lanzador
+# precalienta el motor EN EL MISMO PROCESO (módulos, registro de datos y
+# cachés de flujos quedan listos para app.py) y luego levanta Streamlit.
+# Con --archivo-listo (o CALCULADORA_ARCHIVO_LISTO) el archivo de
+# disponibilidad se publica solo cuando el servidor ya responde; se retira
+# al salir y mientras se precalienta una versión nueva de los datos.
+#   python iniciar_app.py --puerto 8501 --archivo-listo /tmp/calculadora.listo
+
+RUTA_APP = os.path.join(BASE_DIR, 'app.py')
+TIEMPO_MAXIMO_ARRANQUE_S = 120
+INTERVALO_VERSION_S = 5
+
+log = logging.getLogger(__name__)
+
+
+def precalentar_proceso(registro):
+    """Precalienta el motor con la instantánea vigente; devuelve (versión, tiempos en ms)."""
+    datos = registro.instantanea()
+    if datos is None:
+        raise RuntimeError(f"No se pudieron cargar los datos: {registro.ultimo_error}")
+    return datos.version, {'version_datos': datos.version, **precalentar_motor(datos_mercado(datos))}
+
+
+def esperar_servidor(puerto, tiempo_maximo=TIEMPO_MAXIMO_ARRANQUE_S):
+    """True cuando el chequeo de salud de Streamlit responde 200; False si se agota el tiempo."""
+    url = f"http://127.0.0.1:{puerto}/_stcore/health"
+    limite = time.monotonic() + tiempo_maximo
+    while time.monotonic() < limite:
+        try:
+            with urlopen(url, timeout=2) as respuesta:
+                if respuesta.status == 200:
+                    return True
+        except OSError:
+            pass
+        time.sleep(0.2)
+    return False
+
+
+def publicar_disponibilidad(registro, puerto, archivo_listo, version, tiempos, intervalo=INTERVALO_VERSION_S):
+    """
+    Hilo del lanzador: marca el proceso listo cuando Streamlit responde y,
+    si el registro publica otra versión de los datos, retira la marca,
+    precalienta con la versión nueva y vuelve a marcar.
+    """
+    if not esperar_servidor(puerto):
+        log.error("Streamlit no respondió en el puerto %s; el proceso no se marca listo.", puerto)
+        return
+    marcar_listo(archivo_listo, tiempos)
+    while True:
+        time.sleep(intervalo)
+        datos = registro.instantanea()
+        if datos is None or datos.version == version:
+            continue
+        desmarcar_listo(archivo_listo) # La marca anterior describe datos que ya no se usan
+        version = datos.version
+        try:
+            version, tiempos = precalentar_proceso(registro)
+        except Exception as e:
+            log.error("Precalentamiento con los datos %s falló: %s", version[:12], e)
+            continue
+        marcar_listo(archivo_listo, tiempos)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Precalienta el motor y levanta la app de Streamlit.")
+    parser.add_argument('--puerto', type=int, default=8501)
+    parser.add_argument('--direccion', default=None, help="server.address de Streamlit")
+    parser.add_argument(
+        '--archivo-listo', default=os.environ.get("CALCULADORA_ARCHIVO_LISTO"),
+        help="Archivo de disponibilidad (sonda de readiness)"
+    )
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    if args.archivo_listo:
+        desmarcar_listo(args.archivo_listo) # Marca de una ejecución anterior que no terminó limpia
+        atexit.register(desmarcar_listo, args.archivo_listo)
+
+    registro = obtener_registro(BASE_DIR) # El mismo registro que usará app.py en este proceso
+    version, tiempos = precalentar_proceso(registro) # Si falla, el proceso termina sin marcarse listo
+    log.info("Motor precalentado: %s", tiempos)
+
+    if args.archivo_listo:
+        threading.Thread(
+            target=publicar_disponibilidad,
+            args=(registro, args.puerto, args.archivo_listo, version, tiempos),
+            name="disponibilidad-app", daemon=True
+        ).start()
+
+    from streamlit.web import bootstrap
+    opciones = {'server_port': args.puerto, 'server_address': args.direccion, 'server_headless': True}
+    bootstrap.load_config_options(opciones) # Como 'streamlit run --server.port ...'
+    bootstrap.run(RUTA_APP, False, [], opciones)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,237 @@
+import asyncio
+import time
+import numpy as np
+
+from calculo_motor import calcular_factor_sobrevivencia, calcular_factores_combinados
+from cartera import agrupar_perfiles, perfil_canonico
+from cotizacion import (
+    MotorFactores,
+    calcular_factores_cotizacion,
+    cotizar_con_cache,
+    escalar_cotizacion,
+)
+from estres_longevidad import flujos_lote
+from modelos import como_afiliado, como_conyuge, como_hijos
+from motor_vectorial import EDAD_MAXIMA, flujos_esperados, valorizar, vector_descuento
+
+# --- MICRO-LOTES V57.0: COTIZACIONES CONCURRENTES EN UNA SOLA LLAMADA ---
+# Detrás de una API, cada cotización individual llega por separado. El
+# programador junta las que llegan dentro de una ventana corta (2-5 ms) y
+# las entrega juntas a 'procesar_lote' en UNA llamada al ejecutor (hilo o
+# proceso); luego reparte cada resultado a quien lo pidió.
+# - max_lote: al juntar tantas solicitudes el lote sale sin esperar la ventana.
+# - presupuesto_latencia_ms: la espera se acorta para que espera + tiempo
+#   de servicio (promedio móvil de los últimos lotes) no lo superen.
+# 'procesar_lote(solicitudes)' devuelve una lista alineada: un resultado o
+# una excepción por solicitud (un error no arrastra al resto del lote).
+# cotizar_lote es el procesador de cotizaciones: los flujos de todas las
+# familias del lote salen de UNA pasada del tensor (estres_longevidad
+# .flujos_lote) y cada vector de descuento se arma una vez por lote; la
+# etapa de factores (V44.0) usa ese MotorFactores en vez de los motores
+# perfil a perfil. Resultados idénticos a calcular_cotizacion.
+
+VENTANA_MS = 3.0
+MAX_LOTE = 64
+PESO_SERVICIO = 0.2 # Peso del último lote en el promedio móvil del tiempo de servicio
+
+
+def _cronometrar(procesar_lote, solicitudes):
+    """(resultados, segundos) medidos dentro del ejecutor, sin la espera en su cola."""
+    inicio = time.perf_counter()
+    resultados = procesar_lote(solicitudes)
+    return resultados, time.perf_counter() - inicio
+
+
+class _MotorLote:
+    """
+    Motores de calculo_motor.py sobre los flujos precalculados del lote. Lo
+    que no está en el lote (sobrevivencia exacta, otras tablas) se delega
+    en los motores perfil a perfil.
+    """
+
+    def __init__(self, parametros, tablas_mortalidad):
+        perfiles, _ = agrupar_perfiles([
+            (como_afiliado(p.datos_afiliado), como_conyuge(p.datos_conyuge), como_hijos(p.datos_hijos))
+            for p in parametros if p.datos_afiliado is not None and not p.check_sobrevivencia_exacta
+        ])
+        self.tablas_mortalidad = tablas_mortalidad
+        self.filas = {perfil: j for j, perfil in enumerate(perfiles)}
+        self.flujos = flujos_lote(perfiles, tablas_mortalidad) if perfiles else None
+        self.descuentos = {}
+
+    def flujos_esperados(self, datos_afiliado, conyuge_data, hijos_data, tablas_mortalidad, periodo_garantizado_en_anos=0, exacto=False):
+        afiliado = como_afiliado(datos_afiliado)
+        fila = None
+        if not exacto and afiliado is not None and tablas_mortalidad is self.tablas_mortalidad:
+            fila = self.filas.get(perfil_canonico(afiliado, como_conyuge(conyuge_data), como_hijos(hijos_data)))
+        if fila is None:
+            return flujos_esperados(
+                datos_afiliado, conyuge_data, hijos_data, tablas_mortalidad, periodo_garantizado_en_anos, exacto
+            )
+        contingentes = self.flujos[fila, :max(EDAD_MAXIMA - afiliado.edad + 1, 0)]
+        if periodo_garantizado_en_anos <= 0:
+            return contingentes
+        return np.maximum(contingentes, (np.arange(len(contingentes)) < periodo_garantizado_en_anos).astype(float))
+
+    def _descuento(self, modo_calculo, tasa_plana, vector_vtd, n):
+        clave = (modo_calculo, tasa_plana, id(vector_vtd), n)
+        descuento = self.descuentos.get(clave)
+        if descuento is None:
+            descuento = self.descuentos[clave] = vector_descuento(modo_calculo, tasa_plana, vector_vtd, n=n)
+        return descuento
+
+    def factores_combinados(
+        self, datos_afiliado, conyuge_data, hijos_data, vector_vtd, tablas_mortalidad, modo_calculo,
+        tasa_plana_rp=0.0, periodo_garantizado_en_anos=0, anos_de_aumento=0, sobrevivencia_exacta=False
+        ):
+        """Como calculo_motor.calcular_factores_combinados."""
+        if not datos_afiliado:
+            return calcular_factores_combinados(
+                datos_afiliado, conyuge_data, hijos_data, vector_vtd, tablas_mortalidad, modo_calculo,
+                tasa_plana_rp, periodo_garantizado_en_anos, anos_de_aumento, sobrevivencia_exacta
+            )
+        flujos = self.flujos_esperados(
+            datos_afiliado, conyuge_data, hijos_data, tablas_mortalidad, periodo_garantizado_en_anos,
+            exacto=sobrevivencia_exacta
+        )
+        descuento = self._descuento(modo_calculo, tasa_plana_rp, vector_vtd, max(len(flujos), 1))
+        factor_temporal, factor_diferido = valorizar(flujos, descuento, anos_de_aumento)
+        return float(factor_temporal), float(factor_diferido)
+
+
+def motor_lote(parametros, tablas_mortalidad):
+    """MotorFactores con los flujos de todas las familias de 'parametros' (una pasada)."""
+    motor = _MotorLote(parametros, tablas_mortalidad)
+    return MotorFactores(motor.factores_combinados, calcular_factor_sobrevivencia, motor.flujos_esperados)
+
+
+def cotizar_lote(parametros, datos, cache=None):
+    """
+    ResultadoCotizacion (o la excepción: ErrorCotizacion u otra falla del
+    motor) de cada cotización, en orden; una falla no arrastra al resto.
+    Con 'cache' (CacheCotizaciones) se reutilizan los factores ya calculados.
+    """
+    motor = motor_lote(parametros, datos.tablas_mortalidad)
+    resultados = []
+    for p in parametros:
+        try:
+            if cache is None:
+                factores = calcular_factores_cotizacion(p, datos, motor)
+                resultados.append(escalar_cotizacion(p, datos, factores))
+            else:
+                resultados.append(cotizar_con_cache(p, datos, cache, motor))
+        except Exception as e: # ErrorCotizacion o falla del motor (p.ej. ZeroDivisionError)
+            resultados.append(e)
+    return resultados
+
+
+class ProgramadorMicroLotes:
+    """
+    Junta solicitudes concurrentes (asyncio) en lotes para 'procesar_lote'.
+    'ejecutor': concurrent.futures (None = ejecutor por defecto del loop).
+    Uso: resultado = await programador.enviar(solicitud); al terminar,
+    await programador.cerrar() (o 'async with programador').
+    """
+
+    def __init__(
+        self,
+        procesar_lote,
+        ventana_ms=VENTANA_MS,
+        max_lote=MAX_LOTE,
+        presupuesto_latencia_ms=None,
+        ejecutor=None
+        ):
+        if max_lote < 1:
+            raise ValueError("max_lote debe ser al menos 1.")
+        self.procesar_lote = procesar_lote
+        self.ventana_ms = ventana_ms
+        self.max_lote = max_lote
+        self.presupuesto_latencia_ms = presupuesto_latencia_ms
+        self.ejecutor = ejecutor
+        self._pendientes = [] # [(solicitud, futuro)]
+        self._temporizador = None
+        self._en_curso = set()
+        self._servicio_s = 0.0
+        self._cerrado = False
+        self.lotes = 0
+        self.solicitudes = 0
+        self.max_tamano = 0
+
+    def espera_s(self):
+        """Segundos que se espera a más solicitudes desde la primera del lote."""
+        ventana = self.ventana_ms / 1000.0
+        if self.presupuesto_latencia_ms is None:
+            return ventana
+        return max(0.0, min(ventana, self.presupuesto_latencia_ms / 1000.0 - self._servicio_s))
+
+    async def enviar(self, solicitud):
+        """Agrega la solicitud al lote en formación y espera su resultado."""
+        if self._cerrado:
+            raise RuntimeError("El programador de micro-lotes está cerrado.")
+        loop = asyncio.get_running_loop()
+        futuro = loop.create_future()
+        self._pendientes.append((solicitud, futuro))
+        if len(self._pendientes) >= self.max_lote:
+            self._despachar()
+        elif self._temporizador is None:
+            self._temporizador = loop.call_later(self.espera_s(), self._despachar)
+        return await futuro
+
+    def _despachar(self):
+        if self._temporizador is not None:
+            self._temporizador.cancel()
+            self._temporizador = None
+        lote = [(s, f) for s, f in self._pendientes if not f.cancelled()]
+        self._pendientes = []
+        if not lote:
+            return
+        tarea = asyncio.ensure_future(self._ejecutar(lote))
+        self._en_curso.add(tarea)
+        tarea.add_done_callback(self._en_curso.discard)
+
+    async def _ejecutar(self, lote):
+        loop = asyncio.get_running_loop()
+        try:
+            resultados, servicio = await loop.run_in_executor(
+                self.ejecutor, _cronometrar, self.procesar_lote, [s for s, _ in lote]
+            )
+            if len(resultados) != len(lote):
+                raise ValueError(f"procesar_lote devolvió {len(resultados)} resultados para {len(lote)} solicitudes.")
+            self._servicio_s = servicio if self.lotes == 0 else (
+                PESO_SERVICIO * servicio + (1 - PESO_SERVICIO) * self._servicio_s
+            )
+        except Exception as e:
+            resultados = [e] * len(lote)
+        self.lotes += 1
+        self.solicitudes += len(lote)
+        self.max_tamano = max(self.max_tamano, len(lote))
+
+        for (_, futuro), resultado in zip(lote, resultados):
+            if futuro.done(): # Cancelada mientras se calculaba
+                continue
+            if isinstance(resultado, BaseException):
+                futuro.set_exception(resultado)
+            else:
+                futuro.set_result(resultado)
+
+    def estadisticas(self):
+        return {
+            'lotes': self.lotes,
+            'solicitudes': self.solicitudes,
+            'tamano_medio': self.solicitudes / self.lotes if self.lotes else 0.0,
+            'max_tamano': self.max_tamano,
+            'servicio_ms': self._servicio_s * 1000.0,
+        }
+
+    async def cerrar(self):
+        """No acepta más solicitudes; despacha lo pendiente y espera los lotes en curso."""
+        self._cerrado = True
+        self._despachar()
+        if self._en_curso:
+            await asyncio.gather(*self._en_curso, return_exceptions=True)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *excepcion):
+        await self.cerrar()
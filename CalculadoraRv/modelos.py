@@ -0,0 +1,164 @@
+from dataclasses import dataclass, asdict
+import numpy as np
+
+# --- MODELOS V37.0: REGISTROS TIPADOS (AFILIADO Y BENEFICIARIOS) ---
+# Registros inmutables (frozen + __slots__): no hay churn de diccionarios en
+# los motores, son hashables (sirven como llave de caché) y se convierten a
+# arreglos NumPy (LoteGrupos) para valorizar en lote.
+
+SEXOS = ('Hombre', 'Mujer')
+INDICE_SEXO = {sexo: i for i, sexo in enumerate(SEXOS)}
+
+PCT_PENSION_CONYUGE = 0.60
+PCT_PENSION_HIJO = 0.15
+PCT_VEJEZ_ANTICIPADA = 0.80 # La pensión debe alcanzar el 80% del promedio imponible de 10 años
+
+
+@dataclass(frozen=True, slots=True)
+class Afiliado:
+    """Afiliado (causante) que contrata la pensión."""
+    edad: int
+    sexo: str
+    es_invalido: bool = False
+
+
+@dataclass(frozen=True, slots=True)
+class Conyuge:
+    """Cónyuge beneficiario. Si es inválido usa la tabla MI-2020."""
+    edad: int
+    sexo: str
+    pct_pension: float = PCT_PENSION_CONYUGE
+    es_invalido: bool = False
+
+
+@dataclass(frozen=True, slots=True)
+class Hijo:
+    """Hijo beneficiario hasta 'edad_limite' (18 o 24). Usa tabla de Vejez."""
+    edad: int
+    sexo: str
+    pct_pension: float = PCT_PENSION_HIJO
+    edad_limite: int = 24
+
+
+def como_afiliado(datos):
+    """Acepta un Afiliado, un dict con las mismas llaves, o None."""
+    if datos is None or isinstance(datos, Afiliado):
+        return datos
+    return Afiliado(
+        edad=int(datos['edad']),
+        sexo=datos['sexo'],
+        es_invalido=bool(datos.get('es_invalido', False))
+    )
+
+
+def como_conyuge(datos):
+    """Acepta un Conyuge, un dict con las mismas llaves, o None."""
+    if datos is None or isinstance(datos, Conyuge):
+        return datos
+    return Conyuge(
+        edad=int(datos['edad']),
+        sexo=datos['sexo'],
+        pct_pension=float(datos.get('pct_pension', PCT_PENSION_CONYUGE)),
+        es_invalido=bool(datos.get('es_invalido', False))
+    )
+
+
+def como_hijos(datos):
+    """Convierte una lista de hijos (dicts o Hijo) en una tupla de Hijo."""
+    if not datos:
+        return ()
+    hijos = []
+    for hijo in datos:
+        if not isinstance(hijo, Hijo):
+            hijo = Hijo(
+                edad=int(hijo['edad']),
+                sexo=hijo['sexo'],
+                pct_pension=float(hijo.get('pct_pension', PCT_PENSION_HIJO)),
+                edad_limite=int(hijo.get('edad_limite', 24))
+            )
+        hijos.append(hijo)
+    return tuple(hijos)
+
+
+def a_dict(registro):
+    """Vuelve un registro a dict (para reportes / JSON)."""
+    if registro is None:
+        return None
+    return asdict(registro)
+
+
+@dataclass(frozen=True)
+class LoteGrupos:
+    """
+    Forma 'struct-of-arrays' de N grupos familiares (afiliado + cónyuge + hijos),
+    para valorizar muchos perfiles de una vez. Los hijos se rellenan hasta el
+    máximo del lote (h_presente indica cuáles existen).
+    """
+    a_presente: np.ndarray  # (N,) bool  (False en Sobrevivencia)
+    a_edad: np.ndarray      # (N,) int
+    a_sexo: np.ndarray      # (N,) int (índice en SEXOS)
+    a_invalido: np.ndarray  # (N,) bool
+    c_presente: np.ndarray  # (N,) bool
+    c_edad: np.ndarray
+    c_sexo: np.ndarray
+    c_invalido: np.ndarray
+    c_pct: np.ndarray       # (N,) float
+    h_presente: np.ndarray  # (N, H) bool
+    h_edad: np.ndarray      # (N, H) int
+    h_sexo: np.ndarray
+    h_pct: np.ndarray       # (N, H) float
+    h_limite: np.ndarray    # (N, H) int
+
+    def __len__(self):
+        return len(self.a_edad)
+
+    @classmethod
+    def desde_registros(cls, grupos):
+        """
+        grupos: iterable de (afiliado, conyuge, hijos). Acepta registros o dicts.
+        """
+        grupos = [
+            (como_afiliado(a), como_conyuge(c), como_hijos(h)) for a, c, h in grupos
+        ]
+        n = len(grupos)
+        max_hijos = max((len(h) for _, _, h in grupos), default=0)
+
+        a_presente = np.zeros(n, dtype=bool)
+        a_edad = np.zeros(n, dtype=np.int64)
+        a_sexo = np.zeros(n, dtype=np.int64)
+        a_invalido = np.zeros(n, dtype=bool)
+        c_presente = np.zeros(n, dtype=bool)
+        c_edad = np.zeros(n, dtype=np.int64)
+        c_sexo = np.zeros(n, dtype=np.int64)
+        c_invalido = np.zeros(n, dtype=bool)
+        c_pct = np.zeros(n, dtype=float)
+        h_presente = np.zeros((n, max_hijos), dtype=bool)
+        h_edad = np.zeros((n, max_hijos), dtype=np.int64)
+        h_sexo = np.zeros((n, max_hijos), dtype=np.int64)
+        h_pct = np.zeros((n, max_hijos), dtype=float)
+        h_limite = np.zeros((n, max_hijos), dtype=np.int64)
+
+        for i, (afiliado, conyuge, hijos) in enumerate(grupos):
+            if afiliado:
+                a_presente[i] = True
+                a_edad[i] = afiliado.edad
+                a_sexo[i] = INDICE_SEXO[afiliado.sexo]
+                a_invalido[i] = afiliado.es_invalido
+            if conyuge:
+                c_presente[i] = True
+                c_edad[i] = conyuge.edad
+                c_sexo[i] = INDICE_SEXO[conyuge.sexo]
+                c_invalido[i] = conyuge.es_invalido
+                c_pct[i] = conyuge.pct_pension
+            for j, hijo in enumerate(hijos):
+                h_presente[i, j] = True
+                h_edad[i, j] = hijo.edad
+                h_sexo[i, j] = INDICE_SEXO[hijo.sexo]
+                h_pct[i, j] = hijo.pct_pension
+                h_limite[i, j] = hijo.edad_limite
+
+        return cls(
+            a_presente, a_edad, a_sexo, a_invalido,
+            c_presente, c_edad, c_sexo, c_invalido, c_pct,
+            h_presente, h_edad, h_sexo, h_pct, h_limite
+        )
@@ -0,0 +1,170 @@
+import os
+import threading
+from dataclasses import dataclass
+import numpy as np
+import pandas as pd
+
+from registro_datos import NOMBRE_H_VEJEZ, NOMBRE_M_VEJEZ, NOMBRE_H_INV, NOMBRE_M_INV
+from utils import CACHE_DISCO, TABLAS_MORTALIDAD, arreglo_solo_lectura
+
+# --- MORTALIDAD GENERACIONAL V51.0: FACTORES DE MEJORAMIENTO POR COHORTE ---
+# Las tablas 2020 traen, junto al qx 2020, los factores de mejoramiento
+# AA(x, t) para t = 2016..2035 y '2036*' (constante desde 2036). La tasa de
+# un año calendario y es
+#     qx(x, y) = qx2020(x) * prod_{t=2021..y} (1 - AA(x, min(t, 2036)))
+# (y hacia atrás, dividiendo por los factores de 2020..y+1).
+# Para una persona nacida en el año c, la tasa a la edad x es qx(x, c + x):
+# se precalcula UNA vez una matriz px[tabla, sexo, cohorte, edad] y el motor
+# solo elige la fila de la cohorte (año de valorización - edad).
+
+COHORTE_MINIMA = 1900
+COHORTE_MAXIMA = 2040
+EDAD_MAXIMA_TABLA = 110
+ANO_BASE = 2020
+
+HOJAS_TABLAS = (
+    ('CB-2020, Hombres', 'B-2020, Mujeres'),    # Vejez
+    ('MI-2020, Hombres', 'MI-2020, Mujeres'),   # Invalidez
+)
+
+
+def _ano_encabezado(valor):
+    """2017, 2017.0 o '2036*' -> año entero; None si la celda no es un año."""
+    try:
+        return int(float(str(valor).rstrip('*')))
+    except ValueError:
+        return None
+
+
+def _leer_hoja_mejoramiento(archivo, hoja):
+    """(edades, qx, años AA, AA (edad, año)) de una hoja de tabla 2020."""
+    df = pd.read_excel(archivo, sheet_name=hoja, header=None)
+    fila_titulos = df.index[df[0].astype(str).str.strip() == 'Edad'][0]
+    fila_anos = df.loc[fila_titulos + 1]
+    columnas_aa = [
+        c for c in df.columns[2:]
+        if not pd.isna(fila_anos[c]) and _ano_encabezado(fila_anos[c]) is not None
+    ]
+    anos = np.array([_ano_encabezado(fila_anos[c]) for c in columnas_aa])
+
+    datos = df.loc[fila_titulos + 2:]
+    edades = pd.to_numeric(datos[0], errors='coerce')
+    datos = datos[edades.notna() & (edades % 1 == 0)]
+    return (
+        datos[0].astype(int).to_numpy(),
+        datos[1].astype(float).to_numpy(),
+        anos,
+        datos[columnas_aa].astype(float).to_numpy()
+    )
+
+
+def _leer_tablas_generacionales(arch_h_vejez, arch_m_vejez, arch_h_inv, arch_m_inv):
+    """
+    qx[tabla, sexo, edad] (2020) y aa[tabla, sexo, edad, año] con años
+    consecutivos (el último se mantiene constante). NaN si la edad no existe.
+    """
+    archivos = ((arch_h_vejez, arch_m_vejez), (arch_h_inv, arch_m_inv))
+    leidas = [
+        [_leer_hoja_mejoramiento(archivo, hoja) for archivo, hoja in zip(archivos[i], HOJAS_TABLAS[i])]
+        for i in range(len(TABLAS_MORTALIDAD))
+    ]
+    anos = leidas[0][0][2]
+    if any(not np.array_equal(hoja[2], anos) for fila in leidas for hoja in fila):
+        raise ValueError("Los años de los factores de mejoramiento no coinciden entre tablas.")
+    if not np.array_equal(anos, np.arange(anos[0], anos[-1] + 1)):
+        raise ValueError("Los años de los factores de mejoramiento no son consecutivos.")
+
+    n_edades = EDAD_MAXIMA_TABLA + 1
+    qx = np.full((2, 2, n_edades), np.nan)
+    aa = np.full((2, 2, n_edades, len(anos)), np.nan)
+    for i_tabla, fila in enumerate(leidas):
+        for i_sexo, (edades, q, _, factores) in enumerate(fila):
+            dentro = edades < n_edades
+            qx[i_tabla, i_sexo, edades[dentro]] = q[dentro]
+            aa[i_tabla, i_sexo, edades[dentro]] = factores[dentro]
+    return {'qx': qx, 'aa': aa, 'anos_aa': anos}, {}
+
+
+def matriz_qx_anual(qx, aa, anos_aa, ano_min, ano_max):
+    """
+    qx[..., edad, año] para los años calendario ano_min..ano_max. Los AA
+    fuera del rango publicado se extienden con el primero / el último.
+    """
+    desde = min(ano_min, ANO_BASE)
+    anos = np.arange(desde, max(ano_max, ANO_BASE) + 1)
+    indices_aa = np.clip(anos - anos_aa[0], 0, len(anos_aa) - 1)
+    # Índice acumulado de mejora: sum log(1 - AA(x, t)) para t <= y
+    acumulado = np.cumsum(np.log1p(-aa[..., indices_aa]), axis=-1)
+    relativo = acumulado - acumulado[..., [ANO_BASE - desde]] # 0 en el año base
+    return qx[..., None] * np.exp(relativo[..., ano_min - desde:ano_max - desde + 1])
+
+
+def matriz_px_cohortes(qx, aa, anos_aa, cohorte_min=COHORTE_MINIMA, cohorte_max=COHORTE_MAXIMA):
+    """
+    px[tabla, sexo, cohorte, edad] = 1 - qx(edad, cohorte + edad), con 0.0
+    donde la tabla no tiene dato (igual que motor_vectorial).
+    """
+    edades = np.arange(qx.shape[-1])
+    cohortes = np.arange(cohorte_min, cohorte_max + 1)
+    qx_anual = matriz_qx_anual(qx, aa, anos_aa, cohorte_min, cohorte_max + edades[-1])
+    indice_ano = cohortes[:, None] + edades[None, :] - cohorte_min
+    qx_cohorte = qx_anual[..., edades[None, :], indice_ano]
+    px = np.nan_to_num(1.0 - np.minimum(qx_cohorte, 1.0), nan=0.0)
+    return arreglo_solo_lectura(px)
+
+
+@dataclass(frozen=True, eq=False)
+class TablasGeneracionales:
+    """
+    Tablas generacionales listas para el motor: la fila de cada persona se
+    elige por su cohorte (ano_valorizacion - edad). eq=False: se identifican
+    por objeto (el motor cachea flujos por objeto de tablas).
+    """
+    px_cohortes: np.ndarray  # (tabla, sexo, cohorte, edad), solo lectura
+    cohorte_minima: int
+    ano_valorizacion: int
+    version: str = ''
+
+    def indice_cohorte(self, edad):
+        """Fila de 'px_cohortes' de una persona de la edad dada (se acota al rango)."""
+        return np.clip(self.ano_valorizacion - np.asarray(edad) - self.cohorte_minima, 0, self.px_cohortes.shape[2] - 1)
+
+    def fila(self, tabla, sexo, edad):
+        """px por edad (0..110) de la cohorte de una persona de 'edad' años."""
+        return self.px_cohortes[tabla, sexo, self.indice_cohorte(edad)]
+
+
+_CACHE_GENERACIONAL = {}
+_LOCK_GENERACIONAL = threading.Lock()
+
+
+def tablas_generacionales(directorio, version, ano_valorizacion):
+    """
+    TablasGeneracionales del directorio de datos para un año de valorización.
+    La matriz de cohortes se arma una vez por versión de datos (y el parseo
+    se comparte vía CACHE_DISCO); el objeto se reutiliza por (versión, año)
+    para que la caché de flujos del motor siga sirviendo entre reruns.
+    """
+    with _LOCK_GENERACIONAL:
+        por_ano = _CACHE_GENERACIONAL.get(version)
+        if por_ano is None:
+            archivos = [
+                os.path.join(directorio, nombre)
+                for nombre in (NOMBRE_H_VEJEZ, NOMBRE_M_VEJEZ, NOMBRE_H_INV, NOMBRE_M_INV)
+            ]
+            arrays, _ = CACHE_DISCO.obtener(
+                'tablas_generacionales', archivos, {},
+                lambda: _leer_tablas_generacionales(*archivos)
+            )
+            px = matriz_px_cohortes(arrays['qx'], arrays['aa'], arrays['anos_aa'])
+            _CACHE_GENERACIONAL.clear() # Solo interesa la versión vigente
+            por_ano = _CACHE_GENERACIONAL[version] = {'px': px}
+        tablas = por_ano.get(ano_valorizacion)
+        if tablas is None:
+            tablas = por_ano[ano_valorizacion] = TablasGeneracionales(
+                px_cohortes=por_ano['px'],
+                cohorte_minima=COHORTE_MINIMA,
+                ano_valorizacion=int(ano_valorizacion),
+                version=f"{version}|gen{ano_valorizacion}"
+            )
+    return tablas
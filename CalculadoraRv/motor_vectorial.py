@@ -0,0 +1,338 @@
+import itertools
+import threading
+from functools import lru_cache
+import numpy as np
+from modelos import como_afiliado, como_conyuge, como_hijos
+from mortalidad_generacional import TablasGeneracionales
+
+# --- MOTOR VECTORIAL V42.0: CACHÉ DE FLUJOS ESPERADOS ---
+# El pago esperado de cada año ('pago_base_del_ano_t' antes de descontar)
+# depende solo de edades, sexos, invalidez, beneficiarios y periodo
+# garantizado; NO de la tasa. Por eso el cálculo se separa en:
+#   flujos    -> vector f[t] por perfil (se calcula una vez y se cachea)
+#   descuento -> vector d[t] por curva/tasa (VTD, tasa de venta, TITRP; cacheado)
+#   factor    -> producto punto d · f (separado en tramo temporal y diferido)
+# Re-valorizar un perfil con otro mes del VTD, otra compañía u otra TITRP es
+# solo un producto punto; muchas curvas a la vez, un producto matriz-vector.
+
+EDAD_MAXIMA = 110
+N_PLAZOS = EDAD_MAXIMA + 1 # t = 0 .. 110
+
+TABLAS_PX = ('Vejez', 'Invalidez')
+SEXOS_PX = ('Hombre', 'Mujer')
+
+MAX_FLUJOS_EN_CACHE = 4096
+MAX_DESCUENTOS_EN_CACHE = 1024
+
+
+# --- 1. TABLAS DE MORTALIDAD COMO ARREGLO ---
+# Los motores reciben las tablas anidadas (dict o MappingProxyType), que no son
+# hashables. Cada objeto de tablas se registra (por id, con una referencia para
+# que el id no se reutilice mientras esté registrado) con un token ÚNICO y su
+# arreglo px, armado una vez. Las cachés de flujos usan ese registro como
+# clave: al sacar unas tablas del registro sus flujos simplemente dejan de
+# usarse (y salen de las LRU), sin vaciar los de las demás tablas.
+# El registro cubre las tablas vivas de los llamadores: estáticas, las
+# generacionales de la app y las MAX_DATOS_MERCADO (16) de cada proceso del
+# servicio de cotización.
+_PX_POR_TABLAS = {} # id(tablas) -> (tablas, _PxRegistrado), en orden de registro
+_LOCK_PX = threading.Lock()
+_TOKENS = itertools.count()
+_MAX_TABLAS_REGISTRADAS = 32
+
+
+class _PxRegistrado(int):
+    """Token (entero único: se compara y hashea como tal) con el px de sus tablas."""
+
+    def __new__(cls, token, px):
+        registrado = super().__new__(cls, token)
+        registrado.px = px
+        return registrado
+
+
+def _registro_tablas(tablas_mortalidad):
+    clave = id(tablas_mortalidad)
+    entrada = _PX_POR_TABLAS.get(clave) # Atómico: sin KeyError si otro hilo la saca
+    if entrada is not None:
+        return entrada[1]
+    px = _matriz_px(tablas_mortalidad) # Fuera del lock: puede tardar
+    with _LOCK_PX:
+        entrada = _PX_POR_TABLAS.get(clave)
+        if entrada is not None: # Otro hilo lo registró mientras tanto
+            return entrada[1]
+        registrado = _PxRegistrado(next(_TOKENS), px)
+        _PX_POR_TABLAS[clave] = (tablas_mortalidad, registrado)
+        while len(_PX_POR_TABLAS) > _MAX_TABLAS_REGISTRADAS:
+            _PX_POR_TABLAS.pop(next(iter(_PX_POR_TABLAS)))
+    return registrado
+
+
+def _matriz_px(tablas_mortalidad):
+    """
+    Arreglo (tabla, sexo, edad) con px para edades 0..110. Las edades sin dato
+    quedan en 0.0 (igual que el KeyError de 'obtener_prob_supervivencia').
+    (V51.0) Las TablasGeneracionales ya vienen como arreglo por cohorte: se
+    usan tal cual (ver '_fila_px').
+    """
+    if isinstance(tablas_mortalidad, TablasGeneracionales):
+        return tablas_mortalidad
+    px = np.zeros((len(TABLAS_PX), len(SEXOS_PX), N_PLAZOS), dtype=float)
+    for i_tabla, tabla in enumerate(TABLAS_PX):
+        for i_sexo, sexo in enumerate(SEXOS_PX):
+            fila = tablas_mortalidad[tabla][sexo]
+            for edad in range(N_PLAZOS):
+                valor = fila.get(edad)
+                if valor is not None and not np.isnan(valor):
+                    px[i_tabla, i_sexo, edad] = valor
+    px.flags.writeable = False
+    return px
+
+
+def matriz_px(tablas_mortalidad):
+    """
+    px (tabla, sexo, edad) de las tablas dadas (construido una sola vez), o
+    las TablasGeneracionales (px por cohorte) si las tablas son generacionales.
+    """
+    return _registro_tablas(tablas_mortalidad).px
+
+
+def _fila_px(px, tabla, sexo, edad):
+    """px por edad de una persona: fila fija (estáticas) o la de su cohorte (V51.0)."""
+    if isinstance(px, TablasGeneracionales):
+        return px.fila(tabla, sexo, edad)
+    return px[tabla, sexo]
+
+
+def _supervivencia(px, es_invalido, sexo, edad, n, edad_maxima=EDAD_MAXIMA):
+    """
+    Probabilidad acumulada de seguir vivo en t = 0..n-1. Desde la edad
+    máxima en adelante la probabilidad es 0 (regla V24.1 de los motores).
+    """
+    fila = _fila_px(px, 1 if es_invalido else 0, SEXOS_PX.index(sexo), edad)
+    edades = edad + np.arange(n - 1)
+    q = np.where(edades < edad_maxima, fila[np.clip(edades, 0, N_PLAZOS - 1)], 0.0)
+    s = np.empty(n, dtype=float)
+    if n > 0:
+        s[0] = 1.0
+        np.cumprod(q, out=s[1:])
+    return s
+
+
+def _pct_sobrevivencia(px, conyuge, hijos, n, edad_maxima=EDAD_MAXIMA):
+    """Suma de % de pensión de beneficiarios vivos (y en edad) por año, con tope 100%."""
+    total = np.zeros(n, dtype=float)
+    if conyuge:
+        total += conyuge.pct_pension * _supervivencia(
+            px, conyuge.es_invalido, conyuge.sexo, conyuge.edad, n, edad_maxima
+        )
+    t = np.arange(n)
+    for hijo in hijos:
+        # Hijos se asumen no-inválidos (usan tabla Vejez)
+        s_hijo = _supervivencia(px, False, hijo.sexo, hijo.edad, n, edad_maxima)
+        total += np.where(hijo.edad + t < hijo.edad_limite, hijo.pct_pension * s_hijo, 0.0)
+    return np.minimum(total, 1.0)
+
+
+# --- INICIO CAMBIO V49.0 (Sobrevivencia exacta por estados) ---
+# El tope de 100% se aplica sobre valores esperados: min(sum(pct * p_vivo), 1)
+# no es E[min(sum(pct * vivo), 1)] cuando varios beneficiarios pueden estar
+# vivos a la vez. El modo exacto enumera los estados vivo/muerto (máscara de
+# bits sobre cónyuge + hijos) y aplica el tope en cada estado. Como
+#     E[min(S, 1)] = E[S] - E[max(S - 1, 0)]
+# solo los estados con suma de % > 100% aportan una corrección, así que:
+#   - se descartan los beneficiarios que ya no pueden cobrar,
+#   - solo se valorizan los años en que los que pueden cobrar suman > 100%,
+#   - solo se enumeran los estados con suma > 100%, y
+#   - se podan los estados cuya probabilidad máxima (cota por producto de
+#     las probabilidades de los vivos) es menor que 'tolerancia'.
+MAX_BENEFICIARIOS_EXACTO = 20
+TOLERANCIA_ESTADOS = 1e-12
+
+
+def probabilidades_beneficiarios(px, conyuge, hijos, n, edad_maxima=EDAD_MAXIMA):
+    """
+    (pcts (B,), activos (B, n)): % de pensión de cada beneficiario y la
+    probabilidad de que esté vivo y con derecho a cobrar en t = 0..n-1.
+    """
+    pcts = []
+    activos = []
+    if conyuge:
+        pcts.append(conyuge.pct_pension)
+        activos.append(_supervivencia(px, conyuge.es_invalido, conyuge.sexo, conyuge.edad, n, edad_maxima))
+    t = np.arange(n)
+    for hijo in hijos:
+        s_hijo = _supervivencia(px, False, hijo.sexo, hijo.edad, n, edad_maxima)
+        pcts.append(hijo.pct_pension)
+        activos.append(np.where(hijo.edad + t < hijo.edad_limite, s_hijo, 0.0))
+    return np.array(pcts, dtype=float), np.array(activos, dtype=float).reshape(len(pcts), n)
+
+
+def correccion_tope_exacta(pcts, activos, tolerancia=TOLERANCIA_ESTADOS):
+    """
+    E[max(sum(pct * vivo) - 1, 0)] por año, enumerando los estados (máscara
+    de bits) de los beneficiarios, supuestos independientes.
+    """
+    n = activos.shape[1]
+    correccion = np.zeros(n, dtype=float)
+    utiles = (pcts > 0) & (activos.max(axis=1, initial=0.0) > 0)
+    pcts, activos = pcts[utiles], activos[utiles]
+    B = len(pcts)
+    if pcts.sum() <= 1.0:
+        return correccion
+    if B > MAX_BENEFICIARIOS_EXACTO:
+        raise ValueError(f"Demasiados beneficiarios para el modo exacto ({B} > {MAX_BENEFICIARIOS_EXACTO}).")
+
+    # Años en que los beneficiarios que aún pueden cobrar suman más de 100%
+    anos = np.flatnonzero(pcts @ (activos > 0) > 1.0)
+    if len(anos) == 0:
+        return correccion
+    activos = activos[:, anos]
+
+    estados = ((np.arange(2 ** B)[:, None] >> np.arange(B)) & 1).astype(bool)
+    exceso = estados @ pcts - 1.0
+    seleccion = exceso > 1e-12
+    estados, exceso = estados[seleccion], exceso[seleccion]
+
+    with np.errstate(divide='ignore'):
+        log_maximo = np.log(activos.max(axis=1))
+    cota = np.exp(np.where(estados, log_maximo, 0.0).sum(axis=1))
+    seleccion = cota >= tolerancia
+    estados, exceso = estados[seleccion], exceso[seleccion]
+
+    prob_estado = np.ones((len(estados), len(anos)), dtype=float)
+    for b in range(B):
+        prob_estado *= np.where(estados[:, b, None], activos[b], 1.0 - activos[b])
+    correccion[anos] = exceso @ prob_estado
+    return correccion
+
+
+def _pct_sobrevivencia_exacto(px, conyuge, hijos, n, edad_maxima=EDAD_MAXIMA):
+    """E[min(suma de % de beneficiarios vivos (y en edad), 100%)] por año."""
+    pcts, activos = probabilidades_beneficiarios(px, conyuge, hijos, n, edad_maxima)
+    return pcts @ activos - correccion_tope_exacta(pcts, activos)
+
+
+def _pago_sobrevivencia(px, conyuge, hijos, n, edad_maxima=EDAD_MAXIMA, exacto=False):
+    if exacto:
+        return _pct_sobrevivencia_exacto(px, conyuge, hijos, n, edad_maxima)
+    return _pct_sobrevivencia(px, conyuge, hijos, n, edad_maxima)
+# --- FIN CAMBIO V49.0 ---
+
+
+# --- 2. FLUJOS ESPERADOS (SIN DESCONTAR) ---
+@lru_cache(maxsize=MAX_FLUJOS_EN_CACHE)
+def _flujos_contingentes(registrado, afiliado, conyuge, hijos, exacto=False):
+    px = registrado.px
+    n = max(EDAD_MAXIMA - afiliado.edad + 1, 0)
+    prob_afiliado_vivo = _supervivencia(px, afiliado.es_invalido, afiliado.sexo, afiliado.edad, n)
+    pago_sobrevivencia = _pago_sobrevivencia(px, conyuge, hijos, n, exacto=exacto)
+    flujos = 1.0 * prob_afiliado_vivo + pago_sobrevivencia * (1.0 - prob_afiliado_vivo)
+    flujos.flags.writeable = False
+    return flujos
+
+
+def flujos_esperados(datos_afiliado, conyuge_data, hijos_data, tablas_mortalidad, periodo_garantizado_en_anos=0, exacto=False):
+    """
+    Pago esperado (en unidades de pensión) de cada año t = 0..110-edad de una
+    renta vitalicia con beneficiarios y periodo garantizado. Cacheado por perfil.
+    (V49.0) exacto=True aplica el tope de 100% por estado de los beneficiarios.
+    """
+    contingentes = _flujos_contingentes(
+        _registro_tablas(tablas_mortalidad),
+        como_afiliado(datos_afiliado), como_conyuge(conyuge_data), como_hijos(hijos_data),
+        exacto
+    )
+    if periodo_garantizado_en_anos <= 0:
+        return contingentes
+    pago_cierto = (np.arange(len(contingentes)) < periodo_garantizado_en_anos).astype(float)
+    return np.maximum(contingentes, pago_cierto)
+
+
+@lru_cache(maxsize=MAX_FLUJOS_EN_CACHE)
+def _flujos_sobrevivencia(registrado, conyuge, hijos, edad_maxima, exacto=False):
+    flujos = _pago_sobrevivencia(registrado.px, conyuge, hijos, edad_maxima + 1, edad_maxima, exacto)
+    flujos.flags.writeable = False
+    return flujos
+
+
+def flujos_sobrevivencia(conyuge_data, hijos_data, tablas_mortalidad, edad_maxima=EDAD_MAXIMA, exacto=False):
+    """Pago esperado de cada año t = 0..edad_maxima de una pensión de sobrevivencia."""
+    return _flujos_sobrevivencia(
+        _registro_tablas(tablas_mortalidad),
+        como_conyuge(conyuge_data), como_hijos(hijos_data), edad_maxima, exacto
+    )
+
+
+# --- 3. VECTORES DE DESCUENTO ---
+@lru_cache(maxsize=MAX_DESCUENTOS_EN_CACHE)
+def _descuento_tasa_plana(tasa, n):
+    v = 1 / (1 + tasa)
+    d = np.array([v ** t for t in range(n)], dtype=float)
+    d[0] = 1.0 # Pago hoy
+    d.flags.writeable = False
+    return d
+
+
+@lru_cache(maxsize=MAX_DESCUENTOS_EN_CACHE)
+def _descuento_curva(tasas):
+    d = np.array([(1 / (1 + tasa)) ** t for t, tasa in enumerate(tasas)], dtype=float)
+    d[0] = 1.0 # Pago hoy
+    d.flags.writeable = False
+    return d
+
+
+def tasas_por_plazo(vector_vtd, n=N_PLAZOS):
+    """Tasa del VTD para t = 0..n-1 (con el fallback a 110 de los motores)."""
+    return tuple(vector_vtd.get(t, vector_vtd[110]) for t in range(n))
+
+
+def vector_descuento(modo_calculo, tasa_plana=0.0, vector_vtd=None, n=N_PLAZOS):
+    """
+    d[t] para t = 0..n-1 según el modo (lógica V30.0 de los motores):
+    - 'RVI': curva VTD
+    - 'RP' / 'TASA_PLANA': tasa plana (TITRP o tasa de venta)
+    - otro: solo se valoriza el pago de t = 0
+    """
+    if modo_calculo == 'RVI':
+        return _descuento_curva(tasas_por_plazo(vector_vtd, n))
+    if modo_calculo in ('RP', 'TASA_PLANA'):
+        return _descuento_tasa_plana(float(tasa_plana), n)
+    d = np.zeros(n, dtype=float)
+    d[0] = 1.0
+    return d
+
+
+def matriz_descuento_tasas(tasas, n=N_PLAZOS):
+    """(K, n): una fila de descuento por tasa plana (p.ej. una por compañía)."""
+    tasas = np.asarray(tasas, dtype=float)
+    d = (1.0 / (1.0 + tasas))[:, None] ** np.arange(n)
+    d[:, 0] = 1.0
+    return d
+
+
+def matriz_descuento_vtd(vectores_vtd, n=N_PLAZOS):
+    """(M, n): una fila de descuento por curva VTD (p.ej. una por mes publicado)."""
+    return np.stack([vector_descuento('RVI', vector_vtd=vtd, n=n) for vtd in vectores_vtd])
+
+
+# --- 4. VALORIZACIÓN ---
+def valorizar(flujos, descuento, anos_de_aumento=0):
+    """
+    (factor_temporal, factor_diferido): producto punto de los flujos con el
+    descuento, separado en los años con aumento (t < anos_de_aumento) y el resto.
+    'descuento' puede ser un vector (n,) o una matriz (K, n) de curvas.
+    """
+    n = len(flujos)
+    descuento = np.asarray(descuento)[..., :n]
+    corte = min(max(int(anos_de_aumento), 0), n)
+    factor_temporal = descuento[..., :corte] @ flujos[:corte]
+    factor_diferido = descuento[..., corte:] @ flujos[corte:]
+    return factor_temporal, factor_diferido
+
+
+def limpiar_caches():
+    """Vacía las cachés de flujos y descuentos (p.ej. tras recargar tablas)."""
+    _flujos_contingentes.cache_clear()
+    _flujos_sobrevivencia.cache_clear()
+    _descuento_tasa_plana.cache_clear()
+    _descuento_curva.cache_clear()
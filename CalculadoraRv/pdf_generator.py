@@ -1,192 +1,261 @@
+from collections import namedtuple
+from functools import lru_cache
 from fpdf import FPDF
+from modelos import como_conyuge
 
-# --- ¡FUNCIÓN V20.0: CONSTRUCTOR DE PDF NATIVO! (MODIFICADA V34.0) ---
+# --- INICIO CAMBIO V36.0 (Plantilla de Reporte Precompilada) ---
+# Todo lo estático del informe (textos, colores, columnas de cada tabla y
+# notas legales) se define una sola vez al importar el módulo. Por reporte
+# solo se dibujan las filas variables.
+
+FUENTE_REPORTE = "Times"
+COLOR_GRIS_TEXTO = (85, 85, 85)
+COLOR_GRIS_CABECERA = (242, 242, 242)
+COLOR_NEGRO = (0, 0, 0)
+
+TITULO_REPORTE = "ESTUDIO PRELIMINAR DE PENSIÓN"
+
+NOTAS_PIE_REPORTE = (
+    "NOTA: VALORES ESTIMATIVOS NO CONSTITUYEN UNA OFERTA FORMAL DE PENSIÓN.",
+    "LA PGU SE SOLICITA A LOS 65 AÑOS, REQUISITO TENER REGISTRO SOCIAL DE HOGARES Y NO PERTENECER AL 90% DE MAYORES INGRESOS.",
+    "BONIFICACIÓN POR AÑO COTIZADO SE COMIENZA A PAGAR A LOS 9 MESES DE PUBLICADA LA LEY. LA BONIFICACIÓN SON 0.1 UF POR AÑO COTIZADO...",
+)
+
+# Configuración de columnas (nombre, ancho). Total de cada tabla = 190.
+# COLUMNA_COMISION se reemplaza por la cabecera dinámica ('Desc. X.XX%').
+COLUMNA_COMISION = "Comisión AFP"
+
+COLUMNAS_RP = (
+    ("Modalidad", 55), ("Pensión (UF)", 25), ("Pensión M. Bruto", 30),
+    (COLUMNA_COMISION, 20),
+    ("Dscto. 7% Salud", 30),
+    ("Pensión Liquida", 30)
+)
+
+COLUMNAS_RVI = (
+    ("Modalidad", 60),
+    ("Tasa (%)", 20),
+    ("Pensión (UF)", 25),
+    ("Pensión M. Bruto", 30),
+    ("Dscto. 7% Salud", 30),
+    ("Pensión Liquida", 25)
+)
+
+COLUMNAS_RVAT = (
+    ("Modalidad", 70), ("Pensión (UF)", 25), ("Pensión M. Bruto", 30),
+    ("Dscto. 7% Salud", 35), ("Pensión Liquida", 30)
+)
+
+# Las filas de RP-RVD usan la misma configuración que RP (incluyen comisión)
+COLUMNAS_RVD = COLUMNAS_RP
+
+# Columna ya resuelta: clave de datos, formateador y estilos por tipo de fila
+ColumnaCompilada = namedtuple(
+    "ColumnaCompilada",
+    ["cabecera", "ancho", "clave", "formatear", "align", "estilo_bonus", "estilo_sub"]
+)
+
+
+def _formato_uf(val):
+    return f"{val:,.2f} UF"
+
+def _formato_tasa(val):
+    return f"{val:,.2f}%"
+
+def _formato_descuento(val):
+    return f"-{val:,.0f}" # Formato como negativo
+
+def _formato_pesos(val):
+    return f"${val:,.0f}" # Formato para Bruto/Líquido
+
+
+@lru_cache(maxsize=64)
+def _compilar_columna(header_name, col_width):
+    """
+    Resuelve UNA vez por columna lo que antes se decidía en cada celda:
+    la clave del dato, el formateador y la alineación/bordes según el
+    tipo de fila (normal, bonus PGU/Bono o sub-fila).
+    """
+    data_key = header_name
+    if header_name.startswith("Desc.") and header_name != "Dscto. 7% Salud":
+        data_key = COLUMNA_COMISION
+
+    if data_key.endswith("(UF)"):
+        formateador = _formato_uf
+    elif data_key == "Tasa (%)":
+        formateador = _formato_tasa
+    elif data_key == "Dscto. 7% Salud" or data_key == COLUMNA_COMISION:
+        formateador = _formato_descuento
+    else:
+        formateador = _formato_pesos
+
+    def formatear(val):
+        if isinstance(val, float):
+            return formateador(val)
+        return str(val)
+
+    # Centrar tasas y UF (V23.2)
+    align = "C" if (data_key == "Tasa (%)" or data_key.endswith("(UF)")) else "L"
+
+    # Estilos (align, border, conservar_texto) para filas especiales
+    if data_key == "Modalidad":
+        estilo_bonus = ("R", "LBR", True)
+        estilo_sub = ("L", "LR", True)
+    elif data_key == "Pensión Liquida":
+        estilo_bonus = ("L", "RBL", True)
+        estilo_sub = (align, "R", False)
+    else:
+        estilo_bonus = (align, "B", False)
+        estilo_sub = (align, "R", False)
+
+    return ColumnaCompilada(
+        header_name, col_width, data_key, formatear, align, estilo_bonus, estilo_sub
+    )
+
+
+@lru_cache(maxsize=32)
+def compilar_tabla(column_config):
+    """
+    Compila una configuración de columnas (tupla de (nombre, ancho)).
+    El resultado se reutiliza entre reportes con la misma cabecera.
+    """
+    return tuple(_compilar_columna(nombre, ancho) for nombre, ancho in column_config)
+
+
+def _con_cabecera_comision(column_config, com_header):
+    """Reemplaza la columna de comisión por la cabecera dinámica."""
+    if com_header == COLUMNA_COMISION:
+        return column_config
+    return tuple(
+        (com_header if nombre == COLUMNA_COMISION else nombre, ancho)
+        for nombre, ancho in column_config
+    )
+
+
+def draw_table(pdf, title, subtitle, data_rows, columnas):
+    """
+    Dibuja una tabla ya compilada (ver 'compilar_tabla').
+    """
+    pdf.set_font(FUENTE_REPORTE, "B", 11) # Título H3
+    if title:
+        pdf.cell(0, 10, title, ln=1)
+
+    if subtitle:
+        pdf.set_font(FUENTE_REPORTE, "I", 10)
+        pdf.set_text_color(*COLOR_GRIS_TEXTO)
+        pdf.cell(0, 5, subtitle, ln=1, align="L")
+        pdf.set_text_color(*COLOR_NEGRO) # Reset color
+        pdf.ln(2)
+
+    pdf.set_font(FUENTE_REPORTE, "B", 9)
+    pdf.set_fill_color(*COLOR_GRIS_CABECERA)
+    for col in columnas:
+        pdf.cell(col.ancho, 7, col.cabecera, border=1, ln=0, align="C", fill=True)
+    pdf.ln()
+
+    pdf.set_font(FUENTE_REPORTE, "", 9)
+    cell = pdf.cell
+    for row in data_rows:
+        if row.get("is_bonus_row", False):
+            for col in columnas:
+                align, border, conservar = col.estilo_bonus
+                text = col.formatear(row.get(col.clave, "")) if conservar else ""
+                cell(col.ancho, 7, text, border=border, ln=0, align=align)
+        elif row.get("is_sub_row", False):
+            for col in columnas:
+                align, border, conservar = col.estilo_sub
+                text = col.formatear(row.get(col.clave, "")) if conservar else ""
+                cell(col.ancho, 7, text, border=border, ln=0, align=align)
+        else:
+            for col in columnas:
+                cell(col.ancho, 7, col.formatear(row.get(col.clave, "")), border=1, ln=0, align=col.align)
+        pdf.ln()
+
+# --- FIN CAMBIO V36.0 ---
+
+# --- ¡FUNCIÓN V20.0: CONSTRUCTOR DE PDF NATIVO! (MODIFICADA V36.0) ---
 def create_native_pdf_report(data):
     """
     Usa fpdf2 NATIVAMENTE para construir un PDF limpio y profesional.
-    (Versión modificada V34.0).
+    (Versión modificada V36.0: usa la plantilla precompilada del módulo).
     """
     pdf = FPDF()
     pdf.add_page()
-    
-    # --- Configuración de Fuentes ---
-    pdf.set_font("Times", "B", 15) # Título H1
-    
+
     # --- Cabecera del Reporte ---
-    pdf.cell(0, 10, "ESTUDIO PRELIMINAR DE PENSIÓN", ln=1, align="C")
-    pdf.set_font("Times", "B", 13) # Título H2
+    pdf.set_font(FUENTE_REPORTE, "B", 15) # Título H1
+    pdf.cell(0, 10, TITULO_REPORTE, ln=1, align="C")
+    pdf.set_font(FUENTE_REPORTE, "B", 13) # Título H2
     pdf.cell(0, 10, f"SR. {data['input_afiliado_nombre'].upper()}", ln=1, align="C")
     pdf.ln(5) # Salto de línea
-    
+
     # --- Datos del Afiliado (MODIFICADO V32.0) ---
-    pdf.set_font("Times", "", 10)
+    pdf.set_font(FUENTE_REPORTE, "", 10)
     pdf.cell(0, 5, f"Valor UF Utilizado: ${data['input_valor_uf_clp']:,.0f}".replace(",", "."), ln=1)
-    
+
     # Mostrar datos del afiliado solo si NO es Sobrevivencia
     if not data.get('es_sobrevivencia', False):
         pdf.cell(0, 5, f"Edad Afiliado: {data['afiliado_edad_calculada']} años ({data['afiliado_tipo_pension']})", ln=1)
-    
+
     if data['incluye_conyuge']:
-        tipo_conyuge = "Inválido" if data['datos_conyuge']['es_invalido'] else ""
-        pdf.cell(0, 5, f"Beneficiario Conyuge {data['datos_conyuge']['edad']} años {tipo_conyuge}", ln=1)
-    
+        conyuge = como_conyuge(data['datos_conyuge']) # Conyuge o dict (informes antiguos / API)
+        tipo_conyuge = "Inválido" if conyuge.es_invalido else ""
+        pdf.cell(0, 5, f"Beneficiario Conyuge {conyuge.edad} años {tipo_conyuge}", ln=1)
+
     pdf.cell(0, 5, f"Saldo Acumulado (Bruto): {data['saldo_uf']:,.0f} UF".replace(",", "."), ln=1)
 
     # --- INICIO CAMBIO V24.1 (Pilar 3) ---
     if data['check_incluye_comision']:
-        pdf.set_font("Times", "I", 9) # Fuente más pequeña e itálica
-        pdf.set_text_color(85, 85, 85) # Gris
-        pdf.cell(0, 5, 
+        pdf.set_font(FUENTE_REPORTE, "I", 9) # Fuente más pequeña e itálica
+        pdf.set_text_color(*COLOR_GRIS_TEXTO)
+        pdf.cell(0, 5,
             f"(Se descuenta {data['input_comision_pct']:.2f}% de comisión. Prima Neta RVI: {data['prima_neta_rvi']:,.0f} UF)"
             .replace(",", "."), ln=1)
-        pdf.set_font("Times", "", 10) # Reset
-        pdf.set_text_color(0, 0, 0) # Reset
+        pdf.set_font(FUENTE_REPORTE, "", 10) # Reset
+        pdf.set_text_color(*COLOR_NEGRO) # Reset
     # --- FIN CAMBIO V24.1 ---
     pdf.ln(5)
 
-    # --- Función Ayudante para dibujar Tablas (MODIFICADA V34.0) ---
-    def draw_table(title, subtitle, data_rows, column_config):
-        pdf.set_font("Times", "B", 11) # Título H3
-        if title:
-            pdf.cell(0, 10, title, ln=1)
-        
-        if subtitle:
-            pdf.set_font("Times", "I", 10)
-            pdf.set_text_color(85, 85, 85) # Gris
-            pdf.cell(0, 5, subtitle, ln=1, align="L")
-            pdf.set_text_color(0, 0, 0) # Reset color
-            pdf.ln(2)
-        
-        pdf.set_font("Times", "B", 9)
-        pdf.set_fill_color(242, 242, 242) # Gris claro
-        for col_name, col_width in column_config:
-            pdf.cell(col_width, 7, col_name, border=1, ln=0, align="C", fill=True)
-        pdf.ln()
-        
-        pdf.set_font("Times", "", 9)
-        for row in data_rows:
-            is_bonus_row = row.get("is_bonus_row", False)
-            is_sub_row = row.get("is_sub_row", False) 
-            
-            # Dibujar cada celda
-            for header_name, col_width in column_config:
-                
-                data_key = header_name
-                if header_name.startswith("Desc.") and header_name != "Dscto. 7% Salud":
-                    data_key = "Comisión AFP"
-
-                val = row.get(data_key, "")
-                
-                # --- Formateo de texto ---
-                if isinstance(val, float) and data_key.endswith("(UF)"):
-                    text = f"{val:,.2f} UF"
-                # --- INICIO V34.0 ---
-                elif isinstance(val, float) and data_key == "Tasa (%)":
-                    text = f"{val:,.2f}%"
-                # --- FIN V34.0 ---
-                elif isinstance(val, float) and (data_key == "Dscto. 7% Salud" or data_key == "Comisión AFP"):
-                    text = f"-{val:,.0f}" # Formato como negativo
-                elif isinstance(val, float):
-                    text = f"${val:,.0f}" # Formato para Bruto/Líquido
-                else:
-                    text = str(val)
-                
-                # --- Alineación y Bordes (MODIFICADO V23.2) ---
-                align = "L"
-                border = 1
-                
-                if data_key == "Tasa (%)" or data_key.endswith("(UF)"): # Centrar tasas y UF
-                    align = "C"
-
-                if is_bonus_row:
-                    if data_key == "Modalidad":
-                        align = "R"
-                        border = "LBR"
-                    elif data_key == "Pensión Liquida":
-                        align = "L"
-                        border = "RBL"
-                    else:
-                        text = ""
-                        border = "B" 
-                elif is_sub_row:
-                    if data_key == "Modalidad":
-                        align = "L"
-                        border = "LR" 
-                    else:
-                        text = ""
-                        border = "R" 
-                
-                pdf.cell(col_width, 7, text, border=border, ln=0, align=align)
-            pdf.ln()
-
-    # --- TABLA 1: Retiro Programado (¡¡MODIFICADA V23.4!!) ---
+    com_header = data.get('comision_header_str', COLUMNA_COMISION)
+
+    # --- TABLA 1: Retiro Programado ---
     if data['rp_rows']:
-        com_header = data.get('comision_header_str', 'Comisión AFP')
-        # Total width: 55+25+30+20+30+30 = 190
-        col_config_rp = [
-            ("Modalidad", 55), ("Pensión (UF)", 25), ("Pensión M. Bruto", 30),
-            (com_header, 20), 
-            ("Dscto. 7% Salud", 30), 
-            ("Pensión Liquida", 30)
-        ]
-        draw_table("1. Retiro Programado", data.get('afp_details_str', ''), data['rp_rows'], col_config_rp)
+        columnas_rp = compilar_tabla(_con_cabecera_comision(COLUMNAS_RP, com_header))
+        draw_table(pdf, "1. Retiro Programado", data.get('afp_details_str', ''), data['rp_rows'], columnas_rp)
         pdf.ln(5)
 
-    # --- TABLA 2: RVI Simple y Garantizada (¡¡MODIFICADA V34.0!!) ---
+    # --- TABLA 2: RVI Simple y Garantizada ---
     if data['rvi_simple_rows']:
-        # Total width: 60+20+25+30+30+25 = 190
-        col_config_rvi = [
-            ("Modalidad", 60), 
-            ("Tasa (%)", 20), # <-- NUEVA COLUMNA V34.0
-            ("Pensión (UF)", 25), 
-            ("Pensión M. Bruto", 30),
-            ("Dscto. 7% Salud", 30), # <-- Ancho ajustado
-            ("Pensión Liquida", 25)  # <-- Ancho ajustado
-        ]
-
         # --- INICIO CAMBIO V32.0 ---
         subtitle_rvi = f"Cálculo RVI: {data['metodo_rvi_desc']}"
         title_rvi = "2. Renta Vitalicia Inmediata (Simple y Garantizada)"
         if data.get('es_sobrevivencia', False):
              title_rvi = "2. Pensiones de Sobrevivencia"
         # --- FIN CAMBIO V32.0 ---
-        
-        draw_table(title_rvi, subtitle_rvi, data['rvi_simple_rows'], col_config_rvi)
+
+        draw_table(pdf, title_rvi, subtitle_rvi, data['rvi_simple_rows'], compilar_tabla(COLUMNAS_RVI))
         pdf.ln(5)
 
-    # --- TABLA 3: RVI con Aumento Temporal (¡¡MODIFICADA V23.4!!) ---
+    # --- TABLA 3: RVI con Aumento Temporal ---
     if data['rvat_rows']:
-        # Total width: 70+25+30+35+30 = 190
-        col_config_rvat = [
-            ("Modalidad", 70), ("Pensión (UF)", 25), ("Pensión M. Bruto", 30),
-            ("Dscto. 7% Salud", 35), ("Pensión Liquida", 30)
-        ]
-        draw_table("3. Renta Vitalicia con Aumento Temporal", "", data['rvat_rows'], col_config_rvat)
+        draw_table(pdf, "3. Renta Vitalicia con Aumento Temporal", "", data['rvat_rows'], compilar_tabla(COLUMNAS_RVAT))
         pdf.ln(5)
-    
+
     # --- TABLA 4: RP con RVD (NUEVO V33.0) ---
     if data['rvd_rows']:
-        # Usamos la misma config que RP, ya que tiene la comisión
-        com_header_rvd = data.get('comision_header_str', 'Comisión AFP')
-        col_config_rvd = [
-            ("Modalidad", 55), ("Pensión (UF)", 25), ("Pensión M. Bruto", 30),
-            (com_header_rvd, 20), 
-            ("Dscto. 7% Salud", 30), 
-            ("Pensión Liquida", 30)
-        ]
-        
+        columnas_rvd = compilar_tabla(_con_cabecera_comision(COLUMNAS_RVD, com_header))
+
         # Subtítulo (usa el de RVI ya que depende del mismo cálculo)
         subtitle_rvd = f"Cálculo RVI: {data['metodo_rvi_desc']}"
-        
-        draw_table("4. RP con Renta Vitalicia Diferida", subtitle_rvd, data['rvd_rows'], col_config_rvd)
+
+        draw_table(pdf, "4. RP con Renta Vitalicia Diferida", subtitle_rvd, data['rvd_rows'], columnas_rvd)
         pdf.ln(5)
 
 
     # --- Pie de Página del Reporte ---
-    pdf.set_font("Times", "I", 8)
-    pdf.set_text_color(85, 85, 85)
-    pdf.cell(0, 5, "NOTA: VALORES ESTIMATIVOS NO CONSTITUYEN UNA OFERTA FORMAL DE PENSIÓN.", ln=1)
-    pdf.cell(0, 5, "LA PGU SE SOLICITA A LOS 65 AÑOS, REQUISITO TENER REGISTRO SOCIAL DE HOGARES Y NO PERTENECER AL 90% DE MAYORES INGRESOS.", ln=1)
-    pdf.cell(0, 5, "BONIFICACIÓN POR AÑO COTIZADO SE COMIENZA A PAGAR A LOS 9 MESES DE PUBLICADA LA LEY. LA BONIFICACIÓN SON 0.1 UF POR AÑO COTIZADO...", ln=1)
-    
+    pdf.set_font(FUENTE_REPORTE, "I", 8)
+    pdf.set_text_color(*COLOR_GRIS_TEXTO)
+    for nota in NOTAS_PIE_REPORTE:
+        pdf.cell(0, 5, nota, ln=1)
+
     return bytes(pdf.output())
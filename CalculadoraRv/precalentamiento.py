@@ -0,0 +1,122 @@
+import os
+import json
+import time
+import tempfile
+from dataclasses import replace
+
+from cotizacion import (
+    METODO_TASA_VENTA,
+    METODO_VTD,
+    Escenario,
+    ParametrosCotizacion,
+    calcular_factores_cotizacion,
+    escalar_cotizacion,
+)
+from micro_lotes import cotizar_lote
+from modelos import Afiliado, Conyuge, Hijo, PCT_PENSION_CONYUGE, PCT_PENSION_HIJO
+from pdf_generator import create_native_pdf_report
+
+# --- PRECALENTAMIENTO V60.0: ARRANQUE EN FRÍO INVISIBLE PARA EL ASESOR ---
+# Al desplegar, el primer asesor que llega a cada proceso pagaba la lectura
+# de los xlsx, las importaciones y los primeros llamados a los motores
+# (flujos, vectores de descuento, tasas de venta, fpdf). 'precalentar_motor'
+# corre unas cotizaciones sintéticas (Vejez con familia y comparador,
+# Invalidez con VTD, Sobrevivencia) por los dos motores (perfil a perfil y
+# micro-lotes) y arma un PDF; si alguna falla, el proceso NO está listo.
+# 'marcar_listo' publica un archivo de disponibilidad (sonda de readiness
+# del orquestador) y 'desmarcar_listo' lo retira al apagar.
+# Lo usan servicio_cotizacion.py (antes de crear los procesos) e
+# iniciar_app.py (antes de levantar Streamlit).
+
+
+def cotizaciones_sinteticas():
+    """Cotizaciones que recorren los caminos del motor (tasa de venta, VTD, familias y Sobrevivencia)."""
+    base = ParametrosCotizacion(
+        input_afiliado_nombre='PRECALENTAMIENTO',
+        input_valor_uf_clp=39600.0,
+        saldo_uf=3000.0,
+        input_afp_nombre='AFP HABITAT',
+        input_tasa_rp=3.41,
+        input_metodo_rvi=METODO_TASA_VENTA,
+        input_cia_rvi='Media Mercado',
+        check_comparar_todas=True,
+        check_incluye_comision=False,
+        input_comision_pct=0.0,
+        input_valor_pgu_clp=224004.0,
+        check_incluye_pgu=False,
+        check_incluye_bono=False,
+        input_bonificacion_uf=0.0,
+        afiliado_tipo_pension='Vejez (Edad Legal)',
+        afiliado_edad_calculada=65,
+        input_pension_referencia_uf=0.0,
+        input_promedio_10_anos_uf=0.0,
+        datos_afiliado=Afiliado(edad=65, sexo='Hombre', es_invalido=False),
+        datos_conyuge=Conyuge(edad=62, sexo='Mujer', pct_pension=PCT_PENSION_CONYUGE, es_invalido=False),
+        datos_hijos=(Hijo(edad=15, sexo='Mujer', pct_pension=PCT_PENSION_HIJO, edad_limite=24),),
+        check_rp=True,
+        check_rvi_simple=True,
+        escenarios=(Escenario('Escenario A', 10, 1, 0),),
+        check_rp_rvd=True,
+        n_anos_diferimiento=3,
+    )
+    invalidez = replace(
+        base, input_metodo_rvi=METODO_VTD, input_cia_rvi=None, check_comparar_todas=False,
+        afiliado_tipo_pension='Invalidez', afiliado_edad_calculada=60,
+        datos_afiliado=Afiliado(edad=60, sexo='Mujer', es_invalido=True),
+        datos_conyuge=None, datos_hijos=(), check_rp_rvd=False,
+    )
+    sobrevivencia = replace(
+        base, check_comparar_todas=False, afiliado_tipo_pension='Sobrevivencia', afiliado_edad_calculada=0,
+        input_pension_referencia_uf=20.0, datos_afiliado=None, escenarios=(), check_rp_rvd=False,
+    )
+    return base, invalidez, sobrevivencia
+
+
+def precalentar_motor(datos_mercado):
+    """
+    Corre las cotizaciones sintéticas y un PDF con 'datos_mercado'.
+    Devuelve los milisegundos de cada etapa; RuntimeError si alguna falla.
+    """
+    parametros = cotizaciones_sinteticas()
+    tiempos = {}
+    inicio = time.perf_counter()
+    try:
+        resultados = [
+            escalar_cotizacion(p, datos_mercado, calcular_factores_cotizacion(p, datos_mercado))
+            for p in parametros
+        ]
+        tiempos['perfil_a_perfil_ms'] = (time.perf_counter() - inicio) * 1000.0
+
+        inicio = time.perf_counter()
+        errores = [r for r in cotizar_lote(list(parametros), datos_mercado) if isinstance(r, Exception)]
+        if errores:
+            raise errores[0]
+        tiempos['micro_lotes_ms'] = (time.perf_counter() - inicio) * 1000.0
+    except Exception as e:
+        raise RuntimeError(f"La cotización sintética de precalentamiento falló: {e}") from e
+
+    inicio = time.perf_counter()
+    create_native_pdf_report(resultados[0].report_data)
+    tiempos['pdf_ms'] = (time.perf_counter() - inicio) * 1000.0
+    return {clave: round(valor, 2) for clave, valor in tiempos.items()}
+
+
+def marcar_listo(ruta, informacion=None):
+    """Escribe (atómicamente) el archivo de disponibilidad con 'informacion' en JSON."""
+    directorio = os.path.dirname(os.path.abspath(ruta))
+    os.makedirs(directorio, exist_ok=True)
+    descriptor, temporal = tempfile.mkstemp(dir=directorio, prefix='.listo-')
+    try:
+        with os.fdopen(descriptor, 'w', encoding='utf-8') as f:
+            json.dump({'pid': os.getpid(), 'fecha': time.strftime('%Y-%m-%dT%H:%M:%S'), **(informacion or {})}, f)
+        os.replace(temporal, ruta)
+    except BaseException:
+        os.unlink(temporal)
+        raise
+
+
+def desmarcar_listo(ruta):
+    try:
+        os.remove(ruta)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,187 @@
+import os
+import numpy as np
+import pandas as pd
+
+from cartera import agrupar_perfiles, columna_numerica, grupos_desde_dataframe
+from estres_longevidad import EscenarioEstres, componentes_flujos, largo_flujos, tensor_px_estres
+from modelos import LoteGrupos
+from motor_vectorial import N_PLAZOS, flujos_sobrevivencia, matriz_px
+from reservas_en_vigor import TAMANO_BLOQUE, anos_transcurridos, bloques, envejecer_polizas
+from valorizacion_por_lotes import pa, pq, requerir_pyarrow # pyarrow es opcional (solo para Parquet)
+
+# --- PROYECCIÓN DE FLUJOS DE CARTERA V54.0 (CALCE ACTIVO-PASIVO) ---
+# Flujos esperados agregados (UF) de una cartera de pensionados por año (o
+# mes) futuro, separados en:
+#   fase_afiliado      -> pensión mientras el afiliado vive
+#   fase_sobrevivencia -> % de pensión de los beneficiarios tras su muerte
+#   periodo_garantizado -> pago cierto adicional dentro del PG
+# con la misma lógica de supervivencia que 'calcular_factores_combinados'
+# (f = s_af + pago_sob * (1 - s_af), max(f, 1) dentro del PG) y el aumento
+# temporal aplicado a los primeros años. La suma descontada de 'total_uf'
+# es la suma de las reservas de reservas_en_vigor.py.
+# Nada se materializa por afiliado: las pólizas se agrupan por (perfil, PG,
+# aumento, grupo) sumando sus pensiones, y cada bloque acumula en arreglos
+# fijos (grupos x años). Entrada: las columnas de reservas_en_vigor.py; sin
+# 'fecha_valorizacion' las edades, el PG y los años de aumento se toman como
+# los vigentes hoy (no se usa 'fecha_inicio').
+
+COLUMNAS_FASES = ("fase_afiliado_uf", "fase_sobrevivencia_uf", "periodo_garantizado_uf")
+MAX_ELEMENTOS_BLOQUE = 4_000_000 # combinaciones x años por paso de acumulación
+
+
+def _polizas_vigentes(df_polizas, fecha_valorizacion):
+    """(cartera a la fecha, PG restante, años de aumento restantes) de las pólizas en vigor."""
+    pg = columna_numerica(df_polizas, 'pg_anos').astype(np.int64)
+    anos_aumento = columna_numerica(df_polizas, 'anos_aumento').astype(np.int64)
+    if fecha_valorizacion is None:
+        return df_polizas, pg, anos_aumento
+    transcurridos = anos_transcurridos(df_polizas['fecha_inicio'], fecha_valorizacion)
+    vigentes = transcurridos >= 0
+    transcurridos = transcurridos[vigentes]
+    return (
+        envejecer_polizas(df_polizas[vigentes], transcurridos),
+        np.maximum(pg[vigentes] - transcurridos, 0),
+        np.maximum(anos_aumento[vigentes] - transcurridos, 0)
+    )
+
+
+def _componentes_perfiles(perfiles, tablas_mortalidad, exacto):
+    """(lote, s_afiliado (U, n), pago_sobrevivencia (U, n)) de los perfiles."""
+    lote = LoteGrupos.desde_registros(perfiles)
+    px = matriz_px(tablas_mortalidad)
+    pago = None
+    if exacto:
+        pago = np.zeros((len(perfiles), N_PLAZOS), dtype=float)
+        for j, (_, conyuge, hijos) in enumerate(perfiles):
+            f = flujos_sobrevivencia(conyuge, hijos, tablas_mortalidad, exacto=True)
+            pago[j, :len(f)] = f
+    s_afiliado, pago = componentes_flujos(lote, tensor_px_estres(px, (EscenarioEstres("Base"),)), px, pago_sobrevivencia=pago)
+    return lote, s_afiliado[0], pago[0]
+
+
+class _Acumulador:
+    """Arreglos (grupos, fases, años) que crecen solo cuando aparece un grupo nuevo."""
+
+    def __init__(self, n):
+        self.n = n
+        self.claves = {}
+        self.valores = np.zeros((0, len(COLUMNAS_FASES), n), dtype=float)
+        self.polizas = np.zeros(0, dtype=np.int64)
+
+    def indices(self, claves):
+        nuevas = [c for c in dict.fromkeys(claves) if c not in self.claves]
+        for clave in nuevas:
+            self.claves[clave] = len(self.claves)
+        if nuevas:
+            self.valores = np.concatenate([self.valores, np.zeros((len(nuevas),) + self.valores.shape[1:])])
+            self.polizas = np.concatenate([self.polizas, np.zeros(len(nuevas), dtype=np.int64)])
+        return np.array([self.claves[c] for c in claves], dtype=np.int64)
+
+
+def _acumular_bloque(acumulador, df_bloque, tablas_mortalidad, fecha_valorizacion, por, exacto):
+    df, pg, anos_aumento = _polizas_vigentes(df_bloque, fecha_valorizacion)
+    if df.empty:
+        return
+    perfiles, indice = agrupar_perfiles(grupos_desde_dataframe(df))
+    lote, s_afiliado, pago = _componentes_perfiles(perfiles, tablas_mortalidad, exacto)
+    largo = largo_flujos(lote)
+
+    combinaciones = pd.DataFrame({
+        "perfil": indice,
+        "pg": pg,
+        "anos_aumento": anos_aumento,
+        "pct_aumento": columna_numerica(df, 'pct_aumento'),
+        "grupo": df[por].fillna('').to_numpy() if por else 0, # Celda vacía = grupo '' (no se pierde)
+        "pension_uf": df['pension_uf'].to_numpy(dtype=float),
+    }).groupby(["perfil", "pg", "anos_aumento", "pct_aumento", "grupo"], sort=False, dropna=False).agg(
+        pension_uf=("pension_uf", "sum"), polizas=("pension_uf", "size")
+    ).reset_index()
+    grupo = acumulador.indices(combinaciones["grupo"].tolist())
+    np.add.at(acumulador.polizas, grupo, combinaciones["polizas"].to_numpy())
+
+    n = acumulador.n
+    t = np.arange(n)
+    paso = max(1, MAX_ELEMENTOS_BLOQUE // n)
+    for inicio in range(0, len(combinaciones), paso):
+        c = combinaciones.iloc[inicio:inicio + paso]
+        j = c["perfil"].to_numpy()
+        sa, ps = s_afiliado[j], pago[j]
+        contingente = sa + ps * (1.0 - sa)
+        pg_c = np.minimum(c["pg"].to_numpy(), largo[j])
+        garantizado = np.where(t < pg_c[:, None], 1.0 - contingente, 0.0)
+        # Pago anual (UF) con el aumento temporal en los primeros años
+        peso = 12.0 * c["pension_uf"].to_numpy()[:, None] * np.where(
+            t < c["anos_aumento"].to_numpy()[:, None], 1 + c["pct_aumento"].to_numpy()[:, None] / 100.0, 1.0
+        )
+        fases = np.stack([sa * peso, ps * (1.0 - sa) * peso, garantizado * peso], axis=1)
+        np.add.at(acumulador.valores, grupo[inicio:inicio + paso], fases)
+
+
+def proyectar_flujos(
+    fuente,
+    tablas_mortalidad,
+    fecha_valorizacion=None,
+    frecuencia='anual',
+    por=None,
+    tamano_bloque=TAMANO_BLOQUE,
+    exacto=False
+    ):
+    """
+    Flujos esperados agregados de la cartera (UF por periodo), una fila por
+    grupo ('por': columna de la cartera, p.ej. 'compania'; None = total) y
+    periodo. 'fuente': DataFrame (en bloques de 'tamano_bloque') o iterable
+    de DataFrames. Con 'fecha_valorizacion' se agrega la fecha de cada pago.
+    """
+    acumulador = _Acumulador(N_PLAZOS)
+    for bloque in bloques(fuente, tamano_bloque):
+        _acumular_bloque(acumulador, bloque, tablas_mortalidad, fecha_valorizacion, por, exacto)
+
+    # Se recortan los años finales sin flujo en ningún grupo
+    con_flujo = np.flatnonzero(acumulador.valores.sum(axis=(0, 1)) > 0)
+    n = con_flujo[-1] + 1 if len(con_flujo) else 0
+    valores = acumulador.valores[..., :n]
+    if frecuencia == 'mensual':
+        valores = np.repeat(valores / 12.0, 12, axis=-1)
+    elif frecuencia != 'anual':
+        raise ValueError(f"Frecuencia no soportada: {frecuencia}")
+    G, _, P = valores.shape
+
+    proyeccion = pd.DataFrame({"periodo": np.tile(np.arange(P), G)})
+    if frecuencia == 'mensual':
+        proyeccion["ano"] = proyeccion["periodo"] // 12
+    if fecha_valorizacion is not None:
+        paso = pd.DateOffset(months=1) if frecuencia == 'mensual' else pd.DateOffset(years=1)
+        proyeccion["fecha"] = np.tile(pd.date_range(pd.Timestamp(fecha_valorizacion), periods=P, freq=paso), G)
+    for k, columna in enumerate(COLUMNAS_FASES):
+        proyeccion[columna] = valores[:, k].ravel()
+    proyeccion["total_uf"] = valores.sum(axis=1).ravel()
+    if por:
+        proyeccion.insert(0, por, np.repeat(list(acumulador.claves), P))
+    proyeccion.attrs['polizas'] = int(acumulador.polizas.sum())
+    return proyeccion
+
+
+def como_tabla_arrow(proyeccion, metadatos=None):
+    """pyarrow.Table de la proyección (metadatos -> metadatos del esquema)."""
+    if pa is None:
+        raise ImportError("pyarrow no está instalado: use escribir_proyeccion (CSV).")
+    tabla = pa.Table.from_pandas(proyeccion, preserve_index=False)
+    if metadatos:
+        tabla = tabla.replace_schema_metadata({
+            **(tabla.schema.metadata or {}), **{str(k): str(v) for k, v in metadatos.items()}
+        })
+    return tabla
+
+
+def escribir_proyeccion(proyeccion, ruta, metadatos=None):
+    """
+    Escribe la proyección en Parquet (si la ruta termina en .parquet; exige
+    pyarrow) o en CSV. Devuelve la ruta efectivamente escrita.
+    """
+    if ruta.lower().endswith('.parquet'):
+        requerir_pyarrow(ruta)
+        pq.write_table(como_tabla_arrow(proyeccion, metadatos), ruta)
+        return ruta
+    ruta_csv = os.path.splitext(ruta)[0] + '.csv'
+    proyeccion.to_csv(ruta_csv, index=False)
+    return ruta_csv
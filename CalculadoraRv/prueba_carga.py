@@ -0,0 +1,412 @@
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import platform
+import subprocess
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from urllib.parse import urlsplit
+import numpy as np
+import pandas as pd
+
+from carga_servicio import cliente
+from registro_datos import BASE_DIR
+
+# --- PRUEBA DE CARGA V59.0: SESIONES CONCURRENTES Y CLIENTES DE LA API ---
+# Reproduce cotizaciones realistas (tipos de pensión, familias, comparador
+# y PDF sí/no; ver 'configuraciones_realistas') con N usuarios simultáneos
+# contra:
+#   app  -> app.py con el arnés de pruebas de Streamlit (AppTest): cada
+#           cotización es una sesión nueva que llena el panel lateral y
+#           aprieta 'Generar Informe Comparativo' (un proceso por usuario:
+#           el arnés no admite sesiones concurrentes en hilos).
+#   http -> cualquier front HTTP con la API de servicio_cotizacion.py.
+# Reporta throughput, percentiles de latencia y memoria por sesión (RSS
+# del proceso, o del servidor y sus procesos con --pid) y guarda el
+# resultado en JSON (resultados_carga/) para comparar entre versiones:
+#   python prueba_carga.py app --cotizaciones 40 --concurrencia 4
+#   python prueba_carga.py http --url http://127.0.0.1:8080 --pid 1234
+#   python prueba_carga.py comparar resultados_carga/*.json
+
+DIRECTORIO_RESULTADOS = os.path.join(BASE_DIR, 'resultados_carga')
+RUTA_APP = os.path.join(BASE_DIR, 'app.py')
+TIEMPO_MAXIMO_SESION_S = 120
+
+# Mezcla de cotizaciones (proporciones aproximadas de un día de campaña)
+PESOS_TIPO_PENSION = {
+    'Vejez (Edad Legal)': 0.55, 'Vejez Anticipada': 0.15, 'Invalidez': 0.15, 'Sobrevivencia': 0.15,
+}
+PESOS_FAMILIA = {'solo': 0.35, 'conyuge': 0.40, 'conyuge_hijos': 0.15, 'hijos': 0.10}
+PROBABILIDAD_COMPARADOR = 0.30
+PROBABILIDAD_PDF = 0.40
+PROBABILIDAD_VTD = 0.30
+PROBABILIDAD_RP_RVD = 0.20
+ESCENARIOS_APP = (('A', 'a'), ('B', 'b'), ('C', 'c'))
+
+# Respuestas válidas: informe generado o cotización rechazada por la regla de
+# negocio (p.ej. Vejez Anticipada sin requisito -> st.error / HTTP 422)
+ESTADOS_VALIDOS = ('ok', 'error_cotizacion', '200', '422')
+METRICAS = ('por_segundo', 'p50_ms', 'p90_ms', 'p95_ms', 'p99_ms', 'max_ms', 'errores', 'memoria_por_sesion_mb')
+
+
+def _elegir(rng, pesos):
+    return rng.choices(list(pesos), weights=list(pesos.values()))[0]
+
+
+def configuraciones_realistas(n, semilla=0):
+    """
+    'n' cotizaciones en el JSON de servicio_cotizacion.py, con dos marcas
+    adicionales: 'pdf' (pedir el PDF) y 'familia'. El comparador solo se
+    activa con tasa de venta; Sobrevivencia siempre lleva beneficiarios.
+    """
+    rng = random.Random(semilla)
+    configuraciones = []
+    for _ in range(n):
+        tipo = _elegir(rng, PESOS_TIPO_PENSION)
+        familia = _elegir(rng, PESOS_FAMILIA)
+        if tipo == 'Sobrevivencia' and familia == 'solo':
+            familia = 'conyuge'
+        edad = rng.randint(55, 60) if tipo == 'Vejez Anticipada' else rng.randint(60, 75)
+        metodo = 'vtd' if rng.random() < PROBABILIDAD_VTD else 'tasa_venta'
+        config = {
+            'nombre': 'PRUEBA DE CARGA',
+            'saldo_uf': rng.randrange(1000, 8000, 50),
+            'tipo_pension': tipo,
+            'metodo_rvi': metodo,
+            'comparar_todas': metodo == 'tasa_venta' and rng.random() < PROBABILIDAD_COMPARADOR,
+            'escenarios': [
+                {'nombre': f"Escenario {letra}", 'pg_anos': rng.choice((0, 5, 10, 15)),
+                 'anos_aumento': rng.randint(1, 3), 'pct_aumento': rng.choice((0, 50, 100))}
+                for letra, _ in ESCENARIOS_APP[:rng.randint(0, 3)]
+            ],
+            'rp_rvd': tipo != 'Sobrevivencia' and rng.random() < PROBABILIDAD_RP_RVD,
+            'pdf': rng.random() < PROBABILIDAD_PDF,
+            'familia': familia,
+        }
+        if tipo != 'Sobrevivencia':
+            config['afiliado'] = {'edad': edad, 'sexo': rng.choice(('Hombre', 'Mujer'))}
+        else:
+            config['pension_referencia_uf'] = float(rng.randrange(10, 40))
+        if tipo == 'Vejez Anticipada':
+            config['promedio_10_anos_uf'] = float(rng.randrange(10, 40))
+        if familia in ('conyuge', 'conyuge_hijos'):
+            config['conyuge'] = {'edad': max(edad + rng.randint(-8, 4), 40), 'sexo': rng.choice(('Hombre', 'Mujer'))}
+        if familia in ('conyuge_hijos', 'hijos'):
+            config['hijos'] = [
+                {'edad': rng.randint(5, 23), 'sexo': rng.choice(('Hombre', 'Mujer')), 'edad_limite': 24}
+                for _ in range(rng.randint(1, 3))
+            ]
+        configuraciones.append(config)
+    return configuraciones
+
+
+# --- 1. MEMORIA Y RESUMEN ---
+def _hijos_de(pid):
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [int(p) for p in f.read().split()]
+    except OSError:
+        return []
+
+
+def rss_mb(pid=None, con_hijos=False):
+    """RSS (MB) de un proceso (por defecto, este) y opcionalmente de sus hijos. None fuera de Linux."""
+    pid = pid or os.getpid()
+    total = 0
+    for p in [pid] + (_hijos_de(pid) if con_hijos else []):
+        try:
+            with open(f"/proc/{p}/status") as f:
+                total += next(int(l.split()[1]) for l in f if l.startswith('VmRSS:'))
+        except (OSError, StopIteration):
+            if p == pid:
+                return None
+    return total / 1024.0
+
+
+def resumir(latencias_s, estados, segundos, concurrencia, **extra):
+    """Throughput, percentiles (ms) y conteo de estados de una corrida."""
+    ms = np.asarray(latencias_s, dtype=float) * 1000.0
+    percentiles = np.percentile(ms, [50, 90, 95, 99]) if len(ms) else [np.nan] * 4
+    exitos = sum(v for k, v in estados.items() if str(k) in ESTADOS_VALIDOS)
+    return {
+        'cotizaciones': int(sum(estados.values())),
+        'concurrencia': concurrencia,
+        'segundos': round(segundos, 3),
+        'por_segundo': round(exitos / segundos, 2) if segundos else None,
+        **{f"p{q}_ms": round(float(v), 2) for q, v in zip((50, 90, 95, 99), percentiles)},
+        'max_ms': round(float(ms.max()), 2) if len(ms) else None,
+        'errores': int(sum(estados.values()) - exitos),
+        'estados': {str(k): v for k, v in sorted(estados.items(), key=str)},
+        **extra,
+    }
+
+
+# --- 2. OBJETIVO HTTP ---
+def _ruta_http(config):
+    if config.get('pdf'):
+        return '/pdf'
+    return '/comparar' if config.get('comparar_todas') else '/cotizar'
+
+
+def _solicitud_http(config):
+    """(ruta, cuerpo JSON) de una configuración: 'pdf' y 'familia' no son de la API."""
+    return _ruta_http(config), {k: v for k, v in config.items() if k not in ('pdf', 'familia')}
+
+
+def carga_http(url, configuraciones, concurrencia=8, pid_servidor=None):
+    """
+    Corre las cotizaciones contra un front HTTP con 'concurrencia' clientes
+    keep-alive. Con 'pid_servidor' mide la memoria del servidor y sus procesos.
+    """
+    partes = urlsplit(url)
+    latencias, estados = [], Counter()
+    memoria_antes = rss_mb(pid_servidor, con_hijos=True) if pid_servidor else None
+
+    async def _correr():
+        await asyncio.gather(*[
+            cliente(
+                partes.hostname, partes.port or 80,
+                [_solicitud_http(c) for c in configuraciones[k::concurrencia]], latencias, estados
+            )
+            for k in range(concurrencia)
+        ])
+
+    inicio = time.perf_counter()
+    asyncio.run(_correr())
+    segundos = time.perf_counter() - inicio
+    memoria = rss_mb(pid_servidor, con_hijos=True) if pid_servidor else None
+    return resumir(
+        latencias, estados, segundos, concurrencia,
+        objetivo='http', url=url,
+        memoria_servidor_mb=None if memoria is None else round(memoria, 1),
+        memoria_por_sesion_mb=None if memoria is None else round((memoria - memoria_antes) / concurrencia, 2),
+    )
+
+
+# --- 3. OBJETIVO APP (AppTest) ---
+def _fecha_con_edad(edad, hoy=None):
+    hoy = hoy or date.today()
+    return date(hoy.year - edad, hoy.month, min(hoy.day, 28))
+
+
+def ajustes_app(config):
+    """
+    Interacciones del asesor en el panel lateral, en orden:
+    (tipo de widget, etiqueta o clave, valor). Cada una es un rerun.
+    """
+    ajustes = [('number_input', 'Saldo Acumulado (UF)', int(config['saldo_uf']))]
+    if config['metodo_rvi'] == 'vtd':
+        ajustes.append(('radio', 'Método de Cálculo RVI', 'Vector de Descuento (Tarificador CMF)'))
+    elif config.get('comparar_todas'):
+        ajustes.append(('checkbox', 'Comparar todas las Compañías (RVI Simple)', True))
+    ajustes.append(('selectbox', 'Tipo de Pensión', config['tipo_pension']))
+    if 'afiliado' in config:
+        ajustes.append(('date_input', 'Fecha de Nac. Afiliado', _fecha_con_edad(config['afiliado']['edad'])))
+        ajustes.append(('selectbox', 'Sexo Afiliado', config['afiliado']['sexo']))
+    if 'promedio_10_anos_uf' in config:
+        ajustes.append(('number_input', 'Promedio Imponible 10 Años (UF)', config['promedio_10_anos_uf']))
+    if 'pension_referencia_uf' in config:
+        ajustes.append(('number_input', 'Pensión de Referencia (UF)', config['pension_referencia_uf']))
+    if 'conyuge' in config:
+        ajustes.append(('checkbox', 'Incluir Cónyuge Beneficiario', True))
+        ajustes.append(('date_input', 'Fecha de Nac. Cónyuge', _fecha_con_edad(config['conyuge']['edad'])))
+        ajustes.append(('selectbox', 'Sexo Cónyuge', config['conyuge']['sexo']))
+    hijos = config.get('hijos') or []
+    if hijos:
+        ajustes.append(('number_input', 'Número de Hijos (menores de 18/24)', len(hijos)))
+        for i, hijo in enumerate(hijos):
+            ajustes.append(('date_input', f"dob_h_{i}", _fecha_con_edad(hijo['edad'])))
+            ajustes.append(('selectbox', f"sexo_h_{i}", hijo['sexo']))
+    for (letra, clave), esc in zip(ESCENARIOS_APP, config.get('escenarios') or []):
+        ajustes.append(('checkbox', f"Activar Escenario {letra}", True))
+        ajustes.append(('slider', f"{clave}_pg", esc['pg_anos']))
+        ajustes.append(('slider', f"{clave}_pct", esc['pct_aumento']))
+        ajustes.append(('slider', f"{clave}_anos", esc['anos_aumento']))
+    if config.get('rp_rvd'):
+        ajustes.append(('checkbox', 'Activar Escenario RP-RVD', True))
+    return ajustes
+
+
+def _widget(at, tipo, etiqueta):
+    for widget in getattr(at, tipo):
+        if widget.key == etiqueta or widget.label == etiqueta:
+            return widget
+    raise LookupError(f"No se encontró el widget {tipo} '{etiqueta}'.")
+
+
+def sesion_app(config, ruta_app=RUTA_APP):
+    """
+    Una sesión de asesor: abre la app, llena el panel y genera el informe.
+    Devuelve (AppTest, segundos del botón, segundos de la sesión, estado).
+    El PDF lo genera siempre el botón; 'pdf' no cambia nada aquí.
+    """
+    from streamlit.testing.v1 import AppTest
+
+    inicio = time.perf_counter()
+    at = AppTest.from_file(ruta_app, default_timeout=TIEMPO_MAXIMO_SESION_S).run()
+    for tipo, etiqueta, valor in ajustes_app(config):
+        widget = _widget(at, tipo, etiqueta)
+        if tipo == 'checkbox':
+            widget.check() if valor else widget.uncheck()
+        else:
+            widget.set_value(valor)
+        at.run()
+    inicio_boton = time.perf_counter()
+    at.button(key='generar_informe').click().run()
+    fin = time.perf_counter()
+
+    if at.exception:
+        estado = 'excepcion'
+    elif at.error:
+        estado = 'error_cotizacion'
+    else:
+        estado = 'ok' if at.session_state['report_generated'] else 'sin_informe'
+    return at, fin - inicio_boton, fin - inicio, estado
+
+
+def _usuario_app(configuraciones, ruta_app):
+    """
+    Un asesor (proceso propio): calienta módulos y datos con una sesión
+    fuera de la medición y luego corre sus cotizaciones una tras otra,
+    manteniendo las sesiones abiertas para medir su memoria.
+    """
+    sesion_app(configuraciones[0], ruta_app)
+    memoria_antes = rss_mb()
+    sesiones, latencias, duraciones, estados = [], [], [], Counter()
+    inicio = time.time()
+    for config in configuraciones:
+        try:
+            at, latencia, duracion, estado = sesion_app(config, ruta_app)
+        except Exception as e:
+            estados[f"falla: {type(e).__name__}"] += 1
+            continue
+        sesiones.append(at)
+        latencias.append(latencia)
+        duraciones.append(duracion)
+        estados[estado] += 1
+    fin = time.time()
+    memoria = rss_mb()
+    crecimiento = None if memoria is None else memoria - memoria_antes
+    return latencias, duraciones, estados, inicio, fin, memoria, crecimiento, len(sesiones)
+
+
+def carga_app(configuraciones, concurrencia=4, ruta_app=RUTA_APP):
+    """
+    Corre cada cotización como una sesión de AppTest con 'concurrencia'
+    usuarios en paralelo. El arnés de Streamlit no admite sesiones en
+    hilos del mismo proceso, así que cada usuario es un proceso.
+    Latencia = rerun del botón 'Generar Informe'; memoria por sesión =
+    crecimiento del RSS con las sesiones abiertas / número de sesiones.
+    """
+    latencias, duraciones, estados = [], [], Counter()
+    inicios, fines, memorias, crecimientos, abiertas = [], [], [], [], 0
+    grupos = [configuraciones[k::concurrencia] for k in range(concurrencia) if configuraciones[k::concurrencia]]
+    with ProcessPoolExecutor(len(grupos)) as ejecutor:
+        for lat, dur, est, inicio, fin, memoria, crecimiento, n in ejecutor.map(
+            _usuario_app, grupos, [ruta_app] * len(grupos)
+        ):
+            latencias += lat
+            duraciones += dur
+            estados.update(est)
+            inicios.append(inicio)
+            fines.append(fin)
+            if memoria is not None:
+                memorias.append(memoria)
+                crecimientos.append(crecimiento)
+            abiertas += n
+    return resumir(
+        latencias, estados, max(fines) - min(inicios), concurrencia,
+        objetivo='app', ruta_app=ruta_app,
+        sesion_media_s=round(float(np.mean(duraciones)), 3) if duraciones else None,
+        memoria_proceso_mb=round(float(np.mean(memorias)), 1) if memorias else None,
+        memoria_por_sesion_mb=round(sum(crecimientos) / abiertas, 2) if memorias and abiertas else None,
+    )
+
+
+# --- 4. RESULTADOS ENTRE VERSIONES ---
+def version_codigo():
+    """Commit de git del código probado (o 'sin-version')."""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'sin-version'
+
+
+def guardar_resultado(resumen, directorio=DIRECTORIO_RESULTADOS, etiqueta=None, configuracion=None):
+    """Guarda la corrida en '<objetivo>-<etiqueta>-<fecha>.json'; devuelve la ruta."""
+    os.makedirs(directorio, exist_ok=True)
+    etiqueta = etiqueta or version_codigo()
+    registro = {
+        'etiqueta': etiqueta,
+        'fecha': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'cpus': os.cpu_count(),
+        'configuracion': configuracion or {},
+        'resumen': resumen,
+    }
+    ruta = os.path.join(directorio, f"{resumen['objetivo']}-{etiqueta}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(ruta, 'w', encoding='utf-8') as f:
+        json.dump(registro, f, indent=2, ensure_ascii=False)
+    return ruta
+
+
+def comparar_resultados(rutas):
+    """Tabla con las métricas de cada corrida (columnas) y la variación % contra la primera."""
+    columnas = {}
+    for ruta in rutas:
+        with open(ruta, encoding='utf-8') as f:
+            registro = json.load(f)
+        resumen = registro['resumen']
+        nombre = f"{resumen['objetivo']} {registro['etiqueta']} {registro['fecha']}"
+        columnas[nombre] = {m: resumen.get(m) for m in ('cotizaciones', 'concurrencia') + METRICAS}
+    tabla = pd.DataFrame(columnas).apply(pd.to_numeric, errors='coerce')
+    if tabla.shape[1] > 1:
+        base = tabla.iloc[:, 0]
+        for columna in tabla.columns[1:]:
+            tabla[f"{columna} (% vs 1ª)"] = ((tabla[columna] / base - 1) * 100).round(1)
+    return tabla
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prueba de carga de la app y de la API de cotización.")
+    sub = parser.add_subparsers(dest='comando', required=True)
+    for nombre in ('app', 'http'):
+        p = sub.add_parser(nombre)
+        p.add_argument('--cotizaciones', type=int, default=40 if nombre == 'app' else 2000)
+        p.add_argument('--concurrencia', type=int, default=4 if nombre == 'app' else 32)
+        p.add_argument('--semilla', type=int, default=0)
+        p.add_argument('--etiqueta', default=None, help="Nombre de la versión (por defecto, commit de git)")
+        p.add_argument('--directorio', default=DIRECTORIO_RESULTADOS)
+        p.add_argument('--no-guardar', action='store_true')
+    sub.choices['app'].add_argument('--ruta-app', default=RUTA_APP)
+    sub.choices['http'].add_argument('--url', default='http://127.0.0.1:8080')
+    sub.choices['http'].add_argument('--pid', type=int, default=None, help="PID del servidor (memoria)")
+    p = sub.add_parser('comparar')
+    p.add_argument('rutas', nargs='+')
+    args = parser.parse_args(argv)
+
+    if args.comando == 'comparar':
+        print(comparar_resultados(args.rutas).to_string())
+        return
+
+    configuraciones = configuraciones_realistas(args.cotizaciones, args.semilla)
+    if args.comando == 'app':
+        resumen = carga_app(configuraciones, args.concurrencia, args.ruta_app)
+    else:
+        resumen = carga_http(args.url, configuraciones, args.concurrencia, args.pid)
+    print(json.dumps(resumen, indent=2, ensure_ascii=False))
+    if not args.no_guardar:
+        configuracion = {'cotizaciones': args.cotizaciones, 'concurrencia': args.concurrencia, 'semilla': args.semilla}
+        print(f"Resultado guardado en {guardar_resultado(resumen, args.directorio, args.etiqueta, configuracion)}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
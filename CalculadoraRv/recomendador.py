@@ -0,0 +1,225 @@
+from dataclasses import dataclass
+from typing import Any
+import numpy as np
+import pandas as pd
+
+from utils import calcular_descuentos_clp
+from cartera import pension_mensual
+from cotizacion import AFP_COMMISSIONS, ErrorCotizacion
+from grilla_productos import (
+    RANGO_ANOS_AUMENTO,
+    RANGO_DIFERIMIENTO,
+    RANGO_PCT_AUMENTO,
+    RANGO_PG,
+    factores_grilla,
+    sumas_descontadas
+)
+from modelos import PCT_VEJEZ_ANTICIPADA
+from motor_vectorial import flujos_esperados, matriz_descuento_tasas, vector_descuento
+
+# --- RECOMENDADOR DE MODALIDADES V47.0 ---
+# Recorre todo el espacio de productos de una vez:
+#   RVI: compañía x P.G. x años de aumento x % aumento
+#   RP con RVD: compañía x años de diferimiento
+#   RP: con la comisión de la AFP
+# Los flujos del perfil se calculan una vez (caché de motor_vectorial.py) y
+# se valorizan con una matriz de descuento (una fila por compañía) y sumas
+# acumuladas (ver grilla_productos.py): decenas de miles de combinaciones en
+# milisegundos. Luego se aplican las restricciones del asesor y se devuelve
+# el frente de Pareto (líquido inicial, líquido permanente, meses
+# garantizados), ordenado.
+
+COMPANIA_REFERENCIA = 'Media Mercado' # No es una compañía contratable
+
+MODALIDAD_RP = "Retiro Programado"
+MODALIDAD_RVI = "Renta Vitalicia"
+MODALIDAD_RVD = "RP con RVD"
+
+COLUMNAS_OBJETIVO = ("Líquido Inicial ($)", "Líquido Permanente ($)", "Meses Garantizados")
+
+
+@dataclass(frozen=True)
+class RestriccionesAsesor:
+    """Condiciones mínimas que debe cumplir una modalidad para recomendarse."""
+    liquido_minimo_clp: float = 0.0           # Sobre la pensión líquida permanente (tras el aumento)
+    meses_garantizados_minimos: int = 0
+    exigir_vejez_anticipada: Any = None       # None: solo si la pensión es Vejez Anticipada
+
+
+def _tasas_companias(p, datos):
+    columna_tasa = 'Invalidez total' if p.afiliado_tipo_pension == 'Invalidez' else 'Vejez'
+    tasas = datos.df_tasas_venta[columna_tasa].dropna()
+    tasas = tasas[tasas.index != COMPANIA_REFERENCIA]
+    if tasas.empty:
+        raise ErrorCotizacion(f"No hay tasas de venta para la columna {columna_tasa}.")
+    return tasas
+
+
+def frente_pareto(objetivos):
+    """
+    Máscara (N,) de los puntos no dominados (todos los objetivos se maximizan).
+    La última columna debe ser discreta (p.ej. meses garantizados): dentro de
+    cada nivel se filtra el 'skyline' de las dos primeras columnas ordenando,
+    y los sobrevivientes se comparan todos contra todos.
+    """
+    objetivos = np.asarray(objetivos, dtype=float)
+    n = len(objetivos)
+    candidatos = []
+    for nivel in np.unique(objetivos[:, 2]):
+        idx = np.flatnonzero(objetivos[:, 2] == nivel)
+        a, b = objetivos[idx, 0], objetivos[idx, 1]
+        orden = np.lexsort((-b, -a))
+        b_ordenado = b[orden]
+        maximo_previo = np.concatenate(([-np.inf], np.maximum.accumulate(b_ordenado)[:-1]))
+        candidatos.append(idx[orden[b_ordenado > maximo_previo]])
+    candidatos = np.concatenate(candidatos) if candidatos else np.empty(0, dtype=np.int64)
+
+    sub = objetivos[candidatos]
+    dominado = np.zeros(len(sub), dtype=bool)
+    for inicio in range(0, len(sub), 1024):
+        bloque = sub[inicio:inicio + 1024]
+        mayor_igual = (sub[None, :, :] >= bloque[:, None, :]).all(axis=2)
+        mayor = (sub[None, :, :] > bloque[:, None, :]).any(axis=2)
+        dominado[inicio:inicio + 1024] = (mayor_igual & mayor).any(axis=1)
+
+    mascara = np.zeros(n, dtype=bool)
+    mascara[candidatos[~dominado]] = True
+    return mascara
+
+
+def candidatos_modalidades(
+    p,
+    datos,
+    pgs=RANGO_PG,
+    anos_aumento=RANGO_ANOS_AUMENTO,
+    pcts_aumento=RANGO_PCT_AUMENTO,
+    diferimientos=RANGO_DIFERIMIENTO
+    ):
+    """
+    Todas las combinaciones de modalidad, compañía y parámetros, con su
+    pensión (UF) inicial y permanente. Un DataFrame con una fila por producto.
+    """
+    if p.datos_afiliado is None:
+        raise ErrorCotizacion("El recomendador no aplica en modo Sobrevivencia.")
+    comision_decimal = p.input_comision_pct / 100.0 if p.check_incluye_comision else 0.0
+    if comision_decimal >= 1:
+        raise ErrorCotizacion("Error: Comisión del 100% no es válida.")
+    prima_neta_rp = p.saldo_uf
+    prima_neta_rvi = p.saldo_uf * (1 - comision_decimal)
+    comision_afp = AFP_COMMISSIONS.get(p.input_afp_nombre, 0.0) / 100.0
+
+    tasas = _tasas_companias(p, datos)
+    companias = tasas.index.to_numpy()
+    flujos = flujos_esperados(
+        p.datos_afiliado, p.datos_conyuge, p.datos_hijos, datos.tablas_mortalidad, 0, p.check_sobrevivencia_exacta
+    )
+    L = len(flujos)
+    V, W = sumas_descontadas(flujos, matriz_descuento_tasas(tasas.to_numpy() / 100.0, n=max(L, 1)))
+    V_rp, _ = sumas_descontadas(flujos, vector_descuento('RP', p.input_tasa_rp / 100.0, n=max(L, 1)))
+
+    bloques = []
+
+    # RVI sin aumento (compañía x PG): los años de aumento no influyen
+    pg = np.asarray(pgs)
+    ft, fd = factores_grilla(V, W, pg, np.zeros_like(pg))
+    pension = pension_mensual(prima_neta_rvi, ft + fd)
+    K, P = pension.shape
+    bloques.append(pd.DataFrame({
+        "Modalidad": MODALIDAD_RVI,
+        "Compañía": np.repeat(companias, P),
+        "PG (años)": np.tile(pg, K),
+        "Años Aumento": 0,
+        "% Aumento": 0,
+        "Años RP (N)": 0,
+        "Pensión Inicial (UF)": pension.ravel(),
+        "Pensión Permanente (UF)": pension.ravel(),
+    }))
+
+    # RVI con aumento temporal (compañía x PG x años x %)
+    pcts = np.asarray([pct for pct in pcts_aumento if pct > 0])
+    if len(pcts):
+        anos = np.asarray(anos_aumento)
+        ft, fd = factores_grilla(V, W, pg[:, None, None], anos[None, :, None])
+        factor_pct = 1 + pcts / 100.0
+        pension_ref = pension_mensual(prima_neta_rvi, ft * factor_pct + fd)
+        forma = pension_ref.shape
+        bloques.append(pd.DataFrame({
+            "Modalidad": MODALIDAD_RVI,
+            "Compañía": np.broadcast_to(companias[:, None, None, None], forma).ravel(),
+            "PG (años)": np.broadcast_to(pg[None, :, None, None], forma).ravel(),
+            "Años Aumento": np.broadcast_to(anos[None, None, :, None], forma).ravel(),
+            "% Aumento": np.broadcast_to(pcts[None, None, None, :], forma).ravel(),
+            "Años RP (N)": 0,
+            "Pensión Inicial (UF)": (pension_ref * factor_pct).ravel(),
+            "Pensión Permanente (UF)": pension_ref.ravel(),
+        }))
+
+    # RP con RVD (compañía x N): mismo pago en ambos tramos
+    N = np.minimum(np.asarray(diferimientos), L)
+    factor_hibrido = V_rp[N][None, :] + (V[:, L, None] - V[:, N]) / (1 - comision_decimal)
+    pension = pension_mensual(prima_neta_rp, factor_hibrido)
+    pension_rp_neta = pension - pension * comision_afp
+    bloques.append(pd.DataFrame({
+        "Modalidad": MODALIDAD_RVD,
+        "Compañía": np.repeat(companias, len(N)),
+        "PG (años)": 0,
+        "Años Aumento": 0,
+        "% Aumento": 0,
+        "Años RP (N)": np.tile(np.asarray(diferimientos), K),
+        "Pensión Inicial (UF)": pension_rp_neta.ravel(),
+        "Pensión Permanente (UF)": pension.ravel(),
+    }))
+
+    # RP (la pensión se recalcula cada año; se informa la del primer año)
+    pension = pension_mensual(prima_neta_rp, np.array([V_rp[L]]))
+    pension_rp_neta = pension - pension * comision_afp
+    bloques.append(pd.DataFrame({
+        "Modalidad": MODALIDAD_RP,
+        "Compañía": p.input_afp_nombre,
+        "PG (años)": 0,
+        "Años Aumento": 0,
+        "% Aumento": 0,
+        "Años RP (N)": 0,
+        "Pensión Inicial (UF)": pension_rp_neta,
+        "Pensión Permanente (UF)": pension_rp_neta,
+    }))
+
+    candidatos = pd.concat(bloques, ignore_index=True)
+    candidatos["Meses Garantizados"] = candidatos["PG (años)"] * 12
+    _, _, liquido_inicial = calcular_descuentos_clp(candidatos["Pensión Inicial (UF)"].to_numpy(), p.input_valor_uf_clp)
+    _, _, liquido_permanente = calcular_descuentos_clp(candidatos["Pensión Permanente (UF)"].to_numpy(), p.input_valor_uf_clp)
+    candidatos["Líquido Inicial ($)"] = liquido_inicial
+    candidatos["Líquido Permanente ($)"] = liquido_permanente
+    return candidatos
+
+
+def recomendar_modalidades(p, datos, restricciones=RestriccionesAsesor(), **rangos):
+    """
+    Frente de Pareto de las modalidades que cumplen las restricciones,
+    ordenado por líquido permanente (y luego inicial y meses garantizados).
+    En .attrs quedan el número de combinaciones evaluadas y factibles.
+    """
+    candidatos = candidatos_modalidades(p, datos, **rangos)
+
+    factible = (
+        (candidatos["Líquido Permanente ($)"] >= restricciones.liquido_minimo_clp)
+        & (candidatos["Meses Garantizados"] >= restricciones.meses_garantizados_minimos)
+    )
+    exigir_va = restricciones.exigir_vejez_anticipada
+    if exigir_va is None:
+        exigir_va = p.afiliado_tipo_pension == 'Vejez Anticipada'
+    if exigir_va:
+        pension_minima_requerida = p.input_promedio_10_anos_uf * PCT_VEJEZ_ANTICIPADA
+        factible &= candidatos["Pensión Permanente (UF)"] >= pension_minima_requerida
+
+    factibles = candidatos[factible.to_numpy()]
+    mascara = frente_pareto(factibles[list(COLUMNAS_OBJETIVO)].to_numpy())
+    recomendadas = factibles[mascara].sort_values(
+        ["Líquido Permanente ($)", "Líquido Inicial ($)", "Meses Garantizados"],
+        ascending=False, ignore_index=True
+    )
+    recomendadas.index = pd.RangeIndex(1, len(recomendadas) + 1, name="Ranking")
+
+    recomendadas.attrs['evaluadas'] = len(candidatos)
+    recomendadas.attrs['factibles'] = len(factibles)
+    return recomendadas
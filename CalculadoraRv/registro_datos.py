@@ -0,0 +1,264 @@
+import os
+import glob
+import time
+import logging
+import threading
+from types import MappingProxyType
+from dataclasses import dataclass, field
+
+from cache_disco import huella_archivo, huella_archivos
+from utils import (
+    CACHE_DISCO,
+    leer_tablas_de_mortalidad,
+    leer_tasas_de_venta,
+    leer_vtd_completo,
+    tablas_desde_px,
+    curva_vtd,
+    arreglo_solo_lectura,
+    mapeo_solo_lectura,
+    clave_mes_vtd
+)
+import numpy as np
+import pandas as pd
+
+# --- REGISTRO DE DATOS V40.0: RECARGA EN CALIENTE ---
+# Mantiene en memoria las tablas de mortalidad, TODOS los meses del VTD y
+# las tasas de venta. Un hilo vigila el directorio de datos: cuando la CMF
+# publica un xlsx nuevo (o se reemplaza uno), se parsea en segundo plano y
+# se reemplaza la 'instantánea' completa de una sola vez (asignación
+# atómica). Las sesiones en curso siguen usando la instantánea que tomaron.
+
+log = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Pilar 2: Tablas de Mortalidad (4 tablas)
+NOMBRE_H_VEJEZ = 'CB-H-2020.xlsx'
+NOMBRE_M_VEJEZ = 'B-M-2020.xlsx'
+NOMBRE_H_INV = 'I-H-2020.xlsx'
+NOMBRE_M_INV = 'I-M-2020.xlsx'
+
+# Pilar 1: VTD (se leen todos los libros 'VTD*.xlsx' del directorio)
+PATRON_VTD = 'VTD*.xlsx'
+METRICA_VTD = 'Spot Rate'
+
+# Tasas de Venta (CMF)
+NOMBRE_TASAS_VENTA = 'svtas_rv.xlsx'
+
+INTERVALO_VIGILANCIA_SEGUNDOS = 30.0
+
+
+# --- INICIO CAMBIO V41.0 (Datos inmutables respaldados por arreglos) ---
+# La instantánea se arma UNA vez por versión de archivos y la comparten todas
+# las sesiones (app.py, app_calculadora.py) sin copiarla: los arreglos vienen
+# mapeados desde la caché en disco (o se marcan de solo lectura) y los
+# diccionarios que consumen los motores son vistas de solo lectura
+# (MappingProxyType, ver utils.py). Nada se deserializa por rerun, a
+# diferencia de @st.cache_data.
+
+@dataclass(frozen=True)
+class InstantaneaDatos:
+    """
+    Conjunto coherente (e inmutable) de datos cargados en un momento dado.
+    - px: (tabla, sexo, edad) probabilidades de sobrevivencia (NaN si no hay dato)
+    - tasas_vtd: (mes, plazo) tasas del VTD, filas en el orden de meses_vtd
+    """
+    px: np.ndarray
+    plazos_vtd: np.ndarray
+    tasas_vtd: np.ndarray
+    meses_vtd: tuple                 # en orden cronológico
+    hoja_por_mes: MappingProxyType   # 'oct-25' -> 'SR 2025'
+    tablas_mortalidad: MappingProxyType
+    vtd_por_mes: MappingProxyType    # 'oct-25' -> {plazo: tasa} (solo lectura)
+    df_tasas_venta: pd.DataFrame     # respaldado por un arreglo de solo lectura
+    archivos: MappingProxyType       # nombre de archivo -> huella SHA-256
+    version: str
+    cargado_en: float = field(default_factory=time.time)
+
+    @property
+    def mes_vtd_reciente(self):
+        return self.meses_vtd[-1]
+
+    def indice_mes(self, mes=None):
+        """Fila de 'tasas_vtd' correspondiente al mes."""
+        return self.meses_vtd.index(mes or self.mes_vtd_reciente)
+
+    def vector_vtd(self, mes=None):
+        """Curva VTD del mes pedido (por defecto, el más reciente)."""
+        return self.vtd_por_mes[mes or self.mes_vtd_reciente]
+
+    def version_mes(self, mes=None):
+        """Versión de datos para un mes VTD (llave de caché de cotizaciones)."""
+        mes = mes or self.mes_vtd_reciente
+        return f"{self.hoja_por_mes[mes]}|{mes}|{METRICA_VTD}|{self.version}"
+
+
+def _archivos_de_datos(directorio):
+    tablas = [
+        os.path.join(directorio, nombre)
+        for nombre in (NOMBRE_H_VEJEZ, NOMBRE_M_VEJEZ, NOMBRE_H_INV, NOMBRE_M_INV)
+    ]
+    vtd = sorted(glob.glob(os.path.join(directorio, PATRON_VTD)))
+    tasas = os.path.join(directorio, NOMBRE_TASAS_VENTA)
+    return tablas, vtd, tasas
+
+
+def cargar_instantanea(directorio):
+    """
+    Parsea (o lee desde la caché en disco) todos los datos del directorio.
+    Lanza la excepción original si algún archivo no se puede leer.
+    """
+    archivos_tablas, archivos_vtd, archivo_tasas = _archivos_de_datos(directorio)
+    if not archivos_vtd:
+        raise FileNotFoundError(f"No hay archivos '{PATRON_VTD}' en {directorio}")
+
+    arrays, _ = CACHE_DISCO.obtener(
+        'tablas_mortalidad', archivos_tablas, {},
+        lambda: leer_tablas_de_mortalidad(*archivos_tablas)
+    )
+    px = arreglo_solo_lectura(arrays['px'])
+
+    # Si un mes aparece en más de un libro, gana el último (orden alfabético)
+    filas_por_mes = {}
+    hoja_por_mes = {}
+    plazos = None
+    for archivo_vtd in archivos_vtd:
+        arrays, meta = CACHE_DISCO.obtener(
+            'vtd_completo', [archivo_vtd], {'col_metrica': METRICA_VTD},
+            lambda: leer_vtd_completo(archivo_vtd, METRICA_VTD)
+        )
+        if plazos is not None and not np.array_equal(plazos, arrays['plazos']):
+            raise ValueError(f"Los plazos del VTD en '{os.path.basename(archivo_vtd)}' no coinciden con los demás libros.")
+        plazos = arrays['plazos']
+        for i, mes in enumerate(meta['meses']):
+            filas_por_mes[mes] = arrays['tasas'][i]
+            hoja_por_mes[mes] = meta['hojas'][i]
+
+    meses_vtd = tuple(sorted(filas_por_mes, key=clave_mes_vtd))
+    tasas_vtd = arreglo_solo_lectura(np.stack([filas_por_mes[mes] for mes in meses_vtd]))
+    plazos_vtd = arreglo_solo_lectura(plazos)
+
+    arrays, meta = CACHE_DISCO.obtener(
+        'tasas_de_venta', [archivo_tasas], {},
+        lambda: leer_tasas_de_venta(archivo_tasas)
+    )
+    df_tasas_venta = pd.DataFrame(
+        arreglo_solo_lectura(arrays['valores']),
+        index=pd.Index(meta['indice'], name=meta['nombre_indice']),
+        columns=meta['columnas'],
+        copy=False
+    )
+
+    todos = archivos_tablas + archivos_vtd + [archivo_tasas]
+    return InstantaneaDatos(
+        px=px,
+        plazos_vtd=plazos_vtd,
+        tasas_vtd=tasas_vtd,
+        meses_vtd=meses_vtd,
+        hoja_por_mes=MappingProxyType(hoja_por_mes),
+        tablas_mortalidad=mapeo_solo_lectura(tablas_desde_px(px)),
+        vtd_por_mes=MappingProxyType({
+            mes: MappingProxyType(curva_vtd(plazos_vtd, tasas_vtd[i]))
+            for i, mes in enumerate(meses_vtd)
+        }),
+        df_tasas_venta=df_tasas_venta,
+        archivos=MappingProxyType({os.path.basename(r): huella_archivo(r) for r in todos}),
+        version=huella_archivos(*todos)
+    )
+# --- FIN CAMBIO V41.0 ---
+
+
+class RegistroDatos:
+    """
+    Registro de datos del proceso. 'instantanea()' siempre devuelve la
+    última versión completa y válida; si una recarga falla (p.ej. un xlsx
+    copiado a medias) se mantiene la anterior y se reintenta cuando
+    los archivos vuelvan a cambiar.
+    """
+
+    def __init__(self, directorio=BASE_DIR, intervalo_segundos=INTERVALO_VIGILANCIA_SEGUNDOS):
+        self.directorio = directorio
+        self.intervalo_segundos = intervalo_segundos
+        self.ultimo_error = None
+        self._instantanea = None
+        self._firma = None
+        self._firma_fallida = None
+        self._lock_recarga = threading.Lock()
+        self._detener = threading.Event()
+        self._hilo = None
+
+    def _firma_directorio(self):
+        """(nombre, mtime, tamaño) de cada archivo vigilado: barato de calcular."""
+        tablas, vtd, tasas = _archivos_de_datos(self.directorio)
+        firma = []
+        for ruta in tablas + vtd + [tasas]:
+            try:
+                estado = os.stat(ruta)
+                firma.append((os.path.basename(ruta), estado.st_mtime_ns, estado.st_size))
+            except OSError:
+                firma.append((os.path.basename(ruta), None, None))
+        return tuple(firma)
+
+    def instantanea(self):
+        if self._instantanea is None:
+            self.recargar()
+        return self._instantanea
+
+    def recargar(self, forzar=False):
+        """
+        Vuelve a cargar si cambió algún archivo. Devuelve True si se
+        publicó una instantánea nueva.
+        """
+        with self._lock_recarga:
+            firma = self._firma_directorio()
+            if not forzar and firma in (self._firma, self._firma_fallida) and self._instantanea is not None:
+                return False
+            try:
+                nueva = cargar_instantanea(self.directorio)
+            except Exception as e:
+                self.ultimo_error = e
+                self._firma_fallida = firma # No se reintenta hasta que cambien los archivos
+                log.warning("No se pudieron recargar los datos de %s: %s", self.directorio, e)
+                return False
+
+            cambio = self._instantanea is None or nueva.version != self._instantanea.version
+            self._instantanea = nueva # Reemplazo atómico
+            self._firma = firma
+            self.ultimo_error = None
+            if cambio:
+                log.info("Datos cargados (versión %s, %d meses VTD)", nueva.version[:12], len(nueva.meses_vtd))
+            return cambio
+
+    def _vigilar(self):
+        while not self._detener.wait(self.intervalo_segundos):
+            self.recargar()
+
+    def iniciar_vigilancia(self):
+        """Inicia (una vez) el hilo que vigila el directorio de datos."""
+        if self._hilo is None or not self._hilo.is_alive():
+            self._detener.clear()
+            self._hilo = threading.Thread(
+                target=self._vigilar, name="vigilancia-datos-cmf", daemon=True
+            )
+            self._hilo.start()
+
+    def detener_vigilancia(self):
+        self._detener.set()
+
+
+_REGISTROS = {}
+_LOCK_REGISTROS = threading.Lock()
+
+def obtener_registro(directorio=BASE_DIR, vigilar=True):
+    """
+    Registro único por directorio y por proceso (compartido por todas las
+    sesiones de Streamlit y por cualquier otra interfaz).
+    """
+    with _LOCK_REGISTROS:
+        registro = _REGISTROS.get(directorio)
+        if registro is None:
+            registro = RegistroDatos(directorio)
+            _REGISTROS[directorio] = registro
+    if vigilar:
+        registro.iniciar_vigilancia()
+    return registro
@@ -0,0 +1,183 @@
+import re
+import numpy as np
+import pandas as pd
+
+from cartera import agrupar_perfiles, columna, columna_numerica, grupos_desde_dataframe, matriz_flujos
+from estres_longevidad import flujos_lote
+from motor_vectorial import EDAD_MAXIMA, N_PLAZOS, vector_descuento
+
+# --- RESERVAS DE LA CARTERA EN VIGOR V53.0 ---
+# Valoriza las rentas vitalicias YA contratadas a una fecha de valorización:
+# para cada póliza se calculan los años transcurridos desde su inicio, las
+# edades a la fecha, el periodo garantizado y los años de aumento que quedan,
+# y el factor del periodo restante con la curva VTD del mes de valorización.
+#     reserva = 12 * pensión base * (ft_restante * (1 + %aumento) + fd_restante)
+# Como en cartera.py, las familias se agrupan en perfiles únicos; los flujos
+# de todos los perfiles del bloque se calculan como tensor (estres_longevidad
+# .flujos_lote; en modo exacto, perfil a perfil) y el PG / aumento restante
+# de cada póliza sale en O(1) de las sumas acumuladas de la grilla
+# (grilla_productos.py). La cartera se procesa en bloques de pólizas (un
+# DataFrame grande o un iterable de DataFrames, p.ej. pd.read_csv(...,
+# chunksize=...)): la memoria depende del tamaño del bloque, no del total.
+# El motor es anual: los años transcurridos son años póliza cumplidos.
+#
+# Columnas de entrada (una fila por póliza): las de cartera.py con las edades
+# AL INICIO de la póliza (edad vacía = pensión de sobrevivencia en curso), y
+#   fecha_inicio, pension_uf (pensión base, sin el aumento temporal)
+#   pg_anos, anos_aumento, pct_aumento (opcionales, 0 por defecto)
+#   compania, producto (opcionales; sin 'producto' se deduce del PG y aumento)
+
+TAMANO_BLOQUE = 50_000
+COLUMNAS_AGRUPACION = ("cohorte", "producto", "compania")
+
+_PATRON_EDAD = re.compile(r'^(edad|conyuge_edad|hijo_\d+_edad)$')
+
+
+def anos_transcurridos(fechas_inicio, fecha_valorizacion):
+    """Años póliza cumplidos a la fecha (como utils.calculate_age)."""
+    inicio = pd.DatetimeIndex(pd.to_datetime(fechas_inicio))
+    fecha = pd.Timestamp(fecha_valorizacion)
+    antes_del_aniversario = (fecha.month < inicio.month) | ((fecha.month == inicio.month) & (fecha.day < inicio.day))
+    return (fecha.year - inicio.year - antes_del_aniversario).to_numpy(dtype=np.int64)
+
+
+def envejecer_polizas(df_polizas, anos):
+    """Copia de la cartera con todas las edades avanzadas 'anos' años (por fila)."""
+    envejecida = df_polizas.copy()
+    for columna in filter(_PATRON_EDAD.match, df_polizas.columns):
+        envejecida[columna] = pd.to_numeric(df_polizas[columna], errors='coerce') + anos
+    return envejecida
+
+
+def _etiqueta_producto(pg, anos_aumento, pct_aumento):
+    con_pg = pg > 0
+    con_aumento = (anos_aumento > 0) & (pct_aumento > 0)
+    return np.select(
+        [con_pg & con_aumento, con_pg, con_aumento],
+        ["RVI con PG y Aumento", "RVI con PG", "RVI con Aumento"],
+        default="RVI Simple"
+    )
+
+
+def factores_restantes(flujos, descuento, largo, indice, pg, anos_aumento):
+    """
+    (ft, fd) del periodo restante de cada póliza: 'flujos' (U, n) por perfil,
+    'indice' el perfil de cada póliza y 'largo' (U,) los años del motor de
+    cada perfil (el PG no se extiende más allá de la edad 110).
+    Mismas fórmulas que grilla_productos.factores_grilla, con V por perfil.
+    """
+    n = flujos.shape[1]
+    d = np.asarray(descuento, dtype=float)[:n]
+    V = np.zeros((len(flujos), n + 1), dtype=float)
+    np.cumsum(flujos * d, axis=1, out=V[:, 1:])
+    W = np.concatenate(([0.0], np.cumsum(d)))
+
+    L = largo[indice]
+    pg = np.minimum(np.maximum(pg, 0), L)
+    anos = np.minimum(np.maximum(anos_aumento, 0), L)
+    m = np.minimum(pg, anos)
+    M = np.maximum(pg, anos)
+    ft = W[m] + V[indice, anos] - V[indice, m]
+    fd = W[M] - W[anos] + V[indice, L] - V[indice, M]
+    return ft, fd
+
+
+def valorizar_reservas(df_polizas, tablas_mortalidad, fecha_valorizacion, vector_vtd, exacto=False):
+    """
+    Reserva (UF) de cada póliza en vigor a la fecha (mismo índice que la
+    entrada). Las pólizas con inicio posterior a la fecha quedan con NaN.
+    En .attrs queda el número de perfiles únicos.
+    """
+    transcurridos = anos_transcurridos(df_polizas['fecha_inicio'], fecha_valorizacion)
+    en_vigor = transcurridos >= 0
+    transcurridos = np.maximum(transcurridos, 0)
+
+    pg = columna_numerica(df_polizas, 'pg_anos').astype(np.int64)
+    anos_aumento = columna_numerica(df_polizas, 'anos_aumento').astype(np.int64)
+    pct_aumento = columna_numerica(df_polizas, 'pct_aumento')
+    pension = df_polizas['pension_uf'].to_numpy(dtype=float)
+
+    grupos = grupos_desde_dataframe(envejecer_polizas(df_polizas, transcurridos))
+    perfiles, indice = agrupar_perfiles(grupos)
+    if exacto:
+        flujos = matriz_flujos(perfiles, tablas_mortalidad, 0, exacto)
+    else:
+        flujos = flujos_lote(perfiles, tablas_mortalidad)
+    largo = np.array(
+        [N_PLAZOS if afiliado is None else max(EDAD_MAXIMA - afiliado.edad + 1, 0) for afiliado, _, _ in perfiles],
+        dtype=np.int64
+    )
+    ft, fd = factores_restantes(
+        flujos, vector_descuento('RVI', vector_vtd=vector_vtd), largo, indice,
+        pg - transcurridos, anos_aumento - transcurridos
+    )
+    factor = ft * (1 + pct_aumento / 100.0) + fd
+
+    resultado = pd.DataFrame(index=df_polizas.index)
+    resultado['cohorte'] = pd.DatetimeIndex(pd.to_datetime(df_polizas['fecha_inicio'])).year.to_numpy()
+    etiqueta = _etiqueta_producto(pg, anos_aumento, pct_aumento)
+    if 'producto' in df_polizas.columns: # Celda vacía: se deduce, como si faltara la columna
+        producto = df_polizas['producto']
+        resultado['producto'] = np.where(producto.isna() | (producto == ''), etiqueta, producto.to_numpy())
+    else:
+        resultado['producto'] = etiqueta
+    resultado['compania'] = pd.Series(columna(df_polizas, 'compania', ''), index=df_polizas.index).fillna('')
+    resultado['anos_transcurridos'] = transcurridos
+    resultado['pg_restante'] = np.maximum(pg - transcurridos, 0)
+    resultado['aumento_restante'] = np.maximum(anos_aumento - transcurridos, 0)
+    resultado['pension_uf'] = pension
+    resultado['factor_reserva'] = np.where(en_vigor, factor, np.nan)
+    resultado['reserva_uf'] = np.where(en_vigor, 12.0 * pension * factor, np.nan)
+    resultado.attrs['perfiles_unicos'] = len(perfiles)
+    return resultado
+
+
+def bloques(fuente, tamano_bloque):
+    """Bloques de pólizas: trozos de un DataFrame, o los de un iterable de DataFrames tal cual."""
+    if isinstance(fuente, pd.DataFrame):
+        for inicio in range(0, len(fuente), tamano_bloque):
+            yield fuente.iloc[inicio:inicio + tamano_bloque]
+    else:
+        yield from fuente
+
+
+def reservas_en_vigor(
+    fuente,
+    tablas_mortalidad,
+    fecha_valorizacion,
+    vector_vtd,
+    por=COLUMNAS_AGRUPACION,
+    tamano_bloque=TAMANO_BLOQUE,
+    exacto=False,
+    detalle=False
+    ):
+    """
+    Reservas de toda la cartera en vigor, agregadas por 'por' (cohorte de
+    inicio, producto y compañía por defecto): número de pólizas, pensión base
+    y reserva (UF). 'fuente' es un DataFrame (se procesa en bloques de
+    'tamano_bloque' pólizas) o un iterable de DataFrames.
+    Con detalle=True devuelve (resumen, reservas por póliza).
+    """
+    por = list(por)
+    parciales = []
+    detalles = []
+    for bloque in bloques(fuente, tamano_bloque):
+        reservas = valorizar_reservas(bloque, tablas_mortalidad, fecha_valorizacion, vector_vtd, exacto)
+        vigentes = reservas[reservas['reserva_uf'].notna()]
+        parciales.append(
+            vigentes.groupby(por, sort=False, dropna=False).agg( # Una llave vacía no saca la póliza del total
+                polizas=('reserva_uf', 'size'), pension_uf=('pension_uf', 'sum'), reserva_uf=('reserva_uf', 'sum')
+            )
+        )
+        if detalle:
+            detalles.append(reservas)
+
+    if parciales:
+        resumen = pd.concat(parciales).groupby(level=por, dropna=False).sum().sort_index()
+    else:
+        resumen = pd.DataFrame(
+            columns=['polizas', 'pension_uf', 'reserva_uf'], index=pd.MultiIndex.from_tuples([], names=por)
+        )
+    if detalle:
+        return resumen, (pd.concat(detalles) if detalles else pd.DataFrame())
+    return resumen
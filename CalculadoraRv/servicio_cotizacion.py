@@ -0,0 +1,593 @@
+import gc
+import os
+import json
+import math
+import time
+import signal
+import asyncio
+import argparse
+import dataclasses
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from http import HTTPStatus
+import numpy as np
+
+from utils import calculate_age
+from cotizacion import (
+    AFP_COMMISSIONS,
+    METODO_TASA_VENTA,
+    METODO_VTD,
+    DatosMercado,
+    ErrorCotizacion,
+    Escenario,
+    ParametrosCotizacion,
+)
+from micro_lotes import MAX_LOTE, VENTANA_MS, ProgramadorMicroLotes, cotizar_lote
+from motor_vectorial import EDAD_MAXIMA
+from modelos import SEXOS, Afiliado, Conyuge, Hijo, PCT_PENSION_CONYUGE, PCT_PENSION_HIJO
+from mortalidad_generacional import tablas_generacionales
+from pdf_generator import create_native_pdf_report
+from precalentamiento import desmarcar_listo, marcar_listo, precalentar_motor
+from registro_datos import BASE_DIR, obtener_registro
+
+# --- SERVICIO DE COTIZACIÓN V58.0: API HTTP SOBRE EL MOTOR ---
+# Servidor HTTP/1.1 mínimo (solo biblioteca estándar, asyncio) para que el
+# CRM cotice sin pasar por la interfaz de Streamlit:
+#   GET  /salud          -> estado del servicio y de los micro-lotes
+#   GET  /listo          -> 200 cuando terminó el precalentamiento (503 antes)
+#   POST /cotizar        -> informe completo (Tablas 1 a 4, como app.py)
+#   POST /comparar       -> RVI Simple de todas las compañías (tasa de venta)
+#   POST /sobrevivencia  -> pensión de sobrevivencia (causante fallecido)
+#   POST /pdf            -> el informe en PDF (pdf_generator.py)
+# El cuerpo es JSON (ver 'parametros_desde_json'). El cálculo corre en un
+# ProcessPoolExecutor: cada proceso carga una vez el registro de datos
+# (tablas, VTD y tasas, con recarga en caliente) y recibe las solicitudes
+# en micro-lotes (micro_lotes.py), así el loop solo lee y escribe sockets.
+# (V60.0) Al arrancar, el proceso principal carga los datos y corre las
+# cotizaciones sintéticas de precalentamiento.py ANTES de crear los procesos
+# de cálculo; con 'fork' estos heredan la memoria ya cargada (compartida
+# mientras no se escriba; gc.freeze evita que el recolector la toque) y
+# quedan listos al nacer. Solo entonces /listo responde 200 y se escribe
+# --archivo-listo; mientras tanto las cotizaciones reciben 503.
+# Ejemplo: python servicio_cotizacion.py --puerto 8080 --procesos 4
+# Prueba de carga: carga_servicio.py.
+
+TIPOS_PENSION = ('Vejez (Edad Legal)', 'Vejez Anticipada', 'Invalidez', 'Sobrevivencia')
+METODOS_RVI = {'tasa_venta': METODO_TASA_VENTA, 'vtd': METODO_VTD}
+ESCENARIOS_POR_DEFECTO = ('Escenario A', 'Escenario B', 'Escenario C')
+
+MAX_CUERPO_BYTES = 1_000_000
+TIEMPO_INACTIVO_S = 30.0 # Conexiones keep-alive sin solicitudes se cierran
+MAX_DATOS_MERCADO = 16   # DatosMercado (mes VTD, tablas) guardados por proceso
+
+# Límites de los widgets del panel de app.py: la API no acepta otros valores
+LIMITES_PG_ANOS = (0, 25)
+LIMITES_PCT_AUMENTO = (0, 100)
+LIMITES_ANOS_AUMENTO = (1, 25)
+LIMITES_ANOS_DIFERIMIENTO = (1, 10)
+LIMITES_ANO_VALORIZACION = (2016, 2040)
+EDADES_LIMITE_HIJO = (18, 24)
+MAX_HIJOS = 10
+
+TIPO_JSON = 'application/json; charset=utf-8'
+TIPO_PDF = 'application/pdf'
+
+
+class ErrorSolicitud(ValueError):
+    """Cuerpo inválido (se responde 400)."""
+
+
+# --- 1. JSON -> PARÁMETROS (mismos valores por defecto que el panel de app.py) ---
+def _numero(datos, campo, defecto=None, minimo=None, maximo=None, tipo=float, quien=None):
+    """Campo numérico de 'datos' dentro de [minimo, maximo]; ErrorSolicitud si no."""
+    nombre = f"{quien}: '{campo}'" if quien else f"'{campo}'"
+    valor = datos.get(campo, defecto)
+    if valor is None:
+        raise ErrorSolicitud(f"Falta {nombre}.")
+    if isinstance(valor, bool) or not isinstance(valor, (int, float)) or not math.isfinite(valor):
+        raise ErrorSolicitud(f"{nombre} debe ser un número.")
+    if tipo is int and valor != int(valor):
+        raise ErrorSolicitud(f"{nombre} debe ser un número entero.")
+    if (minimo is not None and valor < minimo) or (maximo is not None and valor > maximo):
+        rango = f"entre {minimo} y {maximo}" if maximo is not None else f"al menos {minimo}"
+        raise ErrorSolicitud(f"{nombre} debe estar {rango} (recibido {valor}).")
+    return tipo(valor)
+
+
+def _booleano(datos, campo, defecto, quien=None):
+    """Campo true/false de 'datos' (solo booleanos JSON: "false" no es falso); ErrorSolicitud si no."""
+    valor = datos.get(campo, defecto)
+    if not isinstance(valor, bool):
+        nombre = f"{quien}: '{campo}'" if quien else f"'{campo}'"
+        raise ErrorSolicitud(f"{nombre} debe ser true o false (recibido {valor!r}).")
+    return valor
+
+
+def _edad(datos, quien):
+    if not isinstance(datos, dict):
+        raise ErrorSolicitud(f"{quien}: debe ser un objeto JSON.")
+    if 'edad' in datos:
+        return _numero(datos, 'edad', minimo=0, maximo=EDAD_MAXIMA, tipo=int, quien=quien)
+    if 'fecha_nacimiento' in datos:
+        try:
+            edad = calculate_age(date.fromisoformat(str(datos['fecha_nacimiento'])))
+        except ValueError:
+            raise ErrorSolicitud(f"{quien}: 'fecha_nacimiento' debe tener el formato AAAA-MM-DD.") from None
+        return _numero({'edad': edad}, 'edad', minimo=0, maximo=EDAD_MAXIMA, tipo=int, quien=quien)
+    raise ErrorSolicitud(f"{quien}: indique 'edad' o 'fecha_nacimiento' (AAAA-MM-DD).")
+
+
+def _sexo(datos, quien):
+    sexo = datos.get('sexo')
+    if sexo not in SEXOS:
+        raise ErrorSolicitud(f"{quien}: 'sexo' debe ser uno de {SEXOS}.")
+    return sexo
+
+
+def parametros_desde_json(cuerpo):
+    """
+    ParametrosCotizacion a partir del JSON de la API, con los mismos
+    límites que los widgets del panel de app.py (ErrorSolicitud si no).
+    Campos (opcionales salvo 'saldo_uf' y los datos de las personas):
+      nombre, valor_uf_clp, saldo_uf, afp, tasa_rp_pct,
+      metodo_rvi ('tasa_venta' | 'vtd'), compania, comparar_todas,
+      comision_pct, pgu_clp, incluye_pgu, bonificacion_uf,
+      tipo_pension, pension_referencia_uf, promedio_10_anos_uf,
+      afiliado {edad | fecha_nacimiento, sexo},
+      conyuge {edad | fecha_nacimiento, sexo, es_invalido},
+      hijos [{edad | fecha_nacimiento, sexo, edad_limite}],
+      rp, rvi_simple, escenarios [{nombre, pg_anos, anos_aumento, pct_aumento}],
+      rp_rvd, anos_diferimiento, sobrevivencia_exacta.
+    'pension_referencia_uf' es obligatoria en Sobrevivencia y
+    'promedio_10_anos_uf' en Vejez Anticipada.
+    """
+    if not isinstance(cuerpo, dict):
+        raise ErrorSolicitud("El cuerpo debe ser un objeto JSON.")
+
+    tipo_pension = cuerpo.get('tipo_pension', TIPOS_PENSION[0])
+    if tipo_pension not in TIPOS_PENSION:
+        raise ErrorSolicitud(f"'tipo_pension' debe ser uno de {TIPOS_PENSION}.")
+    afp = cuerpo.get('afp', 'AFP HABITAT')
+    if afp not in AFP_COMMISSIONS:
+        raise ErrorSolicitud(f"AFP desconocida: {afp}.")
+    metodo = cuerpo.get('metodo_rvi', 'tasa_venta')
+    if metodo not in METODOS_RVI:
+        raise ErrorSolicitud(f"'metodo_rvi' debe ser uno de {tuple(METODOS_RVI)}.")
+
+    comparar_todas = _booleano(cuerpo, 'comparar_todas', False) and metodo == 'tasa_venta'
+    compania = None
+    if metodo == 'tasa_venta':
+        compania = 'Media Mercado' if comparar_todas else cuerpo.get('compania', 'Media Mercado')
+
+    datos_afiliado = None
+    edad_afiliado = 0
+    if tipo_pension != 'Sobrevivencia':
+        afiliado = cuerpo.get('afiliado') or {}
+        edad_afiliado = _edad(afiliado, 'afiliado')
+        datos_afiliado = Afiliado(
+            edad=edad_afiliado, sexo=_sexo(afiliado, 'afiliado'), es_invalido=(tipo_pension == 'Invalidez')
+        )
+
+    datos_conyuge = None
+    if cuerpo.get('conyuge'):
+        conyuge = cuerpo['conyuge']
+        datos_conyuge = Conyuge(
+            edad=_edad(conyuge, 'cónyuge'),
+            sexo=_sexo(conyuge, 'cónyuge'),
+            pct_pension=PCT_PENSION_CONYUGE,
+            es_invalido=_booleano(conyuge, 'es_invalido', False, quien='cónyuge')
+        )
+    hijos = cuerpo.get('hijos') or []
+    if len(hijos) > MAX_HIJOS:
+        raise ErrorSolicitud(f"A lo más {MAX_HIJOS} hijos.")
+    datos_hijos = []
+    for i, hijo in enumerate(hijos):
+        quien = f"hijo {i + 1}"
+        edad = _edad(hijo, quien)
+        edad_limite = hijo.get('edad_limite', 24)
+        if edad_limite not in EDADES_LIMITE_HIJO:
+            raise ErrorSolicitud(f"{quien}: 'edad_limite' debe ser uno de {EDADES_LIMITE_HIJO}.")
+        datos_hijos.append(Hijo(
+            edad=edad, sexo=_sexo(hijo, quien), pct_pension=PCT_PENSION_HIJO, edad_limite=int(edad_limite)
+        ))
+
+    escenarios = []
+    for i, esc in enumerate(cuerpo.get('escenarios') or []):
+        if not isinstance(esc, dict):
+            raise ErrorSolicitud(f"escenario {i + 1}: debe ser un objeto JSON.")
+        nombre = esc.get('nombre', ESCENARIOS_POR_DEFECTO[i] if i < len(ESCENARIOS_POR_DEFECTO) else f"Escenario {i + 1}")
+        escenarios.append(Escenario(
+            nombre,
+            _numero(esc, 'pg_anos', 0, *LIMITES_PG_ANOS, tipo=int, quien=nombre),
+            _numero(esc, 'anos_aumento', 1, *LIMITES_ANOS_AUMENTO, tipo=int, quien=nombre),
+            _numero(esc, 'pct_aumento', 0, *LIMITES_PCT_AUMENTO, tipo=int, quien=nombre)
+        ))
+    comision_pct = _numero(cuerpo, 'comision_pct', 0.0, 0.0, 5.0)
+    bonificacion_uf = _numero(cuerpo, 'bonificacion_uf', 0.0, 0.0, 3.0)
+    pension_referencia_uf = 0.0
+    if tipo_pension == 'Sobrevivencia':
+        pension_referencia_uf = _numero(cuerpo, 'pension_referencia_uf', minimo=1.0)
+    promedio_10_anos_uf = 0.0
+    if tipo_pension == 'Vejez Anticipada':
+        promedio_10_anos_uf = _numero(cuerpo, 'promedio_10_anos_uf', minimo=1.0)
+
+    return ParametrosCotizacion(
+        input_afiliado_nombre=str(cuerpo.get('nombre', '')),
+        input_valor_uf_clp=_numero(cuerpo, 'valor_uf_clp', 39600.0, minimo=30000.0),
+        saldo_uf=_numero(cuerpo, 'saldo_uf', minimo=100.0),
+        input_afp_nombre=afp,
+        input_tasa_rp=_numero(cuerpo, 'tasa_rp_pct', 3.41, 1.0, 10.0),
+        input_metodo_rvi=METODOS_RVI[metodo],
+        input_cia_rvi=compania,
+        check_comparar_todas=comparar_todas,
+        check_incluye_comision=comision_pct > 0,
+        input_comision_pct=comision_pct,
+        input_valor_pgu_clp=_numero(cuerpo, 'pgu_clp', 224004.0, minimo=0.0),
+        check_incluye_pgu=_booleano(cuerpo, 'incluye_pgu', False),
+        check_incluye_bono=bonificacion_uf > 0,
+        input_bonificacion_uf=bonificacion_uf,
+        afiliado_tipo_pension=tipo_pension,
+        afiliado_edad_calculada=edad_afiliado,
+        input_pension_referencia_uf=pension_referencia_uf,
+        input_promedio_10_anos_uf=promedio_10_anos_uf,
+        datos_afiliado=datos_afiliado,
+        datos_conyuge=datos_conyuge,
+        datos_hijos=tuple(datos_hijos),
+        check_rp=_booleano(cuerpo, 'rp', True),
+        check_rvi_simple=_booleano(cuerpo, 'rvi_simple', True),
+        escenarios=tuple(escenarios),
+        check_rp_rvd=_booleano(cuerpo, 'rp_rvd', False),
+        n_anos_diferimiento=_numero(cuerpo, 'anos_diferimiento', 3, *LIMITES_ANOS_DIFERIMIENTO, tipo=int),
+        check_sobrevivencia_exacta=_booleano(cuerpo, 'sobrevivencia_exacta', False)
+    )
+
+
+def ano_valorizacion_desde_json(cuerpo):
+    """Año de valorización (tablas generacionales) o None (tablas estáticas)."""
+    if cuerpo.get('ano_valorizacion') is None:
+        return None
+    return _numero(cuerpo, 'ano_valorizacion', None, *LIMITES_ANO_VALORIZACION, tipo=int)
+
+
+# Campos que fija cada ruta sobre el cuerpo recibido
+CAMPOS_POR_RUTA = {
+    '/cotizar': {},
+    '/comparar': {
+        'metodo_rvi': 'tasa_venta', 'comparar_todas': True, 'rvi_simple': True,
+        'rp': False, 'escenarios': [], 'rp_rvd': False,
+    },
+    '/sobrevivencia': {'tipo_pension': 'Sobrevivencia'},
+    '/pdf': {},
+}
+
+
+# --- 2. DATOS DE MERCADO (como en app.py) ---
+def datos_mercado(datos, mes_vtd=None, ano_valorizacion=None, directorio=BASE_DIR):
+    """
+    DatosMercado de la instantánea para un mes VTD; con 'ano_valorizacion'
+    se cotiza con tablas generacionales (V51.0).
+    """
+    mes_vtd = mes_vtd or datos.mes_vtd_reciente
+    if mes_vtd not in datos.meses_vtd:
+        raise ErrorSolicitud(f"Mes VTD no disponible: {mes_vtd}.")
+    version = datos.version_mes(mes_vtd)
+    tablas = datos.tablas_mortalidad
+    if ano_valorizacion is not None:
+        tablas = tablas_generacionales(directorio, datos.version, int(ano_valorizacion))
+        version = f"{version}|gen{int(ano_valorizacion)}"
+    return DatosMercado(
+        tablas_mortalidad=tablas,
+        vector_vtd=datos.vector_vtd(mes_vtd),
+        df_tasas_venta=datos.df_tasas_venta,
+        col_mes_vtd=mes_vtd,
+        vtd_details_str=f"VTD Cargado: {mes_vtd} (Hoja {datos.hoja_por_mes[mes_vtd]})",
+        version=version
+    )
+
+
+def _a_json(valor):
+    if dataclasses.is_dataclass(valor):
+        return dataclasses.asdict(valor)
+    if isinstance(valor, np.generic):
+        return valor.item()
+    raise TypeError(f"No serializable: {type(valor).__name__}")
+
+
+def _respuesta_json(estado, contenido):
+    return int(estado), TIPO_JSON, json.dumps(contenido, ensure_ascii=False, default=_a_json).encode('utf-8')
+
+
+def _respuesta(ruta, resultado):
+    if isinstance(resultado, ErrorCotizacion):
+        return _respuesta_json(HTTPStatus.UNPROCESSABLE_ENTITY, {
+            'errores': list(resultado.args), 'mensajes': resultado.mensajes
+        })
+    if isinstance(resultado, Exception): # Falla del motor en esta cotización (no en el lote)
+        return _respuesta_json(HTTPStatus.INTERNAL_SERVER_ERROR, {
+            'error': f"{type(resultado).__name__}: {resultado}"
+        })
+    informe = resultado.report_data
+    if ruta == '/pdf':
+        return int(HTTPStatus.OK), TIPO_PDF, bytes(create_native_pdf_report(informe))
+    if ruta == '/comparar':
+        return _respuesta_json(HTTPStatus.OK, {
+            'metodo': informe.get('metodo_rvi_desc'),
+            'companias': informe.get('rvi_simple_rows', []),
+            'mensajes': resultado.mensajes,
+        })
+    return _respuesta_json(HTTPStatus.OK, {'informe': informe, 'mensajes': resultado.mensajes})
+
+
+# --- 3. PROCESOS DE CÁLCULO ---
+_REGISTRO = None
+_DIRECTORIO = BASE_DIR
+_DATOS_MERCADO = OrderedDict()
+_PRECALENTADO = False
+
+
+def precalentar(directorio=BASE_DIR):
+    """
+    Carga el registro de datos y corre las cotizaciones sintéticas (motor y
+    cada ruta de la API) en este proceso. Devuelve los tiempos en ms.
+    """
+    global _REGISTRO, _DIRECTORIO, _PRECALENTADO
+    inicio = time.perf_counter()
+    _DIRECTORIO = directorio
+    _REGISTRO = obtener_registro(directorio, vigilar=False) # Sin hilos antes del fork
+    datos = _REGISTRO.instantanea()
+    if datos is None:
+        raise RuntimeError(f"No se pudieron cargar los datos: {_REGISTRO.ultimo_error}")
+    tiempos = {'datos_ms': round((time.perf_counter() - inicio) * 1000.0, 2)}
+    tiempos.update(precalentar_motor(_datos_mercado_cacheados(datos, None, None)))
+
+    inicio = time.perf_counter()
+    cuerpo = {
+        'saldo_uf': 3000, 'afiliado': {'edad': 65, 'sexo': 'Hombre'}, 'conyuge': {'edad': 62, 'sexo': 'Mujer'},
+        'pension_referencia_uf': 20.0,
+    }
+    for (estado, _, contenido), ruta in zip(atender_lote([(ruta, cuerpo) for ruta in CAMPOS_POR_RUTA]), CAMPOS_POR_RUTA):
+        if estado != HTTPStatus.OK:
+            raise RuntimeError(f"Precalentamiento de {ruta} falló ({estado}): {contenido[:200]!r}")
+    tiempos['rutas_ms'] = round((time.perf_counter() - inicio) * 1000.0, 2)
+    _PRECALENTADO = True
+    return tiempos
+
+
+def _iniciar_trabajador(directorio):
+    """
+    Inicializador de cada proceso. Con 'fork' hereda el precalentamiento
+    del proceso principal; si no (p.ej. 'spawn'), lo hace aquí.
+    """
+    if not _PRECALENTADO or _DIRECTORIO != directorio:
+        precalentar(directorio)
+    obtener_registro(directorio) # Vigila el directorio de datos (recarga en caliente)
+
+
+
+def _datos_mercado_cacheados(datos, mes_vtd, ano_valorizacion):
+    clave = (datos.version, mes_vtd or datos.mes_vtd_reciente, ano_valorizacion)
+    dm = _DATOS_MERCADO.get(clave)
+    if dm is None:
+        dm = _DATOS_MERCADO[clave] = datos_mercado(datos, mes_vtd, ano_valorizacion, _DIRECTORIO)
+        while len(_DATOS_MERCADO) > MAX_DATOS_MERCADO:
+            _DATOS_MERCADO.popitem(last=False)
+    return dm
+
+
+def atender_lote(solicitudes):
+    """
+    Procesa un micro-lote de solicitudes (ruta, cuerpo JSON) en el proceso
+    de cálculo: (estado HTTP, tipo de contenido, bytes) por solicitud.
+    Las cotizaciones con los mismos datos de mercado van juntas a cotizar_lote.
+    """
+    datos = _REGISTRO.instantanea()
+    respuestas = [None] * len(solicitudes)
+    grupos = {}
+    for i, (ruta, cuerpo) in enumerate(solicitudes):
+        try:
+            cuerpo = {**cuerpo, **CAMPOS_POR_RUTA[ruta]}
+            dm = _datos_mercado_cacheados(datos, cuerpo.get('mes_vtd'), ano_valorizacion_desde_json(cuerpo))
+            parametros = parametros_desde_json(cuerpo)
+        except (ValueError, TypeError, KeyError, AttributeError) as e:
+            respuestas[i] = _respuesta_json(HTTPStatus.BAD_REQUEST, {'error': str(e)})
+            continue
+        grupos.setdefault(id(dm), (dm, []))[1].append((i, ruta, parametros))
+
+    for dm, items in grupos.values():
+        for (i, ruta, _), resultado in zip(items, cotizar_lote([p for _, _, p in items], dm)):
+            try:
+                respuestas[i] = _respuesta(ruta, resultado)
+            except Exception as e:
+                respuestas[i] = _respuesta_json(HTTPStatus.INTERNAL_SERVER_ERROR, {'error': str(e)})
+    return respuestas
+
+
+# --- 4. SERVIDOR HTTP ---
+class ServicioCotizacion:
+    """
+    Servidor asyncio. 'responder' atiende una solicitud ya leída (útil sin
+    sockets); 'iniciar' abre el puerto y 'preparar' precalienta (las
+    cotizaciones reciben 503 hasta que termine). Cerrar con 'detener'.
+    """
+
+    def __init__(
+        self,
+        directorio=BASE_DIR,
+        procesos=None,
+        ventana_ms=VENTANA_MS,
+        max_lote=MAX_LOTE,
+        presupuesto_latencia_ms=None,
+        archivo_listo=None
+        ):
+        self.directorio = directorio
+        self.procesos = procesos or os.cpu_count() or 1
+        self.archivo_listo = archivo_listo
+        contexto = multiprocessing.get_context('fork') if 'fork' in multiprocessing.get_all_start_methods() else None
+        self.ejecutor = ProcessPoolExecutor(
+            self.procesos, mp_context=contexto, initializer=_iniciar_trabajador, initargs=(directorio,)
+        )
+        self.programador = ProgramadorMicroLotes(
+            atender_lote, ventana_ms, max_lote, presupuesto_latencia_ms, self.ejecutor
+        )
+        self.servidor = None
+        self.solicitudes = 0
+        self.listo = False
+        self.precalentamiento = None
+
+    async def preparar(self):
+        """
+        Precalienta el proceso principal (en un hilo: el loop sigue
+        respondiendo /salud y /listo), crea los procesos de cálculo y
+        verifica que respondan. Luego marca el servicio como listo.
+        """
+        inicio = time.perf_counter()
+        tiempos = await asyncio.to_thread(precalentar, self.directorio)
+        gc.freeze() # Los objetos ya cargados no se tocan más: páginas compartidas con los procesos
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*[ # Crea los procesos y verifica que respondan
+            loop.run_in_executor(self.ejecutor, os.getpid) for _ in range(self.procesos)
+        ])
+        self.precalentamiento = {**tiempos, 'total_ms': round((time.perf_counter() - inicio) * 1000.0, 2)}
+        self.listo = True
+        if self.archivo_listo:
+            marcar_listo(self.archivo_listo, self.precalentamiento)
+        return self.precalentamiento
+
+    async def responder(self, metodo, ruta, cuerpo):
+        """(estado, tipo de contenido, bytes) de una solicitud."""
+        self.solicitudes += 1
+        ruta = ruta.split('?', 1)[0].rstrip('/') or '/'
+        if ruta == '/salud':
+            if metodo != 'GET':
+                return _respuesta_json(HTTPStatus.METHOD_NOT_ALLOWED, {'error': 'Use GET.'})
+            return _respuesta_json(HTTPStatus.OK, {
+                'estado': 'ok', 'listo': self.listo, 'procesos': self.procesos, 'solicitudes': self.solicitudes,
+                'micro_lotes': self.programador.estadisticas(),
+            })
+        if ruta == '/listo':
+            if metodo != 'GET':
+                return _respuesta_json(HTTPStatus.METHOD_NOT_ALLOWED, {'error': 'Use GET.'})
+            if not self.listo:
+                return _respuesta_json(HTTPStatus.SERVICE_UNAVAILABLE, {'estado': 'precalentando'})
+            return _respuesta_json(HTTPStatus.OK, {'estado': 'listo', 'precalentamiento': self.precalentamiento})
+        if ruta not in CAMPOS_POR_RUTA:
+            return _respuesta_json(HTTPStatus.NOT_FOUND, {'error': f"Ruta desconocida: {ruta}"})
+        if metodo != 'POST':
+            return _respuesta_json(HTTPStatus.METHOD_NOT_ALLOWED, {'error': 'Use POST con un cuerpo JSON.'})
+        if not self.listo:
+            return _respuesta_json(HTTPStatus.SERVICE_UNAVAILABLE, {'error': 'Servicio precalentando; reintente en unos segundos.'})
+        try:
+            contenido = json.loads(cuerpo or b'{}')
+        except (UnicodeDecodeError, json.JSONDecodeError) as e:
+            return _respuesta_json(HTTPStatus.BAD_REQUEST, {'error': f"JSON inválido: {e}"})
+        try:
+            return await self.programador.enviar((ruta, contenido))
+        except Exception as e: # Falla del proceso de cálculo (p.ej. BrokenProcessPool)
+            return _respuesta_json(HTTPStatus.SERVICE_UNAVAILABLE, {'error': str(e)})
+
+    async def _atender_conexion(self, reader, writer):
+        try:
+            while True:
+                try:
+                    linea = await asyncio.wait_for(reader.readline(), TIEMPO_INACTIVO_S)
+                except asyncio.TimeoutError:
+                    break
+                if not linea:
+                    break
+                try:
+                    metodo, ruta, version = linea.decode('latin-1').split()
+                except ValueError:
+                    break
+                cabeceras = {}
+                while True:
+                    cabecera = await reader.readline()
+                    if cabecera in (b'\r\n', b'\n', b''):
+                        break
+                    nombre, _, valor = cabecera.decode('latin-1').partition(':')
+                    cabeceras[nombre.strip().lower()] = valor.strip()
+
+                try:
+                    largo = int(cabeceras.get('content-length', 0) or 0)
+                except ValueError:
+                    largo = -1
+                if largo < 0:
+                    respuesta = _respuesta_json(HTTPStatus.BAD_REQUEST, {'error': 'Content-Length inválido.'})
+                    mantener = False
+                elif largo > MAX_CUERPO_BYTES:
+                    respuesta = _respuesta_json(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {'error': 'Cuerpo demasiado grande.'})
+                    mantener = False
+                else:
+                    cuerpo = await reader.readexactly(largo) if largo else b''
+                    respuesta = await self.responder(metodo.upper(), ruta, cuerpo)
+                    conexion = cabeceras.get('connection', '').lower()
+                    mantener = conexion == 'keep-alive' or (version == 'HTTP/1.1' and conexion != 'close')
+
+                estado, tipo, datos = respuesta
+                writer.write(
+                    f"HTTP/1.1 {estado} {HTTPStatus(estado).phrase}\r\n"
+                    f"Content-Type: {tipo}\r\nContent-Length: {len(datos)}\r\n"
+                    f"Connection: {'keep-alive' if mantener else 'close'}\r\n\r\n".encode('latin-1') + datos
+                )
+                await writer.drain()
+                if not mantener:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def iniciar(self, host='127.0.0.1', puerto=8080):
+        self.servidor = await asyncio.start_server(self._atender_conexion, host, puerto)
+        return self.servidor
+
+    async def detener(self):
+        self.listo = False
+        if self.archivo_listo:
+            desmarcar_listo(self.archivo_listo) # Primero: el balanceador deja de enviar
+        if self.servidor is not None:
+            self.servidor.close()
+            await self.servidor.wait_closed()
+        await self.programador.cerrar()
+        self.ejecutor.shutdown(cancel_futures=True)
+
+
+async def servir(host, puerto, **opciones):
+    servicio = ServicioCotizacion(**opciones)
+    servidor = await servicio.iniciar(host, puerto)
+    tarea = asyncio.current_task()
+    for senal in (signal.SIGTERM, signal.SIGINT): # Apagado ordenado (p.ej. al redesplegar)
+        asyncio.get_running_loop().add_signal_handler(senal, tarea.cancel)
+    print(f"Servicio de cotización en http://{host}:{puerto} ({servicio.procesos} procesos), precalentando...", flush=True)
+    try:
+        async with servidor:
+            tiempos = await servicio.preparar()
+            print(f"Listo en {tiempos['total_ms'] / 1000.0:.2f} s", flush=True)
+            await servidor.serve_forever()
+    except asyncio.CancelledError:
+        pass
+    finally:
+        await servicio.detener()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Servicio HTTP de cotización de pensiones.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--puerto', type=int, default=8080)
+    parser.add_argument('--procesos', type=int, default=None, help="Procesos de cálculo (por defecto, CPUs)")
+    parser.add_argument('--datos', default=BASE_DIR, help="Directorio de tablas, VTD y tasas de venta")
+    parser.add_argument('--ventana-ms', type=float, default=VENTANA_MS)
+    parser.add_argument('--max-lote', type=int, default=MAX_LOTE)
+    parser.add_argument('--presupuesto-latencia-ms', type=float, default=None)
+    parser.add_argument('--archivo-listo', default=None, help="Archivo que se crea al terminar el precalentamiento")
+    args = parser.parse_args(argv)
+    asyncio.run(servir(
+        args.host, args.puerto, directorio=args.datos, procesos=args.procesos,
+        ventana_ms=args.ventana_ms, max_lote=args.max_lote,
+        presupuesto_latencia_ms=args.presupuesto_latencia_ms, archivo_listo=args.archivo_listo
+    ))
+
+
+if __name__ == '__main__':
+    main()
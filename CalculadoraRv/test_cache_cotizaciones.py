@@ -0,0 +1,25 @@
+import pickle
+
+import cotizacion
+from cotizacion import CacheCotizaciones, clave_factores
+from precalentamiento import cotizaciones_sinteticas
+
+
+class _ClaseRenombrada:
+    pass
+
+
+def test_archivo_de_otra_version_del_codigo_es_un_fallo(tmp_path, monkeypatch):
+    cache = CacheCotizaciones(directorio=str(tmp_path))
+    with open(cache._ruta('llave'), 'wb') as f:
+        pickle.dump(_ClaseRenombrada(), f)
+    monkeypatch.delattr(__import__(__name__), '_ClaseRenombrada')
+    assert cache.obtener('llave') is None
+    assert cache.fallos == 1
+
+
+def test_la_llave_cambia_con_la_version_del_motor(monkeypatch):
+    parametros = cotizaciones_sinteticas()[0]
+    antes = clave_factores(parametros, 'datos')
+    monkeypatch.setattr(cotizacion, 'VERSION_MOTOR', 'otra')
+    assert clave_factores(parametros, 'datos') != antes
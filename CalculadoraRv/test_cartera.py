@@ -0,0 +1,13 @@
+import numpy as np
+
+from cartera import pension_mensual
+
+
+def test_pension_mensual_factor_sin_financiamiento_y_formas():
+    factores = np.array([[120.0, 0.0], [-3.0, 240.0]])
+    pension = pension_mensual(1200.0, factores)
+    assert np.array_equal(pension, [[10.0 / 12, 0.0], [0.0, 5.0 / 12]])
+    # Prima por fila contra factores por columna: la forma combinada
+    primas = np.array([[1200.0], [2400.0]])
+    assert pension_mensual(primas, np.array([120.0, 240.0])).shape == (2, 2)
+    assert pension_mensual(1200.0, 120.0) == 10.0 / 12
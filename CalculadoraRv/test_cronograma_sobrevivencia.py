@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+from cronograma_sobrevivencia import cronograma_lote
+from modelos import Conyuge, Hijo
+from motor_vectorial import flujos_sobrevivencia
+
+PR = 20.0
+FAMILIAS = [
+    (None, Conyuge(62, 'Mujer'), (Hijo(10, 'Mujer'),)),
+    (None, Conyuge(55, 'Hombre', es_invalido=True), tuple(Hijo(e, 'Hombre') for e in (3, 6, 9, 12))), # 120%
+    (None, None, (Hijo(20, 'Mujer', edad_limite=18), Hijo(16, 'Hombre'))),
+]
+
+
+@pytest.mark.parametrize('exacto', [False, True])
+def test_pagos_por_ano_suman_el_flujo_de_sobrevivencia(instantanea, exacto):
+    tablas = instantanea.tablas_mortalidad
+    cronograma = cronograma_lote(FAMILIAS, tablas, PR, exacto=exacto)
+    for familia, (_, conyuge, hijos) in enumerate(FAMILIAS):
+        flujos = flujos_sobrevivencia(conyuge, hijos, tablas, exacto=exacto) * PR
+        por_ano = cronograma[cronograma['familia'] == familia].groupby('ano')['pago_esperado_uf'].sum()
+        assert np.allclose(por_ano.reindex(range(len(flujos)), fill_value=0.0), flujos, atol=1e-12)
+
+
+def test_hijos_cobran_hasta_la_edad_limite_y_condicional_con_tope(instantanea):
+    cronograma = cronograma_lote(FAMILIAS, instantanea.tablas_mortalidad, PR, exacto=True)
+    hijos = cronograma[cronograma['beneficiario'] != 'Cónyuge']
+    assert (hijos['edad'] < 24).all()
+    assert not ((cronograma['familia'] == 2) & (cronograma['edad'] >= 18) & (cronograma['beneficiario'] == 'Hijo 1')).any()
+    assert np.allclose(cronograma['pago_condicional_uf'] * cronograma['prob_cobro'], cronograma['pago_esperado_uf'])
+    assert (cronograma['pago_condicional_uf'] <= cronograma['pct_pension'] * PR + 1e-12).all()
+
+
+def test_cronograma_mensual_repite_el_ano(instantanea):
+    anual = cronograma_lote(FAMILIAS[:1], instantanea.tablas_mortalidad, PR)
+    mensual = cronograma_lote(FAMILIAS[:1], instantanea.tablas_mortalidad, PR, frecuencia='mensual')
+    assert len(mensual) == 12 * len(anual)
+    assert np.isclose(mensual['pago_esperado_uf'].sum(), 12 * anual['pago_esperado_uf'].sum())
+    assert mensual['mes'].tolist()[:13] == list(range(1, 14))
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from cartera import matriz_flujos
+from estres_longevidad import ESCENARIOS_ESTANDAR, EscenarioEstres, ModalidadEstres, factores_estres, flujos_lote
+from modelos import Afiliado, Conyuge, Hijo
+from motor_vectorial import N_PLAZOS, SEXOS_PX, TABLAS_PX, vector_descuento
+
+PERFILES = [
+    (Afiliado(65, 'Hombre'), Conyuge(62, 'Mujer'), ()),
+    (Afiliado(58, 'Mujer', es_invalido=True), None, (Hijo(12, 'Hombre'),)),
+    (Afiliado(70, 'Hombre'), Conyuge(50, 'Mujer', es_invalido=True), tuple(Hijo(e, 'Mujer') for e in (2, 5, 8, 11))),
+    (None, Conyuge(60, 'Mujer'), (Hijo(15, 'Hombre'),)), # Sobrevivencia en curso
+]
+
+
+def _tablas_estresadas(tablas, escenario):
+    """Las tablas (dict de px) con el shock aplicado edad por edad, como diccionarios."""
+    estresadas = {}
+    for tabla in TABLAS_PX:
+        origen = 'Vejez' if escenario.invalidos_con_tabla_vejez else tabla
+        estresadas[tabla] = {}
+        for sexo in SEXOS_PX:
+            fila = {edad: tablas[origen][sexo].get(edad, 0.0) for edad in range(N_PLAZOS)}
+            nueva = {}
+            for edad in range(N_PLAZOS):
+                if not fila[edad] > 0:
+                    nueva[edad] = 0.0
+                    continue
+                px = fila[max(edad - escenario.desplazamiento_anos, 0)]
+                nueva[edad] = 1.0 - min((1.0 - px) * escenario.factor_qx, 1.0)
+            estresadas[tabla][sexo] = nueva
+    return estresadas
+
+
+def test_flujos_lote_igual_que_perfil_a_perfil(instantanea):
+    tablas = instantanea.tablas_mortalidad
+    assert np.allclose(flujos_lote(PERFILES, tablas), matriz_flujos(PERFILES, tablas), rtol=0.0, atol=1e-13)
+
+
+@pytest.mark.parametrize('escenario', ESCENARIOS_ESTANDAR + (EscenarioEstres('Combinado', 0.85, 2, True),), ids=lambda e: e.nombre)
+def test_escenario_igual_a_valorizar_con_tablas_estresadas(instantanea, escenario):
+    tablas = instantanea.tablas_mortalidad
+    descuento = vector_descuento('RVI', vector_vtd=instantanea.vector_vtd())
+    modalidades = [ModalidadEstres('RVI', descuento), ModalidadEstres('RVI PG 10 + 50% x 3', descuento, 10, 3, 50.0)]
+    base, estresados = factores_estres(PERFILES, tablas, [escenario], modalidades)
+
+    for factores, tablas_usadas in ((base, tablas), (estresados[0], _tablas_estresadas(tablas, escenario))):
+        flujos = matriz_flujos(PERFILES, tablas_usadas)
+        simple = flujos @ descuento
+        garantizado = np.maximum(flujos, np.arange(N_PLAZOS) < 10) @ (descuento * np.where(np.arange(N_PLAZOS) < 3, 1.5, 1.0))
+        assert np.allclose(factores, np.column_stack([simple, garantizado]), rtol=1e-12)
+
+
+def test_menos_mortalidad_sube_los_factores(instantanea):
+    descuento = vector_descuento('RVI', vector_vtd=instantanea.vector_vtd())
+    base, estresados = factores_estres(PERFILES[:1], instantanea.tablas_mortalidad, ESCENARIOS_ESTANDAR[:4], [ModalidadEstres('RVI', descuento)])
+    assert (estresados[:, 0, 0] > base[0, 0]).all()
+    assert estresados[1, 0, 0] > estresados[0, 0, 0] # qx x 0.8 más severo que x 0.9
@@ -0,0 +1,75 @@
+import shutil
+
+import pandas as pd
+import pytest
+
+import valorizacion_por_lotes
+from fragmentos_cartera import (
+    ErrorFragmentos,
+    _exigir_pyarrow,
+    dividir_cartera,
+    ejecutar_fragmento,
+    fusionar_fragmentos,
+)
+from registro_datos import BASE_DIR, obtener_registro
+from valorizacion_por_lotes import leer_lotes, requerir_pyarrow
+
+
+@pytest.fixture
+def sin_pyarrow(monkeypatch):
+    monkeypatch.setattr(valorizacion_por_lotes, 'pq', None)
+    monkeypatch.setattr(valorizacion_por_lotes, 'pa', None)
+
+
+def test_parquet_sin_pyarrow_da_un_error_claro(sin_pyarrow):
+    with pytest.raises(ImportError, match='pyarrow'):
+        next(leer_lotes('cartera.parquet', 10))
+    with pytest.raises(ErrorFragmentos, match='pyarrow'):
+        _exigir_pyarrow('/tmp/salida.parquet')
+
+
+def test_csv_no_requiere_pyarrow(sin_pyarrow):
+    requerir_pyarrow('cartera.csv')
+    _exigir_pyarrow('salida.csv')
+
+
+def _cartera(ruta, edad):
+    pd.DataFrame({
+        'edad': [edad, edad + 5, edad + 10], 'sexo': ['Hombre', 'Mujer', 'Hombre'],
+        'es_invalido': False, 'saldo_uf': [2000.0, 3000.0, 4000.0],
+    }).to_csv(ruta, index=False)
+
+
+def _dividir_y_ejecutar(tmp_path, edad, datos, ejecutar=True):
+    ruta = tmp_path / 'cartera.csv'
+    _cartera(ruta, edad)
+    directorio = str(tmp_path / 'corrida')
+    dividir_cartera(str(ruta), directorio, 2, datos, opciones_valorizacion={'valor_uf_clp': 39600.0, 'tasa_rp_pct': 3.41})
+    if ejecutar:
+        for numero in range(2):
+            ejecutar_fragmento(directorio, numero, datos)
+    return directorio
+
+
+def test_redividir_no_reutiliza_resultados_de_otra_cartera(tmp_path):
+    datos = obtener_registro(BASE_DIR, vigilar=False).instantanea()
+    directorio = _dividir_y_ejecutar(tmp_path, 60, datos)
+    anterior = fusionar_fragmentos(directorio)['totales']
+    resultado_viejo = tmp_path / 'resultado.json'
+    shutil.copy(tmp_path / 'corrida' / 'fragmento-000' / 'resultado.json', resultado_viejo)
+
+    # Otra cartera del mismo tamaño (mismos ids 'fila_cartera'): sin ejecutar no hay fusión
+    _dividir_y_ejecutar(tmp_path, 66, datos, ejecutar=False)
+    with pytest.raises(ErrorFragmentos, match='sin resultado'):
+        fusionar_fragmentos(directorio)
+
+    # Un resultado.json de la división anterior se rechaza aunque filas e ids coincidan
+    for numero in range(2):
+        ejecutar_fragmento(directorio, numero, datos)
+    shutil.copy(resultado_viejo, tmp_path / 'corrida' / 'fragmento-000' / 'resultado.json')
+    with pytest.raises(ErrorFragmentos, match='otra división'):
+        fusionar_fragmentos(directorio)
+
+    for numero in range(2):
+        ejecutar_fragmento(directorio, numero, datos)
+    assert fusionar_fragmentos(directorio)['totales'] != anterior
@@ -0,0 +1,28 @@
+from dataclasses import replace
+
+from cotizacion import ResultadoCotizacion
+from micro_lotes import cotizar_lote
+from modelos import Afiliado
+from precalentamiento import cotizaciones_sinteticas
+from registro_datos import BASE_DIR
+from servicio_cotizacion import _datos_mercado_cacheados, _iniciar_trabajador
+import servicio_cotizacion
+
+
+def _datos():
+    _iniciar_trabajador(BASE_DIR)
+    return _datos_mercado_cacheados(servicio_cotizacion._REGISTRO.instantanea(), None, None)
+
+
+def test_falla_del_motor_no_arrastra_al_lote():
+    # Edad fuera de la tabla: factor RP nulo -> ZeroDivisionError en la etapa de escala
+    buena = cotizaciones_sinteticas()[0]
+    mala = replace(buena, afiliado_edad_calculada=115, datos_afiliado=Afiliado(edad=115, sexo='Hombre', es_invalido=False))
+    resultados = cotizar_lote([buena, mala, buena], _datos())
+    assert isinstance(resultados[0], ResultadoCotizacion)
+    assert isinstance(resultados[1], ZeroDivisionError)
+    assert isinstance(resultados[2], ResultadoCotizacion)
+
+
+def test_falla_del_motor_responde_500_solo_a_su_solicitud():
+    assert servicio_cotizacion._respuesta('/cotizar', ZeroDivisionError('float division by zero'))[0] == 500
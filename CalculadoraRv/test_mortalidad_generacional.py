@@ -0,0 +1,59 @@
+import numpy as np
+
+from mortalidad_generacional import ANO_BASE, matriz_px_cohortes, matriz_qx_anual, tablas_generacionales
+from motor_vectorial import matriz_px
+from registro_datos import BASE_DIR
+
+ANOS_AA = np.arange(2016, 2037) # El último ('2036*') se mantiene constante
+
+
+def _qx_directo(qx, aa, ano):
+    """qx2020 * prod(1 - AA) hacia adelante, o dividido por los factores hacia atrás."""
+    factor = 1.0
+    for t in range(ANO_BASE + 1, ano + 1):
+        factor *= 1.0 - aa[min(t, ANOS_AA[-1]) - ANOS_AA[0]]
+    for t in range(ano + 1, ANO_BASE + 1):
+        factor /= 1.0 - aa[max(t, ANOS_AA[0]) - ANOS_AA[0]]
+    return qx * factor
+
+
+def test_qx_anual_igual_al_producto_de_factores():
+    rng = np.random.default_rng(1)
+    qx = rng.uniform(0.001, 0.3, 5)
+    aa = rng.uniform(0.0, 0.03, (5, len(ANOS_AA)))
+    anual = matriz_qx_anual(qx, aa, ANOS_AA, 2005, 2060)
+    for edad in range(5):
+        for k, ano in enumerate(range(2005, 2061)):
+            assert np.isclose(anual[edad, k], _qx_directo(qx[edad], aa[edad], ano), rtol=1e-12)
+
+
+def test_px_por_cohorte_usa_el_ano_calendario_de_cada_edad():
+    rng = np.random.default_rng(2)
+    qx = rng.uniform(0.001, 0.3, (2, 2, 4))
+    qx[1, 1, 3] = np.nan # Edad sin dato en la tabla
+    aa = rng.uniform(0.0, 0.03, (2, 2, 4, len(ANOS_AA)))
+    px = matriz_px_cohortes(qx, aa, ANOS_AA, 1950, 2000)
+    for cohorte in (1950, 1977, 2000):
+        for edad in range(3):
+            esperado = 1.0 - _qx_directo(qx[0, 1, edad], aa[0, 1, edad], cohorte + edad)
+            assert np.isclose(px[0, 1, cohorte - 1950, edad], esperado, rtol=1e-12)
+    assert (px[1, 1, :, 3] == 0.0).all()
+    assert not px.flags.writeable
+
+
+def test_ano_base_reproduce_las_tablas_estaticas(instantanea):
+    generacionales = tablas_generacionales(BASE_DIR, instantanea.version, ANO_BASE)
+    estaticas = matriz_px(instantanea.tablas_mortalidad)
+    for tabla in range(2):
+        for sexo in range(2):
+            edades = np.arange(110)
+            assert np.array_equal(generacionales.fila(tabla, sexo, edades)[edades, edades], estaticas[tabla, sexo, edades])
+    # Mismo objeto por (versión, año): la caché de flujos del motor sigue sirviendo
+    assert tablas_generacionales(BASE_DIR, instantanea.version, ANO_BASE) is generacionales
+
+
+def test_cohortes_mas_jovenes_viven_mas(instantanea):
+    hoy = tablas_generacionales(BASE_DIR, instantanea.version, 2020)
+    en_diez_anos = tablas_generacionales(BASE_DIR, instantanea.version, 2030)
+    assert (en_diez_anos.fila(0, 0, 65)[65:110] >= hoy.fila(0, 0, 65)[65:110]).all()
+    assert en_diez_anos.fila(0, 0, 65)[70] > hoy.fila(0, 0, 65)[70]
@@ -0,0 +1,94 @@
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+import motor_vectorial
+from modelos import Afiliado, Conyuge, Hijo
+from motor_vectorial import (
+    MAX_BENEFICIARIOS_EXACTO,
+    _MAX_TABLAS_REGISTRADAS,
+    _flujos_contingentes,
+    correccion_tope_exacta,
+    flujos_esperados,
+    flujos_sobrevivencia,
+)
+from registro_datos import BASE_DIR, obtener_registro
+
+AFILIADO = Afiliado(65, 'Hombre')
+CONYUGE = Conyuge(62, 'Mujer')
+
+
+def _tablas():
+    return obtener_registro(BASE_DIR, vigilar=False).instantanea().tablas_mortalidad
+
+
+def test_rotar_tablas_no_vacia_los_flujos_de_las_demas():
+    tablas = _tablas()
+    referencia = flujos_esperados(AFILIADO, CONYUGE, (), tablas)
+    for _ in range(_MAX_TABLAS_REGISTRADAS // 2): # Otras tablas (objetos nuevos), como los años de valorización
+        flujos_esperados(AFILIADO, CONYUGE, (), dict(tablas))
+    aciertos = _flujos_contingentes.cache_info().hits
+    assert flujos_esperados(AFILIADO, CONYUGE, (), tablas) is referencia
+    assert _flujos_contingentes.cache_info().hits == aciertos + 1
+
+
+def test_registro_concurrente_con_desalojo():
+    tablas = _tablas()
+    referencia = flujos_esperados(AFILIADO, CONYUGE, (), tablas).copy()
+
+    def _cotizar(i):
+        flujos = flujos_esperados(AFILIADO, CONYUGE, (), tablas if i % 2 else dict(tablas))
+        return bool((flujos == referencia).all())
+
+    with ThreadPoolExecutor(8) as ejecutor:
+        assert all(ejecutor.map(_cotizar, range(4 * _MAX_TABLAS_REGISTRADAS)))
+    assert len(motor_vectorial._PX_POR_TABLAS) <= _MAX_TABLAS_REGISTRADAS
+
+
+# --- Sobrevivencia exacta (V49.0) ---
+def _correccion_por_enumeracion(pcts, activos):
+    """E[max(sum(pct * vivo) - 1, 0)] recorriendo TODOS los estados, sin podas."""
+    correccion = np.zeros(activos.shape[1])
+    for estado in itertools.product((0, 1), repeat=len(pcts)):
+        vivo = np.array(estado, dtype=bool)[:, None]
+        probabilidad = np.where(vivo, activos, 1.0 - activos).prod(axis=0)
+        correccion += max(float(np.dot(estado, pcts)) - 1.0, 0.0) * probabilidad
+    return correccion
+
+
+def test_correccion_exacta_igual_a_la_enumeracion_completa():
+    rng = np.random.default_rng(0)
+    for _ in range(20):
+        B = int(rng.integers(2, 8))
+        pcts = rng.choice([0.15, 0.30, 0.50, 0.60], B)
+        activos = rng.random((B, 12)) * (rng.random((B, 12)) > 0.2)
+        assert np.allclose(correccion_tope_exacta(pcts, activos, tolerancia=0.0), _correccion_por_enumeracion(pcts, activos), atol=1e-14)
+
+
+def test_exacto_igual_al_aproximado_si_los_porcentajes_no_superan_100():
+    tablas = _tablas()
+    hijos = (Hijo(10, 'Mujer'),)
+    assert np.allclose(
+        flujos_sobrevivencia(CONYUGE, hijos, tablas, exacto=True), flujos_sobrevivencia(CONYUGE, hijos, tablas),
+        rtol=0.0, atol=1e-15
+    )
+
+
+def test_exacto_nunca_supera_al_tope_sobre_valores_esperados():
+    # E[min(S, 1)] <= min(E[S], 1): cónyuge 60% + cuatro hijos 15% suman 120%
+    tablas = _tablas()
+    hijos = tuple(Hijo(edad, 'Hombre') for edad in (3, 6, 9, 12))
+    exacto = flujos_sobrevivencia(CONYUGE, hijos, tablas, exacto=True)
+    aproximado = flujos_sobrevivencia(CONYUGE, hijos, tablas)
+    assert (exacto <= aproximado + 1e-15).all() and (exacto < aproximado - 1e-6).any()
+    assert (exacto >= 0).all() and (exacto <= 1).all()
+    con_afiliado = flujos_esperados(AFILIADO, CONYUGE, hijos, tablas, exacto=True)
+    assert (con_afiliado <= flujos_esperados(AFILIADO, CONYUGE, hijos, tablas) + 1e-15).all()
+
+
+def test_exacto_limita_los_beneficiarios():
+    B = MAX_BENEFICIARIOS_EXACTO + 1
+    with pytest.raises(ValueError):
+        correccion_tope_exacta(np.full(B, 0.15), np.full((B, 3), 0.5))
@@ -0,0 +1,14 @@
+from dataclasses import asdict
+
+from cotizacion import calcular_factores_cotizacion, escalar_cotizacion
+from pdf_generator import create_native_pdf_report
+from precalentamiento import cotizaciones_sinteticas
+from test_micro_lotes import _datos
+
+
+def test_informe_con_conyuge_como_dict():
+    parametros = cotizaciones_sinteticas()[0]
+    datos = _datos()
+    data = dict(escalar_cotizacion(parametros, datos, calcular_factores_cotizacion(parametros, datos)).report_data)
+    data['datos_conyuge'] = asdict(data['datos_conyuge'])
+    assert bytes(create_native_pdf_report(data))[:4] == b'%PDF'
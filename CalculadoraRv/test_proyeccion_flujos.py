@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import proyeccion_flujos
+import valorizacion_por_lotes
+from motor_vectorial import vector_descuento
+from proyeccion_flujos import COLUMNAS_FASES, escribir_proyeccion, proyectar_flujos
+from reservas_en_vigor import reservas_en_vigor
+from test_reservas_en_vigor import _polizas as _polizas_en_vigor
+
+FECHA = '2026-09-30'
+
+
+def _polizas():
+    return pd.DataFrame({
+        'edad': [65.0, 70.0], 'sexo': ['Hombre', 'Mujer'], 'es_invalido': False,
+        'fecha_inicio': ['2015-03-01', '2019-07-15'], 'pension_uf': [12.0, 20.0],
+        'pg_anos': [10, 0], 'compania': ['A', np.nan],
+    })
+
+
+def test_grupo_vacio_no_saca_polizas_de_la_proyeccion(instantanea):
+    total = proyectar_flujos(_polizas(), instantanea.tablas_mortalidad, FECHA)
+    por_compania = proyectar_flujos(_polizas(), instantanea.tablas_mortalidad, FECHA, por='compania')
+    assert total.attrs['polizas'] == por_compania.attrs['polizas'] == 2
+    assert set(por_compania['compania']) == {'A', ''}
+    assert np.isclose(por_compania['total_uf'].sum(), total['total_uf'].sum())
+
+
+def test_parquet_sin_pyarrow_no_escribe_csv_en_silencio(tmp_path, monkeypatch):
+    for modulo in (proyeccion_flujos, valorizacion_por_lotes):
+        monkeypatch.setattr(modulo, 'pq', None)
+    with pytest.raises(ImportError, match='pyarrow'):
+        escribir_proyeccion(pd.DataFrame({'periodo': [0]}), str(tmp_path / 'proyeccion.parquet'))
+    assert not list(tmp_path.iterdir())
+
+
+@pytest.mark.parametrize('exacto', [False, True])
+def test_valor_presente_de_los_flujos_igual_a_las_reservas(instantanea, exacto):
+    tablas, vtd = instantanea.tablas_mortalidad, instantanea.vector_vtd()
+    polizas = _polizas_en_vigor()
+    proyeccion = proyectar_flujos(polizas, tablas, FECHA, tamano_bloque=3, exacto=exacto)
+    d = vector_descuento('RVI', vector_vtd=vtd)
+    reservas = reservas_en_vigor(polizas, tablas, FECHA, vtd, exacto=exacto)
+    assert np.isclose(proyeccion['total_uf'].to_numpy() @ d[:len(proyeccion)], reservas['reserva_uf'].sum(), rtol=1e-12)
+    assert np.allclose(proyeccion[list(COLUMNAS_FASES)].sum(axis=1), proyeccion['total_uf'])
+    assert (proyeccion[list(COLUMNAS_FASES)] >= 0).all().all()
+
+
+def test_primer_ano_paga_la_pension_completa(instantanea):
+    # Afiliado vivo al inicio (t = 0): 12 pensiones, con el aumento si aún corre
+    polizas = _polizas().assign(anos_aumento=[2, 0], pct_aumento=[50, 0], fecha_inicio=FECHA)
+    proyeccion = proyectar_flujos(polizas, instantanea.tablas_mortalidad, FECHA)
+    assert np.isclose(proyeccion['total_uf'].iloc[0], 12 * (12.0 * 1.5 + 20.0))
+    assert proyeccion['fecha'].iloc[1] == pd.Timestamp('2027-09-30')
+
+
+def test_proyeccion_mensual_reparte_cada_ano(instantanea):
+    anual = proyectar_flujos(_polizas(), instantanea.tablas_mortalidad, FECHA)
+    mensual = proyectar_flujos(_polizas(), instantanea.tablas_mortalidad, FECHA, frecuencia='mensual')
+    assert len(mensual) == 12 * len(anual)
+    assert np.allclose(mensual.groupby('ano')['total_uf'].sum().to_numpy(), anual['total_uf'].to_numpy())
@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from modelos import Afiliado, Conyuge
+from motor_vectorial import flujos_esperados, flujos_sobrevivencia, vector_descuento
+from reservas_en_vigor import anos_transcurridos, reservas_en_vigor, valorizar_reservas
+
+FECHA = '2026-09-30'
+
+
+def _polizas():
+    return pd.DataFrame({
+        'edad': [65.0, 70.0, 62.0, np.nan], 'sexo': ['Hombre', 'Mujer', 'Hombre', 'Mujer'], 'es_invalido': False,
+        'conyuge_edad': [60.0, np.nan, 58.0, 66.0], 'conyuge_sexo': 'Mujer',
+        'fecha_inicio': ['2015-03-01', '2019-07-15', '2022-01-10', '2020-05-05'],
+        'pension_uf': [12.0, 20.0, 8.0, 15.0], 'pg_anos': [10, 0, 15, 0], 'anos_aumento': [0, 3, 0, 0],
+        'pct_aumento': [0, 50, 0, 0],
+        'compania': ['A', np.nan, 'B', np.nan], 'producto': [np.nan, 'RVI Simple', '', np.nan],
+    })
+
+
+def test_resumen_suma_lo_mismo_que_el_detalle(instantanea):
+    resumen, detalle = reservas_en_vigor(
+        _polizas(), instantanea.tablas_mortalidad, FECHA, instantanea.vector_vtd(), detalle=True, tamano_bloque=3
+    )
+    assert resumen['polizas'].sum() == detalle['reserva_uf'].notna().sum() == 4
+    assert np.isclose(resumen['reserva_uf'].sum(), detalle['reserva_uf'].sum())
+    assert not detalle[['compania', 'producto']].isna().any().any()
+
+
+def test_anos_transcurridos_son_anos_poliza_cumplidos():
+    assert anos_transcurridos(['2015-09-30', '2015-10-01', '2026-10-01'], FECHA).tolist() == [11, 10, -1]
+
+
+@pytest.mark.parametrize('exacto', [False, True])
+def test_reserva_por_poliza_igual_a_los_motores(instantanea, exacto):
+    tablas, vtd = instantanea.tablas_mortalidad, instantanea.vector_vtd()
+    polizas = pd.concat([_polizas(), _polizas().iloc[:1].assign(fecha_inicio='2027-01-01')], ignore_index=True)
+    reservas = valorizar_reservas(polizas, tablas, FECHA, vtd, exacto=exacto)
+    assert np.isnan(reservas['reserva_uf'].iloc[-1]) # Aún no comienza
+
+    d = vector_descuento('RVI', vector_vtd=vtd)
+    for i, poliza in polizas.iloc[:-1].iterrows():
+        k = int(reservas.at[i, 'anos_transcurridos'])
+        pg, anos_aumento = max(poliza.pg_anos - k, 0), max(poliza.anos_aumento - k, 0)
+        conyuge = None if np.isnan(poliza.conyuge_edad) else Conyuge(int(poliza.conyuge_edad) + k, poliza.conyuge_sexo)
+        if np.isnan(poliza.edad):
+            flujos = np.maximum(flujos_sobrevivencia(conyuge, (), tablas, exacto=exacto), np.arange(111) < pg)
+        else:
+            afiliado = Afiliado(int(poliza.edad) + k, poliza.sexo)
+            flujos = flujos_esperados(afiliado, conyuge, (), tablas, pg, exacto)
+        t = np.arange(len(flujos))
+        factor = flujos @ (d[:len(flujos)] * np.where(t < anos_aumento, 1 + poliza.pct_aumento / 100.0, 1.0))
+        assert np.isclose(reservas.at[i, 'reserva_uf'], 12.0 * poliza.pension_uf * factor, rtol=1e-12)
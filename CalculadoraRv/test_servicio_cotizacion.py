@@ -0,0 +1,47 @@
+import pytest
+
+from servicio_cotizacion import ErrorSolicitud, ano_valorizacion_desde_json, parametros_desde_json
+
+BASE = {'saldo_uf': 3000, 'afiliado': {'edad': 65, 'sexo': 'Hombre'}}
+
+
+@pytest.mark.parametrize('cambios', [
+    {'afiliado': {'edad': 115, 'sexo': 'Hombre'}},
+    {'hijos': [{'edad': -3, 'sexo': 'Mujer'}]},
+    {'saldo_uf': -1},
+    {'saldo_uf': 'mucho'},
+    {'escenarios': [{'pg_anos': 200}]},
+    {'anos_diferimiento': -1},
+    {'tipo_pension': 'Sobrevivencia', 'conyuge': {'edad': 60, 'sexo': 'Mujer'}},
+])
+def test_fuera_de_los_limites_del_panel(cambios):
+    with pytest.raises(ErrorSolicitud):
+        parametros_desde_json({**BASE, **cambios})
+
+
+def test_ano_valorizacion():
+    assert ano_valorizacion_desde_json(BASE) is None
+    assert ano_valorizacion_desde_json({'ano_valorizacion': 2030}) == 2030
+    with pytest.raises(ErrorSolicitud):
+        ano_valorizacion_desde_json({'ano_valorizacion': 2500})
+
+
+@pytest.mark.parametrize('cambios', [
+    {'comparar_todas': 'false'},
+    {'conyuge': {'edad': 60, 'sexo': 'Mujer', 'es_invalido': 'false'}},
+    {'incluye_pgu': 1},
+    {'rp': 'false'},
+    {'rvi_simple': 0},
+    {'rp_rvd': None},
+    {'sobrevivencia_exacta': 'true'},
+])
+def test_solo_booleanos_json(cambios):
+    with pytest.raises(ErrorSolicitud, match='true o false'):
+        parametros_desde_json({**BASE, **cambios})
+
+
+def test_booleanos_json():
+    parametros = parametros_desde_json({
+        **BASE, 'rp': False, 'conyuge': {'edad': 60, 'sexo': 'Mujer', 'es_invalido': True}
+    })
+    assert parametros.check_rp is False and parametros.datos_conyuge.es_invalido is True
@@ -0,0 +1,17 @@
+import pandas as pd
+
+from valorizacion_por_lotes import ConfiguracionLotes, leer_partes, valorizar_por_lotes
+
+
+def _valorizar(df):
+    return pd.DataFrame({'saldo_uf': df['saldo_uf'] * 2}, index=df.index)
+
+
+def test_una_corrida_mas_corta_no_hereda_partes_anteriores(tmp_path):
+    salida = str(tmp_path / 'salida')
+    configuracion = ConfiguracionLotes(filas_por_lote=1, formato_salida='csv')
+    for filas in (7, 4):
+        ruta = tmp_path / f'cartera-{filas}.csv'
+        pd.DataFrame({'saldo_uf': range(filas)}).to_csv(ruta, index=False)
+        valorizar_por_lotes(str(ruta), salida, valorizar=_valorizar, configuracion=configuracion)
+    assert leer_partes(salida)['saldo_uf'].tolist() == [0, 2, 4, 6]
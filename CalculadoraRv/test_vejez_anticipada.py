@@ -0,0 +1,16 @@
+import pandas as pd
+
+from registro_datos import BASE_DIR, obtener_registro
+from vejez_anticipada import evaluar_cartera_vejez_anticipada
+
+
+def test_cartera_con_filas_de_sobrevivencia():
+    datos = obtener_registro(BASE_DIR, vigilar=False).instantanea()
+    df = pd.DataFrame({
+        'edad': [58, None], 'sexo': ['Hombre', None], 'saldo_uf': [6000, 3000], 'promedio_10_anos_uf': [20, 20],
+        'conyuge_edad': [55, 60], 'conyuge_sexo': ['Mujer', 'Mujer'],
+    })
+    resultado = evaluar_cartera_vejez_anticipada(df, datos.tablas_mortalidad, vector_vtd=datos.vector_vtd())
+    assert resultado.loc[0, 'edad_actual'] == 58
+    assert resultado.loc[0, 'pension_rvi_uf'] > 0
+    assert resultado.loc[1].isna().all() # Causante fallecido: no aplica
@@ -1,6 +1,8 @@
+import numpy as np
 import pandas as pd
-import streamlit as st
 from datetime import date
+from types import MappingProxyType
+from cache_disco import CacheDisco
 
 # --- 0. FUNCIÓN AYUDANTE PARA CALCULAR EDAD ---
 def calculate_age(born):
@@ -13,147 +15,203 @@ def calculate_age(born):
 
 # --- 1. CARGA DE DATOS (EXCEL) ---
 
-@st.cache_data
-def cargar_tablas_de_mortalidad_reales(arch_h_vejez, arch_m_vejez, arch_h_inv, arch_m_inv):
+# --- INICIO CAMBIO V39.0 (Caché en disco compartida entre procesos) ---
+# Cada cargador se divide en:
+#   _leer_*      -> parsea el Excel y devuelve arreglos NumPy (lento, una vez)
+#   CACHE_DISCO  -> guarda/lee esos arreglos en disco (mmap, todos los workers)
+#   registro_datos.cargar_instantanea -> arma la estructura que usa la app
+
+TABLAS_MORTALIDAD = ('Vejez', 'Invalidez')
+SEXOS_MORTALIDAD = ('Hombre', 'Mujer')
+
+CACHE_DISCO = CacheDisco()
+
+# --- INICIO CAMBIO V41.0 (Datos de solo lectura, sin copia por rerun) ---
+# La instantánea del registro de datos (registro_datos.py) es un único objeto
+# compartido por todas las sesiones y procesos. Para que compartir sea
+# seguro, lo que contiene es inmutable.
+
+def arreglo_solo_lectura(arreglo):
+    """Devuelve el arreglo (sin copiarlo) marcado como no escribible."""
+    arreglo = np.asarray(arreglo)
+    if arreglo.flags.writeable:
+        arreglo.flags.writeable = False
+    return arreglo
+
+def mapeo_solo_lectura(valor):
+    """Convierte recursivamente un dict en vistas de solo lectura (MappingProxyType)."""
+    if isinstance(valor, dict):
+        return MappingProxyType({k: mapeo_solo_lectura(v) for k, v in valor.items()})
+    return valor
+# --- FIN CAMBIO V41.0 ---
+
+def leer_tablas_de_mortalidad(arch_h_vejez, arch_m_vejez, arch_h_inv, arch_m_inv):
     """
-    Carga las 4 Tablas de Mortalidad 2020 (Vejez e Invalidez)
-    desde los archivos Excel oficiales. (Pilar 2)
+    Parsea las 4 tablas y devuelve la probabilidad de supervivencia (1 - qx)
+    como arreglo px[tabla, sexo, edad] (NaN si la edad no existe).
     """
-    try:
-        # 1. Cargar Vejez
-        df_h_vejez = pd.read_excel(
-            arch_h_vejez, sheet_name='CB-2020, Hombres', skiprows=6, index_col='Edad'
-        )
-        df_m_vejez = pd.read_excel(
-            arch_m_vejez, sheet_name='B-2020, Mujeres', skiprows=6, index_col='Edad'
-        )
-        
-        # 2. Cargar Invalidez
-        df_h_inv = pd.read_excel(
-            arch_h_inv, sheet_name='MI-2020, Hombres', skiprows=6, index_col='Edad'
-        )
-        df_m_inv = pd.read_excel(
-            arch_m_inv, sheet_name='MI-2020, Mujeres', skiprows=6, index_col='Edad'
-        )
-
-        # 3. Crear el diccionario anidado
-        # (1 - qx) es la probabilidad de supervivencia
-        tablas_anidadas = {
-            'Vejez': {
-                'Hombre': (1 - df_h_vejez['Tasas de mortalidad qx']).to_dict(),
-                'Mujer': (1 - df_m_vejez['Tasas de mortalidad qx']).to_dict()
-            },
-            'Invalidez': {
-                'Hombre': (1 - df_h_inv['Tasas de mortalidad qx']).to_dict(),
-                'Mujer': (1 - df_m_inv['Tasas de mortalidad qx']).to_dict()
+    # 1. Cargar Vejez
+    df_h_vejez = pd.read_excel(
+        arch_h_vejez, sheet_name='CB-2020, Hombres', skiprows=6, index_col='Edad'
+    )
+    df_m_vejez = pd.read_excel(
+        arch_m_vejez, sheet_name='B-2020, Mujeres', skiprows=6, index_col='Edad'
+    )
+    
+    # 2. Cargar Invalidez
+    df_h_inv = pd.read_excel(
+        arch_h_inv, sheet_name='MI-2020, Hombres', skiprows=6, index_col='Edad'
+    )
+    df_m_inv = pd.read_excel(
+        arch_m_inv, sheet_name='MI-2020, Mujeres', skiprows=6, index_col='Edad'
+    )
+
+    # 3. (1 - qx) es la probabilidad de supervivencia. Solo filas con edad entera
+    # (el Excel trae filas de notas al final).
+    series = [
+        [1 - df_h_vejez['Tasas de mortalidad qx'], 1 - df_m_vejez['Tasas de mortalidad qx']],
+        [1 - df_h_inv['Tasas de mortalidad qx'], 1 - df_m_inv['Tasas de mortalidad qx']],
+    ]
+    edades = sorted({
+        int(edad) for fila in series for serie in fila for edad in serie.index
+        if isinstance(edad, (int, float)) and not pd.isna(edad) and float(edad).is_integer()
+    })
+    px = np.full((2, 2, max(edades) + 1), np.nan)
+    for i_tabla, fila in enumerate(series):
+        for i_sexo, serie in enumerate(fila):
+            for edad, valor in serie.items():
+                if isinstance(edad, (int, float)) and not pd.isna(edad) and float(edad).is_integer():
+                    px[i_tabla, i_sexo, int(edad)] = valor
+    return {'px': px}, {}
+
+def tablas_desde_px(px):
+    """Arma el diccionario anidado (V24.1) a partir del arreglo px."""
+    tablas_anidadas = {}
+    for i_tabla, tabla in enumerate(TABLAS_MORTALIDAD):
+        tablas_anidadas[tabla] = {}
+        for i_sexo, sexo in enumerate(SEXOS_MORTALIDAD):
+            fila = px[i_tabla, i_sexo]
+            tablas_anidadas[tabla][sexo] = {
+                edad: float(fila[edad]) for edad in range(len(fila)) if not np.isnan(fila[edad])
             }
-        }
-        
-        # 4. Regla especial: Beneficiarias no inválidas usan B-2020 (Vejez Mujer)
-        tablas_anidadas['Beneficiaria'] = tablas_anidadas['Vejez']['Mujer']
-        
-        return tablas_anidadas
-        
-    except FileNotFoundError as e:
-        st.error(f"Error: No se encontró un archivo de tabla de mortalidad. {e}")
-        return None
-    except Exception as e:
-        st.error(f"Error al leer Excel. Revisa los nombres de las hojas. Error: {e}")
-        return None
-
-@st.cache_data
-def cargar_vector_vtd(archivo_etti_cmf, hoja, col_mes, col_metrica):
+    
+    # 4. Regla especial: Beneficiarias no inválidas usan B-2020 (Vejez Mujer)
+    tablas_anidadas['Beneficiaria'] = tablas_anidadas['Vejez']['Mujer']
+    return tablas_anidadas
+
+def _leer_hoja_vtd(archivo_etti_cmf, hoja):
     """
-    Carga el Vector de Tasas de Descuento (VTD) V28.0
-    Fuerza la lectura de todo como string (dtype=str) para
-    evitar la conversión automática de 'oct-25' a Timestamp.
+    Lee una hoja del VTD como texto (dtype=str) para evitar la conversión
+    automática de 'oct-25' a Timestamp, y limpia los encabezados.
     """
-    try:
-        # --- INICIO PARCHE V27.0 ---
-        df_etti_full = pd.read_excel(
-            archivo_etti_cmf,
-            sheet_name=hoja,
-            skiprows=0, 
-            header=[0, 1], 
-            index_col=0, 
-            dtype=str 
-        )
-        df_etti_full.index.name = "Plazo"
-        
-        df_etti_full.index = df_etti_full.index.astype(int)
-        # --- FIN PARCHE V27.0 ---
-
-        # --- Limpieza V24.2 ---
-        level_0 = df_etti_full.columns.get_level_values(0)
-        cleaned_level_0 = [col.strip() if isinstance(col, str) else col for col in level_0]
-        
-        level_1 = df_etti_full.columns.get_level_values(1)
-        cleaned_level_1 = [col.strip() if isinstance(col, str) else col for col in level_1]
-        
-        df_etti_full.columns = pd.MultiIndex.from_arrays([cleaned_level_0, cleaned_level_1])
-        # --- FIN LIMPIEZA ---
+    # --- INICIO PARCHE V27.0 ---
+    df_etti_full = pd.read_excel(
+        archivo_etti_cmf,
+        sheet_name=hoja,
+        skiprows=0, 
+        header=[0, 1], 
+        index_col=0, 
+        dtype=str 
+    )
+    df_etti_full.index.name = "Plazo"
+    
+    df_etti_full.index = df_etti_full.index.astype(int)
+    # --- FIN PARCHE V27.0 ---
 
-        vector_series = df_etti_full.loc[:, (col_mes, col_metrica)]
+    # --- Limpieza V24.2 ---
+    level_0 = df_etti_full.columns.get_level_values(0)
+    cleaned_level_0 = [col.strip() if isinstance(col, str) else col for col in level_0]
+    
+    level_1 = df_etti_full.columns.get_level_values(1)
+    cleaned_level_1 = [col.strip() if isinstance(col, str) else col for col in level_1]
+    
+    df_etti_full.columns = pd.MultiIndex.from_arrays([cleaned_level_0, cleaned_level_1])
+    # --- FIN LIMPIEZA ---
+    return df_etti_full
 
-        vector_series = vector_series.str.replace('%', '', regex=False) \
-                                     .str.replace(',', '.', regex=False) \
-                                     .astype(float) / 100.0
-            
-        vector_series = vector_series.dropna()
-        vtd_dict = vector_series.to_dict()
+def _serie_vtd(df_etti_full, col_mes, col_metrica):
+    """Extrae la curva de un mes como tasas decimales, indexada por plazo."""
+    vector_series = df_etti_full.loc[:, (col_mes, col_metrica)]
 
-        max_plazo_cargado = max(vtd_dict.keys())
-        tasa_largo_plazo = vtd_dict[max_plazo_cargado]
+    vector_series = vector_series.str.replace('%', '', regex=False) \
+                                 .str.replace(',', '.', regex=False) \
+                                 .astype(float) / 100.0
         
-        for t in range(int(max_plazo_cargado) + 1, 111): # Rellenar hasta edad 110
-            vtd_dict[t] = tasa_largo_plazo
-            
-        return vtd_dict
+    return vector_series.dropna()
 
-    # --- INICIO BLOQUE DEBUG V24.5 ---
-    except KeyError:
-        st.error(f"Error al leer VTD: No se encontró la columna '{col_mes}' / '{col_metrica}' en la hoja '{hoja}'.")
-        st.error("¡MODO DEBUG! Nombres de columna leídos desde el Excel:")
-        try:
-            st.warning(df_etti_full.columns.to_list())
-        except Exception as e_debug:
-            st.error(f"Error durante el debug: {e_debug}")
-        
-        st.error("VERIFICA que los nombres en el script coincidan 100% con lo que se muestra en la lista de arriba.")
-        return None
-    # --- FIN BLOQUE DEBUG V24.5 ---
-        
-    except FileNotFoundError:
-        st.error(f"Error: No se encontró el archivo '{archivo_etti_cmf}'.")
-        return None
-    except Exception as e:
-        st.error(f"Error al procesar el archivo VTD: {e}")
-        return None
-
-@st.cache_data
-def cargar_tasas_de_venta(archivo_tasas_venta):
+def curva_vtd(plazos, tasas):
     """
-    Carga el archivo de Tasas de Venta Promedio (svtas_rv.xlsx)
-    publicado por la CMF.
+    Arma el dict {plazo: tasa} y rellena hasta el plazo 110 con la
+    última tasa disponible (ignora plazos sin dato).
     """
-    try:
-        df_tasas = pd.read_excel(
-            archivo_tasas_venta,
-            sheet_name='Informe SVTAS', # <-- ¡CORRECCIÓN V31.0!
-            skiprows=0, 
-            index_col=0 
-        )
-        df_tasas.index = df_tasas.index.str.strip()
-        df_tasas = df_tasas.replace({',': '.'}, regex=True).astype(float)
-        
-        return df_tasas
+    vtd_dict = {
+        int(plazo): float(tasa) for plazo, tasa in zip(plazos, tasas) if not np.isnan(tasa)
+    }
+
+    max_plazo_cargado = max(vtd_dict.keys())
+    tasa_largo_plazo = vtd_dict[max_plazo_cargado]
+    
+    for t in range(int(max_plazo_cargado) + 1, 111): # Rellenar hasta edad 110
+        vtd_dict[t] = tasa_largo_plazo
         
-    except FileNotFoundError:
-        st.error(f"Error: No se encontró el archivo '{archivo_tasas_venta}'.")
-        return None
-    except Exception as e:
-        st.error(f"Error al procesar el archivo de Tasas de Venta: {e}")
-        return None
+    return vtd_dict
+
+# --- INICIO V40.0: TODOS LOS MESES DEL VTD ---
+MESES_ES = ('ene', 'feb', 'mar', 'abr', 'may', 'jun', 'jul', 'ago', 'sep', 'oct', 'nov', 'dic')
+
+def clave_mes_vtd(mes):
+    """'oct-25' -> (2025, 10). Sirve para ordenar cronológicamente."""
+    abrev, anio = mes.split('-')
+    return (2000 + int(anio), MESES_ES.index(abrev.lower()) + 1)
+
+def leer_vtd_completo(archivo_etti_cmf, col_metrica='Spot Rate', prefijo_hoja='SR '):
+    """
+    Lee TODAS las hojas 'SR AAAA' del VTD y devuelve una matriz
+    tasas[mes, plazo] (NaN donde no hay dato) con los meses en orden
+    cronológico. Los meses sin ningún dato (aún no publicados) se omiten.
+    """
+    hojas = [h for h in pd.ExcelFile(archivo_etti_cmf).sheet_names if h.startswith(prefijo_hoja)]
+    series = {}
+    hoja_por_mes = {}
+    for hoja in hojas:
+        df_hoja = _leer_hoja_vtd(archivo_etti_cmf, hoja)
+        for col_mes, metrica in df_hoja.columns:
+            if metrica != col_metrica:
+                continue
+            serie = _serie_vtd(df_hoja, col_mes, col_metrica)
+            if serie.empty:
+                continue
+            series[col_mes] = serie
+            hoja_por_mes[col_mes] = hoja
+
+    meses = sorted(series, key=clave_mes_vtd)
+    plazos = np.arange(0, max(int(s.index.max()) for s in series.values()) + 1, dtype=np.int64)
+    tasas = np.full((len(meses), len(plazos)), np.nan)
+    for i, mes in enumerate(meses):
+        serie = series[mes]
+        tasas[i, serie.index.to_numpy(dtype=np.int64)] = serie.to_numpy(dtype=float)
+
+    meta = {'meses': meses, 'hojas': [hoja_por_mes[m] for m in meses]}
+    return {'plazos': plazos, 'tasas': tasas}, meta
+# --- FIN V40.0 ---
+
+def leer_tasas_de_venta(archivo_tasas_venta):
+    df_tasas = pd.read_excel(
+        archivo_tasas_venta,
+        sheet_name='Informe SVTAS', # <-- ¡CORRECCIÓN V31.0!
+        skiprows=0, 
+        index_col=0 
+    )
+    df_tasas.index = df_tasas.index.str.strip()
+    df_tasas = df_tasas.replace({',': '.'}, regex=True).astype(float)
+    meta = {
+        'indice': list(df_tasas.index),
+        'nombre_indice': df_tasas.index.name,
+        'columnas': list(df_tasas.columns)
+    }
+    return {'valores': df_tasas.to_numpy(dtype=float)}, meta
+
+# --- FIN CAMBIO V39.0 ---
 
 def obtener_prob_supervivencia(sexo, edad, es_invalido, tablas_mortalidad):
     """
@@ -0,0 +1,162 @@
+import os
+import time
+from dataclasses import dataclass
+from functools import partial
+from typing import Any
+import pandas as pd
+
+from cartera import valorizar_cartera
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError: # pyarrow es opcional: sin él solo se leen/escriben CSV
+    pa = pq = None
+
+# --- VALORIZACIÓN POR LOTES V55.0: CARTERAS MÁS GRANDES QUE LA RAM ---
+# La cartera se lee por lotes de filas (record batches de Parquet o trozos
+# de CSV), cada lote se valoriza con el motor vectorial (por defecto
+# cartera.valorizar_cartera) y el resultado se escribe de inmediato como una
+# parte 'parte-00000.parquet' (o .csv) en el directorio de salida. Nunca hay
+# más de un lote en memoria: la memoria máxima depende del tamaño del lote,
+# no del tamaño de la entrada.
+# El tamaño del lote se acota con 'memoria_maxima_mb' usando una estimación
+# fija de bytes por fila (registros de modelos.py + columnas de
+# resultado). Es un tope APROXIMADO: no se mide la memoria real, y carteras
+# con muchas columnas o hijos por fila pueden usar más por fila; en ese caso
+# conviene bajar BYTES_POR_FILA_ESTIMADOS o 'filas_por_lote'.
+# Cada lote informa su avance a la función 'progreso'. Las partes de una
+# corrida anterior en el directorio de salida se borran al empezar.
+
+FILAS_POR_LOTE = 50_000
+BYTES_POR_FILA_ESTIMADOS = 4096
+PREFIJO_PARTE = 'parte-'
+
+
+@dataclass(frozen=True)
+class ConfiguracionLotes:
+    """Tamaño de lote, memoria máxima y formato de las partes de salida."""
+    filas_por_lote: int = FILAS_POR_LOTE
+    memoria_maxima_mb: Any = None    # Tope aproximado (BYTES_POR_FILA_ESTIMADOS); None: sin tope
+    formato_salida: str = 'parquet'  # 'parquet' o 'csv' (CSV si no hay pyarrow)
+    columna_id: Any = None           # Columna de la entrada que se copia a la salida
+
+    def filas_efectivas(self):
+        """Filas por lote respetando el tope de memoria (estimado, no medido)."""
+        if self.memoria_maxima_mb is None:
+            return self.filas_por_lote
+        tope = int(self.memoria_maxima_mb * 1024 * 1024 // BYTES_POR_FILA_ESTIMADOS)
+        return max(1, min(self.filas_por_lote, tope))
+
+
+def _es_parquet(ruta):
+    return ruta.lower().endswith('.parquet')
+
+
+def requerir_pyarrow(ruta):
+    """ImportError claro si 'ruta' es Parquet y pyarrow no está instalado."""
+    if _es_parquet(ruta) and pq is None:
+        raise ImportError(
+            f"'{os.path.basename(ruta)}' es Parquet y requiere pyarrow; instálelo o use CSV."
+        )
+
+
+def contar_filas(ruta):
+    """Filas de la entrada si se conocen sin leerla (metadatos Parquet); si no, None."""
+    if _es_parquet(ruta) and pq is not None:
+        return pq.ParquetFile(ruta).metadata.num_rows
+    return None
+
+
+def leer_lotes(ruta, filas_por_lote=FILAS_POR_LOTE, columnas=None):
+    """Itera la cartera en DataFrames de a lo más 'filas_por_lote' filas."""
+    if _es_parquet(ruta):
+        requerir_pyarrow(ruta)
+        archivo = pq.ParquetFile(ruta)
+        for lote in archivo.iter_batches(batch_size=filas_por_lote, columns=columnas):
+            yield lote.to_pandas()
+    else:
+        yield from pd.read_csv(ruta, chunksize=filas_por_lote, usecols=columnas)
+
+
+def escribir_parte(df, directorio_salida, numero, formato='parquet'):
+    """Escribe el resultado de un lote como una parte numerada; devuelve la ruta."""
+    if formato == 'parquet' and pq is not None:
+        ruta = os.path.join(directorio_salida, f"{PREFIJO_PARTE}{numero:05d}.parquet")
+        pq.write_table(pa.Table.from_pandas(df, preserve_index=False), ruta)
+    else:
+        ruta = os.path.join(directorio_salida, f"{PREFIJO_PARTE}{numero:05d}.csv")
+        df.to_csv(ruta, index=False)
+    return ruta
+
+
+def borrar_partes(directorio_salida):
+    """Borra las partes de una corrida anterior (otra corrida pudo tener más lotes)."""
+    for nombre in os.listdir(directorio_salida):
+        if nombre.startswith(PREFIJO_PARTE):
+            os.remove(os.path.join(directorio_salida, nombre))
+
+
+def leer_partes(directorio_salida):
+    """Une las partes de un directorio de salida (para carteras que caben en memoria)."""
+    partes = sorted(
+        nombre for nombre in os.listdir(directorio_salida) if nombre.startswith(PREFIJO_PARTE)
+    )
+    for nombre in partes:
+        requerir_pyarrow(nombre)
+    return pd.concat(
+        [
+            pd.read_parquet(os.path.join(directorio_salida, nombre)) if _es_parquet(nombre)
+            else pd.read_csv(os.path.join(directorio_salida, nombre))
+            for nombre in partes
+        ],
+        ignore_index=True
+    )
+
+
+def valorizar_por_lotes(
+    ruta_entrada,
+    directorio_salida,
+    valorizar=None,
+    configuracion=ConfiguracionLotes(),
+    progreso=None,
+    **opciones_valorizacion
+    ):
+    """
+    Valoriza la cartera de 'ruta_entrada' lote a lote y escribe una parte por
+    lote en 'directorio_salida'.
+    - valorizar: función (df_lote) -> DataFrame con el mismo índice; por
+      defecto cartera.valorizar_cartera con 'opciones_valorizacion'
+      (tablas_mortalidad, valor_uf_clp, tasa_rp_pct, vector_vtd, ...)
+    - progreso: función (lotes, filas procesadas, filas totales o None)
+    Devuelve un resumen (lotes, filas, partes, segundos).
+    """
+    if valorizar is None:
+        valorizar = partial(valorizar_cartera, **opciones_valorizacion)
+    os.makedirs(directorio_salida, exist_ok=True)
+    borrar_partes(directorio_salida)
+    filas_por_lote = configuracion.filas_efectivas()
+    total = contar_filas(ruta_entrada)
+
+    inicio = time.perf_counter()
+    partes = []
+    filas = 0
+    for numero, lote in enumerate(leer_lotes(ruta_entrada, filas_por_lote)):
+        lote.index = pd.RangeIndex(filas, filas + len(lote)) # Fila global en la entrada
+        resultado = valorizar(lote).drop(columns='perfil', errors='ignore') # 'perfil' es local al lote
+        resultado.insert(0, 'fila', resultado.index.to_numpy())
+        if configuracion.columna_id is not None:
+            resultado.insert(1, configuracion.columna_id, lote[configuracion.columna_id].to_numpy())
+        partes.append(escribir_parte(resultado, directorio_salida, numero, configuracion.formato_salida))
+        filas += len(lote)
+        del lote, resultado
+        if progreso is not None:
+            progreso(len(partes), filas, total)
+
+    return {
+        'lotes': len(partes),
+        'filas': filas,
+        'filas_por_lote': filas_por_lote,
+        'partes': partes,
+        'segundos': time.perf_counter() - inicio,
+    }
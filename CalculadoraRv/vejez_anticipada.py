@@ -0,0 +1,156 @@
+from dataclasses import dataclass, replace
+import numpy as np
+import pandas as pd
+
+from cartera import agrupar_perfiles, columna_numerica, grupos_desde_dataframe, matriz_flujos, pension_mensual
+from grilla_productos import vector_descuento_rvi
+from modelos import PCT_VEJEZ_ANTICIPADA
+from motor_vectorial import N_PLAZOS, vector_descuento
+
+# --- EDAD MÍNIMA PARA VEJEZ ANTICIPADA V48.0 ---
+# El 'gatekeeper' de cotizacion.py solo responde si califica HOY. Aquí se
+# proyecta el saldo a cada edad futura (hasta la edad legal) con un supuesto
+# de aporte y rentabilidad, se valoriza la RVI Simple de la familia
+# envejecida 0, 1, 2, ... años (una fila de flujos por perfil y edad, y un
+# solo producto matriz-vector) y se informa la primera edad en que la
+# pensión alcanza el 80% del promedio de 10 años.
+# En cartera (una fila por afiliado, columnas de cartera.py + la columna
+# 'promedio_10_anos_uf' y, opcional, 'aporte_mensual_uf') se evalúan todos
+# los afiliados a la vez: perfiles únicos x años de postergación.
+
+EDAD_LEGAL = {'Hombre': 65, 'Mujer': 60}
+
+
+@dataclass(frozen=True)
+class SupuestosProyeccion:
+    """Supuestos para proyectar el saldo mientras se posterga la pensión."""
+    aporte_mensual_uf: float = 0.0        # Cotización mensual (UF) mientras sigue trabajando
+    rentabilidad_anual_pct: float = 3.0   # Rentabilidad real anual del fondo
+
+
+def proyectar_saldo(saldo_uf, anos, supuestos, aporte_mensual_uf=None):
+    """
+    Saldo (UF) tras 'anos' años: capitaliza el saldo y suma 12 aportes por año
+    (al cierre de cada año). Acepta arreglos (broadcasting).
+    """
+    r = supuestos.rentabilidad_anual_pct / 100.0
+    aporte = supuestos.aporte_mensual_uf if aporte_mensual_uf is None else aporte_mensual_uf
+    anos = np.asarray(anos, dtype=float)
+    capitalizacion = (1 + r) ** anos
+    anualidad = (capitalizacion - 1) / r if r != 0 else anos
+    return np.asarray(saldo_uf, dtype=float) * capitalizacion + 12.0 * np.asarray(aporte) * anualidad
+
+
+def envejecer(afiliado, conyuge, hijos, anos):
+    """La misma familia 'anos' años después."""
+    return (
+        replace(afiliado, edad=afiliado.edad + anos),
+        replace(conyuge, edad=conyuge.edad + anos) if conyuge else None,
+        tuple(replace(hijo, edad=hijo.edad + anos) for hijo in hijos)
+    )
+
+
+def _factores_por_edad(grupos, max_anos, tablas_mortalidad, descuento, exacto=False):
+    """
+    (G, max_anos + 1): factor de RVI Simple de cada grupo postergando
+    0..max_anos años. Cada familia envejecida se valoriza una sola vez.
+    """
+    perfiles, indice = agrupar_perfiles(grupos)
+    envejecidos, indice_envejecido = agrupar_perfiles([
+        envejecer(*perfil, k) for perfil in perfiles for k in range(max_anos + 1)
+    ])
+    factores = matriz_flujos(envejecidos, tablas_mortalidad, 0, exacto) @ descuento
+    return factores[indice_envejecido].reshape(len(perfiles), max_anos + 1)[indice]
+
+
+def trayectoria_vejez_anticipada(p, datos, supuestos=SupuestosProyeccion()):
+    """
+    Pensión de RVI Simple (método RVI de la cotización) a cada edad desde la
+    actual hasta la edad legal. En .attrs['edad_minima'] queda la primera
+    edad que califica (None si ninguna antes de la edad legal).
+    """
+    afiliado = p.datos_afiliado
+    edad_legal = EDAD_LEGAL[afiliado.sexo]
+    max_anos = max(edad_legal - afiliado.edad, 0)
+
+    descuento = vector_descuento_rvi(p, datos, N_PLAZOS)
+    factores = _factores_por_edad(
+        [(afiliado, p.datos_conyuge, tuple(p.datos_hijos))], max_anos, datos.tablas_mortalidad, descuento,
+        p.check_sobrevivencia_exacta
+    )[0]
+
+    anos = np.arange(max_anos + 1)
+    comision_decimal = p.input_comision_pct / 100.0 if p.check_incluye_comision else 0.0
+    saldo = proyectar_saldo(p.saldo_uf, anos, supuestos)
+    pension = pension_mensual(saldo * (1 - comision_decimal), factores)
+    requisito = p.input_promedio_10_anos_uf * PCT_VEJEZ_ANTICIPADA
+    califica = (pension >= requisito) & (afiliado.edad + anos < edad_legal)
+
+    resultado = pd.DataFrame({
+        "Edad": afiliado.edad + anos,
+        "Saldo Proyectado (UF)": saldo,
+        "Pensión RVI (UF)": pension,
+        "Requisito 80% (UF)": requisito,
+        "Califica": califica,
+    })
+    resultado.attrs['edad_minima'] = int(afiliado.edad + anos[califica][0]) if califica.any() else None
+    return resultado
+
+
+def evaluar_cartera_vejez_anticipada(
+    df_cartera,
+    tablas_mortalidad,
+    supuestos=SupuestosProyeccion(),
+    vector_vtd=None,
+    tasa_venta_pct=None,
+    exacto=False
+    ):
+    """
+    Primera edad en que cada afiliado califica para Vejez Anticipada (NaN si
+    no califica antes de la edad legal), con el saldo y la pensión a esa edad.
+    RVI con tasa de venta si se indica 'tasa_venta_pct'; si no, con el VTD.
+    Las filas sin afiliado (sobrevivencia, ver cartera.py) no aplican: quedan
+    en NaN. exacto=True: tope 100% por estado de los beneficiarios (V49.0).
+    """
+    grupos = grupos_desde_dataframe(df_cartera)
+    con_afiliado = np.array([afiliado is not None for afiliado, _, _ in grupos], dtype=bool)
+    grupos = [grupo for grupo, aplica in zip(grupos, con_afiliado) if aplica]
+    edad = np.array([afiliado.edad for afiliado, _, _ in grupos], dtype=np.int64)
+    edad_legal = np.array([EDAD_LEGAL[afiliado.sexo] for afiliado, _, _ in grupos], dtype=np.int64)
+    max_anos = int(max((edad_legal - edad).max(initial=0), 0))
+
+    if tasa_venta_pct is not None:
+        descuento = vector_descuento('TASA_PLANA', tasa_venta_pct / 100.0)
+    else:
+        descuento = vector_descuento('RVI', vector_vtd=vector_vtd)
+    factores = _factores_por_edad(grupos, max_anos, tablas_mortalidad, descuento, exacto)
+
+    anos = np.arange(max_anos + 1)[None, :]
+    comision_rvi = columna_numerica(df_cartera, 'comision_pct')[con_afiliado] / 100.0
+    aporte = columna_numerica(df_cartera, 'aporte_mensual_uf', supuestos.aporte_mensual_uf)[con_afiliado]
+    saldo = proyectar_saldo(
+        df_cartera['saldo_uf'].to_numpy(dtype=float)[con_afiliado][:, None], anos, supuestos, aporte[:, None]
+    )
+    pension = pension_mensual(saldo * (1 - comision_rvi[:, None]), factores)
+    requisito = df_cartera['promedio_10_anos_uf'].to_numpy(dtype=float)[con_afiliado] * PCT_VEJEZ_ANTICIPADA
+    califica = (pension >= requisito[:, None]) & (edad[:, None] + anos < edad_legal[:, None])
+
+    hay = califica.any(axis=1)
+    primera = np.argmax(califica, axis=1)
+    filas = np.arange(len(grupos))
+
+    def _por_fila(valores, dtype=float):
+        columna = pd.Series(np.nan, index=df_cartera.index, dtype=dtype)
+        columna[con_afiliado] = valores
+        return columna
+
+    resultado = pd.DataFrame(index=df_cartera.index)
+    resultado['edad_actual'] = _por_fila(edad, 'Int64')
+    resultado['edad_legal'] = _por_fila(edad_legal, 'Int64')
+    resultado['califica_hoy'] = _por_fila(califica[:, 0] if len(grupos) else [], 'boolean')
+    resultado['edad_minima_va'] = _por_fila(np.where(hay, edad + primera, np.nan))
+    resultado['anos_a_esperar'] = _por_fila(np.where(hay, primera, np.nan))
+    resultado['saldo_proyectado_uf'] = _por_fila(np.where(hay, saldo[filas, primera], np.nan))
+    resultado['pension_rvi_uf'] = _por_fila(np.where(hay, pension[filas, primera], np.nan))
+    resultado['requisito_uf'] = _por_fila(requisito)
+    return resultado